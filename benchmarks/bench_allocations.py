@@ -0,0 +1,144 @@
+"""Compares the memory kept alive by the API response pipeline.
+
+    The current pipeline (one response record, the body encoded by
+    ``requests`` as the raw request, and one redaction pattern for all
+    the fields) is compared with the pipeline used before (a merged
+    dictionary, a deep copy, and one pattern per field). The retained
+    bytes vary with the hash seed (through the template cache of the
+    ``re`` module), so they are reported in the ``extra_info`` of each
+    benchmark. The unit tests assert the retained blocks and bytes per
+    transaction with function replacements, which are not cached.
+"""
+# pylint: disable=protected-access
+import copy
+import re
+import tracemalloc
+
+import pytest
+import requests
+
+from helcim import conversions, gateway
+
+from benchmarks import corpus
+
+
+def _request_body(request_data):
+    """Returns the body encoded by requests for the POST data."""
+    return requests.Request(
+        'POST', corpus.API_DETAILS['url'], data=request_data
+    ).prepare().body
+
+def _legacy_patterns(request):
+    """Compiles the per-field redaction patterns used before."""
+    fields = request._identify_redact_fields()
+    api_names = ['accountId', 'apiToken', 'terminalId'] + [
+        field['api']
+        for redact_field in fields.values() if redact_field['redact']
+        for field in redact_field['fields']
+    ]
+
+    return [
+        (
+            re.compile(r'({}=.*?)(&|$)'.format(api_name)),
+            r'{}=REDACTED\g<2>'.format(api_name),
+            re.compile(r'<{0}>.*</{0}>'.format(api_name)),
+            r'<{0}>REDACTED</{0}>'.format(api_name),
+        )
+        for api_name in api_names
+    ]
+
+def _legacy_pipeline(dict_response, post_data, raw_response, patterns):
+    """Processes and redacts a response as before."""
+    processed = {
+        'transaction_success': bool(int(dict_response['response'])),
+        'response_message': str(dict_response['responseMessage']),
+        'notice': str(dict_response['notice']),
+    }
+    converted_fields = conversions.convert_helcim_response_fields(
+        dict_response.get('transaction', {}), conversions.FROM_API_FIELDS
+    )
+    processed = {**processed, **converted_fields}
+    processed['token_f4l4'] = conversions.create_f4l4(
+        processed.get('cc_number', None)
+    )
+    processed['raw_request'] = '&'.join(
+        '{}={}'.format(key, item) for key, item in post_data.items()
+    )
+    processed['raw_response'] = raw_response
+
+    redacted = copy.deepcopy(processed)
+
+    for request_pattern, request_repl, response_pattern, response_repl in (
+            patterns
+    ):
+        redacted['raw_request'] = request_pattern.sub(
+            request_repl, redacted['raw_request']
+        )
+        redacted['raw_response'] = response_pattern.sub(
+            response_repl, redacted['raw_response']
+        )
+
+    return processed, redacted
+
+def _retained_bytes(function):
+    """Returns the memory allocated by the function and kept alive."""
+    tracemalloc.start(25)
+
+    try:
+        before = tracemalloc.take_snapshot()
+        result = function()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    # Only counts the allocations made (directly or not) by this module
+    filters = [
+        tracemalloc.Filter(True, __file__, all_frames=True),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ]
+    statistics = after.filter_traces(filters).compare_to(
+        before.filter_traces(filters), 'filename'
+    )
+
+    assert result
+
+    return sum(statistic.size_diff for statistic in statistics)
+
+@pytest.mark.parametrize('pipeline', ['legacy', 'current'])
+@pytest.mark.parametrize('size', corpus.SIZES)
+def test_response_pipeline(benchmark, size, pipeline):
+    dict_response = corpus.api_response(size)
+    raw_response = corpus.API_RESPONSES[size]
+    post_data = conversions.process_request_fields(
+        corpus.API_DETAILS,
+        conversions.validate_request_fields(corpus.request_details(size)),
+        {'transactionType': 'purchase'},
+    )
+    body = _request_body(post_data)
+    request = gateway.BaseRequest(api_details=corpus.API_DETAILS)
+    patterns = _legacy_patterns(request)
+
+    def current():
+        request.response = conversions.process_api_response(
+            dict_response, body, raw_response
+        )
+        request.redact_data()
+
+        return request.response, request.redacted_response
+
+    def legacy():
+        return _legacy_pipeline(
+            dict_response, post_data, raw_response, patterns
+        )
+
+    function = current if pipeline == 'current' else legacy
+
+    # Warms up any cached patterns and settings
+    function()
+    request.response = request.redacted_response = None
+
+    benchmark.group = 'response_pipeline_{}'.format(size)
+    benchmark.extra_info['pipeline'] = pipeline
+    benchmark.extra_info['retained_bytes'] = _retained_bytes(function)
+
+    benchmark(function)
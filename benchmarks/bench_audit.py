@@ -0,0 +1,139 @@
+"""Benchmarks of the inline and compressed audit data storage.
+
+    The transaction table is filled with transactions with full-size
+    raw requests and responses, saved either inline (the default) or
+    as compressed audit payloads (``HELCIM_AUDIT_STORAGE``). The size
+    of each table is recorded in the ``extra_info`` of each result.
+"""
+# pylint: disable=redefined-outer-name
+from datetime import timedelta
+
+import pytest
+
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from helcim import conversions
+from helcim.models import (
+    HelcimTransaction, HelcimTransactionPayload, compress_audit_data
+)
+
+from benchmarks import corpus
+
+
+pytestmark = pytest.mark.django_db
+
+ROWS = 5000
+PAGE_SIZE = 100
+
+STORAGES = ('inline', 'compressed')
+
+def table_size(model):
+    """Returns the size of the model table (in bytes).
+
+        Returns ``None`` if the size is not available (e.g. SQLite
+        built without the ``dbstat`` virtual table).
+    """
+    table = model._meta.db_table # pylint: disable=protected-access
+
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT pg_total_relation_size(%s)'
+    elif connection.vendor == 'sqlite':
+        sql = 'SELECT SUM(pgsize) FROM dbstat WHERE name = %s'
+    else:
+        return None
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+
+@pytest.fixture(params=STORAGES)
+def transactions(request):
+    """Saves the transactions with the parametrized audit storage."""
+    raw_request = conversions.create_raw_request(
+        conversions.process_request_fields(
+            corpus.API_DETAILS,
+            conversions.validate_request_fields(
+                corpus.request_details('full')
+            ),
+            {'transactionType': 'purchase'},
+        )
+    )
+    raw_response = corpus.API_RESPONSES['full']
+    compressed = request.param == 'compressed'
+    now = timezone.now()
+
+    # Saved as new transactions would be (a backfill only frees space
+    # in the transaction table once the database is vacuumed)
+    saved = HelcimTransaction.objects.bulk_create([
+        HelcimTransaction(
+            raw_request=None if compressed else raw_request,
+            raw_response=None if compressed else raw_response,
+            transaction_success=True,
+            date_response=now - timedelta(minutes=index),
+            transaction_type='s',
+            transaction_id=index,
+            amount='100.00',
+            customer_code='CST1000',
+        )
+        for index in range(ROWS)
+    ])
+
+    if compressed:
+        HelcimTransactionPayload.objects.bulk_create([
+            HelcimTransactionPayload(
+                transaction=transaction,
+                raw_request=compress_audit_data(raw_request),
+                raw_response=compress_audit_data(raw_response),
+            )
+            for transaction in saved
+        ])
+
+    return request.param
+
+def _label(benchmark, name, storage):
+    """Groups the benchmark and records the storage and table sizes."""
+    benchmark.group = name
+    benchmark.extra_info['storage'] = storage
+    benchmark.extra_info['database'] = connection.vendor
+    benchmark.extra_info['transaction_table_bytes'] = table_size(
+        HelcimTransaction
+    )
+    benchmark.extra_info['payload_table_bytes'] = table_size(
+        HelcimTransactionPayload
+    )
+
+def test_list_page(benchmark, transactions):
+    """Retrieves a page of the latest transactions (all fields)."""
+    _label(benchmark, 'audit-list-page', transactions)
+
+    benchmark(
+        lambda: list(
+            HelcimTransaction.objects.order_by('-date_response')[:PAGE_SIZE]
+        )
+    )
+
+def test_table_scan(benchmark, transactions):
+    """Counts transactions on a column without an index."""
+    _label(benchmark, 'audit-table-scan', transactions)
+
+    benchmark(
+        HelcimTransaction.objects.filter(customer_code='CST1000').count
+    )
+
+def test_detail(benchmark, transactions):
+    """Retrieves one transaction and its raw request and response."""
+    _label(benchmark, 'audit-detail', transactions)
+    transaction_id = HelcimTransaction.objects.values_list(
+        'id', flat=True
+    ).first()
+
+    def detail():
+        transaction = HelcimTransaction.objects.get(id=transaction_id)
+
+        return transaction.audit_request, transaction.audit_response
+
+    benchmark(detail)
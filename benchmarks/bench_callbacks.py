@@ -0,0 +1,150 @@
+"""Benchmarks of the Helcim.js callback view under concurrent load.
+
+    Signed Helcim.js responses are posted to ``HelcimJSCallbackView``
+    from concurrent threads with ``immediate`` and ``batched`` writes
+    (see ``HELCIM_JS_CALLBACK_WRITES``). Every round also resubmits a
+    quarter of the responses, which must not be recorded again. The
+    p50 and p95 latency of the requests are recorded in the
+    ``extra_info`` of each result.
+"""
+# pylint: disable=redefined-outer-name
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+from itertools import count
+from statistics import median
+from time import perf_counter, sleep
+from unittest.mock import patch
+
+import pytest
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import RequestFactory
+
+from helcim import callbacks, models, views
+
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+SECRET = 'abcdefghijklmnop'
+
+WORKERS = 8
+RESPONSES_PER_ROUND = 64
+
+TRANSACTION_IDS = count(1000000)
+
+def signed_response(transaction_id):
+    """Returns a signed Helcim.js response."""
+    fields = {
+        'response': '1',
+        'responseMessage': 'APPROVED',
+        'date': '2020-09-11',
+        'time': '12:30:45',
+        'type': 'purchase',
+        'amount': '100.00',
+        'currency': 'CAD',
+        'cardHolderName': 'Test Person',
+        'cardNumber': '5454********5454',
+        'cardToken': '80defad45bae30e557da0e',
+        'transactionId': str(transaction_id),
+        'approvalCode': 'T6E1ST',
+        'orderNumber': 'INV{}'.format(transaction_id),
+    }
+    xml = '<?xml version="1.0"?><message>{}</message>'.format(''.join(
+        '<{0}>{1}</{0}>'.format(name, value)
+        for name, value in fields.items()
+    ))
+
+    return dict(
+        fields,
+        xml=xml,
+        xmlHash=hashlib.sha256((SECRET + xml).encode('utf-8')).hexdigest(),
+    )
+
+@pytest.fixture(params=['immediate', 'batched'])
+def callback_writes(request):
+    """Configures the Helcim.js secret and the write mode."""
+    settings = {
+        'helcim_js': {'purchase': {'url': '', 'token': 'a', 'secret': SECRET}},
+        'callback_writes': request.param,
+    }
+
+    with patch.dict('helcim.gateway.SETTINGS', settings):
+        yield request.param
+
+        # Waits for any queued responses to be saved
+        while not callbacks.get_writer().queue.empty():
+            sleep(0.05)
+
+def _post(view, factory, data):
+    """Posts the response and returns the request latency."""
+    request = factory.post('/helcim-js/purchase/', data)
+    request.user = AnonymousUser()
+
+    start = perf_counter()
+    response = view(request, config='purchase')
+    latency = perf_counter() - start
+
+    assert response.status_code == 200
+
+    return latency
+
+def _run_worker(responses):
+    """Posts the responses in a worker thread."""
+    view = views.HelcimJSCallbackView.as_view()
+    factory = RequestFactory()
+
+    try:
+        return [_post(view, factory, data) for data in responses]
+    finally:
+        # Each thread has its own database connection
+        connection.close()
+
+def post_concurrently(latencies, transaction_ids):
+    """Posts a round of responses (and resubmissions) across workers."""
+    round_ids = [next(TRANSACTION_IDS) for _ in range(RESPONSES_PER_ROUND)]
+    transaction_ids.extend(round_ids)
+    responses = [
+        signed_response(transaction_id) for transaction_id in round_ids
+    ]
+    responses += responses[::4]
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        futures = [
+            executor.submit(_run_worker, responses[worker::WORKERS])
+            for worker in range(WORKERS)
+        ]
+
+        for future in futures:
+            latencies.extend(future.result())
+
+def test_callback_concurrent(benchmark, callback_writes):
+    """Throughput and latency of concurrent Helcim.js callbacks."""
+    benchmark.group = 'helcim-js-callback'
+    benchmark.extra_info['writes'] = callback_writes
+    benchmark.extra_info['workers'] = WORKERS
+    benchmark.extra_info['responses'] = RESPONSES_PER_ROUND
+    latencies = []
+    transaction_ids = []
+
+    benchmark.pedantic(
+        post_concurrently, args=(latencies, transaction_ids), rounds=5
+    )
+
+    latencies.sort()
+    benchmark.extra_info['p50_ms'] = round(median(latencies) * 1000, 3)
+    benchmark.extra_info['p95_ms'] = round(
+        latencies[int(len(latencies) * 0.95)] * 1000, 3
+    )
+
+    while not callbacks.get_writer().queue.empty():
+        sleep(0.05)
+
+    # Resubmitted responses are not recorded (the number of rounds
+    # depends on the options, e.g. --benchmark-disable runs one)
+    sleep(callbacks.BATCH_INTERVAL * 2)
+    assert sorted(
+        models.HelcimTransaction.objects.values_list(
+            'transaction_id', flat=True
+        )
+    ) == sorted(transaction_ids)
@@ -0,0 +1,227 @@
+"""Micro-benchmarks of the conversion and redaction hot paths.
+
+    Each function runs on every transaction. The benchmarks are
+    parametrized by payload size (see ``benchmarks.corpus``) to show
+    how the costs scale with the number of populated fields.
+"""
+# pylint: disable=redefined-outer-name
+from datetime import datetime
+
+import pytest
+
+from helcim import conversions, gateway
+from helcim.mixins import ResponseMixin
+
+from benchmarks import corpus
+
+
+class Response(ResponseMixin):
+    """Minimal object to run the ResponseMixin methods."""
+    def __init__(self, response, redacted_response=None):
+        self.response = response
+        self.redacted_response = redacted_response or {}
+        self.django_user = None
+        self.save_token = False
+
+def _label(benchmark, name, size, fields):
+    """Groups the benchmark and records the number of fields."""
+    benchmark.group = name
+    benchmark.extra_info['size'] = size
+    benchmark.extra_info['fields'] = fields
+
+@pytest.mark.parametrize('size', corpus.SIZES)
+def test_validate_request_fields(benchmark, size):
+    details = corpus.request_details(size)
+    _label(benchmark, 'validate_request_fields', size, len(details))
+
+    benchmark(conversions.validate_request_fields, details)
+
+@pytest.mark.parametrize('size', corpus.SIZES)
+def test_process_request_fields(benchmark, size):
+    cleaned = conversions.validate_request_fields(
+        corpus.request_details(size)
+    )
+    _label(benchmark, 'process_request_fields', size, len(cleaned))
+
+    benchmark(
+        conversions.process_request_fields,
+        corpus.API_DETAILS,
+        cleaned,
+        {'transactionType': 'purchase'},
+    )
+
+@pytest.mark.parametrize('size', corpus.SIZES)
+def test_create_raw_request(benchmark, size):
+    request_data = conversions.process_request_fields(
+        corpus.API_DETAILS,
+        conversions.validate_request_fields(corpus.request_details(size)),
+        {'transactionType': 'purchase'},
+    )
+    _label(benchmark, 'create_raw_request', size, len(request_data))
+
+    benchmark(conversions.create_raw_request, request_data)
+
+@pytest.mark.parametrize('size', corpus.SIZES)
+def test_convert_helcim_response_fields__api(benchmark, size):
+    fields = corpus.api_response(size).get('transaction', {})
+    _label(benchmark, 'convert_helcim_response_fields_api', size, len(fields))
+
+    benchmark(
+        conversions.convert_helcim_response_fields,
+        fields,
+        conversions.FROM_API_FIELDS,
+    )
+
+@pytest.mark.parametrize('size', corpus.SIZES)
+def test_convert_helcim_response_fields__helcim_js(benchmark, size):
+    fields = corpus.HELCIM_JS_RESPONSES[size]
+    _label(benchmark, 'convert_helcim_response_fields_js', size, len(fields))
+
+    benchmark(
+        conversions.convert_helcim_response_fields,
+        fields,
+        conversions.FROM_HELCIM_JS_FIELDS,
+    )
+
+# The date and time parsers: strptime (before the fast parsers), the
+# fast parser without its cache (e.g. a new value), and the cached parser
+PARSERS = {
+    'date': {
+        'strptime': lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+        'uncached': conversions.parse_date.__wrapped__,
+        'cached': conversions.parse_date,
+    },
+    'time': {
+        'strptime': lambda value: datetime.strptime(value, '%H:%M:%S').time(),
+        'uncached': conversions.parse_time.__wrapped__,
+        'cached': conversions.parse_time,
+    },
+}
+
+@pytest.mark.parametrize('parser', ['strptime', 'uncached', 'cached'])
+@pytest.mark.parametrize('field,value', [
+    ('date', '2020-09-11'), ('time', '12:30:45'),
+])
+def test_parse_date_time(benchmark, field, value, parser):
+    benchmark.group = 'parse_{}'.format(field)
+    benchmark.extra_info['parser'] = parser
+
+    benchmark(PARSERS[field][parser], value)
+
+@pytest.mark.parametrize('size', corpus.SIZES)
+def test_process_api_response(benchmark, size):
+    response = corpus.api_response(size)
+    request_data = conversions.process_request_fields(
+        corpus.API_DETAILS,
+        conversions.validate_request_fields(corpus.request_details(size)),
+        {'transactionType': 'purchase'},
+    )
+    _label(
+        benchmark,
+        'process_api_response',
+        size,
+        len(response.get('transaction', {})),
+    )
+
+    benchmark(
+        conversions.process_api_response,
+        response,
+        request_data,
+        corpus.API_RESPONSES[size],
+    )
+
+def _processed_response(size):
+    """Returns a processed API response for the provided size."""
+    request_data = conversions.process_request_fields(
+        corpus.API_DETAILS,
+        conversions.validate_request_fields(corpus.request_details(size)),
+        {'transactionType': 'purchase'},
+    )
+
+    return conversions.process_api_response(
+        corpus.api_response(size), request_data, corpus.API_RESPONSES[size]
+    )
+
+@pytest.mark.parametrize('size', corpus.SIZES)
+def test_redact_data(benchmark, size):
+    processed = _processed_response(size)
+    _label(benchmark, 'redact_data', size, len(processed))
+
+    def setup():
+        # redact_data updates the response, so each round gets a copy
+        return (Response(dict(processed)),), {}
+
+    benchmark.pedantic(
+        lambda response: response.redact_data(),
+        setup=setup,
+        rounds=2000,
+    )
+
+@pytest.mark.parametrize('size', corpus.SIZES)
+def test_create_model_arguments(benchmark, size):
+    response = Response(_processed_response(size))
+    response.redact_data()
+    _label(
+        benchmark, 'create_model_arguments', size,
+        len(response.redacted_response),
+    )
+
+    benchmark(response.create_model_arguments, 's')
+
+class Token():
+    """A saved token (without the database)."""
+    # pylint: disable=too-few-public-methods
+    token = '80defad45bae30e557da0e'
+    token_f4l4 = '54545454'
+    customer_code = 'CST1000'
+    django_user = None
+
+def _prepare_request(**kwargs):
+    """Prepares the POST data of a purchase (without sending it)."""
+    request = gateway.Purchase(
+        api_details=corpus.API_DETAILS, amount='100.00', **kwargs
+    )
+    request.validate_fields()
+    request.determine_card_details()
+
+    return request.process_request_fields('purchase')
+
+@pytest.mark.parametrize('token', ['details', 'instance'])
+def test_prepare_token_purchase(benchmark, token):
+    benchmark.group = 'prepare_token_purchase'
+
+    if token == 'details':
+        benchmark(
+            _prepare_request, token=Token.token, token_f4l4=Token.token_f4l4,
+            customer_code=Token.customer_code,
+        )
+    else:
+        benchmark(_prepare_request, token_instance=Token())
+
+PAYMENT_DETAILS = {
+    'token': {
+        'token': Token.token, 'token_f4l4': Token.token_f4l4,
+        'customer_code': Token.customer_code,
+    },
+    'cc': {
+        'cc_number': '5454545454545454', 'cc_expiry': '0125',
+        'cc_name': 'Test Person', 'cc_cvv': '100',
+    },
+    'mag': {'mag': '%B5454545454545454^TEST/PERSON^2501?'},
+}
+
+@pytest.mark.parametrize('method', list(PAYMENT_DETAILS))
+def test_determine_card_details(benchmark, method):
+    benchmark.group = 'determine_card_details'
+    request = gateway.Purchase(
+        api_details=corpus.API_DETAILS, amount='100.00',
+        **PAYMENT_DETAILS[method]
+    )
+    request.validate_fields()
+    cleaned = request.cleaned
+
+    def determine_card_details():
+        request.cleaned = dict(cleaned)
+        request.determine_card_details()
+
+    benchmark(determine_card_details)
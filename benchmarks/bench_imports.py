@@ -0,0 +1,63 @@
+"""Benchmarks of the import time of the helcim modules.
+
+    Each benchmark imports the modules in a new interpreter with
+    ``python -X importtime``, so the timings are not affected by the
+    modules already imported by the test run. None of the modules
+    should import the HTTP and XML libraries (see ``helcim.lazy``).
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+# The libraries only imported when a request is first made
+LAZY_MODULES = ('requests', 'xmltodict')
+
+IMPORTS = {
+    'models': 'helcim.models',
+    'admin': 'helcim.admin',
+    'gateway': 'helcim.gateway',
+    'urls': 'helcim.urls',
+}
+
+SCRIPT = 'import django; django.setup(); import {}'
+
+def import_times(module):
+    """Returns the cumulative import time (in us) of each module.
+
+        The modules imported by ``django.setup()`` are included (a
+        module already imported by it is not timed again).
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SCRIPT.format(module)],
+        env=dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.settings'),
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+    times = {}
+
+    # Lines are "import time: <self> | <cumulative> | <module>"
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+
+    return times
+
+@pytest.mark.parametrize('name', list(IMPORTS))
+def test_import_time(benchmark, name):
+    """Time to start an interpreter and import the module."""
+    benchmark.group = 'import'
+    times = benchmark.pedantic(
+        import_times, args=(IMPORTS[name],), rounds=5, iterations=1
+    )
+    benchmark.extra_info['import_us'] = times.get(IMPORTS[name])
+
+    assert not set(LAZY_MODULES) & set(times)
@@ -0,0 +1,172 @@
+"""End-to-end benchmarks of the transaction pipeline.
+
+    Each transaction is submitted to the local Helcim API stub and
+    saved to the database, so the timings include the request
+    conversions, the XML parsing, the redactions, and the database
+    writes.
+"""
+# pylint: disable=invalid-name, unused-argument
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from django.db import connection
+
+from helcim import gateway
+
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+WORKERS = (4, 16)
+TRANSACTIONS_PER_ROUND = 64
+
+CARD_DETAILS = {
+    'cc_name': 'Test Person',
+    'cc_number': '5454545454545454',
+    'cc_expiry': '0125',
+    'cc_cvv': '100',
+}
+
+HELCIM_JS_RESPONSE = {
+    'response': '1',
+    'responseMessage': 'APPROVED',
+    'noticeMessage': '',
+    'date': '2020-09-11',
+    'time': '12:30:45',
+    'type': 'purchase',
+    'amount': '100.00',
+    'currency': 'CAD',
+    'cardHolderName': 'Test Person',
+    'cardNumber': '5454********5454',
+    'cardExpiry': '0125',
+    'cardToken': '80defad45bae30e557da0e',
+    'cardType': 'MasterCard',
+    'transactionId': '1000000',
+    'avsResponse': 'X',
+    'cvvResponse': 'M',
+    'approvalCode': 'T6E1ST',
+    'orderNumber': 'INV1000000',
+    'customerCode': 'CST1000',
+    'xml': '<?xml version="1.0"?><message><response>1</response></message>',
+    'xmlHash': 'a' * 64,
+}
+
+def purchase(api_details, customer_code):
+    """Makes a credit card purchase."""
+    return gateway.Purchase(
+        api_details=api_details,
+        save_token=True,
+        amount='100.00',
+        customer_code=customer_code,
+        **CARD_DETAILS
+    ).process()
+
+def preauthorize(api_details, customer_code):
+    """Makes a credit card preauthorization."""
+    return gateway.Preauthorize(
+        api_details=api_details,
+        save_token=True,
+        amount='100.00',
+        customer_code=customer_code,
+        **CARD_DETAILS
+    ).process()
+
+def capture(api_details, customer_code):
+    """Captures a preauthorization."""
+    return gateway.Capture(
+        api_details=api_details, transaction_id=1000000
+    ).process()
+
+def refund(api_details, customer_code):
+    """Refunds an amount to a saved card token."""
+    return gateway.Refund(
+        api_details=api_details,
+        amount='100.00',
+        token='80defad45bae30e557da0e',
+        token_f4l4='54545454',
+        customer_code=customer_code,
+    ).process()
+
+def verification(api_details, customer_code):
+    """Verifies a credit card."""
+    return gateway.Verification(
+        api_details=api_details, customer_code=customer_code, **CARD_DETAILS
+    ).process()
+
+def helcim_js_response(api_details, customer_code):
+    """Validates and records a Helcim.js purchase response."""
+    response = gateway.HelcimJSResponse(
+        dict(HELCIM_JS_RESPONSE, customerCode=customer_code), save_token=True
+    )
+    response.is_valid()
+
+    return response.record_purchase()
+
+TRANSACTIONS = {
+    'purchase': purchase,
+    'preauthorize': preauthorize,
+    'capture': capture,
+    'refund': refund,
+    'verification': verification,
+    'helcim_js_response': helcim_js_response,
+}
+
+def _run_worker(transaction, api_details, count, customer_code):
+    """Runs transactions in a worker thread."""
+    try:
+        for _ in range(count):
+            transaction(api_details, customer_code)
+    finally:
+        # Each thread has its own database connection
+        connection.close()
+
+def run_concurrently(transaction, api_details, workers, total):
+    """Runs the total transactions split across the worker threads."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Each worker is a separate customer (as with real checkouts)
+        futures = [
+            executor.submit(
+                _run_worker,
+                transaction,
+                api_details,
+                total // workers,
+                'CST{}'.format(1000 + worker),
+            )
+            for worker in range(workers)
+        ]
+
+        for future in futures:
+            future.result()
+
+@pytest.mark.parametrize('name', sorted(TRANSACTIONS))
+def test_single_thread(benchmark, api_details, database_vendor, name):
+    """Latency of a single transaction."""
+    benchmark.group = 'pipeline-{}'.format(name)
+    benchmark.extra_info['database'] = database_vendor
+    benchmark.extra_info['workers'] = 1
+
+    benchmark(TRANSACTIONS[name], api_details, 'CST1000')
+
+@pytest.mark.parametrize('workers', WORKERS)
+@pytest.mark.parametrize('name', sorted(TRANSACTIONS))
+def test_concurrent(benchmark, api_details, database_vendor, name, workers):
+    """Throughput of transactions across concurrent workers."""
+    benchmark.group = 'pipeline-{}-concurrent'.format(name)
+    benchmark.extra_info['database'] = database_vendor
+    benchmark.extra_info['workers'] = workers
+    benchmark.extra_info['transactions'] = TRANSACTIONS_PER_ROUND
+
+    benchmark.pedantic(
+        run_concurrently,
+        args=(
+            TRANSACTIONS[name], api_details, workers, TRANSACTIONS_PER_ROUND
+        ),
+        rounds=5,
+        iterations=1,
+    )
+
+    # No statistics are collected with --benchmark-disable
+    if benchmark.stats:
+        benchmark.extra_info['transactions_per_second'] = (
+            TRANSACTIONS_PER_ROUND / benchmark.stats.stats.mean
+        )
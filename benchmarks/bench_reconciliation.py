@@ -0,0 +1,76 @@
+"""Benchmarks of the reconciliation of large Helcim exports.
+
+    A CSV export is generated with half of its transactions saved to
+    the database (a quarter with a different amount). The peak memory
+    allocated while reconciling is recorded in the ``extra_info`` of
+    each result, to confirm it does not grow with the export size.
+"""
+# pylint: disable=redefined-outer-name
+from datetime import datetime, timedelta
+from decimal import Decimal
+import tracemalloc
+
+import pytest
+
+from helcim import reconciliation
+from helcim.models import HelcimTransaction
+
+
+pytestmark = pytest.mark.django_db
+
+EXPORT_SIZES = (10000, 40000)
+
+HEADER = 'transactionId,type,date,time,amount,currency,orderNumber\n'
+
+@pytest.fixture(params=EXPORT_SIZES)
+def export(request, tmpdir):
+    """Writes the export and saves half of its transactions."""
+    size = request.param
+    start = datetime(2020, 1, 1)
+    path = tmpdir.join('export.csv')
+
+    with open(str(path), 'w') as export_file:
+        export_file.write(HEADER)
+
+        for index in range(size):
+            export_file.write(
+                '{0},purchase,{1:%Y-%m-%d},{1:%H:%M:%S},10.00,CAD,'
+                'INV{0}\n'.format(index, start + timedelta(seconds=index))
+            )
+
+    HelcimTransaction.objects.bulk_create([
+        HelcimTransaction(
+            transaction_success=True,
+            date_response=start + timedelta(seconds=index),
+            transaction_type='s',
+            transaction_id=index,
+            amount=Decimal('10.00' if index % 4 else '9.00'),
+            currency='CAD',
+            order_number='INV{}'.format(index),
+        )
+        for index in range(0, size, 2)
+    ], batch_size=500)
+
+    return str(path), size
+
+def _reconcile(path):
+    """Reconciles the export and returns the number of discrepancies."""
+    return sum(
+        1 for _ in reconciliation.reconcile(reconciliation.read_export(path))
+    )
+
+def test_reconcile(benchmark, export):
+    """Time and peak memory to reconcile the export."""
+    path, size = export
+    benchmark.group = 'reconcile'
+    benchmark.extra_info['rows'] = size
+
+    tracemalloc.start()
+    discrepancies = _reconcile(path)
+    benchmark.extra_info['peak_memory_bytes'] = (
+        tracemalloc.get_traced_memory()[1]
+    )
+    tracemalloc.stop()
+    benchmark.extra_info['discrepancies'] = discrepancies
+
+    benchmark.pedantic(_reconcile, args=(path,), rounds=3)
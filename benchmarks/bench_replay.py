@@ -0,0 +1,48 @@
+"""Benchmarks of the transaction pipeline replaying recorded responses.
+
+    The responses are recorded from the local Helcim API stub once and
+    then replayed without any network requests, so the timings only
+    include the processing done by django-helcim (conversions, XML
+    parsing, redactions, and database writes).
+"""
+# pylint: disable=redefined-outer-name
+from unittest.mock import patch
+
+import pytest
+
+from helcim import transports
+
+from benchmarks.bench_pipeline import TRANSACTIONS
+
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+REPLAYED = ('purchase', 'preauthorize', 'capture', 'refund', 'verification')
+
+@pytest.fixture
+def cassette(tmpdir, api_details):
+    """Records each replayed transaction type to a cassette."""
+    path = str(tmpdir.join('cassette.jsonl'))
+
+    with patch.dict(transports.SETTINGS, {
+            'transport_mode': 'record', 'transport_cassette': path,
+    }):
+        for name in REPLAYED:
+            TRANSACTIONS[name](api_details, 'CST1000')
+
+    yield path
+
+    transports._TRANSPORTS.clear() # pylint: disable=protected-access
+
+@pytest.mark.parametrize('name', REPLAYED)
+def test_replay(benchmark, api_details, cassette, database_vendor, name):
+    """Latency of a single transaction without the network time."""
+    benchmark.group = 'replay-{}'.format(name)
+    benchmark.extra_info['database'] = database_vendor
+
+    with patch.dict(transports.SETTINGS, {
+            'transport_mode': 'replay',
+            'transport_cassette': cassette,
+            'transport_replay_latency': False,
+    }):
+        benchmark(TRANSACTIONS[name], api_details, 'CST1000')
@@ -0,0 +1,85 @@
+"""Benchmarks of the daily transaction summaries.
+
+    Compares totalling the transactions in Python (loading each
+    transaction) with the database aggregation of ``helcim.reports``,
+    and the cached summaries (where only the current day is
+    recomputed).
+"""
+# pylint: disable=redefined-outer-name, protected-access
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from helcim import reports
+from helcim.models import HelcimTransaction
+
+
+pytestmark = pytest.mark.django_db
+
+DAYS = 30
+TRANSACTIONS_PER_DAY = 200
+TYPES = ('s', 's', 's', 'p', 'c', 'r')
+
+@pytest.fixture
+def transactions():
+    """Saves the transactions of each day."""
+    now = timezone.now()
+
+    HelcimTransaction.objects.bulk_create([
+        HelcimTransaction(
+            transaction_success=index % 10 != 0,
+            date_response=now - timedelta(
+                days=day, minutes=index % (60 * 12)
+            ),
+            transaction_type=TYPES[index % len(TYPES)],
+            amount=Decimal('10.00'),
+            currency='CAD' if index % 3 else 'USD',
+        )
+        for day in range(DAYS)
+        for index in range(TRANSACTIONS_PER_DAY)
+    ], batch_size=500)
+
+    cache.clear()
+
+    yield (now - timedelta(days=DAYS - 1)).date(), reports._today()
+
+    cache.clear()
+
+def _python_totals(date_from, date_to):
+    """Totals the transactions by iterating the model instances."""
+    totals = {}
+
+    for transaction in HelcimTransaction.objects.all():
+        day = transaction.date_response.date()
+
+        if date_from <= day <= date_to:
+            key = (
+                day, transaction.transaction_type, transaction.currency,
+                transaction.transaction_success,
+            )
+            totals[key] = totals.get(key, Decimal('0.00')) + (
+                transaction.amount or 0
+            )
+
+    return totals
+
+def test_python_totals(benchmark, transactions):
+    """Totals computed in Python (the approach being replaced)."""
+    benchmark.group = 'reports'
+    benchmark(_python_totals, *transactions)
+
+def test_daily_totals(benchmark, transactions):
+    """Totals aggregated by the database."""
+    benchmark.group = 'reports'
+    benchmark(reports.daily_totals, *transactions)
+
+def test_daily_summaries_cached(benchmark, transactions):
+    """Summaries with the past days cached."""
+    benchmark.group = 'reports'
+    reports.daily_summaries(*transactions)
+
+    benchmark(reports.daily_summaries, *transactions)
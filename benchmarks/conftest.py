@@ -0,0 +1,35 @@
+"""Fixtures for the django-helcim benchmarks."""
+import pytest
+
+from helcim.testing.simulator import HelcimSimulator
+
+
+@pytest.fixture(scope='session')
+def helcim_simulator():
+    """Starts a local Helcim API simulator for the benchmark session.
+
+        The simulator is stateless, so the same capture and refund
+        requests can be repeated in every round.
+    """
+    simulator = HelcimSimulator(stateful=False).start()
+
+    yield simulator
+
+    simulator.stop()
+
+@pytest.fixture
+def api_details(helcim_simulator): # pylint: disable=redefined-outer-name
+    """API details that direct requests to the local simulator."""
+    return {
+        'url': helcim_simulator.url,
+        'account_id': '1234567890',
+        'token': 'abcdefghijklmno1234567890',
+        'terminal_id': '98765432',
+    }
+
+@pytest.fixture
+def database_vendor():
+    """The vendor of the database used by the benchmarks."""
+    from django.db import connection # pylint: disable=import-outside-toplevel
+
+    return connection.vendor
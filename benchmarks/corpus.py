@@ -0,0 +1,176 @@
+"""Recorded-style payloads used by the micro-benchmarks.
+
+    Payloads are provided at three sizes (``minimal``, ``typical``, and
+    ``full``) to show how costs scale with the number of populated
+    fields.
+"""
+from collections import OrderedDict
+
+import xmltodict
+
+
+API_DETAILS = {
+    'url': 'https://secure.myhelcim.com/api/',
+    'account_id': '1234567890',
+    'token': 'abcdefghijklmno1234567890',
+    'terminal_id': '98765432',
+}
+
+FULL_REQUEST_DETAILS = OrderedDict([
+    ('amount', '100.00'),
+    ('cc_number', '5454545454545454'),
+    ('cc_expiry', '0125'),
+    ('cc_cvv', '100'),
+    ('cc_name', 'Test Person'),
+    ('customer_code', 'CST1000'),
+    ('test', True),
+    ('ecommerce', True),
+    ('ip_address', '192.168.1.1'),
+    ('cc_address', '123 Fake Street'),
+    ('cc_postal_code', 'T1T 1T1'),
+    ('comments', 'Online order'),
+    ('amount_shipping', '10.00'),
+    ('amount_tax', '5.00'),
+    ('tax_details', 'GST'),
+    ('shipping_method', 'Ground'),
+    ('billing_contact_name', 'Test Person'),
+    ('billing_business_name', 'Test Business'),
+    ('billing_street_1', '123 Fake Street'),
+    ('billing_street_2', 'Unit 1'),
+    ('billing_city', 'Edmonton'),
+    ('billing_province', 'AB'),
+    ('billing_country', 'CAN'),
+    ('billing_postal_code', 'T1T 1T1'),
+    ('billing_phone', '780-555-5555'),
+    ('billing_fax', '780-555-5556'),
+    ('billing_email', 'test@example.com'),
+    ('shipping_contact_name', 'Test Person'),
+    ('shipping_business_name', 'Test Business'),
+    ('shipping_street_1', '123 Fake Street'),
+    ('shipping_street_2', 'Unit 1'),
+    ('shipping_city', 'Edmonton'),
+    ('shipping_province', 'AB'),
+    ('shipping_country', 'CAN'),
+    ('shipping_postal_code', 'T1T 1T1'),
+    ('shipping_phone', '780-555-5555'),
+    ('shipping_fax', '780-555-5556'),
+    ('shipping_email', 'test@example.com'),
+])
+
+REQUEST_SIZES = {
+    'minimal': 4,
+    'typical': 14,
+    'full': len(FULL_REQUEST_DETAILS),
+}
+
+def request_details(size):
+    """Returns request details with the number of fields for the size."""
+    return OrderedDict(
+        list(FULL_REQUEST_DETAILS.items())[:REQUEST_SIZES[size]]
+    )
+
+API_RESPONSES = {
+    'minimal': """<?xml version="1.0"?>
+<message>
+    <response>1</response>
+    <responseMessage>APPROVED</responseMessage>
+    <notice></notice>
+</message>
+""",
+    'typical': """<?xml version="1.0"?>
+<message>
+    <response>1</response>
+    <responseMessage>APPROVED</responseMessage>
+    <notice></notice>
+    <transaction>
+        <transactionId>1111111</transactionId>
+        <type>purchase</type>
+        <date>2020-09-11</date>
+        <time>12:30:45</time>
+        <amount>100.00</amount>
+        <currency>CAD</currency>
+        <cardNumber>5454********5454</cardNumber>
+        <cardType>MasterCard</cardType>
+        <approvalCode>T6E1ST</approvalCode>
+    </transaction>
+</message>
+""",
+    'full': """<?xml version="1.0"?>
+<message>
+    <response>1</response>
+    <responseMessage>APPROVED</responseMessage>
+    <notice></notice>
+    <transaction>
+        <transactionId>1111111</transactionId>
+        <type>purchase</type>
+        <date>2020-09-11</date>
+        <time>12:30:45</time>
+        <cardHolderName>Test Person</cardHolderName>
+        <amount>100.00</amount>
+        <currency>CAD</currency>
+        <cardNumber>5454********5454</cardNumber>
+        <cardToken>80defad45bae30e557da0e</cardToken>
+        <expiryDate>0125</expiryDate>
+        <cardType>MasterCard</cardType>
+        <avsResponse>X</avsResponse>
+        <cvvResponse>M</cvvResponse>
+        <approvalCode>T6E1ST</approvalCode>
+        <orderNumber>INV1000</orderNumber>
+        <customerCode>CST1000</customerCode>
+    </transaction>
+</message>
+""",
+}
+
+def api_response(size):
+    """Returns the parsed API response (as from ``xmltodict``)."""
+    return xmltodict.parse(API_RESPONSES[size])['message']
+
+HELCIM_JS_RESPONSES = {
+    'minimal': OrderedDict([
+        ('response', '1'),
+        ('responseMessage', 'APPROVED'),
+        ('noticeMessage', ''),
+        ('date', '2020-09-11'),
+        ('time', '12:30:45'),
+    ]),
+    'typical': OrderedDict([
+        ('response', '1'),
+        ('responseMessage', 'APPROVED'),
+        ('noticeMessage', ''),
+        ('date', '2020-09-11'),
+        ('time', '12:30:45'),
+        ('type', 'purchase'),
+        ('amount', '100.00'),
+        ('currency', 'CAD'),
+        ('cardNumber', '5454********5454'),
+        ('cardType', 'MasterCard'),
+        ('transactionId', '1111111'),
+        ('approvalCode', 'T6E1ST'),
+    ]),
+    'full': OrderedDict([
+        ('response', '1'),
+        ('responseMessage', 'APPROVED'),
+        ('noticeMessage', ''),
+        ('date', '2020-09-11'),
+        ('time', '12:30:45'),
+        ('type', 'purchase'),
+        ('amount', '100.00'),
+        ('currency', 'CAD'),
+        ('cardHolderName', 'Test Person'),
+        ('cardNumber', '5454********5454'),
+        ('cardExpiry', '0125'),
+        ('cardToken', '80defad45bae30e557da0e'),
+        ('cardType', 'MasterCard'),
+        ('transactionId', '1111111'),
+        ('avsResponse', 'X'),
+        ('cvvResponse', 'M'),
+        ('approvalCode', 'T6E1ST'),
+        ('orderNumber', 'INV1000'),
+        ('customerCode', 'CST1000'),
+        ('xml', API_RESPONSES['full']),
+        ('xmlHash', 'a' * 64),
+    ]),
+}
+
+SIZES = ('minimal', 'typical', 'full')
@@ -0,0 +1,502 @@
+"""Load generator simulating Django Oscar checkout traffic.
+
+    Checkouts are run through ``helcim.bridge_oscar`` (the same entry
+    points used by an Oscar payment view) against the local Helcim API
+    simulator (``helcim.testing.simulator``). Each checkout is either a
+    purchase or a preauthorization followed by a capture, paid with
+    either a new card (with the token saved to the vault) or a saved
+    token.
+
+    Run with (see ``--help`` for all options)::
+
+        python -m benchmarks.loadtest --checkouts 500 --workers 8
+
+    The report includes the throughput, the p50/p95/p99 latency of
+    each bridge, and the database contention: the latency of the
+    individual queries (lock waits show up as slow queries) and any
+    database errors (e.g. ``IntegrityError`` from concurrent token
+    saves or ``OperationalError`` from SQLite lock timeouts). Errors
+    that are handled inside a query block (such as the
+    ``IntegrityError`` retried by ``get_or_create``) are counted as
+    well.
+"""
+import argparse
+import json
+import os
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+from random import Random
+from time import perf_counter
+
+import django
+
+from helcim.testing.simulator import (
+    HelcimSimulator, LATENCY_DISTRIBUTIONS, THROUGHPUT_MODES
+)
+
+
+Card = namedtuple('Card', ('name', 'number', 'expiry_date', 'ccv'))
+
+# The prefixes and suffixes of the database names the load test may wipe
+# (without ``--allow-wipe``)
+BENCHMARK_PREFIXES = ('benchmark', 'loadtest')
+BENCHMARK_SUFFIXES = ('_benchmark', '_benchmarks', '_loadtest')
+
+CARD = Card('Test Person', '5454545454545454', date(2025, 1, 31), '100')
+
+BILLING_ADDRESS = {
+    'first_name': 'Test',
+    'last_name': 'Person',
+    'line1': '123 Fake Street',
+    'line4': 'Edmonton',
+    'state': 'AB',
+    'postcode': 'T1T 1T1',
+    'country': 'CA',
+}
+
+def setup_django(api_url=None):
+    """Configures Django and directs the Helcim API to the simulator.
+
+        Run in the main process and in each worker process.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    django.setup()
+
+    # pylint: disable=import-outside-toplevel
+    from helcim.settings import SETTINGS
+
+    if api_url:
+        SETTINGS['api_url'] = api_url
+
+def is_benchmark_database(name):
+    """Whether the database name is reserved for benchmarks.
+
+        The file extension (e.g. of a SQLite database) is ignored.
+    """
+    name = os.path.splitext(os.path.basename(str(name)))[0].lower()
+
+    return name.startswith(BENCHMARK_PREFIXES) or name.endswith(
+        BENCHMARK_SUFFIXES
+    )
+
+def prepare_database(customers, ledger, allow_wipe=False):
+    """Migrates the database and creates the customers.
+
+        All transactions and tokens are deleted first, so the database
+        name must start or end with a benchmark prefix or suffix (see
+        ``BENCHMARK_PREFIXES`` and ``BENCHMARK_SUFFIXES``) unless
+        ``allow_wipe`` is ``True``.
+
+        Each customer is a Django user with one card token, which is
+        also saved to the simulator ledger.
+
+        Returns:
+            list: The ``(user ID, customer code, token ID)`` of each
+                customer.
+
+        Raises:
+            ImproperlyConfigured: The database is not a benchmark
+                database.
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.auth import get_user_model
+    from django.core.exceptions import ImproperlyConfigured
+    from django.core.management import call_command
+    from django.db import connection
+
+    from helcim import models
+
+    database = connection.settings_dict['NAME']
+
+    if not allow_wipe and not is_benchmark_database(database):
+        raise ImproperlyConfigured(
+            'The load test deletes all transactions and tokens, but {} is '
+            'not a benchmark database. Use a database name starting with '
+            '"benchmark" or ending with "_benchmarks" (or pass '
+            '--allow-wipe).'.format(database)
+        )
+
+    call_command('migrate', verbosity=0)
+
+    models.HelcimTransaction.objects.all().delete()
+    models.HelcimToken.objects.all().delete()
+    user_model = get_user_model()
+    user_model.objects.filter(username__startswith='loadtest-').delete()
+
+    prepared = []
+
+    for index in range(customers):
+        customer_code = 'CST{}'.format(2000 + index)
+        user = user_model.objects.create(
+            username='loadtest-{}'.format(index)
+        )
+        card = ledger.add_card(customer_code)
+        token = models.HelcimToken.objects.create(
+            token=card.token,
+            token_f4l4=card.f4l4,
+            cc_name=card.name,
+            cc_type=card.card_type,
+            customer_code=customer_code,
+            django_user=user,
+        )
+        prepared.append((user.pk, customer_code, str(token.pk)))
+
+    return prepared
+
+class QueryRecorder():
+    """Database execute wrapper that records query timings and errors."""
+    def __init__(self):
+        self.durations = []
+        self.errors = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        except Exception as error:
+            self.errors[type(error).__name__] += 1
+            raise
+        finally:
+            self.durations.append(perf_counter() - start)
+
+def _timed_bridge(result, name, bridge):
+    """Processes a bridge and records its latency and outcome."""
+    start = perf_counter()
+
+    try:
+        response = bridge.process()
+    except Exception as error: # pylint: disable=broad-except
+        result['outcomes'][name][type(error).__name__] += 1
+        response = None
+    else:
+        # The bridges return None if the database save failed
+        outcome = 'success' if response is not None else 'DjangoError'
+        result['outcomes'][name][outcome] += 1
+    finally:
+        result['latencies'][name].append(perf_counter() - start)
+
+    return response
+
+def checkout(result, options, random, user, customer_code, token_id):
+    """Runs a single checkout through the Oscar bridges."""
+    from helcim import bridge_oscar # pylint: disable=import-outside-toplevel
+
+    if random.random() < options['saved_token_ratio']:
+        details = {
+            'token_id': token_id,
+            'django_user': user,
+            'customer_code': customer_code,
+        }
+    else:
+        details = {
+            'card': CARD,
+            'save_token': True,
+            'django_user': user,
+        }
+
+    amount = Decimal('100.00')
+
+    if random.random() >= options['preauth_ratio']:
+        _timed_bridge(
+            result,
+            'purchase',
+            bridge_oscar.PurchaseBridge(
+                amount, billing_address=BILLING_ADDRESS, **details
+            ),
+        )
+        return
+
+    response = _timed_bridge(
+        result,
+        'preauthorize',
+        bridge_oscar.PreauthorizeBridge(
+            amount, billing_address=BILLING_ADDRESS, **details
+        ),
+    )
+
+    if response:
+        preauth, _ = response
+        _timed_bridge(
+            result,
+            'capture',
+            bridge_oscar.CaptureBridge(preauth.transaction_id),
+        )
+
+def run_worker(options, worker, checkouts, customers):
+    """Runs checkouts in a worker thread or process.
+
+        Returns:
+            dict: The (picklable) latencies, outcomes, and database
+                query details of the worker.
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+
+    random = Random('{}-{}'.format(options['seed'], worker))
+    recorder = QueryRecorder()
+    result = {
+        'latencies': {
+            'checkout': [], 'purchase': [], 'preauthorize': [], 'capture': [],
+        },
+        'outcomes': {
+            'purchase': Counter(), 'preauthorize': Counter(),
+            'capture': Counter(),
+        },
+    }
+
+    try:
+        users = get_user_model().objects.in_bulk(
+            [user_id for user_id, _, _ in customers]
+        )
+
+        with connection.execute_wrapper(recorder):
+            for _ in range(checkouts):
+                # Customers are shared by the workers to cause contention
+                user_id, customer_code, token_id = random.choice(customers)
+                start = perf_counter()
+                checkout(
+                    result, options, random, users[user_id], customer_code,
+                    token_id,
+                )
+                result['latencies']['checkout'].append(perf_counter() - start)
+    finally:
+        # Each thread has its own database connection
+        connection.close()
+
+    result['outcomes'] = {
+        name: dict(outcomes) for name, outcomes in result['outcomes'].items()
+    }
+    result['queries'] = recorder.durations
+    result['database_errors'] = dict(recorder.errors)
+
+    return result
+
+def _initialize_process(api_url):
+    """Configures Django in a worker process."""
+    setup_django(api_url)
+
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+
+    rank = int(round(fraction * len(values)))
+
+    return values[max(0, min(len(values), rank) - 1)]
+
+def summarize(values):
+    """Returns the count and p50/p95/p99 (in milliseconds) of values."""
+    values = sorted(values)
+
+    return {
+        'count': len(values),
+        'p50': percentile(values, 0.50) * 1000,
+        'p95': percentile(values, 0.95) * 1000,
+        'p99': percentile(values, 0.99) * 1000,
+    }
+
+def combine(results, elapsed):
+    """Combines the worker results into the report."""
+    latencies = {}
+    outcomes = {}
+    queries = []
+    database_errors = Counter()
+
+    for result in results:
+        for name, values in result['latencies'].items():
+            latencies.setdefault(name, []).extend(values)
+
+        for name, counts in result['outcomes'].items():
+            outcomes.setdefault(name, Counter()).update(counts)
+
+        queries.extend(result['queries'])
+        database_errors.update(result['database_errors'])
+
+    checkouts = len(latencies.get('checkout', []))
+
+    return {
+        'elapsed': elapsed,
+        'checkouts': checkouts,
+        'throughput': checkouts / elapsed if elapsed else 0.0,
+        'latency': {
+            name: summarize(values)
+            for name, values in latencies.items() if values
+        },
+        'outcomes': {
+            name: dict(counts) for name, counts in outcomes.items() if counts
+        },
+        'database': {
+            'queries': summarize(queries),
+            'query_time': sum(queries),
+            'errors': dict(database_errors),
+        },
+    }
+
+def run(options, customers):
+    """Runs the load test across the worker pool and returns the report."""
+    workers = options['workers']
+    per_worker = [options['checkouts'] // workers] * workers
+
+    for index in range(options['checkouts'] % workers):
+        per_worker[index] += 1
+
+    if options['pool'] == 'process':
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_initialize_process,
+            initargs=(options['api_url'],),
+        )
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+    start = perf_counter()
+
+    with executor:
+        futures = [
+            executor.submit(run_worker, options, worker, count, customers)
+            for worker, count in enumerate(per_worker)
+        ]
+        results = [future.result() for future in futures]
+
+    return combine(results, perf_counter() - start)
+
+def format_report(report, options):
+    """Formats the report as text."""
+    lines = [
+        'Checkouts: {} ({} {} workers) in {:.2f} s'.format(
+            report['checkouts'], options['workers'], options['pool'],
+            report['elapsed'],
+        ),
+        'Throughput: {:.1f} checkouts/s'.format(report['throughput']),
+        '',
+        '{:<14}{:>8}{:>10}{:>10}{:>10}'.format(
+            'Latency (ms)', 'count', 'p50', 'p95', 'p99'
+        ),
+    ]
+
+    for name, summary in sorted(report['latency'].items()):
+        lines.append('{:<14}{:>8}{:>10.1f}{:>10.1f}{:>10.1f}'.format(
+            name, summary['count'], summary['p50'], summary['p95'],
+            summary['p99'],
+        ))
+
+    database = report['database']
+    lines.append('{:<14}{:>8}{:>10.1f}{:>10.1f}{:>10.1f}'.format(
+        'db queries', database['queries']['count'],
+        database['queries']['p50'], database['queries']['p95'],
+        database['queries']['p99'],
+    ))
+
+    lines.extend(['', 'Outcomes:'])
+
+    for name, counts in sorted(report['outcomes'].items()):
+        lines.append('  {}: {}'.format(name, ', '.join(
+            '{}={}'.format(outcome, count)
+            for outcome, count in sorted(counts.items())
+        )))
+
+    lines.extend([
+        '',
+        'Database time: {:.2f} s'.format(database['query_time']),
+        'Database errors: {}'.format(', '.join(
+            '{}={}'.format(error, count)
+            for error, count in sorted(database['errors'].items())
+        ) or 'none'),
+    ])
+
+    return '\n'.join(lines)
+
+def parse_args(args=None):
+    """Parses the command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Simulates Oscar checkout traffic through django-helcim.'
+    )
+    parser.add_argument('--checkouts', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument(
+        '--pool', choices=('thread', 'process'), default='thread'
+    )
+    parser.add_argument(
+        '--customers', type=int, default=20,
+        help='number of customers shared by the workers',
+    )
+    parser.add_argument(
+        '--saved-token-ratio', type=float, default=0.5,
+        help='fraction of checkouts paid with a saved token',
+    )
+    parser.add_argument(
+        '--preauth-ratio', type=float, default=0.3,
+        help='fraction of checkouts that preauthorize and then capture',
+    )
+    parser.add_argument(
+        '--latency', type=float, default=0.05,
+        help='mean Helcim API latency (in seconds)',
+    )
+    parser.add_argument(
+        '--latency-distribution', choices=LATENCY_DISTRIBUTIONS,
+        default='lognormal',
+    )
+    parser.add_argument(
+        '--decline-rate', type=float, default=0.02,
+        help='fraction of API requests that are declined',
+    )
+    parser.add_argument(
+        '--error-rate', type=float, default=0.01,
+        help='fraction of API requests that fail with HTTP 500',
+    )
+    parser.add_argument(
+        '--max-throughput', type=float, default=None,
+        help='maximum API requests per second',
+    )
+    parser.add_argument(
+        '--throughput-mode', choices=THROUGHPUT_MODES, default='queue',
+        help='whether requests above the maximum wait or fail with HTTP 429',
+    )
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument(
+        '--json', action='store_true', help='print the report as JSON'
+    )
+    parser.add_argument(
+        '--allow-wipe', action='store_true',
+        help='delete the transactions and tokens of a database that is not '
+        'named as a benchmark database',
+    )
+
+    return parser.parse_args(args)
+
+def main(args=None):
+    """Runs the load test from the command line."""
+    arguments = parse_args(args)
+    simulator = HelcimSimulator(
+        latency=arguments.latency,
+        latency_distribution=arguments.latency_distribution,
+        decline_rate=arguments.decline_rate,
+        error_rate=arguments.error_rate,
+        seed=arguments.seed,
+        max_throughput=arguments.max_throughput,
+        throughput_mode=arguments.throughput_mode,
+    ).start()
+
+    try:
+        options = dict(vars(arguments), api_url=simulator.url)
+        setup_django(simulator.url)
+        customers = prepare_database(
+            arguments.customers, simulator.ledger, arguments.allow_wipe
+        )
+        report = run(options, customers)
+    finally:
+        simulator.stop()
+
+    if arguments.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print(format_report(report, options))
+
+    return report
+
+if __name__ == '__main__':
+    main()
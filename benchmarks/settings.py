@@ -0,0 +1,54 @@
+"""Django settings for the django-helcim benchmarks.
+
+    The database is selected with the ``HELCIM_BENCHMARK_DATABASE``
+    environment variable (``sqlite`` or ``postgresql``). PostgreSQL
+    connection details are taken from the standard ``PG*`` environment
+    variables.
+"""
+import os
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SECRET_KEY = 'django-helcim-benchmarks'
+
+DATABASE_VENDOR = os.environ.get('HELCIM_BENCHMARK_DATABASE', 'sqlite')
+
+if DATABASE_VENDOR == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('PGDATABASE', 'helcim_benchmarks'),
+            'USER': os.environ.get('PGUSER', ''),
+            'PASSWORD': os.environ.get('PGPASSWORD', ''),
+            'HOST': os.environ.get('PGHOST', ''),
+            'PORT': os.environ.get('PGPORT', ''),
+        }
+    }
+elif DATABASE_VENDOR == 'sqlite':
+    # A file database is used so worker threads share the same database
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'benchmarks.sqlite3'),
+            'TEST': {
+                'NAME': os.path.join(BASE_DIR, 'test_benchmarks.sqlite3'),
+            },
+        }
+    }
+else:
+    raise ValueError(
+        'Unsupported HELCIM_BENCHMARK_DATABASE: {}'.format(DATABASE_VENDOR)
+    )
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'helcim',
+]
+
+HELCIM_ACCOUNT_ID = '1234567890'
+HELCIM_API_TOKEN = 'abcdefghijklmno1234567890'
+HELCIM_ENABLE_TOKEN_VAULT = True
+HELCIM_ALLOW_ANONYMOUS = True
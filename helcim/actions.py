@@ -0,0 +1,255 @@
+"""Capture and refund actions for saved transactions.
+
+    Actions can be processed during the request (the default) or, if
+    ``HELCIM_ASYNC_TRANSACTION_ACTIONS`` is enabled, submitted to a
+    local worker pool so the request does not wait on the Helcim API.
+
+    The status of each action is tracked in the Django cache. Adding
+    the ``pending`` status is atomic, so only one capture or refund
+    can be processed for a transaction at a time. Captures are also
+    claimed in the open pre-authorization queue (see
+    ``helcim.preauthorizations.claim_capture``), which does not expire,
+    so the sweep does not capture them again. The Helcim API is
+    not called inside a database transaction: the refunded amount is
+    reserved (and the result saved) in their own database
+    transactions, so a later error cannot roll back a refund or
+    capture that Helcim has already processed.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import connection
+
+from helcim import exceptions as helcim_exceptions, gateway, models
+from helcim.lazy import lazy_import
+
+
+LOG = logging.getLogger(__name__)
+
+# Imported when first used (it imports this module)
+preauthorizations = lazy_import('helcim.preauthorizations')
+
+PENDING = 'pending'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+# Seconds before a pending status expires (e.g. if a worker crashed)
+PENDING_TIMEOUT = 300
+
+# Seconds to keep a finished status for the detail page to display
+RESULT_TIMEOUT = 3600
+
+MESSAGES = {
+    'capture': {
+        SUCCEEDED: 'Transaction captured',
+        FAILED: 'Unable to capture transaction',
+    },
+    'refund': {
+        SUCCEEDED: 'Transaction refunded',
+        FAILED: 'Unable to refund transaction',
+    },
+}
+
+def _pending_key(transaction_pk):
+    """Returns the cache key marking a pending action."""
+    return 'helcim_action_pending_{}'.format(transaction_pk)
+
+def _result_key(transaction_pk):
+    """Returns the cache key of a finished action's status."""
+    return 'helcim_action_result_{}'.format(transaction_pk)
+
+def get_status(transaction_pk):
+    """Returns the action status of a transaction.
+
+        Returns:
+            dict: The ``action``, ``status``, and ``message`` of the
+                pending or latest finished action, or ``None`` if there
+                is none.
+    """
+    statuses = cache.get_many([
+        _pending_key(transaction_pk), _result_key(transaction_pk)
+    ])
+
+    return (
+        statuses.get(_pending_key(transaction_pk))
+        or statuses.get(_result_key(transaction_pk))
+    )
+
+def clear_status(transaction_pk):
+    """Removes the finished action status of a transaction."""
+    cache.delete(_result_key(transaction_pk))
+
+def start(transaction_pk, action):
+    """Marks an action as pending for a transaction.
+
+        Returns:
+            bool: ``False`` if an action is already pending for the
+                transaction.
+    """
+    return cache.add(
+        _pending_key(transaction_pk),
+        {'action': action, 'status': PENDING, 'message': None},
+        PENDING_TIMEOUT,
+    )
+
+def finish(transaction_pk, result=None):
+    """Removes the pending status and saves the result (if provided)."""
+    if result:
+        cache.set(_result_key(transaction_pk), result, RESULT_TIMEOUT)
+
+    cache.delete(_pending_key(transaction_pk))
+
+def _process(transaction, action, django_user=None):
+    """Processes the action with the Helcim API.
+
+        Returns:
+            tuple: ``SUCCEEDED`` or ``FAILED``, and the HelcimError
+                raised (if any).
+    """
+    if action == 'capture':
+        if not transaction.can_be_captured:
+            return FAILED, None
+
+        # Claimed in the open pre-authorization queue, like the sweep
+        claim_error = preauthorizations.claim_capture(transaction)
+
+        if claim_error:
+            return FAILED, helcim_exceptions.PaymentError(claim_error)
+
+        request = gateway.Capture(
+            transaction_id=transaction.transaction_id,
+            original_transaction=transaction,
+            django_user=django_user,
+        )
+    else:
+        if not transaction.can_be_refunded:
+            return FAILED, None
+
+        request = gateway.Refund(
+            amount=transaction.refundable_amount,
+            token=transaction.token,
+            token_f4l4=transaction.token_f4l4,
+            customer_code=transaction.customer_code,
+            original_transaction=transaction,
+            django_user=django_user,
+        )
+
+    try:
+        request.process()
+    except helcim_exceptions.HelcimError as error:
+        LOG.warning(
+            'Unable to process %s of %s: %s', action, transaction.pk, error
+        )
+
+        if action == 'capture':
+            preauthorizations.fail_capture(transaction.pk, error)
+
+        return FAILED, error
+    except Exception:
+        if action == 'capture':
+            preauthorizations.fail_capture(
+                transaction.pk, helcim_exceptions.HelcimError()
+            )
+
+        raise
+
+    return SUCCEEDED, None
+
+def process(transaction, action, django_user=None):
+    """Processes an action for a transaction.
+
+        Parameters:
+            transaction (obj): The ``HelcimTransaction`` instance.
+            action (str): ``capture`` or ``refund``.
+            django_user (obj, optional): The user making the request.
+
+        Returns:
+            dict: The ``action``, ``status``, and ``message`` of the
+                action. The message includes the error (if any).
+    """
+    status, error = _process(transaction, action, django_user)
+    message = MESSAGES[action][status]
+
+    if error is not None and str(error):
+        message = '{}: {}'.format(message, error)
+
+    return {
+        'action': action,
+        'status': status,
+        'message': message,
+    }
+
+def run(transaction_pk, action, django_user=None):
+    """Processes the action and saves its status.
+
+        Run by the worker pool when actions are asynchronous.
+    """
+    try:
+        transaction = models.HelcimTransaction.objects.get(pk=transaction_pk)
+        result = process(transaction, action, django_user)
+    except Exception: # pylint: disable=broad-except
+        LOG.exception('Unable to process %s of %s', action, transaction_pk)
+        result = {
+            'action': action,
+            'status': FAILED,
+            'message': MESSAGES[action][FAILED],
+        }
+
+    finish(transaction_pk, result)
+
+    return result
+
+def _run_in_worker(transaction_pk, action, django_user=None):
+    """Runs the action in a worker thread."""
+    try:
+        run(transaction_pk, action, django_user)
+    finally:
+        # Each thread has its own database connection
+        connection.close()
+
+_EXECUTOR = None
+_EXECUTOR_PID = None
+_EXECUTOR_LOCK = threading.Lock()
+
+def get_executor():
+    """Returns the worker pool of this process.
+
+        Checks the process ID so that forked worker processes create
+        their own pool.
+    """
+    global _EXECUTOR, _EXECUTOR_PID # pylint: disable=global-statement
+
+    if _EXECUTOR_PID != os.getpid():
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR_PID != os.getpid():
+                _EXECUTOR = ThreadPoolExecutor(
+                    max_workers=gateway.SETTINGS['async_action_workers']
+                )
+                _EXECUTOR_PID = os.getpid()
+
+    return _EXECUTOR
+
+def submit(transaction_pk, action, django_user=None):
+    """Submits the action to the worker pool.
+
+        Parameters:
+            transaction_pk (int): The primary key of the transaction.
+            action (str): ``capture`` or ``refund``.
+            django_user (obj, optional): The user making the request
+                (already retrieved, so it is not loaded in a worker).
+
+        Returns:
+            bool: ``False`` if an action is already pending for the
+                transaction.
+    """
+    if not start(transaction_pk, action):
+        return False
+
+    get_executor().submit(
+        _run_in_worker, transaction_pk, action, django_user
+    )
+
+    return True
@@ -1,9 +1,59 @@
 """Admin settings for Helcim Commerce API transactions."""
+import json
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
-from helcim.gateway import SETTINGS
+from helcim.settings import SETTINGS
 from helcim.models import HelcimTransaction, HelcimToken
 
+def estimate_count(queryset):
+    """Returns the query planner's estimated row count for a queryset.
+
+        Estimates are only available with PostgreSQL.
+
+        Returns:
+            int: The estimated count (or ``None`` if not available).
+    """
+    connection = connections[queryset.db]
+
+    if connection.vendor != 'postgresql':
+        return None
+
+    sql, params = queryset.query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) {}'.format(sql), params)
+        plan = cursor.fetchone()[0]
+
+    # Older database drivers do not decode the JSON
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that uses estimated counts for large querysets.
+
+        An exact ``COUNT(*)`` requires scanning every matching row. If
+        the estimated count is at least ``estimate_threshold``, the
+        estimate is used instead (so the number of pages is
+        approximate). Smaller querysets are counted exactly.
+    """
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            estimate = estimate_count(self.object_list)
+
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+
+        return super().count
+
 class HelcimTransactionAdmin(admin.ModelAdmin):
     """Admin class for the HelcimTransaction model."""
     MODEL_FIELDS = [
@@ -30,11 +80,19 @@ class HelcimTransactionAdmin(admin.ModelAdmin):
         'order_number',
         'customer_code',
         'django_user',
+        'original_transaction',
+        'captured_amount',
+        'refunded_amount',
     ]
 
-    fields = MODEL_FIELDS
+    # The raw request and response may be saved in a compressed audit
+    # payload, so they are displayed with the audit properties
+    fields = ['audit_request', 'audit_response'] + [
+        field for field in MODEL_FIELDS
+        if field not in ('raw_request', 'raw_response')
+    ]
 
-    readonly_fields = MODEL_FIELDS
+    readonly_fields = fields
 
     list_display = [
         'transaction_type',
@@ -45,6 +103,39 @@ class HelcimTransactionAdmin(admin.ModelAdmin):
         'django_user'
     ]
 
+    # Filters and date hierarchy use the indexed columns
+    list_filter = ['transaction_type', 'transaction_success']
+
+    date_hierarchy = 'date_response'
+
+    list_select_related = ['django_user']
+
+    paginator = EstimatedCountPaginator
+
+    show_full_result_count = False
+
+    def audit_request(self, obj):
+        """Returns the raw request of the transaction."""
+        return obj.audit_request
+
+    audit_request.short_description = 'raw request'
+
+    def audit_response(self, obj):
+        """Returns the raw response of the transaction."""
+        return obj.audit_response
+
+    audit_response.short_description = 'raw response'
+
+    def get_queryset(self, request):
+        """Defers the raw request and response in the changelist."""
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+
+        if match and (match.url_name or '').endswith('_changelist'):
+            queryset = queryset.defer('raw_request', 'raw_response')
+
+        return queryset
+
 class HelcimTokenAdmin(admin.ModelAdmin):
     """Admin class for the HelcimToken model."""
     MODEL_FIELDS = [
@@ -73,6 +164,15 @@ class HelcimTokenAdmin(admin.ModelAdmin):
         'cc_type',
     ]
 
+    # The date hierarchy uses the indexed column (cc_type is not indexed)
+    date_hierarchy = 'date_added'
+
+    list_select_related = ['django_user']
+
+    paginator = EstimatedCountPaginator
+
+    show_full_result_count = False
+
 # Only register admin models if enabled in settings
 if SETTINGS['enable_admin']:
     admin.site.register(HelcimTransaction, HelcimTransactionAdmin)
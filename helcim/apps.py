@@ -6,3 +6,34 @@ class HelcimConfig(AppConfig):
     """Configuration details for django-helcim."""
     name = 'helcim'
     verbose_name = 'django-helcim'
+
+    def ready(self):
+        """Connects the signal receivers.
+
+            Connects the metrics receiver to the stage signal, tracks
+            the open pre-authorizations when transactions are saved,
+            and updates the Helcim.js configuration and the metrics
+            directory when their settings change.
+        """
+        # pylint: disable=import-outside-toplevel
+        from django.db.models.signals import post_save
+        from django.test.signals import setting_changed
+
+        from helcim import metrics, preauthorizations, settings, signals
+
+        signals.stage_completed.connect(
+            metrics.record_stage, dispatch_uid='helcim_metrics_record_stage'
+        )
+        post_save.connect(
+            preauthorizations.track_transaction,
+            sender='helcim.HelcimTransaction',
+            dispatch_uid='helcim_track_open_preauthorization',
+        )
+        setting_changed.connect(
+            settings.update_helcim_js_setting,
+            dispatch_uid='helcim_update_helcim_js_setting',
+        )
+        setting_changed.connect(
+            settings.update_metrics_dir_setting,
+            dispatch_uid='helcim_update_metrics_dir_setting',
+        )
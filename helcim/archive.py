@@ -0,0 +1,267 @@
+"""Archival of old Helcim transactions.
+
+    Transactions older than a provided age are moved out of the
+    ``HelcimTransaction`` table in batches, so the table (and its
+    indexes) only contains recent transactions. Each archived
+    transaction is saved in the ``HelcimTransactionArchive`` table,
+    either with the full transaction details or, if a file is
+    provided, with a reference to a gzip-compressed JSON Lines file
+    containing the details (and the position of its batch in the
+    file). Archived transactions can still be retrieved by ID (e.g. by
+    the ``TransactionDetailView``).
+
+    Captures and refunds are archived together with the transaction
+    they are linked to (``original_transaction``), so the links and
+    the captured and refunded totals of the remaining transactions are
+    kept. A transaction is not archived while any of its linked
+    transactions is too recent to archive, nor while it is an open
+    pre-authorization (see ``helcim.preauthorizations``). The cached
+    summaries (see ``helcim.reports``) of the archived days are
+    removed.
+"""
+import datetime
+import gzip
+import json
+import os
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from helcim import reports
+from helcim.models import HelcimTransaction, HelcimTransactionArchive
+
+
+class ArchiveJSONEncoder(DjangoJSONEncoder):
+    """JSON encoder that keeps the microseconds of datetimes."""
+    def default(self, o): # pylint: disable=method-hidden
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+
+        return super().default(o)
+
+def serialize_transaction(transaction):
+    """Returns the transaction details as a JSON string.
+
+        The raw request and response are included even if they are
+        saved in a compressed audit payload.
+    """
+    details = {
+        field.attname: field.value_from_object(transaction)
+        for field in HelcimTransaction._meta.concrete_fields
+    }
+    details['raw_request'] = transaction.audit_request
+    details['raw_response'] = transaction.audit_response
+
+    return json.dumps(details, cls=ArchiveJSONEncoder)
+
+def deserialize_transaction(data):
+    """Returns an (unsaved) HelcimTransaction from the JSON string."""
+    details = json.loads(data)
+    transaction = HelcimTransaction()
+
+    for field in HelcimTransaction._meta.concrete_fields:
+        if field.attname in details:
+            setattr(
+                transaction,
+                field.attname,
+                field.to_python(details[field.attname]),
+            )
+
+    return transaction
+
+def _kept_transaction_ids(cutoff):
+    """Returns the IDs of the old transactions that must be kept.
+
+        An old transaction is kept if it is linked (directly or through
+        its captures and refunds) to a recent transaction or an open
+        pre-authorization.
+    """
+    kept = set()
+    linked = HelcimTransaction.objects.filter(
+        Q(date_response__gte=cutoff)
+        | Q(open_preauthorization__isnull=False),
+        original_transaction__date_response__lt=cutoff,
+    )
+
+    while True:
+        original_ids = set(
+            linked.values_list('original_transaction_id', flat=True)
+        ) - kept
+
+        if not original_ids:
+            return kept
+
+        kept |= original_ids
+        linked = HelcimTransaction.objects.filter(
+            id__in=original_ids, original_transaction__isnull=False
+        )
+
+def _add_linked_transactions(batch):
+    """Adds the linked captures and refunds (and theirs) to the batch."""
+    batch_ids = {transaction.id for transaction in batch}
+    original_ids = batch_ids
+
+    while original_ids:
+        linked = list(
+            HelcimTransaction.objects.select_for_update().filter(
+                original_transaction_id__in=original_ids
+            ).exclude(id__in=batch_ids).prefetch_related('audit_payload')
+        )
+        original_ids = {transaction.id for transaction in linked}
+        batch_ids |= original_ids
+        batch.extend(linked)
+
+    return batch
+
+def _write_archive_file(path, lines):
+    """Appends the lines to the archive file as a new gzip member.
+
+        Returns:
+            int: The position of the new member in the file.
+    """
+    with open(path, 'ab') as raw_file:
+        raw_file.seek(0, os.SEEK_END)
+        offset = raw_file.tell()
+
+        with gzip.GzipFile(fileobj=raw_file, mode='ab') as archive:
+            archive.write(('\n'.join(lines) + '\n').encode('utf-8'))
+
+    return offset
+
+def _local_date(value):
+    """Returns the date of a datetime (in the current time zone)."""
+    if timezone.is_aware(value):
+        return timezone.localtime(value).date()
+
+    return value.date()
+
+def archive_transactions(age, batch_size=1000, path=None):
+    """Moves transactions older than the provided age to the archive.
+
+        Each batch is moved in its own database transaction, so the
+        size of the transactions (and how long rows are locked) is
+        bounded by the batch size (plus the captures and refunds linked
+        to the batch, which are archived with it).
+
+        Parameters:
+            age (timedelta): Transactions with a response date older
+                than this are archived.
+            batch_size (int): The number of transactions to move in
+                each database transaction.
+            path (str, optional): A gzip-compressed JSON Lines file to
+                append the transaction details to. If not provided,
+                the details are saved in the archive table.
+
+        Returns:
+            int: The number of archived transactions.
+    """
+    cutoff = timezone.now() - age
+    archived = 0
+
+    while True:
+        with db_transaction.atomic():
+            kept_ids = _kept_transaction_ids(cutoff)
+            batch = list(
+                HelcimTransaction.objects.select_for_update().filter(
+                    date_response__lt=cutoff,
+                    open_preauthorization__isnull=True,
+                ).exclude(
+                    id__in=kept_ids
+                ).prefetch_related(
+                    'audit_payload'
+                ).order_by('date_response', 'id')[:batch_size]
+            )
+
+            if not batch:
+                break
+
+            _add_linked_transactions(batch)
+            lines = [
+                serialize_transaction(transaction) for transaction in batch
+            ]
+            offset = None
+
+            if path:
+                # Written before the commit so a failed write keeps
+                # the transactions in place
+                offset = _write_archive_file(path, lines)
+
+            HelcimTransactionArchive.objects.bulk_create([
+                HelcimTransactionArchive(
+                    id=transaction.id,
+                    date_response=transaction.date_response,
+                    transaction_type=transaction.transaction_type,
+                    data=None if path else data,
+                    archive_file=path,
+                    archive_offset=offset,
+                )
+                for transaction, data in zip(batch, lines)
+            ])
+            HelcimTransaction.objects.filter(
+                id__in=[transaction.id for transaction in batch]
+            ).delete()
+
+        # The summaries of the archived days no longer match the table
+        days = [
+            _local_date(transaction.date_response) for transaction in batch
+            if transaction.date_response
+        ]
+
+        if days:
+            reports.clear_cached_summaries(min(days), max(days))
+
+        archived += len(batch)
+
+    return archived
+
+def _read_archive_file(path, transaction_id, offset=None):
+    """Returns the transaction details from an archive file.
+
+        The file is read from the batch containing the transaction (if
+        its position is known), so only that batch is decompressed.
+    """
+    search = '"id": "{}"'.format(transaction_id).encode('utf-8')
+
+    with open(path, 'rb') as raw_file:
+        raw_file.seek(offset or 0)
+
+        with gzip.GzipFile(fileobj=raw_file, mode='rb') as archive:
+            for line in archive:
+                # Only decode the matching line
+                if search in line:
+                    return line.decode('utf-8')
+
+    return None
+
+def retrieve_archived_transaction(transaction_id):
+    """Returns an archived transaction.
+
+        Parameters:
+            transaction_id (str): The ID of the original transaction.
+
+        Returns:
+            obj: An unsaved ``HelcimTransaction`` with the archived
+                details, or ``None`` if the transaction is not
+                archived (or its archive file is not available).
+    """
+    try:
+        stub = HelcimTransactionArchive.objects.get(id=transaction_id)
+    except HelcimTransactionArchive.DoesNotExist:
+        return None
+
+    data = stub.data
+
+    if data is None and stub.archive_file:
+        try:
+            data = _read_archive_file(
+                stub.archive_file, stub.id, stub.archive_offset
+            )
+        except OSError:
+            return None
+
+    if data is None:
+        return None
+
+    return deserialize_transaction(data)
@@ -0,0 +1,81 @@
+"""Storage of the raw request and response of Helcim transactions.
+
+    By default the raw request and response (the audit data) are saved
+    in the ``HelcimTransaction`` table. If ``HELCIM_AUDIT_STORAGE`` is
+    ``compressed``, new transactions save the audit data compressed in
+    the ``HelcimTransactionPayload`` table instead. The audit data of
+    existing transactions can be moved with
+    ``backfill_audit_payloads`` (or the
+    ``helcim_backfill_audit_payloads`` management command).
+"""
+from django.db import transaction as db_transaction
+from django.db.models import Q
+
+from helcim.models import (
+    HelcimTransaction, HelcimTransactionPayload, compress_audit_data
+)
+
+
+def backfill_audit_payloads(batch_size=1000):
+    """Moves inline audit data to compressed audit payloads.
+
+        Each batch is moved in its own database transaction, so the
+        size of the transactions (and how long rows are locked) is
+        bounded by the batch size. Batches are retrieved after the
+        last moved ID, so each query starts where the previous batch
+        ended rather than rescanning the moved rows.
+
+        Parameters:
+            batch_size (int): The number of transactions to move in
+                each database transaction.
+
+        Returns:
+            int: The number of moved transactions.
+    """
+    moved = 0
+    last_id = None
+
+    while True:
+        transactions = HelcimTransaction.objects.filter(
+            Q(raw_request__isnull=False) | Q(raw_response__isnull=False)
+        )
+
+        if last_id is not None:
+            transactions = transactions.filter(id__gt=last_id)
+
+        with db_transaction.atomic():
+            batch = list(
+                transactions.select_for_update().only(
+                    'id', 'raw_request', 'raw_response'
+                ).order_by('id')[:batch_size]
+            )
+
+            if not batch:
+                break
+
+            # A transaction saved with both inline and compressed audit
+            # data keeps the compressed data
+            existing = set(
+                HelcimTransactionPayload.objects.filter(
+                    transaction__in=batch
+                ).values_list('transaction_id', flat=True)
+            )
+
+            HelcimTransactionPayload.objects.bulk_create([
+                HelcimTransactionPayload(
+                    transaction=transaction,
+                    raw_request=compress_audit_data(transaction.raw_request),
+                    raw_response=compress_audit_data(
+                        transaction.raw_response
+                    ),
+                )
+                for transaction in batch if transaction.id not in existing
+            ])
+            HelcimTransaction.objects.filter(
+                id__in=[transaction.id for transaction in batch]
+            ).update(raw_request=None, raw_response=None)
+
+        moved += len(batch)
+        last_id = batch[-1].id
+
+    return moved
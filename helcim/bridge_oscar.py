@@ -75,6 +75,8 @@ class BaseCardTransactionBridge():
                 card token.
             customer_code (str): The Helcim customer code to associate
                 with the saved card token.
+            token_id (str): The ID of a saved HelcimToken to charge
+                (for the ``django_user`` or ``customer_code``).
     """
     def __init__(
             self, amount, token_id=None, card=None,
@@ -85,10 +87,13 @@ class BaseCardTransactionBridge():
             'amount': amount,
         }
 
+        # Saved tokens are charged directly (see gateway.retrieve_token)
         if token_id:
-            transaction_details.update(retrieve_token_details(
+            self.token_instance = retrieve_token(
                 token_id, django_user, customer_code
-            ))
+            )
+        else:
+            self.token_instance = None
 
         if billing_address:
             transaction_details.update(remap_oscar_billing_address(
@@ -102,6 +107,16 @@ class BaseCardTransactionBridge():
         self.save_token = save_token
         self.django_user = django_user
 
+    def gateway_details(self):
+        """Returns the transaction details to pass to the gateway.
+
+            The ``django_user`` is passed to the gateway separately.
+        """
+        details = dict(self.transaction_details)
+        details.pop('django_user', None)
+
+        return details
+
 class PurchaseBridge(BaseCardTransactionBridge):
     """Class to bridge Oscar and Helcim purchase transactions."""
     def process(self):
@@ -117,8 +132,9 @@ class PurchaseBridge(BaseCardTransactionBridge):
         """
         purchase_instance = gateway.Purchase(
             save_token=self.save_token,
+            token_instance=self.token_instance,
             django_user=self.django_user,
-            **self.transaction_details
+            **self.gateway_details()
         )
 
         try:
@@ -151,8 +167,9 @@ class PreauthorizeBridge(BaseCardTransactionBridge):
 
         preauth_instance = gateway.Preauthorize(
             save_token=self.save_token,
+            token_instance=self.token_instance,
             django_user=self.django_user,
-            **self.transaction_details
+            **self.gateway_details()
         )
 
         try:
@@ -185,8 +202,9 @@ class RefundBridge(BaseCardTransactionBridge):
 
         refund_instance = gateway.Refund(
             save_token=self.save_token,
+            token_instance=self.token_instance,
             django_user=self.django_user,
-            **self.transaction_details
+            **self.gateway_details()
         )
 
         try:
@@ -219,8 +237,9 @@ class VerificationBridge(BaseCardTransactionBridge):
 
         verification_instance = gateway.Verification(
             save_token=self.save_token,
+            token_instance=self.token_instance,
             django_user=self.django_user,
-            **self.transaction_details
+            **self.gateway_details()
         )
 
         try:
@@ -288,6 +307,14 @@ class CaptureBridge():
 # These functions/dictionaries are provided as a convenience shortcut to allow
 # access to main functions via the bridge module.
 
+def retrieve_token(token_id, django_user=None, customer_code=None):
+    """Shortcut for retrieve_token from the Gateway module.
+
+        Added as a convenience to allow access to core functions via
+        the bridge module exclusively.
+    """
+    return gateway.retrieve_token(token_id, django_user, customer_code)
+
 def retrieve_token_details(token_id, django_user=None, customer_code=None):
     """Shortcut for retrieve_token_details from the Gateway module.
 
@@ -0,0 +1,346 @@
+"""Recording of Helcim.js responses posted to the callback view.
+
+    The Helcim.js response is verified with the ``xmlHash`` (the
+    SHA-256 hash of the Helcim.js secret and the ``xml`` response) of
+    its configuration. Only the ``xml`` is signed, so the transaction
+    is recorded from the fields of the ``xml`` and a response with form
+    fields that differ from it is rejected.
+
+    Each Helcim transaction ID is only recorded once: the ID is claimed
+    by saving a ``HelcimJSCallback`` (the ID is its primary key), so a
+    resubmitted response is reported as a duplicate.
+
+    Responses are saved during the request (the default) or, if
+    ``HELCIM_JS_CALLBACK_WRITES`` is ``batched``, added to a queue that
+    a worker thread saves in batches (one database transaction per
+    batch).
+"""
+import hashlib
+import hmac
+import logging
+import os
+import queue
+import threading
+from time import monotonic
+from xml.parsers.expat import ExpatError
+
+from django.db import (
+    close_old_connections, IntegrityError, transaction as db_transaction
+)
+
+from helcim import exceptions as helcim_exceptions, gateway, models
+from helcim.lazy import lazy_import
+
+
+xmltodict = lazy_import('xmltodict') # pylint: disable=invalid-name
+
+LOG = logging.getLogger(__name__)
+
+RECORDED = 'recorded'
+QUEUED = 'queued'
+DUPLICATE = 'duplicate'
+
+# The Helcim.js transaction types that can be recorded
+TRANSACTION_TYPES = {
+    'purchase': 's',
+    'preauth': 'p',
+    'verify': 'v',
+}
+
+# Seconds the worker waits to fill a batch
+BATCH_INTERVAL = 0.2
+
+def verify_xml_hash(xml, xml_hash, secret):
+    """Confirms the Helcim.js response was signed with the secret.
+
+        Parameters:
+            xml (str): The ``xml`` field of the response.
+            xml_hash (str): The ``xmlHash`` field of the response.
+            secret (str): The Helcim.js configuration secret.
+
+        Returns:
+            bool: Whether the hash matches (compared in constant time).
+    """
+    if not xml or not xml_hash or not secret:
+        return False
+
+    expected = hashlib.sha256(
+        '{}{}'.format(secret, xml).encode('utf-8')
+    ).hexdigest()
+
+    return hmac.compare_digest(
+        expected.encode('ascii'),
+        xml_hash.strip().lower().encode('utf-8'),
+    )
+
+def signed_fields(xml):
+    """Returns the fields of the signed Helcim.js ``xml`` response.
+
+        Nested elements (e.g. ``transaction``) are flattened, so the
+        fields have the same names as the Helcim.js form fields.
+
+        Raises:
+            ProcessingError: The ``xml`` could not be parsed.
+    """
+    try:
+        pending = [xmltodict.parse(xml)]
+    except ExpatError:
+        raise helcim_exceptions.ProcessingError(
+            'Unable to process the Helcim.js response.'
+        )
+
+    fields = {}
+
+    while pending:
+        for name, value in pending.pop().items():
+            if isinstance(value, dict):
+                pending.append(value)
+            elif not name.startswith(('@', '#')) and not isinstance(
+                    value, list
+            ):
+                fields[name] = value or ''
+
+    return fields
+
+def claim(transaction_id):
+    """Claims a Helcim transaction ID to be recorded.
+
+        The unique transaction ID of ``HelcimJSCallback`` ensures only
+        one request can claim it (concurrent requests wait for the
+        first to commit or roll back).
+
+        Returns:
+            bool: ``False`` if the transaction has already been claimed.
+    """
+    try:
+        with db_transaction.atomic():
+            models.HelcimJSCallback.objects.create(
+                transaction_id=transaction_id
+            )
+    except IntegrityError:
+        return False
+
+    return True
+
+def release(transaction_id):
+    """Releases a claimed transaction ID (e.g. if it was not saved)."""
+    models.HelcimJSCallback.objects.filter(
+        transaction_id=transaction_id
+    ).delete()
+
+def save(response, transaction_type):
+    """Saves the validated response (and its token, if requested).
+
+        Returns:
+            tuple: The HelcimTransaction and HelcimToken instances.
+                HelcimToken will be None if the token is not saved.
+    """
+    transaction_instance = response.save_transaction(transaction_type)
+    token_instance = response.save_token_to_vault()
+
+    return transaction_instance, token_instance
+
+def record(config, data, save_token=False, django_user=None):
+    """Verifies and records a Helcim.js response.
+
+        Parameters:
+            config (dict): The Helcim.js configuration (from
+                ``HELCIM_JS_CONFIG``) used for the payment.
+            data (dict): The Helcim.js POST response.
+            save_token (bool): Whether the user requested the token to
+                be saved.
+            django_user (obj): The Django user making the payment.
+
+        Returns:
+            tuple: The status (``recorded``, ``queued``, or
+                ``duplicate``) and the Helcim transaction ID.
+
+        Raises:
+            ProcessingError: The response could not be verified (or
+                does not match the signed ``xml``).
+            PaymentError: The transaction was not successful.
+    """
+    if not verify_xml_hash(
+            data.get('xml'), data.get('xmlHash'), config.get('secret')
+    ):
+        raise helcim_exceptions.ProcessingError(
+            'Unable to verify the Helcim.js response.'
+        )
+
+    signed = signed_fields(data['xml'])
+
+    if any(
+            (value or '') != signed[name]
+            for name, value in data.items() if name in signed
+    ):
+        raise helcim_exceptions.ProcessingError(
+            'The Helcim.js response does not match the signed response.'
+        )
+
+    # Only the signed fields are recorded
+    response = gateway.HelcimJSResponse(
+        dict(signed, xml=data['xml'], xmlHash=data['xmlHash']),
+        save_token=save_token,
+        django_user=django_user,
+    )
+
+    try:
+        valid = response.is_valid()
+    except (KeyError, TypeError, ValueError):
+        raise helcim_exceptions.ProcessingError(
+            'Unable to process the Helcim.js response.'
+        )
+
+    if not valid:
+        raise helcim_exceptions.PaymentError(
+            response.response.get('response_message')
+            or 'Transaction was not successful.'
+        )
+
+    transaction_id = response.response.get('transaction_id')
+    transaction_type = TRANSACTION_TYPES.get(
+        response.response.get('transaction_type')
+    )
+
+    if transaction_id is None or transaction_type is None:
+        raise helcim_exceptions.ProcessingError(
+            'Unable to process the Helcim.js response.'
+        )
+
+    if gateway.SETTINGS['callback_writes'] == 'batched':
+        # The worker thread saves the response, so the user is checked
+        # before the transaction ID is claimed
+        response.resolve_django_user()
+
+        if not claim(transaction_id):
+            return DUPLICATE, transaction_id
+
+        get_writer().put(response, transaction_type)
+
+        return QUEUED, transaction_id
+
+    # The claim is rolled back (so the response can be resubmitted) if
+    # the transaction is not saved
+    with db_transaction.atomic():
+        if not claim(transaction_id):
+            return DUPLICATE, transaction_id
+
+        save(response, transaction_type)
+
+    return RECORDED, transaction_id
+
+class BatchWriter():
+    """Saves queued Helcim.js responses in batches.
+
+        Each batch is saved in one database transaction by a worker
+        thread, so the callback view does not wait on the database.
+        Queued responses are lost if the process is stopped before
+        they are saved.
+    """
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, response, transaction_type):
+        """Adds a validated response to the queue."""
+        self.queue.put((response, transaction_type))
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        """Starts the worker thread (if not running)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='helcim-callback-writer'
+                )
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _take_batch(self, timeout=None):
+        """Takes up to batch_size responses from the queue.
+
+            Waits up to ``timeout`` seconds for the first response and
+            then up to ``BATCH_INTERVAL`` seconds to fill the batch.
+        """
+        try:
+            batch = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+
+        deadline = monotonic() + BATCH_INTERVAL
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - monotonic()
+
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def flush(self, timeout=0):
+        """Saves one batch of queued responses.
+
+            Returns:
+                int: The number of responses saved.
+        """
+        batch = self._take_batch(timeout)
+        saved = 0
+
+        if not batch:
+            return saved
+
+        with db_transaction.atomic():
+            for response, transaction_type in batch:
+                try:
+                    # A savepoint so one failure does not lose the batch
+                    with db_transaction.atomic():
+                        save(response, transaction_type)
+                except Exception: # pylint: disable=broad-except
+                    LOG.exception(
+                        'Unable to save Helcim.js transaction %s',
+                        response.response.get('transaction_id'),
+                    )
+                    release(response.response.get('transaction_id'))
+                else:
+                    saved += 1
+
+        return saved
+
+    def _run(self):
+        """Saves batches until the process exits."""
+        while True:
+            close_old_connections()
+
+            try:
+                self.flush(timeout=None)
+            except Exception: # pylint: disable=broad-except
+                LOG.exception('Unable to save Helcim.js transactions')
+
+_WRITER = None
+_WRITER_PID = None
+_WRITER_LOCK = threading.Lock()
+
+def get_writer():
+    """Returns the batch writer of this process.
+
+        Checks the process ID so that forked worker processes create
+        their own writer.
+    """
+    global _WRITER, _WRITER_PID # pylint: disable=global-statement
+
+    if _WRITER_PID != os.getpid():
+        with _WRITER_LOCK:
+            if _WRITER_PID != os.getpid():
+                _WRITER = BatchWriter(
+                    gateway.SETTINGS['callback_batch_size']
+                )
+                _WRITER_PID = os.getpid()
+
+    return _WRITER
@@ -1,8 +1,12 @@
 """Process and validates data to and from the Helcim API."""
 
-from datetime import datetime
+from calendar import monthrange
+from collections.abc import Mapping
+from datetime import date, datetime, time
 from decimal import Decimal
+from functools import lru_cache
 import logging
+from urllib.parse import urlencode
 
 LOG = logging.getLogger(__name__)
 
@@ -135,6 +139,165 @@ FROM_HELCIM_JS_FIELDS = {
     'xmlHash': Field('response_xml_hash', 's'),
 }
 
+# The fields of a processed API or Helcim.js response
+RESPONSE_FIELDS = tuple(sorted(
+    {
+        'notice', 'raw_request', 'raw_response', 'response_message',
+        'token_f4l4', 'transaction_success',
+    }
+    | {field.field_name for field in FROM_API_FIELDS.values()}
+    | {field.field_name for field in FROM_HELCIM_JS_FIELDS.values()}
+))
+
+_RESPONSE_FIELD_NAMES = frozenset(RESPONSE_FIELDS)
+
+class HelcimResponse(Mapping):
+    """A processed Helcim API or Helcim.js response.
+
+        The fields (see ``RESPONSE_FIELDS``) are stored in
+        ``__slots__`` and can be read as attributes or with dictionary
+        access (e.g. ``response['amount']`` or ``response.get('amount')``).
+        Any other fields are kept in a separate dictionary. Responses
+        are immutable (use ``replace`` to create an updated copy), so
+        copies share the same instance.
+
+        Parameters:
+            fields (dict, optional): The response fields.
+            **kwargs: Additional response fields.
+    """
+    __slots__ = RESPONSE_FIELDS + ('_extra',)
+
+    def __init__(self, fields=None, **kwargs):
+        extra = None
+
+        for items in (fields.items() if fields else (), kwargs.items()):
+            for name, value in items:
+                if name in _RESPONSE_FIELD_NAMES:
+                    object.__setattr__(self, name, value)
+                else:
+                    extra = extra or {}
+                    extra[name] = value
+
+        object.__setattr__(self, '_extra', extra)
+
+    def __getitem__(self, key):
+        if key in _RESPONSE_FIELD_NAMES:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+
+        if self._extra and key in self._extra:
+            return self._extra[key]
+
+        raise KeyError(key)
+
+    def __iter__(self):
+        for name in RESPONSE_FIELDS:
+            if hasattr(self, name):
+                yield name
+
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('HelcimResponse is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('HelcimResponse is immutable')
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (HelcimResponse, (dict(self),))
+
+    def __repr__(self):
+        return 'HelcimResponse({!r})'.format(dict(self))
+
+    def replace(self, **kwargs):
+        """Returns a copy of the response with the fields replaced."""
+        return HelcimResponse(self, **kwargs)
+
+    def redact(self, fields, raw_request=None, raw_response=None):
+        """Returns a redacted view of the response.
+
+            Parameters:
+                fields (iterable): The names of the fields to redact.
+                raw_request (str, optional): The redacted raw request.
+                raw_response (str, optional): The redacted raw
+                    response.
+
+            Returns:
+                RedactedResponse: The redacted view.
+        """
+        return RedactedResponse(self, fields, raw_request, raw_response)
+
+class RedactedResponse(Mapping):
+    """A redacted, read-only view of a ``HelcimResponse``.
+
+        Redacted fields are ``None`` and the raw request and response
+        are replaced by their redacted versions. All other fields are
+        read from the response (nothing is copied).
+
+        Parameters:
+            response (HelcimResponse): The response.
+            fields (iterable): The names of the fields to redact.
+            raw_request (str, optional): The redacted raw request.
+            raw_response (str, optional): The redacted raw response.
+    """
+    __slots__ = ('_response', '_redacted', '_raw_request', '_raw_response')
+
+    def __init__(self, response, fields, raw_request=None, raw_response=None):
+        if not isinstance(fields, frozenset):
+            fields = frozenset(fields)
+
+        object.__setattr__(self, '_response', response)
+        object.__setattr__(self, '_redacted', fields)
+        object.__setattr__(self, '_raw_request', raw_request)
+        object.__setattr__(self, '_raw_response', raw_response)
+
+    def __getitem__(self, key):
+        if key == 'raw_request':
+            return self._raw_request
+
+        value = self._response[key]
+
+        if key == 'raw_response':
+            return self._raw_response
+
+        if key in self._redacted:
+            return None
+
+        return value
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __iter__(self):
+        yield from self._response
+
+        if 'raw_request' not in self._response:
+            yield 'raw_request'
+
+    def __len__(self):
+        return len(self._response) + ('raw_request' not in self._response)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('RedactedResponse is immutable')
+
+    def __repr__(self):
+        return 'RedactedResponse({!r})'.format(dict(self))
+
 def validate_request_fields(details):
     """Validates and coerces request field data prior to submission.
 
@@ -238,7 +401,52 @@ def process_request_fields(api, cleaned, additional=None):
 
     return request_data
 
-def convert_helcim_response_fields(fields, field_dictionary):
+@lru_cache(maxsize=1024)
+def parse_date(value):
+    """Converts a Helcim API date (``YYYY-MM-DD``) to a date.
+
+        Raises:
+            ValueError: The value is not a valid date.
+    """
+    if (
+            len(value) == 10 and value[4] == value[7] == '-'
+            and value.replace('-', '').isdecimal()
+    ):
+        return date(int(value[:4]), int(value[5:7]), int(value[8:]))
+
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+@lru_cache(maxsize=1024)
+def parse_time(value):
+    """Converts a Helcim API time (``HH:MM:SS``) to a time.
+
+        Raises:
+            ValueError: The value is not a valid time.
+    """
+    if (
+            len(value) == 8 and value[2] == value[5] == ':'
+            and value.replace(':', '').isdecimal()
+    ):
+        return time(int(value[:2]), int(value[3:5]), int(value[6:]))
+
+    return datetime.strptime(value, '%H:%M:%S').time()
+
+@lru_cache(maxsize=2048)
+def parse_expiry(expiry):
+    """Converts a 4 digit (MMYY) card expiry to a date.
+
+        Returns:
+            obj: The last day of the expiry month.
+
+        Raises:
+            ValueError: The value is not a valid expiry.
+    """
+    year = 2000 + int(expiry[2:])
+    month = int(expiry[:2])
+
+    return date(year, month, monthrange(year, month)[1])
+
+def convert_helcim_response_fields(fields, field_dictionary, converted=None):
     """Converts provided Helcim response to Python data types.
 
         Handles both API responses and Helcim.js response.
@@ -247,11 +455,14 @@ def convert_helcim_response_fields(fields, field_dictionary):
             fields (dict): Helcim response fields.
             field_dictionary (dict): dictionary of field references to
                 use for data type conversion.
+            converted (dict, optional): dictionary to add the converted
+                fields to (defaults to a new dictionary).
 
         Returns:
             dictionary: converted fields as Python data types.
     """
-    converted = {}
+    if converted is None:
+        converted = {}
 
     for field_name, field_value in fields.items():
         try:
@@ -278,15 +489,11 @@ def convert_helcim_response_fields(fields, field_dictionary):
 
             # Date Field
             elif api_field.field_type == 'd':
-                converted[new_name] = datetime.strptime(
-                    field_value, '%Y-%m-%d'
-                ).date()
+                converted[new_name] = parse_date(field_value)
 
             # Time Field
             elif api_field.field_type == 't':
-                converted[new_name] = datetime.strptime(
-                    field_value, '%H:%M:%S'
-                ).time()
+                converted[new_name] = parse_time(field_value)
 
             # Handle any invalid types (should never happen...)
             else:
@@ -322,19 +529,28 @@ def create_f4l4(cc_number):
 def create_raw_request(data):
     """Converts the raw request into a POST string.
 
+    The POST data is URL-encoded the same way ``requests`` encodes the
+    request body (fields without a value are left out), so the raw
+    request has the same format whether it is built from the POST data
+    or taken from the request body.
+
     Parameters:
-        data (dict): The POST request data dictionary.
+        data (dict|str|bytes): The POST request data dictionary, or the
+            request body already encoded for the POST request.
 
     Returns:
-        str: The POST request data as a formatted string.
+        str: The POST request data as a URL-encoded string.
     """
-    if data:
-        raw_strings = []
+    if isinstance(data, bytes):
+        return data.decode('utf-8')
 
-        for key, item in data.items():
-            raw_strings.append('{}={}'.format(key, item))
+    if isinstance(data, str):
+        return data
 
-        return '&'.join(raw_strings)
+    if data:
+        return urlencode([
+            (key, item) for key, item in data.items() if item is not None
+        ])
 
     return data
 
@@ -343,11 +559,12 @@ def process_api_response(response, raw_request=None, raw_response=None):
 
     Parameters:
         response (str): The API response (as an ``OrderedDict``).
-        raw_request (str): Raw request (as string) submitted to API.
+        raw_request (dict|str): Raw request submitted to API (the POST
+            data or the encoded request body).
         raw_response (str): Raw response (as string) returned by API.
 
     Returns:
-        dict: The validated and converted API response.
+        HelcimResponse: The validated and converted API response.
     """
     # Add the standard API response details
     processed = {
@@ -358,14 +575,11 @@ def process_api_response(response, raw_request=None, raw_response=None):
 
     # Add and coerece any fields returned in the transaction field
     if 'transaction' in response:
-        # Convert transaction fields to Python dictionary
-        converted_fields = convert_helcim_response_fields(
-            response['transaction'], FROM_API_FIELDS
+        # Convert transaction fields into the processed dictionary
+        convert_helcim_response_fields(
+            response['transaction'], FROM_API_FIELDS, processed
         )
 
-        # Merge converted fields into processed dictionary
-        processed = {**processed, **converted_fields}
-
         # If possible, create the F4L4 field
         processed['token_f4l4'] = create_f4l4(processed.get('cc_number', None))
 
@@ -373,7 +587,7 @@ def process_api_response(response, raw_request=None, raw_response=None):
     processed['raw_request'] = create_raw_request(raw_request)
     processed['raw_response'] = raw_response
 
-    return processed
+    return HelcimResponse(processed)
 
 def process_helcim_js_response(response):
     """Processes the Helcim.js response into a Python dictionary.
@@ -382,7 +596,7 @@ def process_helcim_js_response(response):
         response (dict): The Helicm.js POST response.
 
     Returns:
-        dict: The validated and converted Helcim.js response.
+        HelcimResponse: The validated and converted Helcim.js response.
     """
     # Convert response fields into Python dicitionary
     converted_fields = convert_helcim_response_fields(
@@ -392,6 +606,4 @@ def process_helcim_js_response(response):
     # If possible, create the F4L4 field
     token_f4l4 = create_f4l4(converted_fields.get('cc_number', None))
 
-    processed = {**converted_fields, 'token_f4l4': token_f4l4}
-
-    return processed
+    return HelcimResponse(converted_fields, token_f4l4=token_f4l4)
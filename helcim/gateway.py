@@ -3,17 +3,161 @@
 These functions provide an agonstic interface with the Helcim Commerce
 API and should work in any application.
 """
-import requests
-import xmltodict
+from functools import lru_cache
+from itertools import combinations
+from threading import Lock
+from types import MappingProxyType
 
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import F
 
 from helcim import (
-    conversions, exceptions as helcim_exceptions, mixins, models
+    conversions, exceptions as helcim_exceptions, metrics, mixins, models,
+    transports
 )
+from helcim.instrumentation import timed
+from helcim.lazy import lazy_import
 from helcim.settings import SETTINGS
 
 
+# Imported on the first request (see helcim.lazy)
+requests = lazy_import('requests')
+xmltodict = lazy_import('xmltodict')
+
+# The settings that determine the shared client (see get_client)
+CLIENT_SETTINGS = (
+    'api_url', 'account_id', 'api_token', 'terminal_id', 'transport_mode',
+    'transport_cassette', 'transport_replay_latency',
+) + mixins.REDACT_SETTINGS
+
+_CLIENTS = {}
+_CLIENTS_LOCK = Lock()
+
+# The details that determine the payment method of a card transaction
+PAYMENT_FIELDS = frozenset((
+    'token', 'customer_code', 'token_f4l4', 'token_f4l4_skip', 'cc_number',
+    'cc_expiry', 'cc_name', 'cc_cvv', 'cc_address', 'cc_postal_code',
+    'mag_enc', 'mag_enc_serial_number', 'mag',
+))
+
+# The payment details that decide the payment method (the F4L4 skip
+# only counts when it is true)
+PAYMENT_METHOD_FIELDS = frozenset((
+    'token', 'customer_code', 'token_f4l4', 'token_f4l4_skip', 'cc_number',
+    'cc_expiry', 'mag_enc', 'mag_enc_serial_number', 'mag',
+))
+
+# The optional details kept with a credit card number
+CC_OPTIONAL_FIELDS = frozenset((
+    'cc_name', 'cc_cvv', 'cc_address', 'cc_postal_code',
+))
+
+def _decide_payment_method(present):
+    """Returns the payment details to keep for the present details.
+
+        Payment methods take precedence in order: token > customer
+        code > CC number > encrypted magnetic strip > magnetic strip.
+
+        Parameters:
+            present (frozenset): The ``PAYMENT_METHOD_FIELDS`` provided.
+
+        Returns:
+            tuple: The (frozen sets of) required and optional details
+                to keep, or ``None`` if the details are not valid.
+    """
+    if {'token', 'customer_code'} <= present:
+        # F4L4 required or it must be explicitly skipped (not both)
+        if 'token_f4l4' in present and 'token_f4l4_skip' in present:
+            return None
+
+        for f4l4_field in ('token_f4l4', 'token_f4l4_skip'):
+            if f4l4_field in present:
+                return (
+                    frozenset(('token', 'customer_code', f4l4_field)),
+                    frozenset(),
+                )
+
+        return None
+
+    if 'customer_code' in present:
+        return frozenset(('customer_code',)), frozenset()
+
+    if {'cc_number', 'cc_expiry'} <= present:
+        return frozenset(('cc_number', 'cc_expiry')), CC_OPTIONAL_FIELDS
+
+    if {'mag_enc', 'mag_enc_serial_number'} <= present:
+        return frozenset(('mag_enc', 'mag_enc_serial_number')), frozenset()
+
+    if 'mag' in present:
+        return frozenset(('mag',)), frozenset()
+
+    return None
+
+# The payment decision for every combination of PAYMENT_METHOD_FIELDS
+PAYMENT_DECISIONS = {
+    frozenset(present): _decide_payment_method(frozenset(present))
+    for size in range(len(PAYMENT_METHOD_FIELDS) + 1)
+    for present in combinations(sorted(PAYMENT_METHOD_FIELDS), size)
+}
+
+@lru_cache(maxsize=None)
+def _dropped_payment_fields(present):
+    """Returns the present payment details that are not kept.
+
+        Cached for each combination of the ``PAYMENT_FIELDS`` (at most
+        8192).
+
+        Returns:
+            tuple: The details to remove, or ``None`` if the details
+                are not valid.
+    """
+    decision = PAYMENT_DECISIONS[present & PAYMENT_METHOD_FIELDS]
+
+    if decision is None:
+        return None
+
+    required, optional = decision
+
+    return tuple(present - required - optional)
+
+def resolve_api_details(details=None):
+    """Returns the API details to connect to the Helcim API.
+
+        Any details that are not provided (or are ``None``) are taken
+        from the Django settings.
+
+        Parameters:
+            details (dict, optional): A dictionary of the API details
+                (``url``, ``account_id``, ``token``, and
+                ``terminal_id``).
+
+        Returns:
+            dict: The API details.
+    """
+    details = details or {}
+    api_details = {
+        'url': details.get('url'),
+        'account_id': details.get('account_id'),
+        'token': details.get('token'),
+        'terminal_id': details.get('terminal_id'),
+    }
+
+    # For any missing values, use values/defaults from settings
+    if api_details['url'] is None:
+        api_details['url'] = SETTINGS['api_url']
+
+    if api_details['account_id'] is None:
+        api_details['account_id'] = SETTINGS['account_id']
+
+    if api_details['token'] is None:
+        api_details['token'] = SETTINGS['api_token']
+
+    if api_details['terminal_id'] is None:
+        api_details['terminal_id'] = SETTINGS['terminal_id']
+
+    return api_details
+
+
 class BaseRequest(mixins.ResponseMixin):
     """Base class to handle validation and submission to Helcim API.
 
@@ -26,6 +170,9 @@ class BaseRequest(mixins.ResponseMixin):
             - **terminal_id** (*str*): Helcim terminal ID.
 
         django_user (obj): The Django model for the requesting user.
+        client (HelcimClient, optional): The client making the
+            request (replaces ``api_details`` with the API details,
+            transport, and redaction plan resolved by the client).
         **kwargs (dict): Any additional transaction details.
 
     Keyword Arguments:
@@ -95,13 +242,33 @@ class BaseRequest(mixins.ResponseMixin):
         test (bool, optional): Whether this is a test transaction or not.
     """
 
-    def __init__(self, api_details=None, django_user=None, **kwargs):
-        self.api = self.set_api_details(api_details)
+    # The HelcimTransaction field totalling the linked transactions
+    # (e.g. the captured amount of a pre-authorization)
+    original_total_field = None
+
+    # The Helcim API transaction type (e.g. ``purchase``)
+    transaction_type = None
+
+    def __init__(
+            self, api_details=None, django_user=None, client=None, **kwargs
+    ):
+        if client is None:
+            self.api = self.set_api_details(api_details)
+            self.transport = None
+        else:
+            # The client has already resolved the details
+            self.api = client.api
+            self.transport = client.transport
+            self.redaction_plan = client.redaction_plan
+
         self.details = kwargs
         self.cleaned = {}
         self.response = {}
         self.redacted_response = {}
         self.django_user = django_user
+        self.original_transaction = None
+        # The amount already added to the original total (see Refund)
+        self.reserved_amount = None
 
     def set_api_details(self, details):
         """Sets the API details for this transaction.
@@ -120,35 +287,9 @@ class BaseRequest(mixins.ResponseMixin):
                 ImproperlyConfigured: A required API setting is not
                     found.
         """
-        api_details = {
-            'url': None,
-            'account_id': None,
-            'token': None,
-            'terminal_id': None,
-        }
-
-        # Tries and retrieves settings form API details
-        if details:
-            api_details['url'] = details.get('url')
-            api_details['account_id'] = details.get('account_id')
-            api_details['token'] = details.get('token')
-            api_details['terminal_id'] = details.get('terminal_id')
-
-        # For any missing values, use values/defaults from settings
-        if api_details['url'] is None:
-            api_details['url'] = SETTINGS['api_url']
-
-        if api_details['account_id'] is None:
-            api_details['account_id'] = SETTINGS['account_id']
-
-        if api_details['token'] is None:
-            api_details['token'] = SETTINGS['api_token']
-
-        if api_details['terminal_id'] is None:
-            api_details['terminal_id'] = SETTINGS['terminal_id']
-
-        return api_details
+        return resolve_api_details(details)
 
+    @timed('configure_test_transaction')
     def configure_test_transaction(self):
         """Adds test flag to post data if HELCIM_API_TEST is True.
 
@@ -192,6 +333,7 @@ class BaseRequest(mixins.ResponseMixin):
 
         raise helcim_exceptions.HelcimError(exception_message)
 
+    @timed('post')
     def post(self, post_data=None):
         """Makes POST to Helcim API and updates response attribute.
 
@@ -204,17 +346,21 @@ class BaseRequest(mixins.ResponseMixin):
         """
         # Make the POST request
         try:
-            response = requests.post(
-                self.api['url'],
-                data=post_data,
+            transport = self.transport or transports.get_transport()
+            response = transport.post(
+                self.api['url'], post_data
             )
         except requests.ConnectionError:
+            metrics.record_api_connection_error()
+
             raise helcim_exceptions.ProcessingError(
                 'Unable to connect to Helcim API ({})'.format(self.api['url'])
             )
 
         # Catch any response errors in status code
         if response.status_code != 200:
+            metrics.record_api_response(response.status_code)
+
             raise helcim_exceptions.ProcessingError(
                 'Helcim API request failed with status code {}'.format(
                     response.status_code
@@ -223,18 +369,28 @@ class BaseRequest(mixins.ResponseMixin):
 
         # Create the dictionary ('message' is the XML structure object)
         dict_response = xmltodict.parse(response.text)['message']
+        metrics.record_api_response(
+            response.status_code, dict_response['response']
+        )
 
         # Catch any issues with the API response
         if dict_response['response'] == '0':
             self.process_error_response(dict_response['responseMessage'])
 
+        # Reuses the body encoded by requests (if available)
+        raw_request = getattr(getattr(response, 'request', None), 'body', None)
+
+        if not isinstance(raw_request, (str, bytes)):
+            raw_request = post_data
+
         # Return the response
         self.response = conversions.process_api_response(
             dict_response,
-            post_data,
+            raw_request,
             response.text
         )
 
+    @timed('save_transaction')
     def save_transaction(self, transaction_type):
         """Saves provided transaction data as Django model instance.
 
@@ -257,9 +413,10 @@ class BaseRequest(mixins.ResponseMixin):
         model_dictionary = self.create_model_arguments(transaction_type)
 
         try:
-            saved_model = models.HelcimTransaction.objects.create(
-                **model_dictionary
-            )
+            if self.original_transaction:
+                saved_model = self._save_linked_transaction(model_dictionary)
+            else:
+                saved_model = self._create_transaction(model_dictionary)
         except IntegrityError as error:
             raise helcim_exceptions.DjangoError(
                 'Unable to save transaction record: {}'.format(error)
@@ -271,94 +428,159 @@ class BaseRequest(mixins.ResponseMixin):
 
         return saved_model
 
+    def _save_linked_transaction(self, model_dictionary):
+        """Saves the transaction linked to its original transaction.
+
+            The total of the original transaction (e.g. the refunded
+            amount) is updated in the same database transaction.
+        """
+        model_dictionary['original_transaction'] = self.original_transaction
+
+        with db_transaction.atomic():
+            saved_model = self._create_transaction(model_dictionary)
+
+            # Any reserved amount has already been added to the total
+            difference = (
+                (saved_model.amount or 0) if saved_model.transaction_success
+                else 0
+            ) - (self.reserved_amount or 0)
+
+            if difference:
+                field = self.original_total_field
+
+                models.HelcimTransaction.objects.filter(
+                    pk=self.original_transaction.pk
+                ).update(**{field: F(field) + difference})
+                self.original_transaction.refresh_from_db(fields=[field])
+
+            self.reserved_amount = None
+
+        return saved_model
+
+    @timed('process_request_fields')
+    def process_request_fields(self, transaction_type):
+        """Converts the cleaned data into the Helcim API POST data.
+
+            Parameters:
+                transaction_type (str): The Helcim API transaction type
+                    (e.g. ``purchase``, ``preauth``, ``capture``).
+
+            Returns:
+                dict: The data ready for a POST request.
+        """
+        return conversions.process_request_fields(
+            self.api,
+            self.cleaned,
+            {
+                'transactionType': transaction_type,
+            }
+        )
+
+    @timed('validate_fields')
     def validate_fields(self):
         """Validates Helcim API request fields and coerces values."""
         self.cleaned = conversions.validate_request_fields(self.details)
 
 class BaseCardTransaction(BaseRequest):
     """Base class for transactions involving credit card details."""
-    def __init__(self, save_token=False, **kwargs):
+    def __init__(self, save_token=False, token_instance=None, **kwargs):
         """Extends BaseRequest to include save_token and django_user.
 
             Parameters:
                 save_token (bool): Whether the user has requested this
                     token to be saved or not.
+                token_instance (obj, optional): A saved HelcimToken to
+                    charge. Its details are added to the request
+                    directly (the card details are not determined) and
+                    the token is not saved again.
         """
         super(BaseCardTransaction, self).__init__(**kwargs)
-        self.save_token = self._determine_save_token_status(save_token)
+        self.token_instance = token_instance
+
+        if token_instance is None:
+            self.save_token = self._determine_save_token_status(save_token)
+        else:
+            self.save_token = False
+            self.token_request_fields = {
+                'cardToken': token_instance.token,
+                'cardF4L4': token_instance.token_f4l4,
+                'customerCode': token_instance.customer_code,
+            }
+
+            if self.django_user is None:
+                self.django_user = token_instance.django_user
 
+    @timed('determine_card_details')
     def determine_card_details(self):
         """Confirms valid payment details and updates self.cleaned.
 
-        Cycles through the provided details to determine the most
-        appropriate payment method. If multiple methods provided, only the
-        first match is returned (token > customer code > CC number >
-        encrypted magnetic strip > magnetic strip).
+        Looks up the provided details in ``PAYMENT_DECISIONS`` to
+        determine the most appropriate payment method. If multiple methods
+        provided, only the first match is returned (token > customer code
+        > CC number > encrypted magnetic strip > magnetic strip).
+
+        A saved ``token_instance`` is always the payment method (no
+        other payment details may be provided).
 
         Raises:
             ValueError: No valid payment details provided.
         """
+        if self.token_instance is not None:
+            if not PAYMENT_FIELDS.isdisjoint(self.cleaned):
+                raise ValueError(
+                    'Payment details cannot be provided with a saved token.'
+                )
 
-        payment_fields = [
-            'token', 'customer_code', 'token_f4l4', 'token_f4l4_skip',
-            'cc_number', 'cc_expiry', 'cc_name', 'cc_cvv', 'cc_address',
-            'cc_postal_code', 'mag_enc', 'mag_enc_serial_number', 'mag'
-        ]
-
-        if 'token' in self.cleaned and 'customer_code' in self.cleaned:
-            # F4L4 required or it must be explicitly skipped
-            f4l4_skip = self.cleaned.get('token_f4l4_skip', False)
-
-            if f4l4_skip:
-                payment_fields.remove('token')
-                payment_fields.remove('customer_code')
-                payment_fields.remove('token_f4l4_skip')
-
-            if 'token_f4l4' in self.cleaned:
-                payment_fields.remove('token')
-                payment_fields.remove('customer_code')
-                payment_fields.remove('token_f4l4')
+            return
 
-        elif 'customer_code' in self.cleaned:
-            payment_fields.remove('customer_code')
+        cleaned = self.cleaned
+        present = PAYMENT_FIELDS.intersection(cleaned)
+        false_skip = (
+            'token_f4l4_skip' in present and not cleaned['token_f4l4_skip']
+        )
 
-        elif 'cc_number' in self.cleaned and 'cc_expiry' in self.cleaned:
-            payment_fields.remove('cc_number')
-            payment_fields.remove('cc_expiry')
+        # A false F4L4 skip is removed (it does not skip the F4L4)
+        if false_skip:
+            present = present.difference(('token_f4l4_skip',))
 
-            # Add any additional CC details (as provided)
-            if 'cc_name' in self.cleaned:
-                payment_fields.remove('cc_name')
+        dropped = _dropped_payment_fields(present)
 
-            if 'cc_cvv' in self.cleaned:
-                payment_fields.remove('cc_cvv')
+        if dropped is None:
+            raise ValueError('No valid payment details provided.')
 
-            if 'cc_address' in self.cleaned:
-                payment_fields.remove('cc_address')
+        if false_skip:
+            del cleaned['token_f4l4_skip']
 
-            if 'cc_postal_code' in self.cleaned:
-                payment_fields.remove('cc_postal_code')
+        # Remove any other payment details from self.cleaned
+        for field in dropped:
+            del cleaned[field]
 
-        elif (
-                'mag_enc' in self.cleaned
-                and 'mag_enc_serial_number' in self.cleaned
-        ):
-            payment_fields.remove('mag_enc')
-            payment_fields.remove('mag_enc_serial_number')
+    def process_request_fields(self, transaction_type):
+        """Extends BaseRequest to add the saved token details (if any).
 
-        elif 'mag' in self.cleaned:
-            payment_fields.remove('mag')
+            Parameters:
+                transaction_type (str): The Helcim API transaction type
+                    (e.g. ``purchase``, ``preauth``, ``refund``).
 
-        # Raise error if no fields have been removed
-        if len(payment_fields) == 13:
-            raise ValueError('No valid payment details provided.')
+            Returns:
+                dict: The data ready for a POST request.
+        """
+        if self.token_instance is None:
+            return super(BaseCardTransaction, self).process_request_fields(
+                transaction_type
+            )
 
-        # Remove any other fields from self.cleaned
-        for field in payment_fields:
-            self.cleaned.pop(field, None)
+        return conversions.process_request_fields(
+            self.api,
+            self.cleaned,
+            dict(self.token_request_fields, transactionType=transaction_type),
+        )
 
 class Purchase(BaseCardTransaction):
     """Makes a purchase request to Helcim Commerce API."""
+    transaction_type = 'purchase'
+
+    @timed('process')
     def process(self):
         """Makes a purchase request.
 
@@ -370,13 +592,7 @@ class Purchase(BaseCardTransaction):
         self.configure_test_transaction()
         self.determine_card_details()
 
-        purchase_data = conversions.process_request_fields(
-            self.api,
-            self.cleaned,
-            {
-                'transactionType': 'purchase',
-            }
-        )
+        purchase_data = self.process_request_fields(self.transaction_type)
         self.post(purchase_data)
 
         purchase = self.save_transaction('s')
@@ -386,19 +602,16 @@ class Purchase(BaseCardTransaction):
 
 class Preauthorize(BaseCardTransaction):
     """Makes a pre-authorization request to Helcim Commerce API."""
+    transaction_type = 'preauth'
+
+    @timed('process')
     def process(self):
         """Makes a pre-authorization request."""
         self.validate_fields()
         self.configure_test_transaction()
         self.determine_card_details()
 
-        preauth_data = conversions.process_request_fields(
-            self.api,
-            self.cleaned,
-            {
-                'transactionType': 'preauth',
-            }
-        )
+        preauth_data = self.process_request_fields(self.transaction_type)
         self.post(preauth_data)
 
         preauth = self.save_transaction('p')
@@ -408,20 +621,94 @@ class Preauthorize(BaseCardTransaction):
 
 class Refund(BaseCardTransaction):
     """Makes a refund request."""
+    original_total_field = 'refunded_amount'
+    transaction_type = 'refund'
+
+    def __init__(self, original_transaction=None, **kwargs):
+        """Extends BaseCardTransaction to include original_transaction.
+
+            Parameters:
+                original_transaction (obj, optional): The
+                    HelcimTransaction being refunded. If provided, the
+                    refund is linked to it and may not exceed its
+                    refundable amount.
+        """
+        super(Refund, self).__init__(**kwargs)
+        self.original_transaction = original_transaction
+
+    def reserve_refund_amount(self):
+        """Adds the refund amount to the refunded amount of the original.
+
+            The original transaction is locked (``select_for_update``)
+            while the amount is validated and added, so concurrent
+            refunds cannot exceed the refundable amount. The lock is
+            released before the Helcim API is called and the amount
+            is removed again if the refund fails.
+
+            Raises:
+                RefundError: No amount was provided or it exceeds the
+                    amount that has not been refunded.
+        """
+        if not self.original_transaction:
+            return
+
+        amount = self.cleaned.get('amount')
+
+        if not amount or amount <= 0:
+            raise helcim_exceptions.RefundError(
+                'A refund amount must be provided to refund a saved '
+                'transaction.'
+            )
+
+        with db_transaction.atomic():
+            original = models.HelcimTransaction.objects.select_for_update(
+            ).only('amount', 'refunded_amount').get(
+                pk=self.original_transaction.pk
+            )
+
+            if amount > original.refundable_amount:
+                raise helcim_exceptions.RefundError(
+                    'Refund amount exceeds the refundable amount '
+                    '({}).'.format(original.refundable_amount)
+                )
+
+            models.HelcimTransaction.objects.filter(pk=original.pk).update(
+                refunded_amount=F('refunded_amount') + amount
+            )
+
+        self.reserved_amount = amount
+        self.original_transaction.amount = original.amount
+        self.original_transaction.refunded_amount = (
+            original.refunded_amount + amount
+        )
+
+    def release_refund_amount(self):
+        """Removes the reserved amount (e.g. if the refund failed)."""
+        if not self.reserved_amount:
+            return
+
+        models.HelcimTransaction.objects.filter(
+            pk=self.original_transaction.pk
+        ).update(refunded_amount=F('refunded_amount') - self.reserved_amount)
+        self.original_transaction.refunded_amount -= self.reserved_amount
+        self.reserved_amount = None
+
+    @timed('process')
     def process(self):
         """Makes a refund request to Helcim Commerce API."""
         self.validate_fields()
         self.configure_test_transaction()
         self.determine_card_details()
 
-        refund_data = conversions.process_request_fields(
-            self.api,
-            self.cleaned,
-            {
-                'transactionType': 'refund',
-            }
-        )
-        self.post(refund_data)
+        refund_data = self.process_request_fields(self.transaction_type)
+        self.reserve_refund_amount()
+
+        try:
+            self.post(refund_data)
+        except Exception:
+            # Any error before a response is processed (e.g. a timeout)
+            self.release_refund_amount()
+            raise
 
         refund = self.save_transaction('r')
         token = self.save_token_to_vault()
@@ -430,19 +717,16 @@ class Refund(BaseCardTransaction):
 
 class Verification(BaseCardTransaction):
     """Makes a verification request to Helcim Commerce API."""
+    transaction_type = 'verify'
+
+    @timed('process')
     def process(self):
         """Makes a verification request to Helcim Commerce API."""
         self.validate_fields()
         self.configure_test_transaction()
         self.determine_card_details()
 
-        verification_data = conversions.process_request_fields(
-            self.api,
-            self.cleaned,
-            {
-                'transactionType': 'verify',
-            }
-        )
+        verification_data = self.process_request_fields(self.transaction_type)
         self.post(verification_data)
 
         verification = self.save_transaction('v')
@@ -452,6 +736,21 @@ class Verification(BaseCardTransaction):
 
 class Capture(BaseRequest):
     """Makes a capture request (to complete a preauthorization)."""
+    original_total_field = 'captured_amount'
+    transaction_type = 'capture'
+
+    def __init__(self, original_transaction=None, **kwargs):
+        """Extends BaseRequest to include original_transaction.
+
+            Parameters:
+                original_transaction (obj, optional): The
+                    pre-authorization HelcimTransaction being captured.
+                    If not provided, it is retrieved by the transaction
+                    ID (if saved).
+        """
+        super(Capture, self).__init__(**kwargs)
+        self.original_transaction = original_transaction
+
     def validate_preauth_transaction(self):
         """Confirms that a preauth transaction ID was provided.
 
@@ -464,19 +763,38 @@ class Capture(BaseRequest):
                 'Transaction ID must be provided with capture (force) request.'
             )
 
+    def determine_original_transaction(self):
+        """Retrieves the saved pre-authorization being captured.
+
+            Raises:
+                PaymentError: The pre-authorization has already been
+                    captured.
+        """
+        if self.original_transaction is None:
+            # A single lookup on the indexed transaction ID
+            preauths = models.HelcimTransaction.objects.filter(
+                transaction_id=self.cleaned.get('transaction_id'),
+                transaction_type='p',
+                transaction_success=True,
+            )
+            self.original_transaction = preauths.first()
+
+        original = self.original_transaction
+
+        if original and original.captured_amount:
+            raise helcim_exceptions.PaymentError(
+                'Transaction has already been captured.'
+            )
+
+    @timed('process')
     def process(self):
         """Completes a capture request."""
         self.validate_fields()
         self.validate_preauth_transaction()
+        self.determine_original_transaction()
         self.configure_test_transaction()
 
-        capture_data = conversions.process_request_fields(
-            self.api,
-            self.cleaned,
-            {
-                'transactionType': 'capture',
-            }
-        )
+        capture_data = self.process_request_fields(self.transaction_type)
 
         self.post(capture_data)
         capture = self.save_transaction('c')
@@ -511,7 +829,12 @@ class HelcimJSResponse(mixins.ResponseMixin):
         self.validated = False
         self.valid = False
 
+    @property
+    def transaction_type(self):
+        """The Helcim.js transaction type (once the response is validated)."""
+        return self.response.get('transaction_type', None)
 
+    @timed('is_valid')
     def is_valid(self):
         """Validates format is correct and notifies of any errors.
 
@@ -592,11 +915,123 @@ class HelcimJSResponse(mixins.ResponseMixin):
         """
         return self._record_response('v')
 
-def retrieve_token_details(token_id, django_user=None, customer_code=None):
-    """Takes a HelcimToken ID and maps details to dictionary."""
+class HelcimClient():
+    """Long-lived client to make requests to the Helcim Commerce API.
+
+        The API details, transport, and redaction plan are resolved
+        once (when the client is created) instead of for every
+        transaction. Each method creates a new request instance, so a
+        client can be shared between threads.
+
+        Parameters:
+            api_details (dict, optional): Details to connect to the
+                Helcim API (see ``BaseRequest``). Any missing details
+                are taken from the Django settings.
+            transport (obj, optional): The transport to send the
+                requests with (defaults to the transport for the
+                current transport settings).
+
+        Example::
+
+            client = gateway.get_client()
+            transaction, token = client.purchase(
+                amount=Decimal('10.00'), token='abcdefghijklmnopqrstuvw',
+                token_f4l4='42424242', customer_code='CST1000',
+            )
+    """
+    def __init__(self, api_details=None, transport=None):
+        self.api = MappingProxyType(resolve_api_details(api_details))
+        self.transport = transport or transports.get_transport()
+        # pylint: disable=protected-access
+        self.redaction_plan = mixins.ResponseMixin._get_redaction_plan()
+
+    def purchase(self, django_user=None, **kwargs):
+        """Makes a purchase request (see ``Purchase``).
+
+            Returns:
+                tuple: The saved HelcimTransaction model
+                    instance and HelcimToken model.
+        """
+        return Purchase(
+            client=self, django_user=django_user, **kwargs
+        ).process()
+
+    def preauthorize(self, django_user=None, **kwargs):
+        """Makes a pre-authorization request (see ``Preauthorize``).
+
+            Returns:
+                tuple: The saved HelcimTransaction model
+                    instance and HelcimToken model.
+        """
+        return Preauthorize(
+            client=self, django_user=django_user, **kwargs
+        ).process()
+
+    def capture(self, original_transaction=None, django_user=None, **kwargs):
+        """Makes a capture request (see ``Capture``).
+
+            Returns:
+                obj: The saved HelcimTransaction model instance.
+        """
+        return Capture(
+            original_transaction=original_transaction, client=self,
+            django_user=django_user, **kwargs
+        ).process()
+
+    def refund(self, original_transaction=None, django_user=None, **kwargs):
+        """Makes a refund request (see ``Refund``).
+
+            Returns:
+                tuple: The saved HelcimTransaction model
+                    instance and HelcimToken model.
+        """
+        return Refund(
+            original_transaction=original_transaction, client=self,
+            django_user=django_user, **kwargs
+        ).process()
+
+    def verify(self, django_user=None, **kwargs):
+        """Makes a verification request (see ``Verification``).
+
+            Returns:
+                tuple: The saved HelcimTransaction model
+                    instance and HelcimToken model.
+        """
+        return Verification(
+            client=self, django_user=django_user, **kwargs
+        ).process()
+
+def get_client():
+    """Returns the shared client for the current settings.
+
+        Clients are created once per combination of the API,
+        transport, and redact settings.
+    """
+    key = tuple(SETTINGS[setting] for setting in CLIENT_SETTINGS)
+    client = _CLIENTS.get(key)
+
+    if client is None:
+        with _CLIENTS_LOCK:
+            client = _CLIENTS.get(key)
+
+            if client is None:
+                client = HelcimClient()
+                _CLIENTS[key] = client
+
+    return client
+
+def retrieve_token(token_id, django_user=None, customer_code=None):
+    """Returns the HelcimToken of the specified customer.
+
+        The token can be charged directly with the ``token_instance``
+        of a card transaction.
+
+        Raises:
+            ProcessingError: The token does not exist for the customer.
+    """
     # Final validation to ensure token exists & belongs to proper user
     try:
-        token_instance = models.HelcimToken.objects.get(
+        return models.HelcimToken.objects.get(
             id=token_id,
             django_user=django_user,
             customer_code=customer_code
@@ -606,6 +1041,10 @@ def retrieve_token_details(token_id, django_user=None, customer_code=None):
             'Unable to retrieve token details for specified customer.'
         )
 
+def retrieve_token_details(token_id, django_user=None, customer_code=None):
+    """Takes a HelcimToken ID and maps details to dictionary."""
+    token_instance = retrieve_token(token_id, django_user, customer_code)
+
     # Validation passed - map model to the dictionary
     return {
         'token': token_instance.token,
@@ -0,0 +1,95 @@
+"""Timing instrumentation for the transaction processing stages.
+
+    Each stage of a transaction (validation, conversions, the API
+    request, redaction, database saves, etc.) can be timed and
+    reported via the ``helcim.signals.stage_completed`` signal.
+    Receivers of this signal can forward the timings to any metrics
+    system (e.g. a StatsD client or an in-process histogram).
+
+    Instrumentation is controlled by the
+    ``HELCIM_ENABLE_INSTRUMENTATION`` setting (and is also enabled by
+    ``HELCIM_ENABLE_METRICS``, which records the stage timings). When
+    disabled, the only overhead is a settings lookup per stage.
+"""
+from functools import wraps
+from time import perf_counter
+
+from helcim.settings import SETTINGS
+from helcim.signals import stage_completed
+
+
+def is_enabled():
+    """Returns whether stage timings should be recorded."""
+    return SETTINGS['enable_instrumentation'] or SETTINGS['enable_metrics']
+
+def transaction_type_label(instance):
+    """Returns the transaction type of the instance running a stage.
+
+        This is the Helcim transaction type of the request or response
+        (e.g. ``purchase`` or ``preauth``), or ``unknown`` if it is
+        not known (e.g. a Helcim.js response that is not validated).
+    """
+    return getattr(instance, 'transaction_type', None) or 'unknown'
+
+class StageTimer():
+    """Context manager that times a stage and sends the signal.
+
+        Parameters:
+            instance (obj): The gateway instance running the stage.
+            stage (str): The name of the stage being timed.
+    """
+    __slots__ = ('instance', 'stage', 'start')
+
+    def __init__(self, instance, stage):
+        self.instance = instance
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = perf_counter() - self.start
+
+        # An exception is raised by the innermost stage it passes
+        # through (the enclosing stages only complete with its outcome)
+        raised = exc_type is not None and not hasattr(
+            exc_value, 'helcim_stage'
+        )
+
+        if raised:
+            exc_value.helcim_stage = self.stage
+
+        stage_completed.send(
+            sender=type(self.instance),
+            instance=self.instance,
+            stage=self.stage,
+            duration=duration,
+            transaction_type=transaction_type_label(self.instance),
+            outcome='success' if exc_type is None else exc_type.__name__,
+            raised=raised,
+        )
+
+        # Never suppress any exceptions
+        return False
+
+def timed(stage):
+    """Decorator to time a method as a transaction stage.
+
+        Parameters:
+            stage (str): The name of the stage being timed.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not is_enabled():
+                return method(self, *args, **kwargs)
+
+            with StageTimer(self, stage):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,22 @@
+"""Lazy imports of the libraries only needed to contact the API.
+
+    The HTTP (``requests``) and XML (``xmltodict``) libraries are only
+    imported when a request is first made, so the models, settings,
+    and admin (e.g. in management commands and task workers) load
+    without them.
+"""
+from importlib import import_module
+
+from django.utils.functional import SimpleLazyObject
+
+
+def lazy_import(name):
+    """Returns a proxy of a module that is imported on first use.
+
+        Attributes of the proxy are read from (and set on) the module,
+        so the module can still be patched through the proxy.
+
+        Parameters:
+            name (str): The name of the module.
+    """
+    return SimpleLazyObject(lambda: import_module(name))
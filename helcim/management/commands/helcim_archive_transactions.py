@@ -0,0 +1,50 @@
+"""Management command to archive old Helcim transactions."""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from helcim.archive import archive_transactions
+
+
+class Command(BaseCommand):
+    """Moves old transactions to the transaction archive."""
+    help = (
+        'Moves transactions older than the provided number of days to the '
+        'transaction archive.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            default=365,
+            help='Archive transactions older than this many days.',
+            type=int,
+        )
+        parser.add_argument(
+            '--batch-size',
+            default=1000,
+            help='The number of transactions moved in each database '
+            'transaction.',
+            type=int,
+        )
+        parser.add_argument(
+            '--file',
+            default=None,
+            help='Append the transaction details to this gzip-compressed '
+            'JSON Lines file (instead of the archive table).',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days must not be negative.')
+
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        archived = archive_transactions(
+            timedelta(days=options['days']),
+            batch_size=options['batch_size'],
+            path=options['file'],
+        )
+
+        self.stdout.write('Archived {} transaction(s).'.format(archived))
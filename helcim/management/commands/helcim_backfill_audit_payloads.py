@@ -0,0 +1,29 @@
+"""Management command to compress the audit data of saved transactions."""
+from django.core.management.base import BaseCommand, CommandError
+
+from helcim.audit import backfill_audit_payloads
+
+
+class Command(BaseCommand):
+    """Moves inline audit data to compressed audit payloads."""
+    help = (
+        'Moves the raw request and response of saved transactions to '
+        'compressed audit payloads.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            default=1000,
+            help='The number of transactions moved in each database '
+            'transaction.',
+            type=int,
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        moved = backfill_audit_payloads(batch_size=options['batch_size'])
+
+        self.stdout.write('Compressed {} transaction(s).'.format(moved))
@@ -0,0 +1,114 @@
+"""Management command to capture the due Helcim pre-authorizations."""
+from django.core.management.base import BaseCommand, CommandError
+
+from helcim.preauthorizations import (
+    queue_open_preauthorizations, release_capture, sweep
+)
+
+
+class Command(BaseCommand):
+    """Captures the due pre-authorizations and removes the expired ones."""
+    help = (
+        'Captures the open pre-authorizations that are due (earliest first) '
+        'and removes the expired ones from the queue.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            default=4,
+            help='The number of captures processed at once.',
+            type=int,
+        )
+        parser.add_argument(
+            '--rate',
+            default=None,
+            help='The maximum number of captures started per second.',
+            type=float,
+        )
+        parser.add_argument(
+            '--limit',
+            default=None,
+            help='The maximum number of captures.',
+            type=int,
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the due and expired pre-authorizations without '
+            'capturing or removing them.',
+        )
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='First queue the saved pre-authorizations that are not '
+            'captured (e.g. those saved before the queue was added).',
+        )
+        parser.add_argument(
+            '--release',
+            action='append',
+            default=[],
+            help='First release the stalled capture of this pre-authorization '
+            '(only once Helcim shows it was not captured). Can be repeated.',
+            metavar='PK',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1.')
+
+        if options['rate'] is not None and options['rate'] <= 0:
+            raise CommandError('--rate must be positive.')
+
+        if options['limit'] is not None and options['limit'] < 1:
+            raise CommandError('--limit must be at least 1.')
+
+        if options['backfill']:
+            queued = queue_open_preauthorizations()
+            self.stdout.write(
+                'Queued {} pre-authorization(s).'.format(queued)
+            )
+
+        for pk in options['release']:
+            if not release_capture(pk):
+                raise CommandError(
+                    'No capture of pre-authorization {} is in '
+                    'progress.'.format(pk)
+                )
+
+            self.stdout.write('Released pre-authorization {}.'.format(pk))
+
+        result = sweep(
+            limit=options['limit'],
+            workers=options['workers'],
+            rate=options['rate'],
+            dry_run=options['dry_run'],
+        )
+
+        if options['dry_run']:
+            self.stdout.write(
+                '{} pre-authorization(s) due, {} expired, {} stalled.'.format(
+                    len(result.captured), len(result.expired),
+                    len(result.stalled),
+                )
+            )
+            return
+
+        for pk, error in result.failed:
+            self.stderr.write(
+                'Unable to capture pre-authorization {}: {}'.format(pk, error)
+            )
+
+        for pk in result.stalled:
+            self.stderr.write(
+                'The capture of pre-authorization {} has stalled: check it '
+                'with Helcim before releasing it.'.format(pk)
+            )
+
+        self.stdout.write(
+            'Captured {} pre-authorization(s), {} failed, {} expired, '
+            '{} stalled.'.format(
+                len(result.captured), len(result.failed), len(result.expired),
+                len(result.stalled),
+            )
+        )
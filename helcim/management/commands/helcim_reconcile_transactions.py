@@ -0,0 +1,99 @@
+"""Management command to reconcile transactions with a Helcim export."""
+from collections import Counter
+import csv
+from xml.etree.ElementTree import ParseError
+
+from django.core.management.base import BaseCommand, CommandError
+
+from helcim.reconciliation import (
+    AMBIGUOUS, INVALID, MISMATCHED, MISSING, ORPHANED, read_export,
+    reconcile,
+)
+
+
+class Command(BaseCommand):
+    """Compares the saved transactions to a Helcim transaction report."""
+    help = (
+        'Compares the saved transactions to a Helcim transaction report '
+        'export and writes the invalid, missing, mismatched, ambiguous, '
+        'and orphaned transactions as CSV.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'export',
+            help='The Helcim transaction report export (CSV or XML).',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'xml'],
+            default=None,
+            help='The export format (determined from the file extension '
+            'by default).',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            default=1000,
+            help='The number of export transactions compared per database '
+            'query.',
+            type=int,
+        )
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='Write the discrepancies to this CSV file (instead of '
+            'standard output).',
+        )
+
+    def _write(self, discrepancies, output):
+        """Writes the discrepancies and returns the count of each status."""
+        counts = Counter()
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow([
+            'status', 'transaction_id', 'order_number', 'amount',
+            'local_id', 'fields', 'row',
+        ])
+
+        for discrepancy in discrepancies:
+            counts[discrepancy.status] += 1
+            writer.writerow([
+                discrepancy.status,
+                discrepancy.transaction_id,
+                discrepancy.order_number,
+                discrepancy.amount,
+                discrepancy.local_id,
+                ' '.join(discrepancy.fields),
+                discrepancy.row,
+            ])
+
+        return counts
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+
+        try:
+            records = read_export(options['export'], options['format'])
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        discrepancies = reconcile(records, chunk_size=options['chunk_size'])
+
+        try:
+            if options['output']:
+                with open(options['output'], 'w', newline='') as output:
+                    counts = self._write(discrepancies, output)
+            else:
+                counts = self._write(discrepancies, self.stdout)
+        except (OSError, ParseError, csv.Error) as error:
+            raise CommandError(
+                'Unable to reconcile transactions: {}'.format(error)
+            )
+
+        self.stderr.write(
+            'Invalid: {}, missing: {}, mismatched: {}, ambiguous: {}, '
+            'orphaned: {}'.format(
+                counts[INVALID], counts[MISSING], counts[MISMATCHED],
+                counts[AMBIGUOUS], counts[ORPHANED],
+            )
+        )
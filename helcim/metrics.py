@@ -0,0 +1,589 @@
+"""In-process metrics registry for django-helcim.
+
+    Provides counters and histograms for transaction activity that can
+    be exposed in the Prometheus text exposition format (see
+    ``helcim.views.MetricsView``).
+
+    Updating a metric only acquires an uncontended lock and updates a
+    dictionary entry. When ``HELCIM_METRICS_DIR`` is set, each process
+    periodically writes its metrics to a file in that directory (from
+    a background thread) and the exposition combines the metrics from
+    every process. This allows the metrics to be used with
+    multi-process servers (e.g. gunicorn or uWSGI).
+
+    The metrics of a process that has exited (its file is merged when
+    it exits, or when its process ID is no longer running) are kept in
+    a single file of the exited processes, so the combined counters
+    never go backwards and a reused process ID does not overwrite them.
+"""
+import atexit
+import json
+import os
+import threading
+from contextlib import contextmanager
+from time import sleep
+
+try:
+    import fcntl
+except ImportError: # pragma: no cover
+    # Not available on Windows (exited processes are not merged)
+    fcntl = None
+
+from helcim.settings import SETTINGS
+
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+def _format_labels(label_names, label_values, extra=None):
+    """Formats labels for the text exposition format."""
+    pairs = list(zip(label_names, label_values))
+
+    if extra:
+        pairs.append(extra)
+
+    if not pairs:
+        return ''
+
+    formatted = []
+
+    for name, value in pairs:
+        escaped = (
+            str(value).replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"')
+        )
+        formatted.append('{}="{}"'.format(name, escaped))
+
+    return '{{{}}}'.format(','.join(formatted))
+
+def _format_value(value):
+    """Formats a sample value for the text exposition format."""
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value))
+
+class Counter():
+    """A monotonically increasing counter.
+
+        Parameters:
+            name (str): The metric name.
+            documentation (str): The metric description.
+            label_names (tuple): The names of the metric labels.
+    """
+    metric_type = 'counter'
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        """Increments the counter for the provided label values."""
+        with self._lock:
+            self._values[label_values] = (
+                self._values.get(label_values, 0) + amount
+            )
+
+    def value(self, *label_values):
+        """Returns the current (in-process) value of the counter."""
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    @staticmethod
+    def serialize(values):
+        """Returns the values as JSON-serializable data."""
+        return [[list(labels), value] for labels, value in values.items()]
+
+    def dump(self):
+        """Returns the counter values as JSON-serializable data."""
+        with self._lock:
+            return self.serialize(self._values)
+
+    @staticmethod
+    def merge(combined, data):
+        """Merges dumped values into the combined dictionary."""
+        for labels, value in data:
+            labels = tuple(labels)
+            combined[labels] = combined.get(labels, 0) + value
+
+    def expose(self, combined):
+        """Returns the exposition lines for the combined values."""
+        lines = []
+
+        for labels, value in sorted(combined.items()):
+            lines.append('{}{} {}'.format(
+                self.name,
+                _format_labels(self.label_names, labels),
+                _format_value(value),
+            ))
+
+        return lines
+
+class Histogram():
+    """A histogram of observed values.
+
+        Parameters:
+            name (str): The metric name.
+            documentation (str): The metric description.
+            label_names (tuple): The names of the metric labels.
+            buckets (tuple): The upper bounds of the histogram buckets.
+    """
+    metric_type = 'histogram'
+
+    def __init__(
+            self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """Records an observation for the provided label values."""
+        # Find the bucket outside of the lock (buckets are few)
+        index = len(self.buckets)
+
+        for bucket_index, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = bucket_index
+                break
+
+        with self._lock:
+            entry = self._values.get(label_values)
+
+            if entry is None:
+                entry = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[label_values] = entry
+
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *label_values):
+        """Returns the current (in-process) observation count."""
+        with self._lock:
+            entry = self._values.get(label_values)
+
+            return entry[2] if entry else 0
+
+    @staticmethod
+    def serialize(values):
+        """Returns the values as JSON-serializable data."""
+        return [
+            [list(labels), list(entry[0]), entry[1], entry[2]]
+            for labels, entry in values.items()
+        ]
+
+    def dump(self):
+        """Returns the histogram values as JSON-serializable data."""
+        with self._lock:
+            return self.serialize(self._values)
+
+    @staticmethod
+    def merge(combined, data):
+        """Merges dumped values into the combined dictionary."""
+        for labels, bucket_counts, total, count in data:
+            labels = tuple(labels)
+            entry = combined.get(labels)
+
+            if entry is None:
+                combined[labels] = [list(bucket_counts), total, count]
+            else:
+                entry[0] = [a + b for a, b in zip(entry[0], bucket_counts)]
+                entry[1] += total
+                entry[2] += count
+
+    def expose(self, combined):
+        """Returns the exposition lines for the combined values."""
+        lines = []
+        bounds = self.buckets + (float('inf'),)
+
+        for labels, (bucket_counts, total, count) in sorted(combined.items()):
+            cumulative = 0
+
+            for bound, bucket_count in zip(bounds, bucket_counts):
+                cumulative += bucket_count
+                lines.append('{}_bucket{} {}'.format(
+                    self.name,
+                    _format_labels(
+                        self.label_names, labels, ('le', _format_value(bound))
+                    ),
+                    _format_value(cumulative),
+                ))
+
+            formatted_labels = _format_labels(self.label_names, labels)
+            lines.append('{}_sum{} {}'.format(
+                self.name, formatted_labels, _format_value(total)
+            ))
+            lines.append('{}_count{} {}'.format(
+                self.name, formatted_labels, _format_value(count)
+            ))
+
+        return lines
+
+PROCESS_FILE_PREFIX = 'helcim_metrics_'
+EXITED_FILE = 'helcim_metrics_exited.json'
+LOCK_FILE = 'helcim_metrics.lock'
+
+def _is_running(pid):
+    """Returns whether a process is running (assumed if unknown)."""
+    if os.name != 'posix':
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # E.g. the process belongs to another user
+        return True
+
+    return True
+
+def _read_dump(path):
+    """Returns the dumped metrics in a file (or None if unreadable)."""
+    try:
+        with open(path) as dump:
+            return json.load(dump)
+    except (OSError, ValueError):
+        # File may have been removed; skip it
+        return None
+
+def _write_dump(path, data):
+    """Replaces a file with the dumped metrics."""
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+    with open(temp_path, 'w') as temp_file:
+        json.dump(data, temp_file)
+
+    os.replace(temp_path, path)
+
+class Registry():
+    """A collection of metrics that can be exposed together.
+
+        Parameters:
+            directory (str, optional): A directory shared between
+                processes (defaults to the ``HELCIM_METRICS_DIR``
+                setting, read each time it is used). If set, metrics
+                are periodically written to this directory and the
+                exposition includes the metrics of all processes.
+            flush_interval (float): Seconds between writes to the
+                shared directory.
+    """
+    def __init__(self, directory=None, flush_interval=5.0):
+        self._directory = directory
+        self.flush_interval = flush_interval
+        self.metrics = []
+        self._flusher_pid = None
+        self._flusher_lock = threading.Lock()
+        # The process ID that last wrote its file (and whether that
+        # file has been merged into the exited processes' file)
+        self._file_pid = None
+        self._exited = False
+        self._file_lock = threading.Lock()
+
+    @property
+    def directory(self):
+        """Returns the shared directory (None if not set)."""
+        if self._directory is not None:
+            return self._directory
+
+        return SETTINGS['metrics_dir']
+
+    def register(self, metric):
+        """Adds a metric to the registry and returns it."""
+        self.metrics.append(metric)
+
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        """Creates and registers a Counter."""
+        return self.register(Counter(name, documentation, label_names))
+
+    def histogram(
+            self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS
+    ):
+        """Creates and registers a Histogram."""
+        return self.register(
+            Histogram(name, documentation, label_names, buckets)
+        )
+
+    def _process_file(self, pid=None):
+        """Returns the path to the metrics file for a process."""
+        return os.path.join(
+            self.directory,
+            '{}{}.json'.format(PROCESS_FILE_PREFIX, pid or os.getpid()),
+        )
+
+    def dump(self):
+        """Returns all metric values as JSON-serializable data."""
+        return {metric.name: metric.dump() for metric in self.metrics}
+
+    def _combine(self, dumps):
+        """Returns the combined values of the dumps, by metric."""
+        combined = {metric.name: {} for metric in self.metrics}
+
+        for metric in self.metrics:
+            for dump in dumps:
+                metric.merge(combined[metric.name], dump.get(metric.name, []))
+
+        return combined
+
+    @contextmanager
+    def _locked_directory(self, shared=False):
+        """Locks the shared directory between processes.
+
+            Files are merged (and removed) under an exclusive lock and
+            read under a shared lock, so a process' metrics are never
+            read twice or missed.
+        """
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+
+    def _merge_exited(self, paths):
+        """Merges the files of exited processes and removes them.
+
+            Must be called with the directory locked exclusively.
+        """
+        exited_path = os.path.join(self.directory, EXITED_FILE)
+        dumps = [_read_dump(exited_path) or {}]
+        dumps.extend(filter(None, (_read_dump(path) for path in paths)))
+        combined = self._combine(dumps)
+
+        _write_dump(exited_path, {
+            metric.name: metric.serialize(combined[metric.name])
+            for metric in self.metrics
+        })
+
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def flush(self):
+        """Writes this process' metrics to the shared directory."""
+        if not self.directory:
+            return
+
+        with self._file_lock:
+            if self._exited:
+                return
+
+            path = self._process_file()
+
+            # A file left by an exited process with the same ID
+            if (
+                    fcntl and self._file_pid != os.getpid()
+                    and os.path.exists(path)
+            ):
+                with self._locked_directory():
+                    self._merge_exited([path])
+
+            _write_dump(path, self.dump())
+            self._file_pid = os.getpid()
+
+    def _exit(self):
+        """Merges this process' metrics with the exited processes'."""
+        self.flush()
+
+        if not self.directory or not fcntl:
+            return
+
+        with self._file_lock:
+            if self._exited or self._file_pid != os.getpid():
+                return
+
+            with self._locked_directory():
+                self._merge_exited([self._process_file()])
+
+            self._exited = True
+
+    def _flush_periodically(self):
+        """Flushes the metrics in a loop (run in a daemon thread)."""
+        while True:
+            sleep(self.flush_interval)
+            self.flush()
+
+    def ensure_flusher(self):
+        """Starts the flushing thread for this process (if needed).
+
+            Checks the process ID so that forked worker processes start
+            their own thread.
+        """
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+
+        with self._flusher_lock:
+            if self._flusher_pid == os.getpid():
+                return
+
+            self._flusher_pid = os.getpid()
+
+            thread = threading.Thread(
+                target=self._flush_periodically, daemon=True
+            )
+            thread.start()
+            atexit.register(self._exit)
+
+    def _process_files(self):
+        """Returns the metrics files of other processes, by process ID."""
+        files = {}
+
+        for file_name in os.listdir(self.directory):
+            pid = file_name[len(PROCESS_FILE_PREFIX):-len('.json')]
+
+            if (
+                    file_name.startswith(PROCESS_FILE_PREFIX)
+                    and file_name.endswith('.json') and pid.isdigit()
+            ):
+                files[int(pid)] = os.path.join(self.directory, file_name)
+
+        files.pop(os.getpid(), None)
+
+        return files
+
+    def _collect_dumps(self):
+        """Returns the dumped metrics of every process."""
+        dumps = [self.dump()]
+        directory = self.directory
+
+        if not directory or not os.path.isdir(directory):
+            return dumps
+
+        # Merges a file left by an exited process with the same ID
+        if (
+                fcntl and self._file_pid != os.getpid()
+                and os.path.exists(self._process_file())
+        ):
+            self.flush()
+
+        files = self._process_files()
+
+        if not fcntl:
+            dumps.extend(
+                filter(None, (_read_dump(path) for path in files.values()))
+            )
+
+            return dumps
+
+        exited = [
+            path for pid, path in files.items() if not _is_running(pid)
+        ]
+
+        if exited:
+            with self._locked_directory():
+                self._merge_exited(exited)
+
+        paths = [os.path.join(directory, EXITED_FILE)] + [
+            path for path in files.values() if path not in exited
+        ]
+
+        with self._locked_directory(shared=True):
+            dumps.extend(filter(None, (_read_dump(path) for path in paths)))
+
+        return dumps
+
+    def expose(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        dumps = self._collect_dumps()
+        lines = []
+
+        for metric in self.metrics:
+            combined = {}
+
+            for dump in dumps:
+                metric.merge(combined, dump.get(metric.name, []))
+
+            lines.append('# HELP {} {}'.format(
+                metric.name, metric.documentation
+            ))
+            lines.append('# TYPE {} {}'.format(
+                metric.name, metric.metric_type
+            ))
+            lines.extend(metric.expose(combined))
+
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+TRANSACTIONS = REGISTRY.counter(
+    'helcim_transactions_total',
+    'Transactions processed by transaction type and outcome.',
+    ('transaction_type', 'outcome'),
+)
+TRANSACTION_DURATION = REGISTRY.histogram(
+    'helcim_transaction_duration_seconds',
+    'Time to process a transaction by transaction type.',
+    ('transaction_type',),
+)
+STAGE_DURATION = REGISTRY.histogram(
+    'helcim_stage_duration_seconds',
+    'Time spent in each transaction stage.',
+    ('transaction_type', 'stage'),
+)
+API_RESPONSES = REGISTRY.counter(
+    'helcim_api_responses_total',
+    'Helcim API responses by HTTP status code and Helcim response code.',
+    ('status_code', 'response'),
+)
+API_CONNECTION_ERRORS = REGISTRY.counter(
+    'helcim_api_connection_errors_total',
+    'Failed connections to the Helcim API.',
+)
+DATABASE_ERRORS = REGISTRY.counter(
+    'helcim_database_errors_total',
+    'Errors saving transaction details to the database by stage.',
+    ('stage',),
+)
+TOKEN_VAULT = REGISTRY.counter(
+    'helcim_token_vault_total',
+    'Token vault saves by result (existing token hit or new token).',
+    ('result',),
+)
+
+def record_stage(sender, **kwargs): # pylint: disable=unused-argument
+    """Records a completed transaction stage.
+
+        Receiver for the ``helcim.signals.stage_completed`` signal.
+    """
+    if not SETTINGS['enable_metrics']:
+        return
+
+    REGISTRY.ensure_flusher()
+
+    stage = kwargs['stage']
+    duration = kwargs['duration']
+    transaction_type = kwargs['transaction_type']
+
+    STAGE_DURATION.observe(duration, transaction_type, stage)
+
+    if stage == 'process':
+        TRANSACTIONS.inc(transaction_type, kwargs['outcome'])
+        TRANSACTION_DURATION.observe(duration, transaction_type)
+
+    # Only counted by the stage that raised it (not the enclosing ones)
+    if kwargs['outcome'] == 'DjangoError' and kwargs.get('raised', True):
+        DATABASE_ERRORS.inc(stage)
+
+def record_api_response(status_code, response=''):
+    """Records the HTTP status code and Helcim response code."""
+    if SETTINGS['enable_metrics']:
+        API_RESPONSES.inc(str(status_code), str(response))
+
+def record_api_connection_error():
+    """Records a failed connection to the Helcim API."""
+    if SETTINGS['enable_metrics']:
+        API_CONNECTION_ERRORS.inc()
+
+def record_token_vault(created):
+    """Records whether a token vault save found an existing token."""
+    if SETTINGS['enable_metrics']:
+        TOKEN_VAULT.inc('created' if created else 'hit')
@@ -0,0 +1,37 @@
+# pylint: disable=missing-docstring, invalid-name
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('helcim', '0004_add_verified_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='helcimtransaction',
+            index=models.Index(
+                fields=['date_response'], name='helcim_tran_date_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='helcimtransaction',
+            index=models.Index(
+                fields=['transaction_type', 'date_response'],
+                name='helcim_tran_type_date_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='helcimtransaction',
+            index=models.Index(
+                fields=['transaction_success', 'date_response'],
+                name='helcim_tran_success_date_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='helcimtoken',
+            index=models.Index(
+                fields=['date_added'], name='helcim_token_date_idx'
+            ),
+        ),
+    ]
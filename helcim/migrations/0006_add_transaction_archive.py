@@ -0,0 +1,79 @@
+# pylint: disable=missing-docstring, invalid-name
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('helcim', '0005_add_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HelcimTransactionArchive',
+            fields=[
+                (
+                    'id',
+                    models.UUIDField(
+                        editable=False,
+                        help_text='The ID of the archived transaction',
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'date_response',
+                    models.DateTimeField(
+                        db_index=True,
+                        help_text='The date and time of the API response',
+                    ),
+                ),
+                (
+                    'transaction_type',
+                    models.CharField(
+                        choices=[
+                            ('s', 'purchase (sale)'),
+                            ('p', 'pre-authorization'),
+                            ('c', 'capture'),
+                            ('r', 'refund'),
+                            ('v', 'verify'),
+                        ],
+                        help_text='The type of transaction',
+                        max_length=1,
+                    ),
+                ),
+                (
+                    'date_archived',
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text=(
+                            'Date and time this transaction was archived'
+                        ),
+                    ),
+                ),
+                (
+                    'data',
+                    models.TextField(
+                        blank=True,
+                        help_text='The transaction details (as JSON)',
+                        null=True,
+                    ),
+                ),
+                (
+                    'archive_file',
+                    models.CharField(
+                        blank=True,
+                        help_text=(
+                            'The archive file containing the transaction '
+                            'details'
+                        ),
+                        max_length=512,
+                        null=True,
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ('-date_response',),
+            },
+        ),
+    ]
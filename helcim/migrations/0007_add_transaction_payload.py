@@ -0,0 +1,49 @@
+# pylint: disable=missing-docstring, invalid-name
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('helcim', '0006_add_transaction_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HelcimTransactionPayload',
+            fields=[
+                (
+                    'transaction',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='audit_payload',
+                        serialize=False,
+                        to='helcim.HelcimTransaction',
+                    ),
+                ),
+                (
+                    'raw_request',
+                    models.BinaryField(
+                        blank=True,
+                        help_text=(
+                            'The compressed raw request used for this '
+                            'transaction'
+                        ),
+                        null=True,
+                    ),
+                ),
+                (
+                    'raw_response',
+                    models.BinaryField(
+                        blank=True,
+                        help_text=(
+                            'The compressed raw response returned for this '
+                            'transaction'
+                        ),
+                        null=True,
+                    ),
+                ),
+            ],
+        ),
+    ]
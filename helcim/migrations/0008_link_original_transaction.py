@@ -0,0 +1,58 @@
+# pylint: disable=missing-docstring, invalid-name
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('helcim', '0007_add_transaction_payload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='helcimtransaction',
+            name='original_transaction',
+            field=models.ForeignKey(
+                blank=True,
+                help_text=(
+                    'The pre-authorization captured or transaction refunded'
+                ),
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='linked_transactions',
+                to='helcim.HelcimTransaction',
+            ),
+        ),
+        migrations.AddField(
+            model_name='helcimtransaction',
+            name='captured_amount',
+            field=models.DecimalField(
+                decimal_places=2,
+                default=Decimal('0.00'),
+                help_text='The total amount of the linked captures',
+                max_digits=12,
+            ),
+        ),
+        migrations.AddField(
+            model_name='helcimtransaction',
+            name='refunded_amount',
+            field=models.DecimalField(
+                decimal_places=2,
+                default=Decimal('0.00'),
+                help_text='The total amount of the linked refunds',
+                max_digits=12,
+            ),
+        ),
+        migrations.AlterField(
+            model_name='helcimtransaction',
+            name='transaction_id',
+            field=models.PositiveIntegerField(
+                blank=True,
+                db_index=True,
+                help_text='The Helcim Commerce transaction ID',
+                null=True,
+            ),
+        ),
+    ]
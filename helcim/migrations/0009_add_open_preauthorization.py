@@ -0,0 +1,75 @@
+# pylint: disable=missing-docstring, invalid-name
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('helcim', '0008_link_original_transaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HelcimOpenPreauthorization',
+            fields=[
+                (
+                    'preauthorization',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='open_preauthorization',
+                        serialize=False,
+                        to='helcim.HelcimTransaction',
+                    ),
+                ),
+                (
+                    'expires',
+                    models.DateTimeField(
+                        help_text=(
+                            'When the pre-authorization can no longer be '
+                            'captured'
+                        ),
+                    ),
+                ),
+                (
+                    'capture_due',
+                    models.DateTimeField(
+                        help_text=(
+                            'When the pre-authorization should be captured'
+                        ),
+                    ),
+                ),
+                (
+                    'attempts',
+                    models.PositiveSmallIntegerField(
+                        default=0,
+                        help_text='The number of failed capture attempts',
+                    ),
+                ),
+                (
+                    'last_error',
+                    models.CharField(
+                        blank=True,
+                        help_text=(
+                            'The error of the last failed capture attempt'
+                        ),
+                        max_length=256,
+                        null=True,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='helcimopenpreauthorization',
+            index=models.Index(
+                fields=['capture_due', 'expires'],
+                name='helcim_preauth_due_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='helcimopenpreauthorization',
+            index=models.Index(
+                fields=['expires'], name='helcim_preauth_expires_idx'
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# pylint: disable=missing-docstring, invalid-name
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('helcim', '0009_add_open_preauthorization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HelcimJSCallback',
+            fields=[
+                (
+                    'transaction_id',
+                    models.PositiveIntegerField(
+                        help_text='The Helcim Commerce transaction ID',
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    'created',
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text='When the transaction was claimed',
+                    ),
+                ),
+            ],
+        ),
+    ]
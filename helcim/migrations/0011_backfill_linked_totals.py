@@ -0,0 +1,74 @@
+# pylint: disable=missing-docstring, invalid-name
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def linked_total(transaction_model, transaction_type):
+    """Returns the total of the successful linked transactions."""
+    totals = transaction_model.objects.filter(
+        original_transaction=models.OuterRef('pk'),
+        transaction_type=transaction_type,
+        transaction_success=True,
+    ).order_by().values('original_transaction').annotate(
+        total=models.Sum('amount')
+    ).values('total')
+
+    return Coalesce(
+        models.Subquery(
+            totals[:1],
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ),
+        models.Value(Decimal('0.00')),
+    )
+
+def backfill_linked_totals(apps, schema_editor):
+    """Links the earlier captures and totals the linked transactions.
+
+        Captures saved before 0008 are linked to the successful
+        pre-authorization with the same transaction ID (the latest one
+        before the capture). Refunds cannot be matched to the
+        transaction they refunded, so only the linked refunds are
+        totalled.
+    """
+    # pylint: disable=unused-argument
+    transaction_model = apps.get_model('helcim', 'HelcimTransaction')
+
+    captures = transaction_model.objects.filter(
+        transaction_type='c',
+        transaction_success=True,
+        original_transaction__isnull=True,
+        transaction_id__isnull=False,
+    ).values_list('pk', 'transaction_id', 'date_response')
+
+    for pk, transaction_id, date_response in captures.iterator():
+        preauth = transaction_model.objects.filter(
+            transaction_type='p',
+            transaction_success=True,
+            transaction_id=transaction_id,
+            date_response__lte=date_response,
+        ).order_by('-date_response').values_list('pk', flat=True).first()
+
+        if preauth:
+            transaction_model.objects.filter(pk=pk).update(
+                original_transaction_id=preauth
+            )
+
+    transaction_model.objects.filter(transaction_type='p').update(
+        captured_amount=linked_total(transaction_model, 'c')
+    )
+    transaction_model.objects.filter(transaction_type__in=['s', 'c']).update(
+        refunded_amount=linked_total(transaction_model, 'r')
+    )
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('helcim', '0010_add_helcim_js_callback'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_linked_totals, migrations.RunPython.noop
+        ),
+    ]
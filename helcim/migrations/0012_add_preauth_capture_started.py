@@ -0,0 +1,20 @@
+# pylint: disable=missing-docstring, invalid-name
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('helcim', '0011_backfill_linked_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='helcimopenpreauthorization',
+            name='capture_started',
+            field=models.DateTimeField(
+                blank=True,
+                help_text='When the capture in progress was started',
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# pylint: disable=missing-docstring, invalid-name
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('helcim', '0012_add_preauth_capture_started'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='helcimtransactionarchive',
+            name='archive_offset',
+            field=models.BigIntegerField(
+                blank=True,
+                help_text='The position of the batch in the archive file',
+                null=True,
+            ),
+        ),
+    ]
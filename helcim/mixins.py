@@ -1,18 +1,70 @@
 """Mixins to help support Helcim API interactions."""
-from calendar import monthrange
-import copy
 from datetime import datetime
+from functools import lru_cache
 import re
+from types import MappingProxyType
 
-import pytz
-
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction as db_transaction
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 
-from helcim import exceptions as helcim_exceptions
+from helcim import exceptions as helcim_exceptions, metrics
+from helcim.conversions import HelcimResponse, parse_expiry
+from helcim.instrumentation import timed
 from helcim.settings import SETTINGS
-from helcim.models import HelcimToken, HelcimTransaction
+from helcim.models import (
+    HelcimToken, HelcimTransaction, HelcimTransactionPayload,
+    compress_audit_data
+)
+
+
+# The API credentials that are always redacted from the raw request
+API_CREDENTIAL_FIELDS = ('accountId', 'apiToken', 'terminalId')
+
+# The settings that determine the redacted fields
+REDACT_SETTINGS = (
+    'redact_all', 'redact_cc_name', 'redact_cc_number', 'redact_cc_expiry',
+    'redact_cc_cvv', 'redact_cc_type', 'redact_token', 'redact_cc_magnetic',
+    'redact_cc_magnetic_encrypted',
+)
+
+# The redacted field names for each combination of redact settings
+_REDACTION_PLANS = {}
+
+@lru_cache(maxsize=32)
+def _redaction_patterns(api_names):
+    """Returns the raw request and response patterns for the fields.
+
+        Parameters:
+            api_names (tuple): The API field names to redact.
+
+        Returns:
+            tuple: The compiled raw request and raw response patterns.
+    """
+    names = '|'.join(re.escape(api_name) for api_name in api_names)
+
+    return (
+        re.compile(r'({})=.*?(&|$)'.format(names)),
+        re.compile(r'<({0})>.*?</\1>'.format(names)),
+    )
+
+def redact_raw_request(raw_request, api_names):
+    """Returns the raw request with the API fields redacted."""
+    if not raw_request or not api_names:
+        return raw_request
 
+    return _redaction_patterns(api_names)[0].sub(
+        r'\g<1>=REDACTED\g<2>', raw_request
+    )
+
+def redact_raw_response(raw_response, api_names):
+    """Returns the raw response with the API fields redacted."""
+    if not raw_response or not api_names:
+        return raw_response
+
+    return _redaction_patterns(api_names)[1].sub(
+        r'<\g<1>>REDACTED</\g<1>>', raw_response
+    )
 
 class ResponseMixin():
     """Methods to support handling a Helcim repsonse.
@@ -20,6 +72,10 @@ class ResponseMixin():
         Handles some data manipulations to prepare for saving to a
         model instance and applies relevant redactions to data.
      """
+    # The redaction plan resolved by a HelcimClient (if any); otherwise
+    # the plan is looked up for the current settings
+    redaction_plan = None
+
     @classmethod
     def _identify_redact_fields(cls):
         """Identifies which fields (if any) should be redacted.
@@ -108,23 +164,51 @@ class ResponseMixin():
 
         return redact_fields
 
+    @classmethod
+    def _get_redaction_plan(cls):
+        """Returns the field names to redact for the current settings.
+
+            The names are only identified once for each combination of
+            the redact settings.
+
+            Returns:
+                tuple: The API names to redact from the raw request and
+                    from the raw response, and the (frozen set of)
+                    Python names to redact from the response.
+        """
+        key = tuple(SETTINGS[setting] for setting in REDACT_SETTINGS)
+        plan = _REDACTION_PLANS.get(key)
+
+        if plan is None:
+            redacted_fields = [
+                field
+                for redact_field in cls._identify_redact_fields().values()
+                if redact_field['redact']
+                for field in redact_field['fields']
+            ]
+            api_names = tuple(field['api'] for field in redacted_fields)
+            plan = (
+                API_CREDENTIAL_FIELDS + api_names,
+                api_names,
+                frozenset(field['python'] for field in redacted_fields),
+            )
+            _REDACTION_PLANS[key] = plan
+
+        return plan
+
     @classmethod
     def _convert_expiry_to_date(cls, expiry):
-        """Converts a 4 digit expiry to a datetime object.
+        """Converts a 4 digit expiry to a date object.
 
             Parameters:
                 expiry (str): the four digit representation of the
                     credit card expiry
 
             Returns:
-                obj: the expiry as a datetime object.
+                obj: the expiry as a date object (the conversion is
+                    cached, see ``conversions.parse_expiry``).
         """
-
-        year = 2000 + int(expiry[2:])
-        month = int(expiry[:2])
-        day = monthrange(year, month)[1]
-
-        return datetime(year, month, day, tzinfo=pytz.timezone('UTC')).date()
+        return parse_expiry(expiry)
 
     @classmethod
     def _determine_save_token_status(cls, user_decision):
@@ -165,56 +249,20 @@ class ResponseMixin():
         # Otherwise can just return the provided user model
         return self.django_user
 
-    def _redact_api_data(self):
-        """Redacts API data and updates redacted_response attribute."""
-        if 'raw_request' in self.redacted_response:
-            self.redacted_response['raw_request'] = re.sub(
-                r'(accountId=.*?)(&|$)',
-                r'accountId=REDACTED\g<2>',
-                self.redacted_response['raw_request']
-            )
-            self.redacted_response['raw_request'] = re.sub(
-                r'(apiToken=.*?)(&|$)',
-                r'apiToken=REDACTED\g<2>',
-                self.redacted_response['raw_request']
-            )
-            self.redacted_response['raw_request'] = re.sub(
-                r'(terminalId=.*?)(&|$)',
-                r'terminalId=REDACTED\g<2>',
-                self.redacted_response['raw_request']
-            )
-        else:
-            self.redacted_response['raw_request'] = None
-
-    def _redact_field(self, api_name, python_name):
-        """Redacts all information for the provided field.
+    def resolve_django_user(self):
+        """Validates and stores the user reference before saving.
 
-            Method directly updates the redacted_response attribute.
+            Used when the response is saved later by another thread, so
+            a lazy user (e.g. ``request.user``) is evaluated and an
+            absent or anonymous user is rejected in the calling thread.
 
-            Parameters:
-                api_name (str): The field name used by the Helcim API.
-                python_name (str): The field name used by this
-                    application.
+            Raises:
+                ProcessingError: An absent or anonymous user is not
+                    allowed.
         """
-        # Redacts the raw_request data (if present)
-        if self.redacted_response.get('raw_request', None):
-            self.redacted_response['raw_request'] = re.sub(
-                r'({}=.*?)(&|$)'.format(api_name),
-                r'{}=REDACTED\g<2>'.format(api_name),
-                self.redacted_response['raw_request']
-            )
-
-        # Redacts the raw_response data (if present)
-        if self.redacted_response.get('raw_response', None):
-            self.redacted_response['raw_response'] = re.sub(
-                r'<{0}>.*</{0}>'.format(api_name),
-                r'<{0}>REDACTED</{0}>'.format(api_name),
-                self.redacted_response['raw_response']
-            )
-
-        if python_name in self.redacted_response:
-            self.redacted_response[python_name] = None
+        self.django_user = self._determine_user_reference()
 
+    @timed('redact_data')
     def redact_data(self):
         """Removes sensitive and identifiable data.
 
@@ -223,25 +271,39 @@ class ResponseMixin():
             may also redact other fields in the formated and raw
             response.
         """
-        # Copy the response data to the redacted file for updating
-        self.redacted_response = copy.deepcopy(self.response)
+        response = self.response
 
-        # Remove any API content
-        self._redact_api_data()
+        if not isinstance(response, HelcimResponse):
+            response = HelcimResponse(response)
 
-        # Identify and redact any other specified fields
-        fields = self._identify_redact_fields()
-
-        for _, redact_field in fields.items():
-            if redact_field['redact']:
-                for field in redact_field['fields']:
-                    self._redact_field(field['api'], field['python'])
+        # Identify any other specified fields
+        request_names, response_names, python_names = (
+            self.redaction_plan or self._get_redaction_plan()
+        )
 
-        if fields['name']['redact']:
-            self.response['cc_name'] = None
+        # Prevents saving the redacted card details with a token
+        unsaved = {
+            python_name: None
+            for python_name in ('cc_name', 'cc_expiry')
+            if python_name in python_names
+        }
 
-        if fields['expiry']['redact']:
-            self.response['cc_expiry'] = None
+        if unsaved:
+            response = response.replace(**unsaved)
+
+        self.response = response
+
+        # The redacted response is a view of the response (only the
+        # raw request and response are copied, in one pass each)
+        self.redacted_response = response.redact(
+            python_names,
+            redact_raw_request(
+                response.get('raw_request', None), request_names
+            ),
+            redact_raw_response(
+                response.get('raw_response', None), response_names
+            ),
+        )
 
     def create_model_arguments(self, transaction_type):
         """Creates dictionary for use as transaction model arguments.
@@ -307,6 +369,37 @@ class ResponseMixin():
             'django_user': django_user,
         }
 
+    @classmethod
+    def _save_compressed_transaction(cls, model_dictionary):
+        """Saves the transaction with a compressed audit payload.
+
+            The raw request and response are removed from the
+            transaction and saved in a ``HelcimTransactionPayload``.
+        """
+        raw_request = model_dictionary.pop('raw_request')
+        raw_response = model_dictionary.pop('raw_response')
+
+        with db_transaction.atomic():
+            transaction_instance = HelcimTransaction.objects.create(
+                **model_dictionary
+            )
+            HelcimTransactionPayload.objects.create(
+                transaction=transaction_instance,
+                raw_request=compress_audit_data(raw_request),
+                raw_response=compress_audit_data(raw_response),
+            )
+
+        return transaction_instance
+
+    @classmethod
+    def _create_transaction(cls, model_dictionary):
+        """Saves the transaction with the configured audit storage."""
+        if SETTINGS['audit_storage'] == 'compressed':
+            return cls._save_compressed_transaction(model_dictionary)
+
+        return HelcimTransaction.objects.create(**model_dictionary)
+
+    @timed('save_transaction')
     def save_transaction(self, transaction_type):
         """Saves HelcimTransaction with redacted response details."""
         # Redacts data if not already done
@@ -316,9 +409,7 @@ class ResponseMixin():
         model_dictionary = self.create_model_arguments(transaction_type)
 
         try:
-            transaction_instance = HelcimTransaction.objects.create(
-                **model_dictionary
-            )
+            transaction_instance = self._create_transaction(model_dictionary)
         except IntegrityError as error:
             raise helcim_exceptions.DjangoError(
                 'Unable to save transaction record: {}'.format(error)
@@ -330,6 +421,7 @@ class ResponseMixin():
 
         return transaction_instance
 
+    @timed('save_token_to_vault')
     def save_token_to_vault(self):
         """Saves Helcim card token.
 
@@ -361,7 +453,7 @@ class ResponseMixin():
         django_user = self._determine_user_reference()
 
         if token and token_f4l4:
-            token_instance, _ = HelcimToken.objects.get_or_create(
+            token_instance, created = HelcimToken.objects.get_or_create(
                 token=token,
                 token_f4l4=token_f4l4,
                 cc_name=cc_name,
@@ -370,12 +462,76 @@ class ResponseMixin():
                 customer_code=customer_code,
                 django_user=django_user,
             )
+            metrics.record_token_vault(created)
 
             return token_instance
 
         # If unable to save token, return None
         return None
 
+# The Helcim.js configuration and the context built from it
+_HELCIM_JS_CONTEXT = (None, None)
+
+def build_helcim_js_context(helcim_js):
+    """Builds the read-only Helcim.js template context.
+
+        Each configuration is copied (without its ``secret``) and given
+        a ``script`` tag (if a URL is declared) and a ``test_input``.
+        The helper "test" input flags a transaction as a test and
+        allows testing in environments without SSL enabled (e.g. the
+        Django development server).
+
+        Parameters:
+            helcim_js (dict): The Helcim.js configurations.
+
+        Returns:
+            MappingProxyType: A read-only mapping of each configuration.
+    """
+    context = {}
+
+    for name, config in helcim_js.items():
+        # The secret is only used to verify responses
+        details = {
+            key: value for key, value in config.items() if key != 'secret'
+        }
+
+        if 'url' in details:
+            details['script'] = format_html(
+                '<script type="text/javascript" src="{}"></script>',
+                details['url'],
+            )
+
+        if details.get('test', False):
+            details['test_input'] = mark_safe(
+                '<input id="test" type="hidden" value="1">'
+            )
+        else:
+            details['test_input'] = ''
+
+        context[name] = MappingProxyType(details)
+
+    return MappingProxyType(context)
+
+def get_helcim_js_context():
+    """Returns the Helcim.js context (built once per configuration).
+
+        The context is rebuilt when the configuration is replaced (see
+        ``helcim.settings.update_helcim_js_setting``).
+    """
+    global _HELCIM_JS_CONTEXT # pylint: disable=global-statement
+
+    helcim_js = SETTINGS['helcim_js']
+    source, context = _HELCIM_JS_CONTEXT
+
+    if source is not helcim_js:
+        context = build_helcim_js_context(helcim_js)
+
+        # Replaced as one tuple so concurrent requests see a consistent
+        # configuration and context
+        _HELCIM_JS_CONTEXT = (helcim_js, context)
+
+    return context
+
 class HelcimJSMixin():
     """Provides Helcim.js URL and token details in the view context.
 
@@ -383,6 +539,9 @@ class HelcimJSMixin():
         configuration details within your Django settings. They are then
         injected into the view context to allow you to easily declare
         them within a template.
+
+        The context is built once and is read-only, so it is shared by
+        all requests.
     """
     def get_context_data(self, **kwargs):
         """Overrides the view method to add Helcim.js details."""
@@ -390,20 +549,6 @@ class HelcimJSMixin():
         context = super().get_context_data(**kwargs)
 
         # Add the Helcim.js configuration details
-        context['helcim_js'] = SETTINGS['helcim_js']
-
-        # Add a helper "test" input to allow declaration of test status
-        # This input flags a transaction as a test and allows testing
-        # in environments without SSL enabled (e.g. the Django
-        # development server)
-        for config in context['helcim_js']:
-            if context['helcim_js'][config].get('test', False):
-                test_input = mark_safe(
-                    '<input id="test" type="hidden" value="1">'
-                )
-            else:
-                test_input = ''
-
-            context['helcim_js'][config]['test_input'] = test_input
+        context['helcim_js'] = get_helcim_js_context()
 
         return context
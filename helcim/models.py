@@ -1,8 +1,11 @@
 """Models for the django-helcim application."""
+from decimal import Decimal
 from uuid import uuid4
+import zlib
 
 from django.contrib.auth import get_user_model
 from django.contrib.staticfiles import finders
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 
 
@@ -62,6 +65,7 @@ class HelcimTransaction(models.Model):
     )
     transaction_id = models.PositiveIntegerField(
         blank=True,
+        db_index=True,
         help_text='The Helcim Commerce transaction ID',
         null=True,
     )
@@ -150,9 +154,43 @@ class HelcimTransaction(models.Model):
         on_delete=models.CASCADE,
         related_name='helcim_transactions',
     )
+    original_transaction = models.ForeignKey(
+        'self',
+        blank=True,
+        help_text='The pre-authorization captured or transaction refunded',
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='linked_transactions',
+    )
+    captured_amount = models.DecimalField(
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text='The total amount of the linked captures',
+        max_digits=12,
+    )
+    refunded_amount = models.DecimalField(
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text='The total amount of the linked refunds',
+        max_digits=12,
+    )
 
     class Meta:
         ordering = ('-date_response',)
+        indexes = [
+            # Support the admin ordering, filters, and date hierarchy
+            models.Index(
+                fields=['date_response'], name='helcim_tran_date_idx'
+            ),
+            models.Index(
+                fields=['transaction_type', 'date_response'],
+                name='helcim_tran_type_date_idx',
+            ),
+            models.Index(
+                fields=['transaction_success', 'date_response'],
+                name='helcim_tran_success_date_idx',
+            ),
+        ]
         permissions = (
             (
                 'helcim_transactions',
@@ -168,22 +206,204 @@ class HelcimTransaction(models.Model):
 
         return ' - '.join(string_parts)
 
+    def _get_audit_payload(self):
+        """Returns the compressed audit payload (if one was saved)."""
+        try:
+            return self.audit_payload
+        except ObjectDoesNotExist:
+            return None
+
+    @property
+    def audit_request(self):
+        """The raw request (from the compressed payload if required)."""
+        if self.raw_request is not None:
+            return self.raw_request
+
+        payload = self._get_audit_payload()
+
+        return decompress_audit_data(payload.raw_request) if payload else None
+
+    @property
+    def audit_response(self):
+        """The raw response (from the compressed payload if required)."""
+        if self.raw_response is not None:
+            return self.raw_response
+
+        payload = self._get_audit_payload()
+
+        return decompress_audit_data(payload.raw_response) if payload else None
+
     @property
     def can_be_captured(self):
         """Check if this transaction can be captured."""
         return bool(
-            self.transaction_success and self.transaction_type == 'p'
+            self.transaction_success
+            and self.transaction_type == 'p'
+            and not self.captured_amount
         )
 
+    @property
+    def refundable_amount(self):
+        """The amount that has not been refunded."""
+        return (self.amount or 0) - (self.refunded_amount or 0)
+
     @property
     def can_be_refunded(self):
         """Check if this transaction can be refunded."""
         return all([
             self.transaction_success,
             (self.transaction_type == 's' or self.transaction_type == 'c'),
-            (self.amount if self.amount else 0) > 0,
+            self.refundable_amount > 0,
         ])
 
+def compress_audit_data(value):
+    """Returns the zlib-compressed bytes of a raw request or response."""
+    if value is None:
+        return None
+
+    return zlib.compress(value.encode('utf-8'))
+
+def decompress_audit_data(value):
+    """Returns the raw request or response from the compressed bytes."""
+    if value is None:
+        return None
+
+    return zlib.decompress(bytes(value)).decode('utf-8')
+
+class HelcimTransactionPayload(models.Model):
+    """The compressed raw request and response of a transaction.
+
+        Used when ``HELCIM_AUDIT_STORAGE`` is ``compressed``, so the
+        audit data is not stored (or truncated) in the
+        ``HelcimTransaction`` table and is only loaded when needed.
+    """
+    transaction = models.OneToOneField(
+        HelcimTransaction,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='audit_payload',
+    )
+    raw_request = models.BinaryField(
+        blank=True,
+        help_text='The compressed raw request used for this transaction',
+        null=True,
+    )
+    raw_response = models.BinaryField(
+        blank=True,
+        help_text='The compressed raw response returned for this transaction',
+        null=True,
+    )
+
+class HelcimOpenPreauthorization(models.Model):
+    """A successful pre-authorization that has not been captured.
+
+        Pre-authorizations are added when they are saved and removed
+        when they are captured or have expired (see
+        ``helcim.preauthorizations``), so the due captures are found
+        without scanning the ``HelcimTransaction`` table.
+    """
+    preauthorization = models.OneToOneField(
+        HelcimTransaction,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='open_preauthorization',
+    )
+    expires = models.DateTimeField(
+        help_text='When the pre-authorization can no longer be captured',
+    )
+    capture_due = models.DateTimeField(
+        help_text='When the pre-authorization should be captured',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        help_text='The number of failed capture attempts',
+    )
+    capture_started = models.DateTimeField(
+        blank=True,
+        help_text='When the capture in progress was started',
+        null=True,
+    )
+    last_error = models.CharField(
+        blank=True,
+        help_text='The error of the last failed capture attempt',
+        max_length=256,
+        null=True,
+    )
+
+    class Meta:
+        indexes = [
+            # The sweeper captures in order of the due date
+            models.Index(
+                fields=['capture_due', 'expires'],
+                name='helcim_preauth_due_idx',
+            ),
+            models.Index(
+                fields=['expires'], name='helcim_preauth_expires_idx'
+            ),
+        ]
+
+class HelcimTransactionArchive(models.Model):
+    """An archived Helcim transaction.
+
+        Archived transactions are removed from the
+        ``HelcimTransaction`` table. The details are either saved in
+        ``data`` or in the compressed ``archive_file``.
+    """
+    id = models.UUIDField(
+        editable=False,
+        help_text='The ID of the archived transaction',
+        primary_key=True,
+        verbose_name='ID',
+    )
+    date_response = models.DateTimeField(
+        db_index=True,
+        help_text='The date and time of the API response',
+    )
+    transaction_type = models.CharField(
+        choices=HelcimTransaction.TRANSACTION_TYPES,
+        help_text='The type of transaction',
+        max_length=1,
+    )
+    date_archived = models.DateTimeField(
+        auto_now_add=True,
+        help_text='Date and time this transaction was archived',
+    )
+    data = models.TextField(
+        blank=True,
+        help_text='The transaction details (as JSON)',
+        null=True,
+    )
+    archive_file = models.CharField(
+        blank=True,
+        help_text='The archive file containing the transaction details',
+        max_length=512,
+        null=True,
+    )
+    archive_offset = models.BigIntegerField(
+        blank=True,
+        help_text='The position of the batch in the archive file',
+        null=True,
+    )
+
+    class Meta:
+        ordering = ('-date_response',)
+
+class HelcimJSCallback(models.Model):
+    """A Helcim.js transaction recorded by the callback view.
+
+        The transaction ID is the primary key, so each Helcim.js
+        response can only be claimed (and recorded) once, even by
+        concurrent requests in different processes.
+    """
+    transaction_id = models.PositiveIntegerField(
+        help_text='The Helcim Commerce transaction ID',
+        primary_key=True,
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        help_text='When the transaction was claimed',
+    )
+
 class HelcimToken(models.Model):
     """A Helcim card token."""
     id = models.UUIDField(
@@ -236,6 +456,9 @@ class HelcimToken(models.Model):
     )
 
     class Meta:
+        indexes = [
+            models.Index(fields=['date_added'], name='helcim_token_date_idx'),
+        ]
         permissions = (
             (
                 'helcim_tokens',
@@ -0,0 +1,383 @@
+"""Tracks the open pre-authorizations and captures them before expiry.
+
+    Successful pre-authorizations are added to the open
+    pre-authorization queue (``HelcimOpenPreauthorization``) when they
+    are saved and removed when they are captured. Each has an expiry
+    (``HELCIM_PREAUTH_EXPIRY_DAYS`` after the response) and a capture
+    due date (``HELCIM_PREAUTH_CAPTURE_MARGIN_HOURS`` before the
+    expiry), which can be moved with ``schedule_capture`` (e.g. when
+    the order is fulfilled).
+
+    ``sweep`` captures the due pre-authorizations (earliest due first)
+    in a bounded worker pool and removes the expired ones from the
+    queue. It is run by the ``helcim_capture_preauthorizations``
+    management command and can be called by any scheduler (e.g. a
+    periodic task). The ``helcim.signals.preauthorizations_swept``
+    signal is sent with the result of each sweep.
+
+    Captures that stay in progress longer than ``CAPTURE_TIMEOUT``
+    (e.g. the request timed out) are reported as stalled and are not
+    retried: check them with Helcim and retry the uncaptured ones with
+    ``release_capture``.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+import threading
+from time import monotonic, sleep
+
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from helcim import actions, exceptions as helcim_exceptions, gateway
+from helcim.models import HelcimOpenPreauthorization, HelcimTransaction
+from helcim.settings import SETTINGS
+from helcim.signals import preauthorizations_swept
+
+
+LOG = logging.getLogger(__name__)
+
+# The primary keys of the captured, expired, and stalled
+# pre-authorizations, and the failed ones with their error messages (as
+# (pk, message) tuples)
+SweepResult = namedtuple(
+    'SweepResult', ['captured', 'failed', 'expired', 'stalled']
+)
+
+# Seconds before a capture in progress is reported as stalled (e.g. if
+# the sweep was stopped during the request)
+CAPTURE_TIMEOUT = actions.PENDING_TIMEOUT
+
+def expiry_dates(date_response):
+    """Returns the expiry and capture due date of a pre-authorization.
+
+        Parameters:
+            date_response (obj): The date and time of the
+                pre-authorization response.
+
+        Returns:
+            tuple: The expiry and capture due datetimes.
+    """
+    expires = date_response + timedelta(days=SETTINGS['preauth_expiry_days'])
+    capture_due = expires - timedelta(
+        hours=SETTINGS['preauth_capture_margin_hours']
+    )
+
+    return expires, capture_due
+
+def track_transaction(sender, instance, created, raw=False, **kwargs):
+    """Adds new pre-authorizations to the queue (and removes captured ones).
+
+        Connected to the ``post_save`` signal of ``HelcimTransaction``.
+    """
+    # pylint: disable=protected-access, unused-argument
+    if not created or raw or not instance.transaction_success:
+        return
+
+    if instance.transaction_type == 'p':
+        # The response date may not be converted yet (e.g. a string)
+        date_response = HelcimTransaction._meta.get_field(
+            'date_response'
+        ).to_python(instance.date_response)
+        expires, capture_due = expiry_dates(date_response)
+        HelcimOpenPreauthorization.objects.create(
+            preauthorization=instance,
+            expires=expires,
+            capture_due=capture_due,
+        )
+    elif instance.transaction_type == 'c' and instance.original_transaction_id:
+        HelcimOpenPreauthorization.objects.filter(
+            pk=instance.original_transaction_id
+        ).delete()
+
+def queue_open_preauthorizations():
+    """Adds the saved pre-authorizations that are not captured or queued.
+
+        Pre-authorizations with a successful capture are skipped, even
+        if the capture is not linked (e.g. saved before captures were
+        linked) or the ``captured_amount`` was not updated.
+
+        Returns:
+            int: The number of pre-authorizations added.
+    """
+    captures = HelcimTransaction.objects.filter(
+        transaction_type='c', transaction_success=True
+    )
+    preauthorizations = HelcimTransaction.objects.filter(
+        transaction_type='p',
+        transaction_success=True,
+        captured_amount=0,
+        open_preauthorization__isnull=True,
+    ).exclude(
+        pk__in=captures.filter(
+            original_transaction__isnull=False
+        ).values('original_transaction')
+    ).exclude(
+        transaction_id__in=captures.filter(
+            transaction_id__isnull=False
+        ).values('transaction_id')
+    ).values_list('pk', 'date_response')
+
+    queued = HelcimOpenPreauthorization.objects.bulk_create(
+        HelcimOpenPreauthorization(
+            preauthorization_id=pk,
+            expires=expires,
+            capture_due=capture_due,
+        )
+        for pk, date_response in preauthorizations.iterator()
+        for expires, capture_due in (expiry_dates(date_response),)
+    )
+
+    return len(queued)
+
+def schedule_capture(preauthorization, capture_due=None):
+    """Sets when an open pre-authorization should be captured.
+
+        Parameters:
+            preauthorization (obj): The pre-authorization
+                ``HelcimTransaction``.
+            capture_due (obj, optional): When to capture (defaults to
+                now, i.e. the next sweep).
+
+        Returns:
+            bool: ``False`` if the pre-authorization is not open.
+    """
+    return bool(HelcimOpenPreauthorization.objects.filter(
+        pk=preauthorization.pk
+    ).update(capture_due=capture_due or timezone.now()))
+
+class RateLimiter():
+    """Spaces out calls to at most ``rate`` per second (if provided)."""
+    def __init__(self, rate=None):
+        self.interval = 1 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next_slot = 0
+
+    def wait(self):
+        """Waits for the next slot."""
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+
+        if slot > now:
+            sleep(slot - now)
+
+def claim_capture(preauthorization):
+    """Marks the capture of a pre-authorization as started.
+
+        The sweep and the transaction actions (see ``helcim.actions``)
+        both claim a capture with this conditional update, so a capture
+        in progress is not started again by either. A claim is never
+        taken over once it has timed out (the capture may still have
+        been processed by Helcim); see ``release_capture``.
+
+        The pre-authorization is reloaded once claimed, since a capture
+        may have been saved after it was retrieved.
+
+        Returns:
+            str: ``None`` if claimed, otherwise the error message.
+    """
+    queue = HelcimOpenPreauthorization.objects.filter(pk=preauthorization.pk)
+    claimed = queue.filter(capture_started__isnull=True).update(
+        capture_started=timezone.now()
+    )
+
+    # Pre-authorizations that are not queued can still be captured
+    if not claimed and queue.exists():
+        return 'The capture is already in progress'
+
+    preauthorization.refresh_from_db(fields=['captured_amount'])
+
+    if not preauthorization.can_be_captured:
+        queue.delete()
+
+        return 'Transaction cannot be captured'
+
+    return None
+
+def fail_capture(preauthorization_pk, error):
+    """Records a failed capture attempt of a claimed capture.
+
+        The claim is only released (so the next sweep retries the
+        capture) for a ``PaymentError``, which is raised when Helcim
+        declines the capture or before the request is sent. After any
+        other error, Helcim may have processed the capture, so it stays
+        in progress until it is checked and released.
+
+        Parameters:
+            preauthorization_pk (str): The primary key of the
+                pre-authorization.
+            error (obj): The exception raised by the capture.
+    """
+    update = {
+        'attempts': F('attempts') + 1,
+        'last_error': (
+            str(error) or actions.MESSAGES['capture'][actions.FAILED]
+        )[:256],
+    }
+
+    if isinstance(error, helcim_exceptions.PaymentError):
+        update['capture_started'] = None
+
+    HelcimOpenPreauthorization.objects.filter(
+        pk=preauthorization_pk
+    ).update(**update)
+
+def release_capture(preauthorization_pk):
+    """Releases a capture left in progress, so it can be retried.
+
+        Only release a capture once Helcim shows the pre-authorization
+        was not captured, otherwise it may be captured twice.
+
+        Returns:
+            bool: ``False`` if no capture of the pre-authorization is
+                in progress.
+    """
+    return bool(HelcimOpenPreauthorization.objects.filter(
+        pk=preauthorization_pk, capture_started__isnull=False
+    ).update(capture_started=None))
+
+def capture(preauthorization_pk):
+    """Captures an open pre-authorization.
+
+        The capture is marked as pending (see ``helcim.actions``), so
+        it is not captured or refunded at the same time from the
+        transaction detail view, and claimed in the queue (see
+        ``claim_capture``). The pre-authorization is removed from the
+        queue when the capture is saved (or if it can no longer be
+        captured).
+
+        Returns:
+            str: ``None`` if captured, otherwise the error message.
+    """
+    if not actions.start(preauthorization_pk, 'capture'):
+        return 'A capture or refund is already pending'
+
+    claimed = False
+
+    try:
+        preauthorization = HelcimTransaction.objects.get(
+            pk=preauthorization_pk
+        )
+        error = claim_capture(preauthorization)
+
+        if error is None:
+            claimed = True
+            gateway.Capture(
+                transaction_id=preauthorization.transaction_id,
+                original_transaction=preauthorization,
+                django_user=preauthorization.django_user,
+            ).process()
+    except Exception as capture_error: # pylint: disable=broad-except
+        if not isinstance(capture_error, helcim_exceptions.HelcimError):
+            LOG.exception('Unable to capture %s', preauthorization_pk)
+            capture_error = helcim_exceptions.HelcimError()
+
+        error = str(capture_error) or actions.MESSAGES['capture'][
+            actions.FAILED
+        ]
+
+        # Only a capture claimed by this call is marked as failed
+        if claimed:
+            fail_capture(preauthorization_pk, capture_error)
+
+    status = actions.FAILED if error else actions.SUCCEEDED
+    actions.finish(preauthorization_pk, {
+        'action': 'capture',
+        'status': status,
+        'message': actions.MESSAGES['capture'][status],
+    })
+
+    return error
+
+def _capture_in_worker(preauthorization_pk, limiter):
+    """Captures a pre-authorization in a worker thread."""
+    try:
+        limiter.wait()
+
+        return capture(preauthorization_pk)
+    finally:
+        # Each thread has its own database connection
+        connection.close()
+
+def sweep(now=None, limit=None, workers=4, rate=None, dry_run=False):
+    """Captures the due pre-authorizations and removes the expired ones.
+
+        Parameters:
+            now (obj, optional): The current date and time.
+            limit (int, optional): The maximum number of captures.
+            workers (int): The number of captures processed at once
+                (``1`` processes them in this thread).
+            rate (float, optional): The maximum number of captures
+                started per second.
+            dry_run (bool): If ``True``, the due, expired, and stalled
+                pre-authorizations are returned (as ``captured``,
+                ``expired``, and ``stalled``) without any changes.
+
+        Returns:
+            SweepResult: The results of the sweep.
+    """
+    now = now or timezone.now()
+    queue = HelcimOpenPreauthorization.objects.all()
+
+    expired_queue = queue.filter(expires__lte=now)
+    expired = list(expired_queue.values_list('pk', flat=True))
+
+    # Captures in progress are skipped, and reported once they have
+    # timed out (they are not retried until released)
+    due = list(
+        queue.filter(
+            capture_started__isnull=True,
+            capture_due__lte=now,
+            expires__gt=now,
+        ).order_by(
+            'capture_due', 'expires'
+        ).values_list('pk', flat=True)[:limit]
+    )
+    stalled = list(
+        queue.filter(
+            capture_started__lte=now - timedelta(seconds=CAPTURE_TIMEOUT),
+            expires__gt=now,
+        ).values_list('pk', flat=True)
+    )
+
+    if dry_run:
+        return SweepResult(due, [], expired, stalled)
+
+    expired_queue.filter(pk__in=expired).delete()
+
+    for pk in expired:
+        LOG.warning('Pre-authorization %s expired before it was captured', pk)
+
+    for pk in stalled:
+        LOG.warning('The capture of pre-authorization %s has stalled', pk)
+
+    limiter = RateLimiter(rate)
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            errors = list(executor.map(
+                _capture_in_worker, due, [limiter] * len(due)
+            ))
+    else:
+        errors = []
+
+        for pk in due:
+            limiter.wait()
+            errors.append(capture(pk))
+
+    result = SweepResult(
+        [pk for pk, error in zip(due, errors) if error is None],
+        [(pk, error) for pk, error in zip(due, errors) if error is not None],
+        expired,
+        stalled,
+    )
+    preauthorizations_swept.send(sender=sweep, result=result)
+
+    return result
@@ -0,0 +1,395 @@
+"""Reconciliation of saved transactions with Helcim transaction reports.
+
+    A Helcim transaction report export (CSV or XML) is read as a stream
+    and compared to the ``HelcimTransaction`` table in chunks, so the
+    memory used does not depend on the size of the export (other than
+    the transaction IDs seen, which are kept in a compact array of 8
+    bytes per transaction).
+
+    Each export transaction is matched to a saved transaction by its
+    transaction ID or, if no saved transaction has the ID, by its order
+    number and amount (each saved transaction is matched once). Five
+    types of discrepancy are reported:
+
+    * ``invalid``: the export transaction has a value that cannot be
+      converted (e.g. an amount of ``abc``). It is not compared.
+    * ``missing``: the export transaction has no saved transaction.
+    * ``mismatched``: the saved transaction has different details.
+    * ``ambiguous``: more saved transactions have the order number and
+      amount than export transactions, and the export transaction
+      cannot be matched to one of them.
+    * ``orphaned``: a saved transaction (dated within the export) is
+      not in the export.
+"""
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict, namedtuple
+import csv
+from itertools import islice
+import os
+from xml.etree import ElementTree
+
+from helcim.conversions import FROM_API_FIELDS, convert_helcim_response_fields
+from helcim.models import HelcimTransaction
+
+
+INVALID = 'invalid'
+MISSING = 'missing'
+MISMATCHED = 'mismatched'
+AMBIGUOUS = 'ambiguous'
+ORPHANED = 'orphaned'
+
+# Helcim transaction types and the HelcimTransaction codes
+TRANSACTION_TYPES = {
+    'purchase': 's',
+    'sale': 's',
+    'preauth': 'p',
+    'preauthorization': 'p',
+    'capture': 'c',
+    'refund': 'r',
+    'verify': 'v',
+    'verification': 'v',
+}
+
+# The details compared when they are included in the export
+COMPARED_FIELDS = (
+    'amount',
+    'transaction_type',
+    'order_number',
+    'customer_code',
+    'currency',
+    'approval_code',
+)
+
+# The converted record key listing the fields that could not be converted
+INVALID_FIELDS = 'invalid_fields'
+
+# The row is the position of the export transaction (starting at 1),
+# or None for orphaned transactions
+Discrepancy = namedtuple(
+    'Discrepancy',
+    [
+        'status', 'transaction_id', 'order_number', 'amount',
+        'local_id', 'fields', 'row',
+    ],
+)
+
+# The errors raised when an export value cannot be converted
+CONVERSION_ERRORS = (ArithmeticError, TypeError, ValueError)
+
+def convert_export_record(record):
+    """Converts an export record to HelcimTransaction field names.
+
+        Parameters:
+            record (dict): The export fields (with Helcim API names).
+
+        Returns:
+            dict: The converted fields. Unknown and empty fields are
+                removed. Fields that cannot be converted are also
+                removed and their names are listed in
+                ``invalid_fields``.
+    """
+    fields = {
+        name: value.strip() for name, value in record.items()
+        if name in FROM_API_FIELDS and value and value.strip()
+    }
+
+    try:
+        converted = convert_helcim_response_fields(fields, FROM_API_FIELDS)
+    except CONVERSION_ERRORS:
+        # Converts each field to find the invalid ones
+        converted = {}
+        invalid_fields = []
+
+        for name, value in fields.items():
+            try:
+                convert_helcim_response_fields(
+                    {name: value}, FROM_API_FIELDS, converted
+                )
+            except CONVERSION_ERRORS:
+                invalid_fields.append(FROM_API_FIELDS[name].field_name)
+
+        converted[INVALID_FIELDS] = tuple(invalid_fields)
+
+    if 'transaction_type' in converted:
+        transaction_type = converted['transaction_type'].lower()
+        converted['transaction_type'] = TRANSACTION_TYPES.get(
+            transaction_type, transaction_type
+        )
+
+    return converted
+
+def read_csv_export(path):
+    """Yields the converted transactions of a CSV export."""
+    with open(path, newline='', encoding='utf-8-sig') as export:
+        for record in csv.DictReader(export):
+            yield convert_export_record(record)
+
+def read_xml_export(path):
+    """Yields the converted transactions of an XML export.
+
+        Each ``transaction`` element is removed from the parsed tree
+        once converted, so the whole document is never loaded.
+    """
+    parents = []
+
+    for event, element in ElementTree.iterparse(
+            path, events=('start', 'end')
+    ):
+        if event == 'start':
+            parents.append(element)
+            continue
+
+        parents.pop()
+
+        if element.tag == 'transaction':
+            yield convert_export_record(
+                {child.tag: child.text for child in element}
+            )
+
+            if parents:
+                parents[-1].remove(element)
+
+def read_export(path, export_format=None):
+    """Yields the converted transactions of a CSV or XML export.
+
+        Parameters:
+            path (str): The path to the export file.
+            export_format (str, optional): ``csv`` or ``xml``.
+                Determined from the file extension if not provided.
+    """
+    if export_format is None:
+        export_format = os.path.splitext(path)[1].lstrip('.').lower()
+
+    if export_format == 'csv':
+        return read_csv_export(path)
+
+    if export_format == 'xml':
+        return read_xml_export(path)
+
+    raise ValueError('Unsupported export format: {}'.format(export_format))
+
+def _local_values(queryset):
+    """Returns the values used to compare saved transactions."""
+    return queryset.values('id', 'transaction_id', *COMPARED_FIELDS).order_by()
+
+def _compare(record, local):
+    """Returns the names of the fields that do not match."""
+    fields = [
+        name for name in COMPARED_FIELDS
+        if name in record and record[name] != local[name]
+    ]
+
+    if (
+            'transaction_id' in record
+            and record['transaction_id'] != local['transaction_id']
+    ):
+        fields.insert(0, 'transaction_id')
+
+    return tuple(fields)
+
+class _SeenIDs():
+    """Compact sorted set of the transaction IDs in the export."""
+    def __init__(self):
+        self.ids = array('q')
+        self.is_sorted = True
+
+    def add(self, transaction_id):
+        """Adds a transaction ID."""
+        if self.ids and transaction_id < self.ids[-1]:
+            self.is_sorted = False
+
+        self.ids.append(transaction_id)
+
+    def __contains__(self, transaction_id):
+        if not self.is_sorted:
+            self.ids = array('q', sorted(self.ids))
+            self.is_sorted = True
+
+        index = bisect_left(self.ids, transaction_id)
+
+        return index < len(self.ids) and self.ids[index] == transaction_id
+
+def _order_key(values):
+    """Returns the order number and amount used to match transactions."""
+    return values.get('order_number'), values.get('amount')
+
+def _reconcile_chunk(records, seen, matched):
+    """Yields the status, export and saved transaction of a chunk.
+
+        The status is ``None`` for the matched transactions (which are
+        then compared), ``missing``, or ``ambiguous``. Saved
+        transactions with a transaction ID in the export, or in
+        ``matched`` (the IDs of the saved transactions matched by order
+        number in any chunk), are not matched by order number again.
+    """
+    by_id = {}
+    ids = [
+        record['transaction_id'] for record in records
+        if 'transaction_id' in record
+    ]
+
+    for local in _local_values(
+            HelcimTransaction.objects.filter(transaction_id__in=ids)
+    ):
+        by_id.setdefault(local['transaction_id'], local)
+
+    unmatched = []
+
+    for record in records:
+        local = by_id.get(record.get('transaction_id'))
+
+        if local:
+            yield None, record, local
+        else:
+            unmatched.append(record)
+
+    # Match the remaining transactions on the order number and amount
+    # (each saved transaction can only be matched once)
+    by_order = defaultdict(list)
+    order_numbers = {
+        record['order_number'] for record in unmatched
+        if 'order_number' in record
+    }
+
+    if order_numbers:
+        for local in _local_values(
+                HelcimTransaction.objects.filter(
+                    order_number__in=order_numbers
+                )
+        ).order_by('id'):
+            if local['id'] in matched or (
+                    local['transaction_id'] is not None
+                    and local['transaction_id'] in seen
+            ):
+                continue
+
+            by_order[_order_key(local)].append(local)
+
+    remaining = Counter(_order_key(record) for record in unmatched)
+
+    for record in unmatched:
+        key = _order_key(record)
+        candidates = by_order.get(key, [])
+        remaining[key] -= 1
+
+        # Prefer the saved transactions with the same details
+        choices = [
+            local for local in candidates if not _compare(record, local)
+        ] or candidates
+
+        if not choices:
+            yield MISSING, record, None
+        elif len(choices) > remaining[key] + 1:
+            # Too many saved transactions to tell which one it is
+            for local in choices:
+                if local['transaction_id'] is not None:
+                    seen.add(local['transaction_id'])
+
+            yield AMBIGUOUS, record, None
+        else:
+            local = choices[0]
+            candidates.remove(local)
+            matched.add(local['id'])
+
+            if local['transaction_id'] is not None:
+                seen.add(local['transaction_id'])
+
+            yield None, record, local
+
+def reconcile(records, chunk_size=1000):
+    """Compares export transactions to the saved transactions.
+
+        Parameters:
+            records (iter): The converted export transactions (e.g.
+                from ``read_export``).
+            chunk_size (int): The number of export transactions
+                compared per database query.
+
+        Yields:
+            Discrepancy: Each invalid, missing, mismatched, ambiguous,
+                and orphaned transaction. Orphaned transactions are
+                yielded once all the export transactions are compared.
+    """
+    records = enumerate(records, 1)
+    seen = _SeenIDs()
+    matched = set()
+    first_date = None
+    last_date = None
+
+    while True:
+        chunk = list(islice(records, chunk_size))
+
+        if not chunk:
+            break
+
+        rows = {}
+        valid = []
+
+        for row, record in chunk:
+            rows[id(record)] = row
+
+            if INVALID_FIELDS in record:
+                yield Discrepancy(
+                    INVALID,
+                    record.get('transaction_id'),
+                    record.get('order_number'),
+                    record.get('amount'),
+                    None,
+                    record[INVALID_FIELDS],
+                    row,
+                )
+            else:
+                valid.append(record)
+
+            if 'transaction_id' in record:
+                seen.add(record['transaction_id'])
+
+            transaction_date = record.get('transaction_date')
+
+            if transaction_date:
+                if first_date is None or transaction_date < first_date:
+                    first_date = transaction_date
+
+                if last_date is None or transaction_date > last_date:
+                    last_date = transaction_date
+
+        for status, record, local in _reconcile_chunk(valid, seen, matched):
+            fields = ()
+
+            if status is None:
+                fields = _compare(record, local)
+
+                if not fields:
+                    continue
+
+                status = MISMATCHED
+
+            yield Discrepancy(
+                status,
+                record.get('transaction_id'),
+                record.get('order_number'),
+                record.get('amount'),
+                local['id'] if local else None,
+                fields,
+                rows[id(record)],
+            )
+
+    # Orphaned transactions can only be found within the export dates
+    if first_date is None:
+        return
+
+    orphans = HelcimTransaction.objects.filter(
+        transaction_id__isnull=False,
+        date_response__date__gte=first_date,
+        date_response__date__lte=last_date,
+    ).values_list(
+        'id', 'transaction_id', 'order_number', 'amount'
+    ).order_by()
+
+    for local_id, transaction_id, order_number, amount in orphans.iterator():
+        if transaction_id not in seen:
+            yield Discrepancy(
+                ORPHANED, transaction_id, order_number, amount, local_id, (),
+                None,
+            )
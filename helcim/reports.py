@@ -0,0 +1,189 @@
+"""Daily transaction and settlement summaries.
+
+    The totals are aggregated by the database (grouped by day,
+    transaction type, currency, and success), so no transactions are
+    loaded into Python. The summary of each past day is cached; only
+    the summary of the current day (which can still change) is
+    recomputed on every call.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from helcim.models import HelcimTransaction
+
+
+# Seconds to cache the summary of a past day
+CACHE_TIMEOUT = 86400
+
+# Transaction types added to (1) or removed from (-1) the settled amount
+SETTLED_TYPES = {
+    's': 1,
+    'c': 1,
+    'r': -1,
+}
+
+def _cache_key(day):
+    """Returns the cache key of a day summary."""
+    return 'helcim_report_{}'.format(day.isoformat())
+
+def _today():
+    """Returns the current date (in the current time zone)."""
+    now = timezone.now()
+
+    if timezone.is_aware(now):
+        return timezone.localtime(now).date()
+
+    return now.date()
+
+def _day_start(day):
+    """Returns the start of the day (in the current time zone)."""
+    start = datetime.combine(day, time.min)
+
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+def _days(date_from, date_to):
+    """Returns each day from date_from to date_to (inclusive)."""
+    return [
+        date_from + timedelta(days=offset)
+        for offset in range((date_to - date_from).days + 1)
+    ]
+
+def daily_totals(date_from, date_to):
+    """Returns the transaction totals of each day.
+
+        Parameters:
+            date_from (date): The first day (inclusive).
+            date_to (date): The last day (inclusive).
+
+        Returns:
+            list: A dictionary for each day, transaction type, currency,
+                and success with the ``count`` and total ``amount`` of
+                the transactions.
+    """
+    return list(
+        # Filtered on the date_response column so its index is used
+        HelcimTransaction.objects.filter(
+            date_response__gte=_day_start(date_from),
+            date_response__lt=_day_start(date_to + timedelta(days=1)),
+        ).annotate(
+            day=TruncDate('date_response'),
+        ).values(
+            'day', 'transaction_type', 'currency', 'transaction_success',
+        ).annotate(
+            count=Count('id'),
+            amount=Sum('amount'),
+        ).order_by(
+            'day', 'transaction_type', 'currency', 'transaction_success',
+        )
+    )
+
+def summarize_day(day, totals):
+    """Returns the summary of a day from its totals.
+
+        Parameters:
+            day (date): The day.
+            totals (list): The ``daily_totals`` of the day.
+
+        Returns:
+            dict: The ``date``, the ``totals``, and the ``settled``
+                (sales and captures less refunds) and ``preauthorized``
+                amounts of the successful transactions by currency.
+    """
+    settled = {}
+    preauthorized = {}
+
+    for total in totals:
+        if not total['transaction_success']:
+            continue
+
+        currency = total['currency']
+        amount = total['amount'] or Decimal('0.00')
+
+        if total['transaction_type'] in SETTLED_TYPES:
+            settled[currency] = (
+                settled.get(currency, Decimal('0.00'))
+                + SETTLED_TYPES[total['transaction_type']] * amount
+            )
+        elif total['transaction_type'] == 'p':
+            preauthorized[currency] = (
+                preauthorized.get(currency, Decimal('0.00')) + amount
+            )
+
+    return {
+        'date': day,
+        'totals': [
+            {key: value for key, value in total.items() if key != 'day'}
+            for total in totals
+        ],
+        'settled': settled,
+        'preauthorized': preauthorized,
+    }
+
+def _summarize_days(date_from, date_to):
+    """Returns the summaries of the days (with one query)."""
+    totals_by_day = {}
+
+    for total in daily_totals(date_from, date_to):
+        totals_by_day.setdefault(total['day'], []).append(total)
+
+    return {
+        day: summarize_day(day, totals_by_day.get(day, []))
+        for day in _days(date_from, date_to)
+    }
+
+def daily_summaries(date_from, date_to):
+    """Returns the summary of each day (see ``summarize_day``).
+
+        Past days are retrieved from the cache. Any uncached past days
+        are summarized with one query and cached; the current day is
+        always summarized.
+
+        Parameters:
+            date_from (date): The first day (inclusive).
+            date_to (date): The last day (inclusive).
+
+        Returns:
+            list: The summary of each day in order.
+    """
+    today = _today()
+    days = _days(date_from, date_to)
+    past_days = [day for day in days if day < today]
+
+    cached = cache.get_many([_cache_key(day) for day in past_days])
+    summaries = {
+        day: cached[_cache_key(day)] for day in past_days
+        if _cache_key(day) in cached
+    }
+    missing = [day for day in past_days if day not in summaries]
+
+    if missing:
+        computed = _summarize_days(missing[0], missing[-1])
+        cache.set_many(
+            {_cache_key(day): computed[day] for day in missing},
+            CACHE_TIMEOUT,
+        )
+        summaries.update({day: computed[day] for day in missing})
+
+    if date_from <= today <= date_to:
+        summaries.update(_summarize_days(today, today))
+
+    # Future days have no transactions
+    for day in days:
+        if day > today:
+            summaries[day] = summarize_day(day, [])
+
+    return [summaries[day] for day in days]
+
+def clear_cached_summaries(date_from, date_to):
+    """Removes the cached summaries of the days.
+
+        Needed if past transactions are changed or removed (e.g. by
+        archiving them).
+    """
+    cache.delete_many([_cache_key(day) for day in _days(date_from, date_to)])
@@ -16,6 +16,40 @@ def _validate_helcim_js_settings(helcim_js):
             )
             raise django_exceptions.ImproperlyConfigured(message)
 
+def _validate_transport_settings(transport_mode, transport_cassette):
+    """Confirms that the declared transport settings are valid."""
+    if transport_mode not in ('live', 'record', 'replay'):
+        message = (
+            'HELCIM_TRANSPORT_MODE setting must be one of "live", '
+            '"record", or "replay".'
+        )
+        raise django_exceptions.ImproperlyConfigured(message)
+
+    if transport_mode != 'live' and not transport_cassette:
+        message = (
+            'HELCIM_TRANSPORT_CASSETTE setting must be provided to '
+            'record or replay transactions.'
+        )
+        raise django_exceptions.ImproperlyConfigured(message)
+
+def _validate_audit_storage(audit_storage):
+    """Confirms that the declared audit storage is valid."""
+    if audit_storage not in ('inline', 'compressed'):
+        message = (
+            'HELCIM_AUDIT_STORAGE setting must be either "inline" or '
+            '"compressed".'
+        )
+        raise django_exceptions.ImproperlyConfigured(message)
+
+def _validate_callback_writes(callback_writes):
+    """Confirms that the declared callback write mode is valid."""
+    if callback_writes not in ('immediate', 'batched'):
+        message = (
+            'HELCIM_JS_CALLBACK_WRITES setting must be either "immediate" '
+            'or "batched".'
+        )
+        raise django_exceptions.ImproperlyConfigured(message)
+
 def determine_helcim_settings():
     """Collects all possible django-helcim settings for easy use.
 
@@ -42,6 +76,13 @@ def determine_helcim_settings():
     # Helcim.js Settings
     helcim_js = getattr(django_settings, 'HELCIM_JS_CONFIG', {})
     _validate_helcim_js_settings(helcim_js)
+    callback_writes = getattr(
+        django_settings, 'HELCIM_JS_CALLBACK_WRITES', 'immediate'
+    )
+    _validate_callback_writes(callback_writes)
+    callback_batch_size = getattr(
+        django_settings, 'HELCIM_JS_CALLBACK_BATCH_SIZE', 50
+    )
 
     # REDACTION SETTINGS
     # -------------------------------------------------------------------------
@@ -63,6 +104,11 @@ def determine_helcim_settings():
     )
     redact_token = getattr(django_settings, 'HELCIM_REDACT_TOKEN', False)
 
+    # AUDIT STORAGE SETTINGS
+    # -------------------------------------------------------------------------
+    audit_storage = getattr(django_settings, 'HELCIM_AUDIT_STORAGE', 'inline')
+    _validate_audit_storage(audit_storage)
+
     # TRANSACTION FUNCTIONALITY SETTINGS
     # -------------------------------------------------------------------------
     enable_transaction_capture = getattr(
@@ -71,6 +117,18 @@ def determine_helcim_settings():
     enable_transaction_refund = getattr(
         django_settings, 'HELCIM_ENABLE_TRANSACTION_REFUND', False
     )
+    async_transaction_actions = getattr(
+        django_settings, 'HELCIM_ASYNC_TRANSACTION_ACTIONS', False
+    )
+    async_action_workers = getattr(
+        django_settings, 'HELCIM_ASYNC_ACTION_WORKERS', 4
+    )
+    preauth_expiry_days = getattr(
+        django_settings, 'HELCIM_PREAUTH_EXPIRY_DAYS', 7
+    )
+    preauth_capture_margin_hours = getattr(
+        django_settings, 'HELCIM_PREAUTH_CAPTURE_MARGIN_HOURS', 24
+    )
 
     # TOKEN VAULT SETTINGS
     # -------------------------------------------------------------------------
@@ -84,6 +142,25 @@ def determine_helcim_settings():
         django_settings, 'HELCIM_ENABLE_ADMIN', False
     )
 
+    # INSTRUMENTATION SETTINGS
+    # -------------------------------------------------------------------------
+    enable_instrumentation = getattr(
+        django_settings, 'HELCIM_ENABLE_INSTRUMENTATION', False
+    )
+    enable_metrics = getattr(django_settings, 'HELCIM_ENABLE_METRICS', False)
+    metrics_dir = getattr(django_settings, 'HELCIM_METRICS_DIR', None)
+
+    # TRANSPORT SETTINGS
+    # -------------------------------------------------------------------------
+    transport_mode = getattr(django_settings, 'HELCIM_TRANSPORT_MODE', 'live')
+    transport_cassette = getattr(
+        django_settings, 'HELCIM_TRANSPORT_CASSETTE', None
+    )
+    transport_replay_latency = getattr(
+        django_settings, 'HELCIM_TRANSPORT_REPLAY_LATENCY', False
+    )
+    _validate_transport_settings(transport_mode, transport_cassette)
+
     # OTHER SETTINGS
     # -------------------------------------------------------------------------
     allow_anonymous = getattr(
@@ -97,6 +174,8 @@ def determine_helcim_settings():
         'terminal_id': terminal_id,
         'api_test': api_test,
         'helcim_js': helcim_js,
+        'callback_writes': callback_writes,
+        'callback_batch_size': callback_batch_size,
         'redact_all': redact_all,
         'redact_cc_name': redact_cc_name,
         'redact_cc_number': redact_cc_number,
@@ -106,11 +185,50 @@ def determine_helcim_settings():
         'redact_cc_magnetic': redact_cc_magnetic,
         'redact_cc_magnetic_encrypted': redact_cc_magnetic_encrypted,
         'redact_token': redact_token,
+        'audit_storage': audit_storage,
         'enable_transaction_capture': enable_transaction_capture,
         'enable_transaction_refund': enable_transaction_refund,
+        'async_transaction_actions': async_transaction_actions,
+        'async_action_workers': async_action_workers,
+        'preauth_expiry_days': preauth_expiry_days,
+        'preauth_capture_margin_hours': preauth_capture_margin_hours,
         'enable_token_vault': enable_token_vault,
         'enable_admin': enable_admin,
+        'enable_instrumentation': enable_instrumentation,
+        'enable_metrics': enable_metrics,
+        'metrics_dir': metrics_dir,
+        'transport_mode': transport_mode,
+        'transport_cassette': transport_cassette,
+        'transport_replay_latency': transport_replay_latency,
         'allow_anonymous': allow_anonymous,
     }
 
 SETTINGS = determine_helcim_settings()
+
+def update_helcim_js_setting(setting, value, **kwargs):
+    """Updates the Helcim.js configuration when its setting changes.
+
+        Connected to the ``setting_changed`` signal (e.g. sent by
+        ``override_settings`` in tests). The configuration is replaced
+        (not mutated), so the cached Helcim.js context is rebuilt.
+    """
+    # pylint: disable=unused-argument
+    if setting != 'HELCIM_JS_CONFIG':
+        return
+
+    helcim_js = {} if value is None else value
+    _validate_helcim_js_settings(helcim_js)
+
+    SETTINGS['helcim_js'] = helcim_js
+
+def update_metrics_dir_setting(setting, value, **kwargs):
+    """Updates the shared metrics directory when its setting changes.
+
+        Connected to the ``setting_changed`` signal; the metrics
+        registry reads the directory each time it is used.
+    """
+    # pylint: disable=unused-argument
+    if setting != 'HELCIM_METRICS_DIR':
+        return
+
+    SETTINGS['metrics_dir'] = value
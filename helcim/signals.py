@@ -0,0 +1,15 @@
+"""Signals sent by django-helcim."""
+from django.dispatch import Signal
+
+
+# Sent after each stage of a transaction has run (only when
+# HELCIM_ENABLE_INSTRUMENTATION is True). Receivers are passed the
+# ``instance``, ``stage``, ``duration`` (in seconds),
+# ``transaction_type``, and ``outcome`` of the stage, and whether the
+# exception (if any) was ``raised`` in this stage rather than in a
+# stage it runs.
+stage_completed = Signal()
+
+# Sent after each sweep of the open pre-authorizations. Receivers are
+# passed the ``result`` (a ``helcim.preauthorizations.SweepResult``).
+preauthorizations_swept = Signal()
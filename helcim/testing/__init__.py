@@ -0,0 +1 @@
+"""Utilities to test and benchmark django-helcim integrations."""
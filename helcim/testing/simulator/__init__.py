@@ -0,0 +1,32 @@
+"""Local simulator of the Helcim Commerce API.
+
+    A threaded HTTP server that implements the XML API used by the
+    ``helcim.gateway`` requests (purchase, preauth, capture, refund, and
+    verify). Approved transactions and card tokens are recorded, so
+    pre-authorizations can only be captured once and saved tokens are
+    validated. The latency (and its distribution), decline and error
+    rates, and maximum throughput are configurable, so gateway
+    workloads can be benchmarked without network access.
+
+    Start the simulator in a background thread::
+
+        from helcim.testing.simulator import HelcimSimulator
+
+        simulator = HelcimSimulator(latency=0.05, seed=1).start()
+        # Set HELCIM_API_URL (or the gateway api_details) to simulator.url
+        simulator.stop()
+
+    Or run it from the command line (see ``--help``)::
+
+        python -m helcim.testing.simulator --port 8000 --latency 0.05
+"""
+from helcim.testing.simulator.ledger import Card, Declined, Ledger
+from helcim.testing.simulator.server import (
+    LATENCY_DISTRIBUTIONS, THROUGHPUT_MODES, HelcimSimulator
+)
+
+
+__all__ = [
+    'Card', 'Declined', 'HelcimSimulator', 'LATENCY_DISTRIBUTIONS',
+    'Ledger', 'THROUGHPUT_MODES',
+]
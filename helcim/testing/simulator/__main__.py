@@ -0,0 +1,77 @@
+"""Runs the Helcim API simulator from the command line.
+
+    Run with (see ``--help`` for all options)::
+
+        python -m helcim.testing.simulator --port 8000 --latency 0.05
+"""
+import argparse
+
+from helcim.testing.simulator.server import (
+    LATENCY_DISTRIBUTIONS, THROUGHPUT_MODES, HelcimSimulator
+)
+
+
+def parse_args(args=None):
+    """Parses the command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Simulates the Helcim Commerce API.'
+    )
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument(
+        '--latency', type=float, default=0,
+        help='mean response latency (in seconds)',
+    )
+    parser.add_argument(
+        '--latency-distribution', choices=LATENCY_DISTRIBUTIONS,
+        default='fixed',
+    )
+    parser.add_argument(
+        '--decline-rate', type=float, default=0,
+        help='fraction of requests that are declined',
+    )
+    parser.add_argument(
+        '--error-rate', type=float, default=0,
+        help='fraction of requests that fail with HTTP 500',
+    )
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument(
+        '--max-throughput', type=float, default=None,
+        help='maximum requests per second',
+    )
+    parser.add_argument(
+        '--throughput-mode', choices=THROUGHPUT_MODES, default='queue',
+        help='whether requests above the maximum wait or fail with HTTP 429',
+    )
+    parser.add_argument(
+        '--stateless', action='store_true',
+        help='accept unknown pre-authorizations and card tokens',
+    )
+
+    return parser.parse_args(args)
+
+def main(args=None):
+    """Serves the simulated API until interrupted."""
+    arguments = parse_args(args)
+    simulator = HelcimSimulator(
+        latency=arguments.latency,
+        port=arguments.port,
+        latency_distribution=arguments.latency_distribution,
+        decline_rate=arguments.decline_rate,
+        error_rate=arguments.error_rate,
+        seed=arguments.seed,
+        max_throughput=arguments.max_throughput,
+        throughput_mode=arguments.throughput_mode,
+        stateful=not arguments.stateless,
+    )
+
+    print('Simulating the Helcim Commerce API at {}'.format(simulator.url))
+
+    try:
+        simulator.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.server_close()
+
+if __name__ == '__main__':
+    main()
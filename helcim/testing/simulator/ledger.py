@@ -0,0 +1,273 @@
+"""Stateful record of the simulated transactions and card tokens."""
+from decimal import Decimal, InvalidOperation
+import hashlib
+from itertools import count
+from threading import Lock
+
+
+# The transactionType values of the Helcim Commerce API
+TRANSACTION_TYPES = ('purchase', 'preauth', 'capture', 'refund', 'verify')
+
+DEFAULT_CARD_NUMBER = '5454545454545454'
+DEFAULT_CARD_EXPIRY = '0125'
+DEFAULT_CARD_NAME = 'Test Person'
+
+class Declined(Exception):
+    """A simulated transaction was declined (with the message)."""
+
+class Card():
+    """A card saved in the simulated vault."""
+    # pylint: disable=too-few-public-methods
+    def __init__(self, token, number, expiry, name, customer_code):
+        self.token = token
+        self.number = number
+        self.expiry = expiry
+        self.name = name
+        self.customer_code = customer_code
+
+    @property
+    def f4l4(self):
+        """The first and last four digits of the card number."""
+        return '{}{}'.format(self.number[:4], self.number[-4:])
+
+    @property
+    def masked_number(self):
+        """The card number as returned by the Helcim API."""
+        return '{}{}{}'.format(
+            self.number[:4], '*' * (len(self.number) - 8), self.number[-4:]
+        )
+
+    @property
+    def card_type(self):
+        """The card brand (from the first digit)."""
+        return {'3': 'AmericanExpress', '4': 'Visa', '5': 'MasterCard'}.get(
+            self.number[:1], 'Unknown'
+        )
+
+def create_token(number, expiry, customer_code):
+    """Returns the (deterministic) token of a card for a customer."""
+    return hashlib.sha1(
+        '{}:{}:{}'.format(number, expiry, customer_code).encode('utf-8')
+    ).hexdigest()[:22]
+
+class Ledger():
+    """Stateful record of the simulated transactions and card tokens.
+
+        Pre-authorizations can only be captured once (for at most the
+        pre-authorized amount) and card tokens must be saved (by an
+        earlier transaction or ``add_card``) before they are used. All
+        methods are thread-safe.
+
+        Parameters:
+            first_transaction_id (int): The first transaction ID.
+            validate (bool): Whether captures and card tokens are
+                validated. If ``False``, unknown pre-authorizations and
+                tokens are accepted (e.g. to repeat the same request in
+                a benchmark).
+    """
+    def __init__(self, first_transaction_id=1000000, validate=True):
+        self.validate = validate
+        self._lock = Lock()
+        self._transaction_ids = count(first_transaction_id)
+        self._customer_ids = count(1000)
+        self._transactions = {}
+        self._cards = {}
+
+    def add_card(
+            self, customer_code, number=DEFAULT_CARD_NUMBER,
+            expiry=DEFAULT_CARD_EXPIRY, name=DEFAULT_CARD_NAME, token=None
+    ):
+        """Saves a card to the vault (e.g. to use a saved token).
+
+            Returns:
+                Card: The saved card.
+        """
+        card = Card(
+            token or create_token(number, expiry, customer_code),
+            number, expiry, name, customer_code,
+        )
+
+        with self._lock:
+            self._cards[card.token] = card
+
+        return card
+
+    def get_transaction(self, transaction_id):
+        """Returns the details of a transaction (or ``None``)."""
+        with self._lock:
+            transaction = self._transactions.get(transaction_id)
+
+            return dict(transaction) if transaction else None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._transactions)
+
+    def _find_card(self, data):
+        """Returns the card for the request payment details."""
+        customer_code = data.get('customerCode') or ''
+
+        if data.get('cardToken'):
+            card = self._cards.get(data['cardToken'])
+
+            if card is None and not self.validate:
+                card = Card(
+                    data['cardToken'], DEFAULT_CARD_NUMBER,
+                    DEFAULT_CARD_EXPIRY, DEFAULT_CARD_NAME, customer_code,
+                )
+                self._cards[card.token] = card
+
+            if not self.validate:
+                return card
+
+            if card is None or card.customer_code != customer_code:
+                raise Declined('Invalid Card Token')
+
+            if (
+                    data.get('cardF4L4Skip') != '1'
+                    and data.get('cardF4L4') != card.f4l4
+            ):
+                raise Declined('Invalid Card F4L4')
+
+            return card
+
+        if data.get('cardNumber'):
+            if not data.get('cardExpiry'):
+                raise Declined('Missing Card Expiry')
+
+            number = data['cardNumber']
+            # New customers are created for cards without a customer
+            customer_code = customer_code or 'CST{}'.format(
+                next(self._customer_ids)
+            )
+            token = create_token(number, data['cardExpiry'], customer_code)
+            card = self._cards.get(token)
+
+            if card is None:
+                card = Card(
+                    token, number, data['cardExpiry'],
+                    data.get('cardHolderName') or DEFAULT_CARD_NAME,
+                    customer_code,
+                )
+                self._cards[token] = card
+
+            return card
+
+        if data.get('cardMag') or data.get('cardMagEnc'):
+            return self._find_card({
+                'cardNumber': DEFAULT_CARD_NUMBER,
+                'cardExpiry': DEFAULT_CARD_EXPIRY,
+                'customerCode': customer_code,
+            })
+
+        if customer_code:
+            # The most recently saved card of the customer
+            for card in reversed(list(self._cards.values())):
+                if card.customer_code == customer_code:
+                    return card
+
+            if not self.validate:
+                return self._find_card({
+                    'cardNumber': DEFAULT_CARD_NUMBER,
+                    'cardExpiry': DEFAULT_CARD_EXPIRY,
+                    'customerCode': customer_code,
+                })
+
+            raise Declined('Customer Not Found')
+
+        raise Declined('Missing Payment Details')
+
+    @staticmethod
+    def _amount(data, required=True):
+        """Returns the request amount."""
+        try:
+            amount = Decimal(data.get('amount') or '0')
+        except InvalidOperation:
+            raise Declined('Invalid Amount')
+
+        if required and amount <= 0:
+            raise Declined('Invalid Amount')
+
+        return amount.quantize(Decimal('0.01'))
+
+    def _capture(self, data):
+        """Captures a saved pre-authorization."""
+        try:
+            preauth_id = int(data.get('transactionId'))
+        except (TypeError, ValueError):
+            raise Declined('Invalid Transaction ID')
+
+        preauth = self._transactions.get(preauth_id)
+
+        unknown = preauth is None or preauth['type'] != 'preauth'
+
+        if unknown and not self.validate:
+            card = self._find_card({
+                'cardNumber': DEFAULT_CARD_NUMBER,
+                'cardExpiry': DEFAULT_CARD_EXPIRY,
+                'customerCode': data.get('customerCode') or '',
+            })
+
+            return card, self._amount(data, required=False), preauth_id
+
+        if unknown:
+            raise Declined('Transaction Not Found')
+
+        if preauth['captured'] and self.validate:
+            raise Declined('Transaction Already Captured')
+
+        amount = (
+            self._amount(data) if data.get('amount') else preauth['amount']
+        )
+
+        if amount > preauth['amount']:
+            raise Declined('Amount Exceeds Preauthorized Amount')
+
+        preauth['captured'] = True
+
+        return self._cards[preauth['token']], amount, preauth_id
+
+    def process(self, data):
+        """Processes a Helcim API request.
+
+            Parameters:
+                data (dict): The POST data of the request.
+
+            Returns:
+                dict: The details of the approved transaction.
+
+            Raises:
+                Declined: The transaction was declined.
+        """
+        transaction_type = data.get('transactionType')
+
+        if transaction_type not in TRANSACTION_TYPES:
+            raise Declined('Invalid Transaction Type')
+
+        with self._lock:
+            preauth_id = None
+
+            if transaction_type == 'capture':
+                card, amount, preauth_id = self._capture(data)
+            else:
+                card = self._find_card(data)
+                amount = self._amount(
+                    data, required=transaction_type != 'verify'
+                )
+
+            transaction_id = next(self._transaction_ids)
+            transaction = {
+                'transaction_id': transaction_id,
+                'type': transaction_type,
+                'amount': amount,
+                'token': card.token,
+                'customer_code': card.customer_code,
+                'order_number': (
+                    data.get('orderNumber') or 'INV{}'.format(transaction_id)
+                ),
+                'preauth_id': preauth_id,
+                'captured': False,
+            }
+            self._transactions[transaction_id] = transaction
+
+            return dict(transaction, card=card)
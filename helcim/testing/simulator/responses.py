@@ -0,0 +1,69 @@
+"""XML responses of the simulated Helcim Commerce API."""
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+
+APPROVED_TEMPLATE = """<?xml version="1.0"?>
+<message>
+    <response>1</response>
+    <responseMessage>APPROVED</responseMessage>
+    <notice></notice>
+    <transaction>
+        <transactionId>{transaction_id}</transactionId>
+        <type>{transaction_type}</type>
+        <date>{date}</date>
+        <time>{time}</time>
+        <cardHolderName>{cc_name}</cardHolderName>
+        <amount>{amount}</amount>
+        <currency>CAD</currency>
+        <cardNumber>{cc_number}</cardNumber>
+        <cardToken>{token}</cardToken>
+        <expiryDate>{cc_expiry}</expiryDate>
+        <cardType>{cc_type}</cardType>
+        <avsResponse>X</avsResponse>
+        <cvvResponse>M</cvvResponse>
+        <approvalCode>{approval_code}</approvalCode>
+        <orderNumber>{order_number}</orderNumber>
+        <customerCode>{customer_code}</customerCode>
+    </transaction>
+</message>
+"""
+
+ERROR_TEMPLATE = """<?xml version="1.0"?>
+<message>
+    <response>0</response>
+    <responseMessage>{message}</responseMessage>
+</message>
+"""
+
+def approved(transaction, now=None):
+    """Returns the response of an approved transaction.
+
+        Parameters:
+            transaction (dict): The transaction (from
+                ``Ledger.process``).
+            now (datetime, optional): The date and time of the
+                transaction (defaults to the current time).
+    """
+    now = now or datetime.now()
+    card = transaction['card']
+
+    return APPROVED_TEMPLATE.format(
+        transaction_id=transaction['transaction_id'],
+        transaction_type=transaction['type'],
+        date=now.strftime('%Y-%m-%d'),
+        time=now.strftime('%H:%M:%S'),
+        cc_name=escape(card.name),
+        amount=transaction['amount'],
+        cc_number=card.masked_number,
+        token=card.token,
+        cc_expiry=escape(card.expiry),
+        cc_type=card.card_type,
+        approval_code='T{:05d}'.format(transaction['transaction_id'] % 100000),
+        order_number=escape(transaction['order_number']),
+        customer_code=escape(card.customer_code),
+    )
+
+def error(message):
+    """Returns the response of a declined or invalid request."""
+    return ERROR_TEMPLATE.format(message=escape(message))
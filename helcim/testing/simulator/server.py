@@ -0,0 +1,204 @@
+"""Threaded HTTP server simulating the Helcim Commerce API."""
+import math
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from random import Random
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from time import monotonic, sleep
+from urllib.parse import parse_qsl
+
+from helcim.testing.simulator import responses
+from helcim.testing.simulator.ledger import Declined, Ledger
+
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+THROUGHPUT_MODES = ('queue', 'reject')
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    """Replies to Helcim API POST requests."""
+    def do_POST(self): # pylint: disable=invalid-name
+        """Handles a Helcim API request."""
+        length = int(self.headers.get('Content-Length', 0))
+        data = dict(parse_qsl(self.rfile.read(length).decode('utf-8')))
+
+        if not self.server.acquire_slot():
+            self._send(429)
+            return
+
+        latency, outcome = self.server.sample()
+
+        if latency:
+            sleep(latency)
+
+        if outcome == 'error':
+            self._send(500)
+            return
+
+        self._send(200, self.server.respond(data, outcome))
+
+    def _send(self, status, body=''):
+        """Sends the response."""
+        encoded = body.encode('utf-8')
+
+        self.send_response(status)
+
+        if encoded:
+            self.send_header('Content-Type', 'application/xml')
+
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        """Silences the request logging."""
+
+class HelcimSimulator(ThreadingMixIn, HTTPServer):
+    """Threaded HTTP server simulating the Helcim Commerce API.
+
+        Approved transactions are recorded in a ``Ledger``, so
+        pre-authorizations can only be captured once and saved card
+        tokens are validated.
+
+        Parameters:
+            latency (float): Seconds to wait before each response (the
+                mean for the ``uniform`` and ``lognormal``
+                distributions).
+            port (int): Port to listen on (0 selects a free port).
+            latency_distribution (str): How the latency varies between
+                responses (``fixed``, ``uniform``, or ``lognormal``).
+            decline_rate (float): Fraction of requests that are
+                declined (``response`` of ``0``).
+            error_rate (float): Fraction of requests that fail with
+                an HTTP 500 response.
+            seed (int, optional): Seed for the random latencies and
+                outcomes (to make runs reproducible).
+            max_throughput (float, optional): The maximum requests per
+                second; requests above it wait for a slot (``queue``)
+                or fail with an HTTP 429 response (``reject``).
+            throughput_mode (str): ``queue`` or ``reject``.
+            stateful (bool): Whether captures and card tokens are
+                validated against the ledger (see ``Ledger``).
+            ledger (Ledger, optional): The ledger to record the
+                transactions in (replaces ``stateful``).
+    """
+    daemon_threads = True
+    # The listen backlog (the default of 5 resets connections when more
+    # concurrent clients connect at once, e.g. in the benchmarks)
+    request_queue_size = 128
+
+    def __init__(
+            self, latency=0, port=0, latency_distribution='fixed',
+            decline_rate=0, error_rate=0, seed=None, max_throughput=None,
+            throughput_mode='queue', stateful=True, ledger=None
+    ):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                'Unsupported latency distribution: {}'.format(
+                    latency_distribution
+                )
+            )
+
+        if throughput_mode not in THROUGHPUT_MODES:
+            raise ValueError(
+                'Unsupported throughput mode: {}'.format(throughput_mode)
+            )
+
+        super().__init__(('127.0.0.1', port), SimulatorHandler)
+        self.latency = latency
+        self.latency_distribution = latency_distribution
+        self.decline_rate = decline_rate
+        self.error_rate = error_rate
+        self.max_throughput = max_throughput
+        self.throughput_mode = throughput_mode
+        self.ledger = ledger or Ledger(validate=stateful)
+        self._random = Random(seed)
+        self._lock = Lock()
+        self._next_slot = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        """The URL of the simulated API."""
+        return 'http://127.0.0.1:{}/api/'.format(self.server_address[1])
+
+    def acquire_slot(self):
+        """Waits for the throughput cap (if any).
+
+            Returns:
+                bool: ``False`` if the request is rejected.
+        """
+        if not self.max_throughput:
+            return True
+
+        with self._lock:
+            now = monotonic()
+            slot = max(now, self._next_slot)
+
+            if slot > now and self.throughput_mode == 'reject':
+                return False
+
+            self._next_slot = slot + 1 / self.max_throughput
+
+        if slot > now:
+            sleep(slot - now)
+
+        return True
+
+    def _sample_latency(self):
+        """Returns the latency for a response (called with the lock)."""
+        if not self.latency or self.latency_distribution == 'fixed':
+            return self.latency
+
+        if self.latency_distribution == 'uniform':
+            return self._random.uniform(0, 2 * self.latency)
+
+        # Log-normal with the requested mean and a long tail
+        sigma = 0.75
+        mu = math.log(self.latency) - sigma ** 2 / 2
+
+        return self._random.lognormvariate(mu, sigma)
+
+    def sample(self):
+        """Returns the latency and outcome for the next response.
+
+            The outcome is ``approve``, ``decline``, or ``error``.
+        """
+        with self._lock:
+            latency = self._sample_latency()
+            roll = self._random.random()
+
+        if roll < self.error_rate:
+            return latency, 'error'
+
+        if roll < self.error_rate + self.decline_rate:
+            return latency, 'decline'
+
+        return latency, 'approve'
+
+    def respond(self, data, outcome='approve'):
+        """Returns the XML response to the request data."""
+        if not data.get('accountId') or not data.get('apiToken'):
+            return responses.error('Invalid API Credentials')
+
+        if outcome == 'decline':
+            return responses.error('DECLINED')
+
+        try:
+            transaction = self.ledger.process(data)
+        except Declined as error:
+            return responses.error(str(error))
+
+        return responses.approved(transaction)
+
+    def start(self):
+        """Serves requests in a background thread."""
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        """Stops the server."""
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,262 @@
+"""Transports to send requests to the Helcim Commerce API.
+
+    By default requests are sent to the Helcim API (``live`` mode). The
+    ``HELCIM_TRANSPORT_MODE`` setting can instead record the requests
+    and responses to a cassette file (``record`` mode), or serve the
+    recorded responses without contacting the API (``replay`` mode).
+    Replaying allows the transaction processing to be profiled at full
+    speed and production issues to be reproduced offline.
+
+    Cassettes are JSON Lines files (one request/response pair per
+    line). Card details and API credentials are removed from the
+    recorded requests, and the card details are removed from the
+    recorded responses following the redaction settings.
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+from time import perf_counter, sleep
+
+from helcim import exceptions as helcim_exceptions
+from helcim.lazy import lazy_import
+from helcim.settings import SETTINGS
+
+
+# Imported on the first request (see helcim.lazy)
+requests = lazy_import('requests')
+
+# Request fields never written to a cassette
+REDACTED_REQUEST_FIELDS = frozenset((
+    'accountId',
+    'apiToken',
+    'cardCVV',
+    'cardExpiry',
+    'cardF4L4',
+    'cardHolderName',
+    'cardMag',
+    'cardMagEnc',
+    'cardNumber',
+    'cardToken',
+))
+
+# Response fields and the redaction setting that removes them
+REDACTED_RESPONSE_FIELDS = (
+    ('cardHolderName', 'redact_cc_name'),
+    ('cardNumber', 'redact_cc_number'),
+    ('expiryDate', 'redact_cc_expiry'),
+    ('cardType', 'redact_cc_type'),
+    ('cardToken', 'redact_token'),
+)
+
+def redact_request(post_data):
+    """Returns the request data without card details or credentials."""
+    return {
+        field: value for field, value in (post_data or {}).items()
+        if field not in REDACTED_REQUEST_FIELDS
+    }
+
+def redact_response(text):
+    """Returns the response XML without the redacted card details."""
+    redact_all = SETTINGS['redact_all']
+
+    for field_name, setting in REDACTED_RESPONSE_FIELDS:
+        if redact_all or (redact_all is None and SETTINGS[setting]):
+            text = re.sub(
+                r'\s*<{0}>.*?</{0}>|\s*<{0}\s*/>'.format(field_name),
+                '',
+                text,
+                flags=re.DOTALL,
+            )
+
+    return text
+
+def request_key(post_data):
+    """Returns the key used to match a request to a recorded response.
+
+        The key ignores the redacted fields, so a replayed request only
+        needs to match the recorded one on the non-sensitive details
+        (e.g. the transaction type, amount, and customer code). The
+        API URL is also ignored, so cassettes can be replayed against
+        any configured URL.
+    """
+    redacted = json.dumps(redact_request(post_data), sort_keys=True)
+
+    return hashlib.sha1(redacted.encode('utf-8')).hexdigest()
+
+class ReplayResponse():
+    """A recorded response to a Helcim API request.
+
+        Provides the ``status_code`` and ``text`` attributes used from
+        a ``requests`` response.
+    """
+    __slots__ = ('status_code', 'text')
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+class RequestsTransport():
+    """Sends requests to the Helcim API (the ``live`` mode)."""
+    def post(self, url, post_data): # pylint: disable=no-self-use
+        """Makes the POST request and returns the response."""
+        return requests.post(url, data=post_data)
+
+class RecordingTransport():
+    """Sends requests to the Helcim API and records them to a cassette.
+
+        Parameters:
+            path (str): The path to the cassette (appended to).
+            transport (obj, optional): The transport that sends the
+                requests (defaults to ``RequestsTransport``).
+    """
+    def __init__(self, path, transport=None):
+        self.path = path
+        self.transport = transport or RequestsTransport()
+        self._lock = threading.Lock()
+
+    def post(self, url, post_data):
+        """Makes the POST request and records the response."""
+        start = perf_counter()
+        response = self.transport.post(url, post_data)
+        latency = perf_counter() - start
+
+        line = json.dumps(
+            {
+                'key': request_key(post_data),
+                'request': redact_request(post_data),
+                'status_code': response.status_code,
+                'text': redact_response(response.text),
+                'latency': round(latency, 6),
+            },
+            separators=(',', ':'),
+        )
+
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as cassette:
+                cassette.write(line + '\n')
+
+        return response
+
+class ReplayTransport():
+    """Serves recorded responses from a cassette.
+
+        The cassette is memory-mapped and indexed by request key when
+        the transport is created; each response is only decoded when
+        it is served. Requests with several recorded responses receive
+        them in the recorded order (repeating from the start once all
+        have been served).
+
+        Parameters:
+            path (str): The path to the cassette.
+            latency (bool): Whether to wait for the recorded latency
+                before returning a response.
+    """
+    def __init__(self, path, latency=False):
+        self.path = path
+        self.latency = latency
+        self._index = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+
+        with open(path, 'rb') as cassette:
+            # An empty file cannot be memory-mapped (nothing to replay)
+            if os.fstat(cassette.fileno()).st_size:
+                self._map = mmap.mmap(
+                    cassette.fileno(), 0, access=mmap.ACCESS_READ
+                )
+                self._build_index()
+            else:
+                self._map = None
+
+    def _build_index(self):
+        """Maps each request key to the offsets of its recorded lines."""
+        start = 0
+        size = len(self._map)
+
+        while start < size:
+            end = self._map.find(b'\n', start)
+
+            if end == -1:
+                end = size
+
+            key_start = self._map.find(b'"key":"', start, end)
+
+            if key_start != -1:
+                key_start += len(b'"key":"')
+                key = self._map[key_start:key_start + 40].decode('ascii')
+                self._index.setdefault(key, []).append((start, end))
+
+            start = end + 1
+
+    def _next_entry(self, key):
+        """Returns the next recorded entry for the request key."""
+        offsets = self._index.get(key)
+
+        if not offsets:
+            return None
+
+        with self._lock:
+            position = self._positions.get(key, 0)
+            self._positions[key] = (position + 1) % len(offsets)
+
+        start, end = offsets[position]
+
+        return json.loads(self._map[start:end].decode('utf-8'))
+
+    def post(self, url, post_data): # pylint: disable=unused-argument
+        """Returns the recorded response for the request."""
+        entry = self._next_entry(request_key(post_data))
+
+        if entry is None:
+            raise helcim_exceptions.ProcessingError(
+                'No recorded Helcim API response for this request'
+            )
+
+        if self.latency:
+            sleep(entry['latency'])
+
+        return ReplayResponse(entry['status_code'], entry['text'])
+
+    def close(self):
+        """Closes the memory-mapped cassette."""
+        if self._map is not None:
+            self._map.close()
+
+_LIVE_TRANSPORT = RequestsTransport()
+_TRANSPORTS = {}
+_TRANSPORTS_LOCK = threading.Lock()
+
+def get_transport():
+    """Returns the transport for the current transport settings.
+
+        Transports are created once per combination of settings (the
+        replay index is only built once per cassette).
+    """
+    mode = SETTINGS['transport_mode']
+
+    if mode == 'live':
+        return _LIVE_TRANSPORT
+
+    key = (
+        mode,
+        SETTINGS['transport_cassette'],
+        SETTINGS['transport_replay_latency'],
+    )
+    transport = _TRANSPORTS.get(key)
+
+    if transport is None:
+        with _TRANSPORTS_LOCK:
+            transport = _TRANSPORTS.get(key)
+
+            if transport is None:
+                if mode == 'record':
+                    transport = RecordingTransport(key[1])
+                else:
+                    transport = ReplayTransport(key[1], latency=key[2])
+
+                _TRANSPORTS[key] = transport
+
+    return transport
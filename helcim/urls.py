@@ -2,7 +2,8 @@
 # pylint: disable=line-too-long
 from django.conf.urls import url
 
-from helcim import gateway, views
+from helcim import views
+from helcim.settings import SETTINGS
 
 urlpatterns = [
     url(
@@ -15,10 +16,15 @@ urlpatterns = [
         views.TransactionDetailView.as_view(),
         name='helcim_transaction_detail'
     ),
+    url(
+        r'^helcim-js/(?P<config>[\w-]+)/$',
+        views.HelcimJSCallbackView.as_view(),
+        name='helcim_js_callback'
+    ),
 ]
 
 # Only add these views if token vault is enabled
-if gateway.SETTINGS['enable_token_vault']:
+if SETTINGS['enable_token_vault']:
     urlpatterns += [
         url(
             r'^tokens/$',
@@ -31,3 +37,13 @@ if gateway.SETTINGS['enable_token_vault']:
             name='helcim_token_delete'
         ),
     ]
+
+# Only add the metrics view if metrics are enabled
+if SETTINGS['enable_metrics']:
+    urlpatterns += [
+        url(
+            r'^metrics/$',
+            views.MetricsView.as_view(),
+            name='helcim_metrics'
+        ),
+    ]
@@ -1,11 +1,17 @@
 """Views for Helcim Commerce API transactions."""
 from django.contrib import messages
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.http import HttpResponseBadRequest, HttpResponseRedirect
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect,
+    JsonResponse
+)
 from django.urls import reverse, reverse_lazy
 from django.views import generic
 
-from helcim import exceptions, models, gateway
+from helcim import (
+    actions, archive, callbacks, exceptions as helcim_exceptions, metrics,
+    models, gateway
+)
 
 
 class TransactionListView(PermissionRequiredMixin, generic.ListView):
@@ -25,6 +31,42 @@ class TransactionDetailView(PermissionRequiredMixin, generic.DetailView):
     context_object_name = 'transaction'
     template_name = 'helcim/transaction_detail.html'
 
+    def get(self, request, *args, **kwargs):
+        """Displays the transaction and any capture or refund status."""
+        # pylint: disable=attribute-defined-outside-init
+        try:
+            self.object = self.get_object()
+        except Http404:
+            # Archived transactions can be displayed (but not modified)
+            self.object = archive.retrieve_archived_transaction(
+                self.kwargs[self.pk_url_kwarg]
+            )
+
+            if self.object is None:
+                raise
+
+            return self.render_to_response(
+                self.get_context_data(object=self.object, archived=True)
+            )
+
+        status = actions.get_status(self.object.pk)
+
+        # Display the result of a finished asynchronous action once
+        if status and status['status'] != actions.PENDING:
+            if status['status'] == actions.SUCCEEDED:
+                messages.success(request, status['message'])
+            else:
+                messages.error(request, status['message'])
+
+            actions.clear_status(self.object.pk)
+            status = None
+
+        context = self.get_context_data(
+            object=self.object, action_status=status
+        )
+
+        return self.render_to_response(context)
+
     def get_context_data(self, **kwargs):
         context = super(TransactionDetailView, self).get_context_data(**kwargs)
 
@@ -36,89 +78,96 @@ class TransactionDetailView(PermissionRequiredMixin, generic.DetailView):
         return context
 
     def post(self, request, *args, **kwargs): # pylint: disable=unused-argument
-        """Handles any capture and refund requests."""
+        """Handles any capture and refund requests.
+
+            The transaction is retrieved once per request. The Helcim
+            API is not called inside a database transaction, so a
+            processed refund or capture is never rolled back.
+        """
+        # pylint: disable=attribute-defined-outside-init
         # Determines which action was submitted
         action = request.POST.get('action', None)
 
-        if action == 'refund':
-            if gateway.SETTINGS['enable_transaction_refund']:
-                return self.refund()
-
-            transaction = self.get_object()
-            messages.error(self.request, 'Transactions cannot be refunded')
+        if action not in ('refund', 'capture'):
+            # Action not found - return bad request
+            return HttpResponseBadRequest('Unrecognized transaction action')
 
-            return HttpResponseRedirect(
-                reverse(
-                    'helcim_transaction_detail',
-                    kwargs={'transaction_id': transaction.id}
-                )
-            )
+        if not gateway.SETTINGS['enable_transaction_{}'.format(action)]:
+            self.object = self.get_object()
 
-        if action == 'capture':
-            if gateway.SETTINGS['enable_transaction_capture']:
-                return self.capture()
+            if action == 'refund':
+                messages.error(self.request, 'Transactions cannot be refunded')
+            else:
+                messages.error(self.request, 'Transactions cannot be captured')
 
-            transaction = self.get_object()
-            messages.error(self.request, 'Transactions cannot be captured')
+            return self.redirect_to_detail()
 
-            return HttpResponseRedirect(
-                reverse(
-                    'helcim_transaction_detail',
-                    kwargs={'transaction_id': transaction.id}
-                )
-            )
+        self.object = self.get_object()
 
-        # Action not found - return bad request
-        return HttpResponseBadRequest('Unrecognized transaction action')
+        if gateway.SETTINGS['async_transaction_actions']:
+            return self.submit_action(action)
 
-    def refund(self):
-        """Processes a refund transaction."""
-        transaction = self.get_object()
-
-        refund = gateway.Refund({
-            'transaction_type': 'r',
-            'amount': transaction.amount,
-            'token': transaction.token,
-            'token_f4l4': transaction.token_f4l4,
-            'customer_code': transaction.customer_code,
-        })
+        if action == 'refund':
+            return self.refund()
 
-        try:
-            refund.process()
-        except exceptions.RefundError:
-            messages.error(self.request, 'Unable to refund transaction')
-        else:
-            messages.success(self.request, 'Transaction refunded')
+        return self.capture()
 
+    def redirect_to_detail(self):
+        """Redirects to the detail page of the transaction."""
         return HttpResponseRedirect(
             reverse(
                 'helcim_transaction_detail',
-                kwargs={'transaction_id': transaction.id}
+                kwargs={'transaction_id': self.object.id}
             )
         )
 
-    def capture(self):
-        """Processes a capture transaction."""
-        transaction = self.get_object()
+    def process_action(self, action):
+        """Processes an action during the request."""
+        if not actions.start(self.object.pk, action):
+            messages.error(
+                self.request,
+                'An action is already being processed for this transaction'
+            )
 
-        capture = gateway.Capture({
-            'transaction_type': 'c',
-            'transaction_id': transaction.transaction_id,
-        })
+            return self.redirect_to_detail()
 
         try:
-            capture.process()
-        except exceptions.PaymentError:
-            messages.error(self.request, 'Unable to capture transaction')
+            result = actions.process(
+                self.object, action, django_user=self.request.user
+            )
+        finally:
+            actions.finish(self.object.pk)
+
+        if result['status'] == actions.SUCCEEDED:
+            messages.success(self.request, result['message'])
         else:
-            messages.success(self.request, 'Transaction captured')
+            messages.error(self.request, result['message'])
 
-        return HttpResponseRedirect(
-            reverse(
-                'helcim_transaction_detail',
-                kwargs={'transaction_id': transaction.id}
+        return self.redirect_to_detail()
+
+    def submit_action(self, action):
+        """Submits an action to the worker pool."""
+        if actions.submit(
+                self.object.pk, action, django_user=self.request.user
+        ):
+            messages.info(
+                self.request, 'Transaction {} submitted'.format(action)
+            )
+        else:
+            messages.error(
+                self.request,
+                'An action is already being processed for this transaction'
             )
-        )
+
+        return self.redirect_to_detail()
+
+    def refund(self):
+        """Processes a refund transaction."""
+        return self.process_action('refund')
+
+    def capture(self):
+        """Processes a capture transaction."""
+        return self.process_action('capture')
 
 class TokenListView(PermissionRequiredMixin, generic.ListView):
     """List of all transactions submitted made by django-helcim."""
@@ -143,3 +192,55 @@ class TokenDeleteView(PermissionRequiredMixin, generic.DeleteView):
         """Override delete to allow success message to be added."""
         messages.success(self.request, self.success_message)
         return super(TokenDeleteView, self).delete(request, *args, **kwargs)
+
+class MetricsView(generic.View):
+    """Exposes django-helcim metrics in Prometheus text format.
+
+        The view does not require authentication (to allow scraping);
+        access should be restricted by your web server or network.
+    """
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def get(self, request, *args, **kwargs): # pylint: disable=unused-argument
+        """Returns the metrics of all django-helcim processes."""
+        return HttpResponse(
+            metrics.REGISTRY.expose(), content_type=self.content_type
+        )
+
+class HelcimJSCallbackView(generic.View):
+    """Records the Helcim.js response of a payment form.
+
+        The form is submitted by Helcim.js to this view with the
+        response fields. The Helcim.js configuration is selected by
+        the ``config`` URL argument and must include its ``secret``.
+        A resubmitted response is not recorded again.
+
+        Redirects to ``success_url`` (if set); otherwise returns the
+        status and Helcim transaction ID as JSON.
+    """
+    success_url = None
+
+    def post(self, request, *args, **kwargs): # pylint: disable=unused-argument
+        """Verifies and records the Helcim.js response."""
+        config = gateway.SETTINGS['helcim_js'].get(kwargs['config'])
+
+        if config is None:
+            raise Http404('Helcim.js configuration not found')
+
+        try:
+            status, transaction_id = callbacks.record(
+                config,
+                request.POST,
+                save_token=bool(request.POST.get('save_token')),
+                django_user=request.user,
+            )
+        except helcim_exceptions.HelcimError as error:
+            return HttpResponseBadRequest(str(error))
+
+        if self.success_url:
+            return HttpResponseRedirect(self.success_url)
+
+        return JsonResponse({
+            'status': status,
+            'transaction_id': transaction_id,
+        })
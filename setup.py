@@ -17,7 +17,7 @@ setup(
     author_email='studybuffalo@gmail.com',
     keywords='Django, Helcim, Oscar, Payment',
     platforms=['linux', 'windows'],
-    packages=find_packages(exclude=['sandbox*', 'tests*']),
+    packages=find_packages(exclude=['benchmarks*', 'sandbox*', 'tests*']),
     package_data={
         'helcim': [
             'templates/helcim/*.html',
@@ -1,5 +1,7 @@
 """Tests for the gateway module."""
 # pylint: disable=missing-docstring, protected-access
+from itertools import combinations
+
 from helcim import gateway
 
 
@@ -238,3 +240,117 @@ def test_determine_card_details_mag_encrypted_priority():
 
     assert len(transaction.cleaned) == 2
     assert 'mag_enc' in transaction.cleaned
+
+class MockToken():
+    token = 'abcdefghijklmnopqrstuvw'
+    token_f4l4 = '11119999'
+    customer_code = 'CST1000'
+    django_user = 'user'
+
+def test_token_instance_request_fields():
+    transaction = gateway.BaseCardTransaction(
+        api_details=API_DETAILS, token_instance=MockToken(), amount=10,
+        save_token=True,
+    )
+    transaction.validate_fields()
+    transaction.determine_card_details()
+    request_data = transaction.process_request_fields('purchase')
+
+    assert transaction.save_token is False
+    assert transaction.django_user == 'user'
+    assert request_data == {
+        'accountId': '12345678',
+        'apiToken': 'abcdefg',
+        'terminalId': '98765432',
+        'amount': '10',
+        'cardToken': 'abcdefghijklmnopqrstuvw',
+        'cardF4L4': '11119999',
+        'customerCode': 'CST1000',
+        'transactionType': 'purchase',
+    }
+
+def test_token_instance_with_payment_details():
+    transaction = gateway.BaseCardTransaction(
+        api_details=API_DETAILS, token_instance=MockToken(),
+        cc_number='4242424242424242',
+    )
+    transaction.validate_fields()
+
+    try:
+        transaction.determine_card_details()
+    except ValueError:
+        assert True
+    else:
+        assert False
+
+def legacy_determine_card_details(cleaned):
+    """The list-based payment method resolution (before the table)."""
+    payment_fields = [
+        'token', 'customer_code', 'token_f4l4', 'token_f4l4_skip',
+        'cc_number', 'cc_expiry', 'cc_name', 'cc_cvv', 'cc_address',
+        'cc_postal_code', 'mag_enc', 'mag_enc_serial_number', 'mag'
+    ]
+
+    if 'token' in cleaned and 'customer_code' in cleaned:
+        if cleaned.get('token_f4l4_skip', False):
+            payment_fields.remove('token')
+            payment_fields.remove('customer_code')
+            payment_fields.remove('token_f4l4_skip')
+
+        if 'token_f4l4' in cleaned:
+            payment_fields.remove('token')
+            payment_fields.remove('customer_code')
+            payment_fields.remove('token_f4l4')
+    elif 'customer_code' in cleaned:
+        payment_fields.remove('customer_code')
+    elif 'cc_number' in cleaned and 'cc_expiry' in cleaned:
+        payment_fields.remove('cc_number')
+        payment_fields.remove('cc_expiry')
+
+        for field in ('cc_name', 'cc_cvv', 'cc_address', 'cc_postal_code'):
+            if field in cleaned:
+                payment_fields.remove(field)
+    elif 'mag_enc' in cleaned and 'mag_enc_serial_number' in cleaned:
+        payment_fields.remove('mag_enc')
+        payment_fields.remove('mag_enc_serial_number')
+    elif 'mag' in cleaned:
+        payment_fields.remove('mag')
+
+    if len(payment_fields) == 13:
+        raise ValueError('No valid payment details provided.')
+
+    for field in payment_fields:
+        cleaned.pop(field, None)
+
+    return cleaned
+
+def _resolve(resolver, cleaned):
+    try:
+        return resolver(dict(cleaned))
+    except ValueError:
+        return ValueError
+
+def test_determine_card_details_matches_legacy_resolution():
+    fields = sorted(gateway.PAYMENT_FIELDS)
+    transaction = gateway.BaseCardTransaction(api_details=API_DETAILS)
+
+    def determine_card_details(cleaned):
+        transaction.cleaned = cleaned
+        transaction.determine_card_details()
+
+        return transaction.cleaned
+
+    for size in range(len(fields) + 1):
+        for present in combinations(fields, size):
+            for skip in (True, False):
+                cleaned = {field: 'a' for field in present}
+                cleaned['amount'] = 1
+
+                if 'token_f4l4_skip' in cleaned:
+                    cleaned['token_f4l4_skip'] = skip
+                elif not skip:
+                    continue
+
+                assert _resolve(determine_card_details, cleaned) == (
+                    _resolve(legacy_determine_card_details, cleaned)
+                ), cleaned
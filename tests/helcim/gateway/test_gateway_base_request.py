@@ -1,10 +1,14 @@
 """Tests for the gateway module."""
 # pylint: disable=missing-docstring, protected-access, too-few-public-methods
+import copy
+import re
+import tracemalloc
 from unittest.mock import patch
 
 import requests
+import xmltodict
 
-from helcim import exceptions as helcim_exceptions, gateway
+from helcim import conversions, exceptions as helcim_exceptions, gateway
 
 
 class MockPostResponse():
@@ -81,7 +85,205 @@ def test_post_returns_dictionary():
     base = gateway.BaseRequest(api_details=API_DETAILS)
     base.post()
 
-    assert isinstance(base.response, dict)
+    assert isinstance(base.response, conversions.HelcimResponse)
+    assert base.response['transaction_id'] == 1111111
+
+class MockPostPreparedResponse(MockPostResponse):
+    def __init__(self, url, data):
+        super().__init__(url, data)
+        self.request = requests.Request('POST', url, data=data).prepare()
+
+@patch('helcim.gateway.requests.post', MockPostPreparedResponse)
+def test_post_reuses_prepared_request_body():
+    base = gateway.BaseRequest(api_details=API_DETAILS)
+    base.post({'accountId': '12345678', 'cardHolderName': 'Test Person'})
+
+    assert base.response['raw_request'] == (
+        'accountId=12345678&cardHolderName=Test+Person'
+    )
+
+@patch('helcim.gateway.requests.post', MockPostResponse)
+def test_post_creates_raw_request_without_prepared_body():
+    base = gateway.BaseRequest(api_details=API_DETAILS)
+    base.post({'accountId': '12345678', 'cardHolderName': 'Test Person'})
+
+    # The same format as the body encoded by requests
+    assert base.response['raw_request'] == (
+        'accountId=12345678&cardHolderName=Test+Person'
+    )
+
+def test_response_pipeline_reuses_values():
+    post_data = {
+        'accountId': '12345678',
+        'apiToken': 'abcdefg',
+        'terminalId': '98765432',
+        'transactionType': 'purchase',
+        'amount': '100.00',
+        'cardHolderName': 'Test Person',
+        'cardNumber': '5454545454545454',
+        'cardExpiry': '0125',
+        'cardCVV': '100',
+        'customerCode': 'CST1000',
+    }
+    response = MockPostPreparedResponse(API_DETAILS['url'], post_data)
+    dict_response = xmltodict.parse(response.text)['message']
+    request = gateway.BaseRequest(api_details=API_DETAILS)
+
+    request.response = conversions.process_api_response(
+        dict_response, response.request.body, response.text
+    )
+    request.redact_data()
+
+    # The encoded body is saved as is (not encoded again)
+    assert request.response['raw_request'] is response.request.body
+
+    # The redacted response shares the values that are not redacted
+    for field in ('transaction_id', 'amount', 'customer_code'):
+        assert request.redacted_response[field] is request.response[field]
+
+    assert request.redacted_response['raw_request'] == (
+        'accountId=REDACTED&apiToken=REDACTED&terminalId=REDACTED'
+        '&transactionType=purchase&amount=100.00'
+        '&cardHolderName=REDACTED&cardNumber=REDACTED'
+        '&cardExpiry=REDACTED&cardCVV=REDACTED&customerCode=CST1000'
+    )
+
+def _legacy_patterns(request):
+    """Compiles the per-field redaction patterns used before."""
+    fields = request._identify_redact_fields()
+    api_names = ['accountId', 'apiToken', 'terminalId'] + [
+        field['api']
+        for redact_field in fields.values() if redact_field['redact']
+        for field in redact_field['fields']
+    ]
+
+    # The replacements are functions (rather than templates), so the
+    # template cache of the re module is not counted
+    return [
+        (
+            re.compile(r'({}=.*?)(&|$)'.format(api_name)),
+            lambda match, api_name=api_name: '{}=REDACTED{}'.format(
+                api_name, match.group(2)
+            ),
+            re.compile(r'<{0}>.*</{0}>'.format(api_name)),
+            lambda match, api_name=api_name: '<{0}>REDACTED</{0}>'.format(
+                api_name
+            ),
+        )
+        for api_name in api_names
+    ]
+
+def _legacy_pipeline(dict_response, post_data, raw_response, patterns):
+    """Processes and redacts a response as before (for comparison)."""
+    processed = {
+        'transaction_success': bool(int(dict_response['response'])),
+        'response_message': str(dict_response['responseMessage']),
+        'notice': str(dict_response['notice']),
+    }
+    converted_fields = conversions.convert_helcim_response_fields(
+        dict_response['transaction'], conversions.FROM_API_FIELDS
+    )
+    processed = {**processed, **converted_fields}
+    processed['token_f4l4'] = conversions.create_f4l4(
+        processed.get('cc_number', None)
+    )
+    processed['raw_request'] = '&'.join(
+        '{}={}'.format(key, item) for key, item in post_data.items()
+    )
+    processed['raw_response'] = raw_response
+
+    redacted = copy.deepcopy(processed)
+
+    for request_pattern, request_repl, response_pattern, response_repl in (
+            patterns
+    ):
+        redacted['raw_request'] = request_pattern.sub(
+            request_repl, redacted['raw_request']
+        )
+        redacted['raw_response'] = response_pattern.sub(
+            response_repl, redacted['raw_response']
+        )
+
+    return processed, redacted
+
+# The number of transactions processed when counting allocations
+TRANSACTIONS = 10
+
+def _retained(function):
+    """Returns the blocks and bytes allocated by the function and kept
+        alive, per transaction.
+    """
+    tracemalloc.start(25)
+
+    try:
+        before = tracemalloc.take_snapshot()
+        results = [function(index) for index in range(TRANSACTIONS)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    # Only counts the allocations made (directly or not) by this test
+    filters = [
+        tracemalloc.Filter(True, __file__, all_frames=True),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ]
+    statistics = after.filter_traces(filters).compare_to(
+        before.filter_traces(filters), 'filename'
+    )
+
+    assert all(results)
+
+    return (
+        sum(statistic.count_diff for statistic in statistics) / TRANSACTIONS,
+        sum(statistic.size_diff for statistic in statistics) / TRANSACTIONS,
+    )
+
+def test_response_pipeline_allocations():
+    post_data = {
+        'accountId': '12345678',
+        'apiToken': 'abcdefg',
+        'terminalId': '98765432',
+        'transactionType': 'purchase',
+        'amount': '100.00',
+        'cardHolderName': 'Test Person',
+        'cardNumber': '5454545454545454',
+        'cardExpiry': '0125',
+        'cardCVV': '100',
+        'customerCode': 'CST1000',
+    }
+    response = MockPostPreparedResponse(API_DETAILS['url'], post_data)
+    dict_response = xmltodict.parse(response.text)['message']
+    base_requests = [
+        gateway.BaseRequest(api_details=API_DETAILS)
+        for _ in range(TRANSACTIONS)
+    ]
+    patterns = _legacy_patterns(base_requests[0])
+
+    def current(index):
+        request = base_requests[index]
+        request.response = conversions.process_api_response(
+            dict_response, response.request.body, response.text
+        )
+        request.redact_data()
+
+        return request.response, request.redacted_response
+
+    def legacy(index): # pylint: disable=unused-argument
+        return _legacy_pipeline(
+            dict_response, post_data, response.text, patterns
+        )
+
+    # Warms up any cached patterns and settings of both pipelines
+    current(0)
+    legacy(0)
+    base_requests[0].response = base_requests[0].redacted_response = None
+
+    blocks, allocated = _retained(current)
+    legacy_blocks, legacy_allocated = _retained(legacy)
+
+    # About 13 blocks and 2450 bytes, against 14 blocks and 3700 bytes
+    assert blocks < legacy_blocks
+    assert allocated < legacy_allocated * 0.75
 
 @patch('helcim.gateway.requests.post', mock_post_api_error)
 def test_post_api_connection_error():
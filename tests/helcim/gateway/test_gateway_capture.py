@@ -1,9 +1,12 @@
 """Tests for the gateway module."""
 # pylint: disable=missing-docstring, protected-access
 
+from decimal import Decimal
 from unittest.mock import patch
 
-from helcim import exceptions as helcim_exceptions, gateway
+import pytest
+
+from helcim import exceptions as helcim_exceptions, gateway, models
 
 
 class MockPostResponse():
@@ -48,6 +51,7 @@ API_DETAILS = {
     'terminal_id': '98765432',
 }
 
+@pytest.mark.django_db
 @patch('helcim.gateway.requests.post', MockPostResponse)
 @patch(
     'helcim.gateway.models.HelcimTransaction.objects.create',
@@ -93,3 +97,55 @@ def test_validate_preauth_transaction_valid():
         assert False
     else:
         assert True
+
+def create_preauth(**kwargs):
+    details = {
+        'transaction_success': True,
+        'date_response': '2018-01-01 01:01:01',
+        'transaction_type': 'p',
+        'transaction_id': 1,
+        'amount': Decimal('100.00'),
+    }
+    details.update(kwargs)
+
+    return models.HelcimTransaction.objects.create(**details)
+
+@pytest.mark.django_db
+@patch('helcim.gateway.requests.post', MockPostResponse)
+def test_capture_processing_links_preauth():
+    preauth = create_preauth()
+
+    capture = gateway.Capture(api_details=API_DETAILS, transaction_id=1)
+    response = capture.process()
+
+    preauth.refresh_from_db()
+    assert response.original_transaction == preauth
+    assert preauth.captured_amount == Decimal('100.00')
+    assert preauth.can_be_captured is False
+    assert list(preauth.linked_transactions.all()) == [response]
+
+@pytest.mark.django_db
+@patch('helcim.gateway.requests.post', MockPostResponse)
+def test_capture_processing_provided_preauth():
+    preauth = create_preauth(transaction_id=2)
+
+    capture = gateway.Capture(
+        api_details=API_DETAILS, transaction_id=2,
+        original_transaction=preauth,
+    )
+    response = capture.process()
+
+    assert response.original_transaction == preauth
+    assert preauth.captured_amount == Decimal('100.00')
+
+@pytest.mark.django_db
+@patch('helcim.gateway.requests.post')
+def test_capture_processing_already_captured(mock_post):
+    create_preauth(captured_amount=Decimal('100.00'))
+
+    capture = gateway.Capture(api_details=API_DETAILS, transaction_id=1)
+
+    with pytest.raises(helcim_exceptions.PaymentError):
+        capture.process()
+
+    assert mock_post.called is False
@@ -0,0 +1,93 @@
+"""Tests for the HelcimClient of the gateway module."""
+# pylint: disable=missing-docstring, protected-access, redefined-outer-name
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from helcim import gateway
+from helcim.testing.simulator import HelcimSimulator
+
+
+CARD = {
+    'cc_name': 'Test Person',
+    'cc_number': '4242424242424242',
+    'cc_expiry': '0125',
+}
+
+@pytest.fixture
+def client():
+    simulator = HelcimSimulator().start()
+
+    yield gateway.HelcimClient({
+        'url': simulator.url,
+        'account_id': '1234567890',
+        'token': 'abcdefghijklmno1234567890',
+        'terminal_id': '98765432',
+    })
+
+    simulator.stop()
+
+@pytest.mark.django_db
+def test_client_transactions(client):
+    purchase, token = client.purchase(
+        amount=Decimal('10.00'), save_token=True, **CARD
+    )
+    preauth, _ = client.preauthorize(
+        amount=Decimal('20.00'), token=token.token,
+        token_f4l4=token.token_f4l4, customer_code=token.customer_code,
+    )
+    capture = client.capture(transaction_id=preauth.transaction_id)
+    refund, _ = client.refund(
+        original_transaction=purchase, amount=Decimal('5.00'),
+        customer_code=token.customer_code,
+    )
+    verification, _ = client.verify(customer_code=token.customer_code)
+
+    assert purchase.transaction_type == 's'
+    assert preauth.transaction_type == 'p'
+    assert capture.original_transaction == preauth
+    assert refund.original_transaction == purchase
+    assert verification.transaction_type == 'v'
+
+@pytest.mark.django_db
+def test_client_token_instance(client):
+    _, token = client.verify(save_token=True, **CARD)
+
+    purchase, saved_token = client.purchase(
+        token_instance=token, amount=Decimal('10.00')
+    )
+
+    assert saved_token is None
+    assert purchase.token == token.token
+    assert purchase.customer_code == token.customer_code
+
+@patch.dict('helcim.gateway.SETTINGS', {'account_id': '1'})
+def test_client_resolves_details_once():
+    client = gateway.HelcimClient(transport='transport')
+    request = gateway.Purchase(client=client)
+
+    assert request.api['account_id'] == '1'
+    assert request.transport == 'transport'
+    assert request.redaction_plan is client.redaction_plan
+
+    with pytest.raises(TypeError):
+        client.api['account_id'] = '2'
+
+def test_request_without_client():
+    request = gateway.Purchase(api_details={'url': 'https://a.com'})
+
+    assert request.api['url'] == 'https://a.com'
+    assert request.transport is None
+    assert request.redaction_plan is None
+
+def test_get_client_is_shared_per_settings():
+    client = gateway.get_client()
+
+    assert gateway.get_client() is client
+
+    with patch.dict('helcim.gateway.SETTINGS', {'account_id': '2'}):
+        other_client = gateway.get_client()
+
+    assert other_client is not client
+    assert other_client.api['account_id'] == '2'
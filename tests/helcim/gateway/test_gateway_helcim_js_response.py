@@ -131,3 +131,19 @@ def test__is_valid__redactions_applied():
     assert redacted_token in raw_response
     assert response.redacted_response['token'] is None
     assert response.redacted_response['token_f4l4'] is None
+
+@patch(
+    'helcim.conversions.process_helcim_js_response',
+    MagicMock(return_value={
+        'transaction_success': True, 'transaction_type': 'preauth',
+    }),
+)
+def test__transaction_type__from_response():
+    """Confirms the transaction type is taken from the response."""
+    response = HelcimJSResponse('')
+
+    assert response.transaction_type is None
+
+    response.is_valid()
+
+    assert response.transaction_type == 'preauth'
@@ -2,7 +2,10 @@
 # pylint: disable=missing-docstring, protected-access
 from unittest.mock import patch
 
-from helcim import exceptions as helcim_exceptions, gateway
+from django.db import IntegrityError
+
+from helcim import exceptions as helcim_exceptions, gateway, metrics
+from helcim.signals import stage_completed
 
 
 class MockPostResponse():
@@ -128,3 +131,74 @@ def test_process_with_save_token_disabled():
     _, token = purchase.process()
 
     assert token is None
+
+@patch('helcim.gateway.requests.post', MockPostResponse)
+@patch(
+    'helcim.gateway.models.HelcimTransaction.objects.create',
+    MockDjangoModel
+)
+@patch.dict('helcim.gateway.SETTINGS', {'enable_instrumentation': True})
+def test_purchase_processing_sends_stage_signals():
+    stages = []
+    transaction_types = set()
+
+    def receiver(sender, **kwargs): # pylint: disable=unused-argument
+        stages.append(kwargs['stage'])
+        transaction_types.add(kwargs['transaction_type'])
+
+    stage_completed.connect(receiver)
+
+    try:
+        purchase = gateway.Purchase(
+            api_details=API_DETAILS,
+            amount=100.00,
+            cc_number='1234567890123456',
+            cc_expiry='0125',
+        )
+        purchase.process()
+    finally:
+        stage_completed.disconnect(receiver)
+
+    assert stages == [
+        'validate_fields',
+        'configure_test_transaction',
+        'determine_card_details',
+        'process_request_fields',
+        'post',
+        'redact_data',
+        'save_transaction',
+        'save_token_to_vault',
+        'process',
+    ]
+    assert transaction_types == {'purchase'}
+
+@patch('helcim.gateway.requests.post', MockPostResponse)
+@patch(
+    'helcim.gateway.models.HelcimTransaction.objects.create',
+    side_effect=IntegrityError('failed'),
+)
+@patch.dict('helcim.gateway.SETTINGS', {'enable_metrics': True})
+def test_purchase_processing_counts_database_error_once(mock_create):
+    errors = {
+        stage: metrics.DATABASE_ERRORS.value(stage)
+        for stage in ('save_transaction', 'process')
+    }
+    purchase = gateway.Purchase(
+        api_details=API_DETAILS,
+        amount=100.00,
+        cc_number='1234567890123456',
+        cc_expiry='0125',
+    )
+
+    try:
+        purchase.process()
+    except helcim_exceptions.DjangoError:
+        pass
+    else:
+        assert False
+
+    assert mock_create.called
+    assert metrics.DATABASE_ERRORS.value('save_transaction') == (
+        errors['save_transaction'] + 1
+    )
+    assert metrics.DATABASE_ERRORS.value('process') == errors['process']
@@ -1,10 +1,13 @@
 """Tests for the gateway module."""
 # pylint: disable=missing-docstring, protected-access
 
+from decimal import Decimal
 from unittest.mock import patch
 
+import pytest
+import requests
 
-from helcim import exceptions as helcim_exceptions, gateway
+from helcim import exceptions as helcim_exceptions, gateway, models
 
 
 class MockPostResponse():
@@ -130,3 +133,147 @@ def test_process_with_save_token_disabled():
     _, token = refund.process()
 
     assert token is None
+
+def create_purchase(**kwargs):
+    details = {
+        'transaction_success': True,
+        'date_response': '2018-01-01 01:01:01',
+        'transaction_type': 's',
+        'transaction_id': 1,
+        'amount': Decimal('150.00'),
+    }
+    details.update(kwargs)
+
+    return models.HelcimTransaction.objects.create(**details)
+
+REFUND_DETAILS = {
+    'token': 'abcdefghijklmnopqrstuvw',
+    'token_f4l4': '11119999',
+    'customer_code': 'CST1000',
+}
+
+@pytest.mark.django_db
+@patch('helcim.gateway.requests.post', MockPostResponse)
+def test_refund_processing_links_original():
+    purchase = create_purchase()
+
+    refund = gateway.Refund(
+        api_details=API_DETAILS, amount=100.00,
+        original_transaction=purchase, **REFUND_DETAILS
+    )
+    response, _ = refund.process()
+
+    purchase.refresh_from_db()
+    assert response.original_transaction == purchase
+    assert purchase.refunded_amount == Decimal('100.00')
+    assert purchase.refundable_amount == Decimal('50.00')
+    assert purchase.can_be_refunded
+
+@pytest.mark.django_db
+@patch('helcim.gateway.requests.post')
+def test_refund_processing_exceeds_refundable_amount(mock_post):
+    purchase = create_purchase()
+
+    # Refunded by another request since the purchase was retrieved
+    models.HelcimTransaction.objects.filter(pk=purchase.pk).update(
+        refunded_amount=Decimal('100.00')
+    )
+
+    refund = gateway.Refund(
+        api_details=API_DETAILS, amount=100.00,
+        original_transaction=purchase, **REFUND_DETAILS
+    )
+
+    with pytest.raises(helcim_exceptions.RefundError):
+        refund.process()
+
+    assert mock_post.called is False
+
+@pytest.mark.django_db
+def test_reserve_refund_amount():
+    purchase = create_purchase()
+
+    refund = gateway.Refund(
+        api_details=API_DETAILS, amount=100.00,
+        original_transaction=purchase, **REFUND_DETAILS
+    )
+    refund.validate_fields()
+    refund.reserve_refund_amount()
+
+    # A concurrent refund sees the reserved amount
+    other_refund = gateway.Refund(
+        api_details=API_DETAILS, amount=100.00,
+        original_transaction=models.HelcimTransaction.objects.get(
+            pk=purchase.pk
+        ),
+        **REFUND_DETAILS
+    )
+    other_refund.validate_fields()
+
+    with pytest.raises(helcim_exceptions.RefundError):
+        other_refund.reserve_refund_amount()
+
+    purchase.refresh_from_db()
+    assert purchase.refunded_amount == Decimal('100.00')
+    assert refund.original_transaction.refunded_amount == Decimal('100.00')
+
+    refund.release_refund_amount()
+
+    purchase.refresh_from_db()
+    assert purchase.refunded_amount == Decimal('0.00')
+
+@pytest.mark.django_db
+@patch('helcim.gateway.requests.post')
+def test_refund_processing_without_amount(mock_post):
+    purchase = create_purchase()
+
+    refund = gateway.Refund(
+        api_details=API_DETAILS, original_transaction=purchase,
+        **REFUND_DETAILS
+    )
+
+    with pytest.raises(helcim_exceptions.RefundError):
+        refund.process()
+
+    assert mock_post.called is False
+
+@pytest.mark.django_db
+@patch('helcim.gateway.requests.post')
+def test_refund_processing_declined_releases_amount(mock_post):
+    mock_post.side_effect = MockPostResponse
+    purchase = create_purchase()
+
+    refund = gateway.Refund(
+        api_details=API_DETAILS, amount=100.00,
+        original_transaction=purchase, **REFUND_DETAILS
+    )
+
+    with patch(
+            'helcim.gateway.xmltodict.parse',
+            return_value={'message': {
+                'response': '0', 'responseMessage': 'DECLINED'
+            }},
+    ):
+        with pytest.raises(helcim_exceptions.RefundError):
+            refund.process()
+
+    purchase.refresh_from_db()
+    assert purchase.refunded_amount == Decimal('0.00')
+    assert models.HelcimTransaction.objects.count() == 1
+
+@pytest.mark.django_db
+@patch('helcim.gateway.requests.post')
+def test_refund_processing_timeout_releases_amount(mock_post):
+    mock_post.side_effect = requests.exceptions.ReadTimeout
+    purchase = create_purchase()
+
+    refund = gateway.Refund(
+        api_details=API_DETAILS, amount=100.00,
+        original_transaction=purchase, **REFUND_DETAILS
+    )
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        refund.process()
+
+    purchase.refresh_from_db()
+    assert purchase.refunded_amount == Decimal('0.00')
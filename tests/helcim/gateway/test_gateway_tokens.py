@@ -29,6 +29,17 @@ class MockHelcimTokenFilter():
         self.django_user = django_user
         self.customer_code = customer_code
 
+def test_retrieve_token():
+    """Tests that the token instance is retrieved for the customer."""
+    token = models.HelcimToken.objects.create(
+        token='a', token_f4l4='11114444', customer_code='1'
+    )
+
+    assert gateway.retrieve_token(token.id, customer_code='1') == token
+
+    with pytest.raises(helcim_exceptions.ProcessingError):
+        gateway.retrieve_token(token.id, customer_code='2')
+
 def test_retrieve_token_details_customer_code_only():
     """Tests that retrieval with customer code only works."""
     token = models.HelcimToken.objects.create(
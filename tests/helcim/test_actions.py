@@ -0,0 +1,197 @@
+"""Tests for the actions module."""
+# pylint: disable=missing-docstring, protected-access, redefined-outer-name
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from django.core.cache import cache
+
+from helcim import actions, exceptions, models
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+    yield
+
+    cache.clear()
+
+def create_transaction(transaction_type, transaction_success=True):
+    return models.HelcimTransaction.objects.create(
+        transaction_success=transaction_success,
+        date_response='2018-01-01 01:01:01',
+        transaction_type=transaction_type,
+        transaction_id='1',
+        amount='2.20',
+        token='f',
+        token_f4l4='11119999',
+        customer_code='k',
+    )
+
+def test__start__only_one_pending_action():
+    assert actions.start('1', 'refund') is True
+    assert actions.start('1', 'capture') is False
+    assert actions.start('2', 'capture') is True
+
+    assert actions.get_status('1') == {
+        'action': 'refund', 'status': 'pending', 'message': None,
+    }
+
+def test__finish__saves_result_and_allows_new_action():
+    result = {'action': 'refund', 'status': 'failed', 'message': 'a'}
+    actions.start('1', 'refund')
+    actions.finish('1', result)
+
+    assert actions.get_status('1') == result
+    assert actions.start('1', 'refund') is True
+    assert actions.get_status('1')['status'] == 'pending'
+
+def test__clear_status():
+    actions.finish('1', {'action': 'refund', 'status': 'failed'})
+    actions.clear_status('1')
+
+    assert actions.get_status('1') is None
+
+@pytest.mark.django_db
+@patch('helcim.actions.gateway.Refund')
+def test__run__refund_succeeded(mock_refund):
+    transaction = create_transaction('s')
+    actions.start(transaction.pk, 'refund')
+
+    result = actions.run(transaction.pk, 'refund')
+
+    assert result == {
+        'action': 'refund',
+        'status': 'succeeded',
+        'message': 'Transaction refunded',
+    }
+    assert actions.get_status(transaction.pk) == result
+    assert mock_refund.return_value.process.call_count == 1
+
+@pytest.mark.django_db
+@patch('helcim.actions.gateway.Capture')
+def test__run__capture_payment_error(mock_capture):
+    mock_capture.return_value.process.side_effect = exceptions.PaymentError
+    transaction = create_transaction('p')
+
+    result = actions.run(transaction.pk, 'capture')
+
+    assert result['status'] == 'failed'
+    assert result['message'] == 'Unable to capture transaction'
+    mock_capture.assert_called_once_with(
+        transaction_id=1, original_transaction=transaction, django_user=None
+    )
+
+@pytest.mark.django_db
+@patch('helcim.actions.gateway.Capture')
+def test__run__capture_claims_preauthorization(mock_capture):
+    transaction = create_transaction('p')
+
+    def capture(**kwargs):
+        # Claimed in the queue, so the sweep skips it during the request
+        assert models.HelcimOpenPreauthorization.objects.get(
+            pk=transaction.pk
+        ).capture_started is not None
+
+        return MagicMock()
+
+    mock_capture.side_effect = capture
+
+    assert actions.run(transaction.pk, 'capture')['status'] == 'succeeded'
+    assert mock_capture.call_count == 1
+
+@pytest.mark.django_db
+@patch('helcim.actions.gateway.Capture')
+def test__run__capture_in_progress(mock_capture):
+    transaction = create_transaction('p')
+    models.HelcimOpenPreauthorization.objects.update(
+        capture_started='2018-01-01 01:01:01'
+    )
+
+    result = actions.run(transaction.pk, 'capture')
+
+    assert result['message'] == (
+        'Unable to capture transaction: The capture is already in progress'
+    )
+    assert mock_capture.call_count == 0
+
+@pytest.mark.django_db
+@patch('helcim.actions.gateway.Capture')
+def test__run__capture_errors(mock_capture):
+    transaction = create_transaction('p')
+    mock_capture.return_value.process.side_effect = exceptions.PaymentError(
+        'Declined'
+    )
+
+    actions.run(transaction.pk, 'capture')
+
+    # A declined capture is released, so it can be retried
+    queued = models.HelcimOpenPreauthorization.objects.get()
+    assert queued.capture_started is None
+    assert queued.last_error == 'Declined'
+
+    mock_capture.return_value.process.side_effect = exceptions.DjangoError(
+        'Unable to save transaction record'
+    )
+
+    actions.run(transaction.pk, 'capture')
+
+    # Helcim processed the capture, so it stays in progress
+    queued.refresh_from_db()
+    assert queued.capture_started is not None
+    assert queued.attempts == 2
+
+@pytest.mark.django_db
+@patch('helcim.actions.gateway.Refund')
+def test__run__not_refundable(mock_refund):
+    transaction = create_transaction('s', transaction_success=False)
+
+    result = actions.run(transaction.pk, 'refund')
+
+    assert result['status'] == 'failed'
+    assert mock_refund.called is False
+
+@pytest.mark.django_db
+@patch('helcim.actions.gateway.Refund')
+def test__run__django_error_after_refund(mock_refund):
+    mock_refund.return_value.process.side_effect = exceptions.DjangoError(
+        'Unable to save transaction record'
+    )
+    transaction = create_transaction('s')
+    actions.start(transaction.pk, 'refund')
+
+    result = actions.run(transaction.pk, 'refund', django_user='user')
+
+    assert result['status'] == 'failed'
+    assert result['message'] == (
+        'Unable to refund transaction: Unable to save transaction record'
+    )
+    assert mock_refund.call_args[1]['django_user'] == 'user'
+
+@pytest.mark.django_db
+@patch('helcim.actions.gateway.Refund')
+def test__run__unexpected_error(mock_refund):
+    mock_refund.return_value.process.side_effect = ValueError
+    transaction = create_transaction('s')
+    actions.start(transaction.pk, 'refund')
+
+    result = actions.run(transaction.pk, 'refund')
+
+    assert result['status'] == 'failed'
+    assert actions.get_status(transaction.pk) == result
+
+@patch('helcim.actions.get_executor')
+def test__submit(mock_get_executor):
+    executor = MagicMock()
+    mock_get_executor.return_value = executor
+
+    assert actions.submit('1', 'refund', django_user='user') is True
+    assert actions.submit('1', 'refund') is False
+
+    executor.submit.assert_called_once_with(
+        actions._run_in_worker, '1', 'refund', 'user'
+    )
+
+def test__get_executor__reused():
+    assert actions.get_executor() is actions.get_executor()
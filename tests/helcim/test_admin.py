@@ -1,11 +1,17 @@
 """Test for the Django admin models."""
 from importlib import reload
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
+
+import pytest
 
 from django.contrib import admin
+from django.test import RequestFactory
 
 from helcim import admin as helcim_admin
-from helcim.admin import HelcimTransactionAdmin, HelcimTokenAdmin
+from helcim.admin import (
+    EstimatedCountPaginator, HelcimTransactionAdmin, HelcimTokenAdmin,
+    estimate_count
+)
 from helcim.models import HelcimTransaction, HelcimToken
 
 
@@ -13,7 +19,7 @@ def test_transaction_admin_fields_match_model():
     """Tests that all fields in admin are present in model."""
     # Get a list of all the model fields
     model_fields = HelcimTransaction._meta.get_fields()
-    field_names = [field.name for field in model_fields]
+    field_names = [field.name for field in model_fields if field.concrete]
 
     # Remove UUID (not included in admin interface)
     field_names.remove('id')
@@ -23,6 +29,15 @@ def test_transaction_admin_fields_match_model():
 
     assert sorted(field_names) == sorted(admin_fields)
 
+def test_transaction_admin_displays_audit_fields():
+    """Tests that the raw fields are replaced by the audit fields."""
+    fields = HelcimTransactionAdmin.fields
+
+    assert fields[:2] == ['audit_request', 'audit_response']
+    assert 'raw_request' not in fields
+    assert 'raw_response' not in fields
+    assert len(fields) == len(HelcimTransactionAdmin.MODEL_FIELDS)
+
 def test_token_admin_fields_match_model():
     """Tests that all fields in admin are present in model."""
     # Get a list of all the model fields
@@ -98,3 +113,72 @@ def test_admin_excluded_when_settings_explictly_exclude():
         assert True
     else:
         assert False
+
+@pytest.mark.django_db
+def test_estimate_count_not_available():
+    """Tests that no estimate is returned without PostgreSQL."""
+    assert estimate_count(HelcimTransaction.objects.all()) is None
+
+@patch('helcim.admin.connections')
+def test_estimate_count_postgresql(mock_connections):
+    """Tests that the PostgreSQL planner estimate is returned."""
+    connection = MagicMock(vendor='postgresql')
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.fetchone.return_value = ['[{"Plan": {"Plan Rows": 12345}}]']
+    mock_connections.__getitem__.return_value = connection
+
+    assert estimate_count(HelcimTransaction.objects.all()) == 12345
+    assert cursor.execute.call_args[0][0].startswith('EXPLAIN (FORMAT JSON)')
+
+@pytest.mark.django_db
+@patch('helcim.admin.estimate_count', return_value=5000000)
+def test_estimated_count_paginator_uses_estimate(mock_estimate):
+    """Tests that the estimate is used above the threshold."""
+    paginator = EstimatedCountPaginator(HelcimTransaction.objects.all(), 100)
+
+    assert paginator.count == 5000000
+    assert paginator.num_pages == 50000
+    assert mock_estimate.call_count == 1
+
+@pytest.mark.django_db
+@patch('helcim.admin.estimate_count', return_value=10)
+def test_estimated_count_paginator_exact_below_threshold(mock_estimate):
+    """Tests that small querysets are counted exactly."""
+    # pylint: disable=unused-argument
+    paginator = EstimatedCountPaginator(HelcimTransaction.objects.all(), 100)
+
+    assert paginator.count == 0
+
+def test_estimated_count_paginator_list():
+    """Tests that lists are counted exactly."""
+    assert EstimatedCountPaginator([1, 2, 3], 2).count == 3
+
+def test_transaction_admin_defers_raw_fields_in_changelist():
+    """Tests that the raw request and response are deferred in the list."""
+    model_admin = HelcimTransactionAdmin(HelcimTransaction, admin.site)
+    request = RequestFactory().get('/')
+    request.resolver_match = MagicMock(
+        url_name='helcim_helcimtransaction_changelist'
+    )
+
+    deferred, defer = model_admin.get_queryset(request).query.deferred_loading
+
+    assert defer is True
+    assert deferred == {'raw_request', 'raw_response'}
+
+def test_transaction_admin_loads_raw_fields_in_change_view():
+    """Tests that the raw request and response are loaded for one record."""
+    model_admin = HelcimTransactionAdmin(HelcimTransaction, admin.site)
+    request = RequestFactory().get('/')
+    request.resolver_match = MagicMock(
+        url_name='helcim_helcimtransaction_change'
+    )
+
+    deferred, _ = model_admin.get_queryset(request).query.deferred_loading
+
+    assert not deferred
+
+def test_admin_list_select_related_users():
+    """Tests that the users are retrieved with the changelist query."""
+    assert HelcimTransactionAdmin.list_select_related == ['django_user']
+    assert HelcimTokenAdmin.list_select_related == ['django_user']
@@ -0,0 +1,274 @@
+"""Tests for the archive module and archive management command."""
+# pylint: disable=missing-docstring, protected-access
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+from django.utils import timezone
+
+from helcim import archive, models
+
+
+def create_transaction(days_old, **kwargs):
+    details = {
+        'raw_request': 'a',
+        'raw_response': 'b',
+        'transaction_success': True,
+        'date_response': timezone.now() - timedelta(days=days_old),
+        'transaction_type': 's',
+        'transaction_id': 1,
+        'amount': Decimal('2.20'),
+        'cc_expiry': '2028-01-31',
+        'customer_code': 'k',
+    }
+    details.update(kwargs)
+
+    return models.HelcimTransaction.objects.create(**details)
+
+@pytest.mark.django_db
+def test__serialize_transaction__round_trip(user):
+    transaction = create_transaction(1, django_user=user)
+    transaction.refresh_from_db()
+
+    restored = archive.deserialize_transaction(
+        archive.serialize_transaction(transaction)
+    )
+
+    assert restored.id == transaction.id
+    assert restored.date_response == transaction.date_response
+    assert restored.amount == Decimal('2.20')
+    assert restored.cc_expiry == transaction.cc_expiry
+    assert restored.django_user_id == user.id
+    assert restored.cc_name is None
+
+@pytest.mark.django_db
+def test__archive_transactions__to_table():
+    old_1 = create_transaction(400)
+    old_2 = create_transaction(500)
+    recent = create_transaction(10)
+
+    archived = archive.archive_transactions(timedelta(days=365), batch_size=1)
+
+    assert archived == 2
+    assert list(models.HelcimTransaction.objects.all()) == [recent]
+
+    stubs = models.HelcimTransactionArchive.objects.all()
+    assert {stub.id for stub in stubs} == {old_1.id, old_2.id}
+    assert all(stub.data and stub.archive_file is None for stub in stubs)
+
+@pytest.mark.django_db
+@patch('helcim.archive.reports.clear_cached_summaries')
+def test__archive_transactions__clears_cached_summaries(mock_clear):
+    old_1 = create_transaction(400)
+    old_2 = create_transaction(500)
+    create_transaction(10)
+
+    archive.archive_transactions(timedelta(days=365))
+
+    mock_clear.assert_called_once_with(
+        archive._local_date(old_2.date_response),
+        archive._local_date(old_1.date_response),
+    )
+
+@pytest.mark.django_db
+def test__archive_transactions__batches_queries(django_assert_num_queries):
+    create_transaction(400)
+    create_transaction(500)
+    create_transaction(600)
+
+    # Each batch: select the kept and batch transactions, prefetch
+    # payloads, select linked transactions, insert, collect and delete
+    # transactions, payloads, and open pre-authorizations, and unlink
+    # their captures and refunds (plus the final selects)
+    with django_assert_num_queries(28) as context:
+        archive.archive_transactions(timedelta(days=365), batch_size=2)
+
+    queries = [
+        query['sql'] for query in context.captured_queries
+        if 'SAVEPOINT' not in query['sql']
+    ]
+    assert len(queries) == 22
+
+@pytest.mark.django_db
+def test__archive_transactions__to_file(tmpdir):
+    path = str(tmpdir.join('archive.jsonl.gz'))
+    old = create_transaction(400)
+
+    assert archive.archive_transactions(timedelta(days=365), path=path) == 1
+
+    stub = models.HelcimTransactionArchive.objects.get(id=old.id)
+    assert stub.data is None
+    assert stub.archive_file == path
+
+    restored = archive.retrieve_archived_transaction(old.id)
+    assert restored.id == old.id
+    assert restored.raw_request == 'a'
+
+@pytest.mark.django_db
+def test__retrieve_archived_transaction__from_table():
+    old = create_transaction(400)
+    archive.archive_transactions(timedelta(days=365))
+
+    restored = archive.retrieve_archived_transaction(str(old.id))
+
+    assert restored.id == old.id
+    assert restored.transaction_type == 's'
+
+@pytest.mark.django_db
+def test__retrieve_archived_transaction__missing(tmpdir):
+    old = create_transaction(400)
+    archive.archive_transactions(
+        timedelta(days=365), path=str(tmpdir.join('archive.jsonl.gz'))
+    )
+    tmpdir.join('archive.jsonl.gz').remove()
+
+    assert archive.retrieve_archived_transaction(old.id) is None
+    assert archive.retrieve_archived_transaction(
+        'a7d1c3b5-0e2f-4a6b-8c9d-0123456789ab'
+    ) is None
+
+@pytest.mark.django_db
+def test__archive_command():
+    create_transaction(40)
+    create_transaction(10)
+    output = StringIO()
+
+    call_command('helcim_archive_transactions', '--days=30', stdout=output)
+
+    assert output.getvalue() == 'Archived 1 transaction(s).\n'
+    assert models.HelcimTransaction.objects.count() == 1
+
+@patch('helcim.management.commands.helcim_archive_transactions.'
+       'archive_transactions', return_value=0)
+def test__archive_command__options(mock_archive):
+    call_command(
+        'helcim_archive_transactions', '--days=7', '--batch-size=50',
+        '--file=archive.jsonl.gz', stdout=StringIO(),
+    )
+
+    mock_archive.assert_called_once_with(
+        timedelta(days=7), batch_size=50, path='archive.jsonl.gz'
+    )
+
+def test__archive_command__invalid_batch_size():
+    with pytest.raises(CommandError):
+        call_command('helcim_archive_transactions', '--batch-size=0')
+
+@pytest.mark.django_db
+def test__transaction_detail_view__archived(admin_client):
+    old = create_transaction(400)
+    archive.archive_transactions(timedelta(days=365))
+    url = reverse(
+        'helcim_transaction_detail', kwargs={'transaction_id': old.id}
+    )
+
+    response = admin_client.get(url)
+
+    assert response.status_code == 200
+    assert response.context['archived'] is True
+    assert response.context['transaction'].id == old.id
+    assert b'This transaction has been archived.' in response.content
+    assert b'name="action"' not in response.content
+
+@pytest.mark.django_db
+def test__transaction_detail_view__not_found(admin_client):
+    url = reverse(
+        'helcim_transaction_detail',
+        kwargs={'transaction_id': 'a7d1c3b5-0e2f-4a6b-8c9d-0123456789ab'},
+    )
+
+    assert admin_client.get(url).status_code == 404
+
+def create_chain(days_old, capture_days_old, refund_days_old=None):
+    """Creates a pre-authorization, its capture, and (optionally) refund."""
+    preauth = create_transaction(days_old, transaction_type='p')
+    capture = create_transaction(
+        capture_days_old, transaction_type='c', original_transaction=preauth
+    )
+    refund = None
+
+    if refund_days_old is not None:
+        refund = create_transaction(
+            refund_days_old, transaction_type='r',
+            original_transaction=capture,
+        )
+
+    return preauth, capture, refund
+
+@pytest.mark.django_db
+def test__archive_transactions__archives_linked_chains():
+    preauth, capture, refund = create_chain(500, 450, 400)
+
+    # The chain is archived together (even across batches)
+    assert archive.archive_transactions(
+        timedelta(days=365), batch_size=1
+    ) == 3
+    assert models.HelcimTransaction.objects.count() == 0
+
+    restored = archive.retrieve_archived_transaction(refund.id)
+    assert restored.original_transaction_id == capture.id
+    restored = archive.retrieve_archived_transaction(capture.id)
+    assert restored.original_transaction_id == preauth.id
+
+@pytest.mark.django_db
+def test__archive_transactions__keeps_chains_with_recent_transactions():
+    preauth, capture, refund = create_chain(500, 450, 10)
+    other = create_transaction(400)
+
+    assert archive.archive_transactions(timedelta(days=365)) == 1
+
+    assert set(models.HelcimTransaction.objects.all()) == {
+        preauth, capture, refund
+    }
+    refund.refresh_from_db()
+    capture.refresh_from_db()
+    assert refund.original_transaction == capture
+    assert capture.original_transaction == preauth
+    assert archive.retrieve_archived_transaction(other.id).id == other.id
+
+@pytest.mark.django_db
+def test__archive_transactions__keeps_open_preauthorizations():
+    # Saving the pre-authorization adds it to the open queue
+    preauth = create_transaction(400, transaction_type='p')
+    assert preauth.open_preauthorization
+
+    assert archive.archive_transactions(timedelta(days=365)) == 0
+    assert models.HelcimOpenPreauthorization.objects.count() == 1
+
+@pytest.mark.django_db
+def test__retrieve_archived_transaction__reads_its_batch(tmpdir):
+    path = str(tmpdir.join('archive.jsonl.gz'))
+    first = create_transaction(500)
+    second = create_transaction(400)
+    archive.archive_transactions(
+        timedelta(days=365), batch_size=1, path=path
+    )
+
+    offsets = dict(
+        models.HelcimTransactionArchive.objects.values_list(
+            'id', 'archive_offset'
+        )
+    )
+    assert offsets[first.id] == 0
+    assert offsets[second.id] > 0
+
+    with patch(
+            'helcim.archive._read_archive_file',
+            wraps=archive._read_archive_file,
+    ) as mock_read:
+        assert archive.retrieve_archived_transaction(second.id).id == (
+            second.id
+        )
+
+    mock_read.assert_called_once_with(path, second.id, offsets[second.id])
+
+    # Reading from the batch only decompresses its member
+    assert archive._read_archive_file(
+        path, first.id, offsets[second.id]
+    ) is None
@@ -0,0 +1,206 @@
+"""Tests for the compressed storage of the raw request and response."""
+# pylint: disable=missing-docstring
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+
+from django.contrib import admin
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from helcim import archive, audit, gateway, models
+from helcim.admin import HelcimTransactionAdmin
+from helcim.mixins import ResponseMixin
+
+
+LONG_RESPONSE = '<message>{}</message>'.format('<a>1</a>' * 500)
+
+class ResponseMixinModel(ResponseMixin):
+    def __init__(self, response):
+        self.response = response
+        self.redacted_response = {}
+        self.django_user = None
+
+def create_transaction(**kwargs):
+    details = {
+        'raw_request': 'amount=1.00',
+        'raw_response': '<message>a</message>',
+        'transaction_success': True,
+        'date_response': timezone.now(),
+        'transaction_type': 's',
+    }
+    details.update(kwargs)
+
+    return models.HelcimTransaction.objects.create(**details)
+
+def test__compress_audit_data__round_trip():
+    compressed = models.compress_audit_data(LONG_RESPONSE)
+
+    assert len(compressed) < len(LONG_RESPONSE)
+    assert models.decompress_audit_data(compressed) == LONG_RESPONSE
+    assert models.decompress_audit_data(memoryview(compressed)) == (
+        LONG_RESPONSE
+    )
+
+def test__compress_audit_data__none():
+    assert models.compress_audit_data(None) is None
+    assert models.decompress_audit_data(None) is None
+
+@pytest.mark.django_db
+def test__audit_properties__inline():
+    transaction = create_transaction()
+
+    assert transaction.audit_request == 'amount=1.00'
+    assert transaction.audit_response == '<message>a</message>'
+
+@pytest.mark.django_db
+def test__audit_properties__no_data(django_assert_num_queries):
+    transaction = create_transaction(raw_request=None, raw_response=None)
+    transaction = models.HelcimTransaction.objects.get(id=transaction.id)
+
+    with django_assert_num_queries(1):
+        assert transaction.audit_request is None
+        assert transaction.audit_response is None
+
+@pytest.mark.django_db
+@patch.dict('helcim.mixins.SETTINGS', {'audit_storage': 'compressed'})
+def test__save_transaction__compressed(django_assert_num_queries):
+    mixin = ResponseMixinModel({
+        'transaction_success': True,
+        'transaction_date': date(2020, 1, 1),
+        'transaction_time': time(12, 0),
+        'raw_request': 'amount=1.00',
+        'raw_response': LONG_RESPONSE,
+    })
+
+    saved = mixin.save_transaction('s')
+    transaction = models.HelcimTransaction.objects.get(id=saved.id)
+
+    assert transaction.raw_request is None
+    assert transaction.raw_response is None
+
+    # The payload is only loaded (once) when the audit data is needed
+    with django_assert_num_queries(1):
+        assert transaction.audit_request == 'amount=1.00'
+        assert transaction.audit_response == LONG_RESPONSE
+
+@pytest.mark.django_db
+@patch.dict('helcim.gateway.SETTINGS', {'audit_storage': 'compressed'})
+def test__gateway_save_transaction__compressed():
+    request = gateway.BaseRequest(api_details={
+        'url': 'a', 'account_id': 'b', 'token': 'c', 'terminal_id': 'd',
+    })
+    request.response = {
+        'transaction_success': True,
+        'transaction_date': date(2020, 1, 1),
+        'transaction_time': time(12, 0),
+        'raw_request': 'amount=1.00',
+        'raw_response': LONG_RESPONSE,
+    }
+
+    saved = request.save_transaction('s')
+    transaction = models.HelcimTransaction.objects.get(id=saved.id)
+
+    assert transaction.raw_response is None
+    assert transaction.audit_response == LONG_RESPONSE
+
+@pytest.mark.django_db
+def test__backfill_audit_payloads():
+    first = create_transaction()
+    second = create_transaction(raw_request=None)
+    empty = create_transaction(raw_request=None, raw_response=None)
+
+    assert audit.backfill_audit_payloads(batch_size=1) == 2
+
+    for original in (first, second):
+        transaction = models.HelcimTransaction.objects.get(id=original.id)
+
+        assert transaction.raw_request is None
+        assert transaction.raw_response is None
+        assert transaction.audit_request == original.raw_request
+        assert transaction.audit_response == original.raw_response
+
+    assert not models.HelcimTransactionPayload.objects.filter(
+        transaction=empty
+    ).exists()
+    assert audit.backfill_audit_payloads() == 0
+
+@pytest.mark.django_db
+def test__backfill_audit_payloads__starts_after_last_batch():
+    create_transaction()
+    create_transaction()
+
+    with CaptureQueriesContext(connection) as queries:
+        assert audit.backfill_audit_payloads(batch_size=1) == 2
+
+    selects = [
+        query['sql'] for query in queries.captured_queries
+        if query['sql'].startswith('SELECT') and 'raw_request' in query['sql']
+    ]
+
+    # Each batch after the first starts after the last moved ID
+    assert len(selects) == 3
+    assert '"id" >' not in selects[0]
+    assert '"id" >' in selects[1]
+    assert '"id" >' in selects[2]
+
+@pytest.mark.django_db
+def test__backfill_audit_payloads__keeps_existing_payload():
+    transaction = create_transaction()
+    models.HelcimTransactionPayload.objects.create(
+        transaction=transaction,
+        raw_request=models.compress_audit_data('a'),
+        raw_response=models.compress_audit_data('b'),
+    )
+
+    assert audit.backfill_audit_payloads() == 1
+
+    transaction = models.HelcimTransaction.objects.get(id=transaction.id)
+    assert transaction.audit_request == 'a'
+    assert transaction.audit_response == 'b'
+
+@pytest.mark.django_db
+def test__backfill_command():
+    create_transaction()
+    output = StringIO()
+
+    call_command('helcim_backfill_audit_payloads', stdout=output)
+
+    assert output.getvalue() == 'Compressed 1 transaction(s).\n'
+    assert models.HelcimTransactionPayload.objects.count() == 1
+
+def test__backfill_command__invalid_batch_size():
+    with pytest.raises(CommandError):
+        call_command('helcim_backfill_audit_payloads', '--batch-size=0')
+
+@pytest.mark.django_db
+def test__archive_transactions__includes_payload():
+    transaction = create_transaction(
+        date_response=timezone.now() - timedelta(days=400),
+        raw_response=LONG_RESPONSE,
+    )
+    audit.backfill_audit_payloads()
+
+    archive.archive_transactions(timedelta(days=365))
+
+    assert models.HelcimTransactionPayload.objects.count() == 0
+
+    restored = archive.retrieve_archived_transaction(transaction.id)
+    assert restored.audit_request == 'amount=1.00'
+    assert restored.audit_response == LONG_RESPONSE
+
+@pytest.mark.django_db
+def test__transaction_admin__displays_audit_data():
+    transaction = create_transaction(raw_response=LONG_RESPONSE)
+    audit.backfill_audit_payloads()
+    transaction = models.HelcimTransaction.objects.get(id=transaction.id)
+    model_admin = HelcimTransactionAdmin(models.HelcimTransaction, admin.site)
+
+    assert model_admin.audit_request(transaction) == 'amount=1.00'
+    assert model_admin.audit_response(transaction) == LONG_RESPONSE
+    assert 'raw_request' not in model_admin.fields
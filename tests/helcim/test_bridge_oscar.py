@@ -57,6 +57,12 @@ def mock_retrieve_token_details(token_id, django_user=None, customer_code=None):
         'customer_code': customer_code,
     }
 
+class MockToken():
+    def __init__(self, token_id, django_user=None, customer_code=None):
+        self.id = token_id # pylint: disable=invalid-name
+        self.django_user = django_user
+        self.customer_code = customer_code
+
 def mock_retrieve_saved_tokens(django_user=None, customer_code=None):
     return {
         'django_user': django_user,
@@ -185,27 +191,45 @@ def test_base_card_bridge_formats_details_without_billing_address():
     assert 'cc_expiry' in transaction.transaction_details
     assert 'cc_cvv' in transaction.transaction_details
 
-@patch(
-    'helcim.bridge_oscar.retrieve_token_details', mock_retrieve_token_details
-)
+@patch('helcim.bridge_oscar.retrieve_token', MockToken)
 @patch.dict('helcim.bridge_oscar.gateway.SETTINGS', {'allow_anonymous': False})
 def test_base_card_bridge_provided_token_details_and_django_user():
     transaction = bridge_oscar.BaseCardTransactionBridge(
         '1', token_id='2', django_user='3'
     )
-    assert transaction.transaction_details['token_id'] == '2'
-    assert transaction.transaction_details['django_user'] == '3'
+    assert transaction.token_instance.id == '2'
+    assert transaction.token_instance.django_user == '3'
+    assert transaction.transaction_details == {'amount': '1'}
 
-@patch(
-    'helcim.bridge_oscar.retrieve_token_details', mock_retrieve_token_details
-)
+@patch('helcim.bridge_oscar.retrieve_token', MockToken)
+def test_base_card_bridge_gateway_details_excludes_django_user():
+    transaction = bridge_oscar.BaseCardTransactionBridge(
+        '1', token_id='2', django_user='3'
+    )
+    details = transaction.gateway_details()
+
+    assert details == {'amount': '1'}
+    assert 'django_user' not in details
+
+@patch('helcim.bridge_oscar.retrieve_token', MockToken)
+@patch('helcim.bridge_oscar.gateway.Purchase')
+def test_purchase_bridge_with_token_and_django_user(mock_purchase):
+    purchase = bridge_oscar.PurchaseBridge('1', token_id='2', django_user='3')
+    purchase.process()
+
+    _, kwargs = mock_purchase.call_args
+    assert kwargs['django_user'] == '3'
+    assert kwargs['token_instance'].id == '2'
+    assert 'token' not in kwargs
+
+@patch('helcim.bridge_oscar.retrieve_token', MockToken)
 @patch.dict('helcim.bridge_oscar.gateway.SETTINGS', {'allow_anonymous': True})
 def test_base_card_bridge_provided_token_details_and_customer_code():
     transaction = bridge_oscar.BaseCardTransactionBridge(
         '1', token_id='2', customer_code='3'
     )
-    assert transaction.transaction_details['token_id'] == '2'
-    assert transaction.transaction_details['customer_code'] == '3'
+    assert transaction.token_instance.id == '2'
+    assert transaction.token_instance.customer_code == '3'
 
 def test_base_card_bridge_provided_card_details():
     transaction = bridge_oscar.BaseCardTransactionBridge(
@@ -488,6 +512,14 @@ def test_retrieve_token_details_shortcut():
     assert token_details['token_id'] == '1'
     assert token_details['customer_code'] == '2'
 
+@patch('helcim.bridge_oscar.gateway.retrieve_token', MockToken)
+def test_retrieve_token_shortcut():
+    """Tests that retrieve_token shortcut works."""
+    token = bridge_oscar.retrieve_token('1', customer_code='2')
+
+    assert token.id == '1'
+    assert token.customer_code == '2'
+
 @patch(
     'helcim.bridge_oscar.gateway.retrieve_saved_tokens',
     mock_retrieve_saved_tokens
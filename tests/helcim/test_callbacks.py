@@ -0,0 +1,339 @@
+"""Tests for the callbacks module and the Helcim.js callback view."""
+# pylint: disable=missing-docstring, protected-access
+import hashlib
+import json
+from unittest.mock import patch
+
+import pytest
+
+from django.contrib.auth.models import AnonymousUser
+from django.urls import reverse
+
+from helcim import callbacks, exceptions, models, views
+
+
+SECRET = 'abcdefghijklmnop'
+
+CONFIG = {'url': 'https://example.com/js', 'token': 'a', 'secret': SECRET}
+
+@pytest.fixture
+def helcim_js_config():
+    with patch.dict(
+            'helcim.gateway.SETTINGS', {'helcim_js': {'purchase': CONFIG}}
+    ):
+        yield CONFIG
+
+def create_response(transaction_id='101', secret=SECRET, signed=None,
+                    **kwargs):
+    """Returns a Helcim.js response signed with the secret.
+
+        The ``xml`` is created from the fields (updated with any
+        ``signed`` fields).
+    """
+    data = {
+        'response': '1',
+        'responseMessage': 'APPROVED',
+        'transactionId': transaction_id,
+        'type': 'purchase',
+        'date': '2020-01-01',
+        'time': '12:00:00',
+        'amount': '10.00',
+        'cardNumber': '5454********5454',
+        'cardToken': '1234567890abcdefghijkl',
+        'customerCode': 'CST1000',
+    }
+    data.update(kwargs)
+    xml_fields = dict(data, **(signed or {}))
+    xml = (
+        '<?xml version="1.0"?><message><response>{}</response>'
+        '<responseMessage>{}</responseMessage><transaction>{}</transaction>'
+        '</message>'
+    ).format(
+        xml_fields.pop('response'),
+        xml_fields.pop('responseMessage'),
+        ''.join(
+            '<{0}>{1}</{0}>'.format(name, value)
+            for name, value in xml_fields.items()
+        ),
+    )
+    data['xml'] = xml
+    data['xmlHash'] = hashlib.sha256(
+        (secret + xml).encode('utf-8')
+    ).hexdigest()
+
+    return data
+
+def test__verify_xml_hash():
+    data = create_response()
+
+    assert callbacks.verify_xml_hash(data['xml'], data['xmlHash'], SECRET)
+    assert callbacks.verify_xml_hash(
+        data['xml'], data['xmlHash'].upper(), SECRET
+    )
+    assert callbacks.verify_xml_hash(
+        data['xml'], data['xmlHash'], 'other'
+    ) is False
+    assert callbacks.verify_xml_hash(
+        data['xml'] + ' ', data['xmlHash'], SECRET
+    ) is False
+    assert callbacks.verify_xml_hash(data['xml'], None, SECRET) is False
+    assert callbacks.verify_xml_hash(data['xml'], data['xmlHash'], None) is (
+        False
+    )
+
+@pytest.mark.django_db
+def test__record():
+    status, transaction_id = callbacks.record(CONFIG, create_response())
+
+    assert (status, transaction_id) == (callbacks.RECORDED, 101)
+
+    transaction = models.HelcimTransaction.objects.get(transaction_id=101)
+    assert transaction.transaction_type == 's'
+    assert str(transaction.amount) == '10.00'
+
+@pytest.mark.django_db
+def test__record__duplicate():
+    callbacks.record(CONFIG, create_response())
+
+    status, _ = callbacks.record(CONFIG, create_response())
+
+    assert status == callbacks.DUPLICATE
+    assert models.HelcimTransaction.objects.count() == 1
+    assert models.HelcimJSCallback.objects.count() == 1
+
+@pytest.mark.django_db
+def test__claim():
+    assert callbacks.claim(101) is True
+    assert callbacks.claim(101) is False
+    assert callbacks.claim(102) is True
+
+    callbacks.release(101)
+
+    assert callbacks.claim(101) is True
+
+@pytest.mark.django_db
+def test__record__forged_fields():
+    forged = create_response(signed={'amount': '10.00'}, amount='9999.00')
+
+    with pytest.raises(exceptions.ProcessingError):
+        callbacks.record(CONFIG, forged)
+
+    assert models.HelcimTransaction.objects.count() == 0
+    assert models.HelcimJSCallback.objects.count() == 0
+
+@pytest.mark.django_db
+def test__record__replayed_xml():
+    signed = create_response('100')
+
+    for transaction_id in ('100', '101', '102'):
+        data = dict(signed, transactionId=transaction_id)
+
+        if transaction_id == '100':
+            assert callbacks.record(CONFIG, data)[0] == callbacks.RECORDED
+        else:
+            with pytest.raises(exceptions.ProcessingError):
+                callbacks.record(CONFIG, data)
+
+    assert models.HelcimTransaction.objects.count() == 1
+
+@pytest.mark.django_db
+def test__record__only_signed_fields():
+    data = create_response()
+    data['orderNumber'] = 'INV1'
+
+    callbacks.record(CONFIG, data)
+
+    transaction = models.HelcimTransaction.objects.get()
+    assert transaction.order_number is None
+    assert '<transactionId>101</transactionId>' in transaction.raw_response
+
+@pytest.mark.django_db
+def test__record__invalid_xml():
+    data = create_response()
+    data['xml'] = '<message>'
+    data['xmlHash'] = hashlib.sha256(
+        (SECRET + data['xml']).encode('utf-8')
+    ).hexdigest()
+
+    with pytest.raises(exceptions.ProcessingError):
+        callbacks.record(CONFIG, data)
+
+def test__signed_fields():
+    fields = callbacks.signed_fields(
+        '<message><response>1</response><notice/><transaction>'
+        '<amount>1.00</amount></transaction></message>'
+    )
+
+    assert fields == {'response': '1', 'notice': '', 'amount': '1.00'}
+
+@pytest.mark.django_db
+def test__record__invalid_hash():
+    with pytest.raises(exceptions.ProcessingError):
+        callbacks.record(CONFIG, create_response(secret='other'))
+
+    assert models.HelcimTransaction.objects.count() == 0
+
+@pytest.mark.django_db
+def test__record__declined():
+    with pytest.raises(exceptions.PaymentError):
+        callbacks.record(
+            CONFIG, create_response(response='0', responseMessage='DECLINED')
+        )
+
+    assert models.HelcimTransaction.objects.count() == 0
+
+@pytest.mark.django_db
+def test__record__unsupported_type():
+    with pytest.raises(exceptions.ProcessingError):
+        callbacks.record(CONFIG, create_response(type='refund'))
+
+@pytest.mark.django_db
+def test__record__save_error_releases_claim():
+    with patch(
+        'helcim.callbacks.save', side_effect=exceptions.DjangoError
+    ):
+        with pytest.raises(exceptions.DjangoError):
+            callbacks.record(CONFIG, create_response())
+
+    status, _ = callbacks.record(CONFIG, create_response())
+
+    assert status == callbacks.RECORDED
+
+@pytest.mark.django_db
+@patch.dict('helcim.gateway.SETTINGS', {'callback_writes': 'batched'})
+@patch('helcim.callbacks.BatchWriter._ensure_thread')
+def test__record__batched(mock_ensure_thread):
+    writer = callbacks.BatchWriter(batch_size=2)
+
+    with patch('helcim.callbacks.get_writer', return_value=writer):
+        for transaction_id in ('101', '102', '103', '101'):
+            callbacks.record(CONFIG, create_response(transaction_id))
+
+    assert mock_ensure_thread.call_count == 3
+    assert models.HelcimTransaction.objects.count() == 0
+
+    assert writer.flush() == 2
+    assert writer.flush() == 1
+    assert writer.flush() == 0
+    assert sorted(
+        models.HelcimTransaction.objects.values_list(
+            'transaction_id', flat=True
+        )
+    ) == [101, 102, 103]
+
+@pytest.mark.django_db
+@patch.dict('helcim.gateway.SETTINGS', {
+    'callback_writes': 'batched', 'allow_anonymous': False,
+})
+@patch('helcim.callbacks.get_writer')
+def test__record__batched_anonymous_user(mock_get_writer):
+    with pytest.raises(exceptions.ProcessingError):
+        callbacks.record(
+            CONFIG, create_response(), django_user=AnonymousUser()
+        )
+
+    # Not claimed or queued, so the response can be resubmitted
+    assert models.HelcimJSCallback.objects.count() == 0
+    assert mock_get_writer.called is False
+
+@pytest.mark.django_db
+@patch.dict('helcim.gateway.SETTINGS', {'callback_writes': 'batched'})
+@patch('helcim.callbacks.BatchWriter._ensure_thread')
+def test__record__batched_resolves_user(mock_ensure_thread):
+    # pylint: disable=unused-argument
+    writer = callbacks.BatchWriter(batch_size=1)
+
+    with patch('helcim.callbacks.get_writer', return_value=writer):
+        callbacks.record(
+            CONFIG, create_response(), django_user=AnonymousUser()
+        )
+
+    response, _ = writer.queue.get_nowait()
+
+    # Anonymous users are resolved before the response is queued
+    assert response.django_user is None
+
+@pytest.mark.django_db
+@patch.dict('helcim.gateway.SETTINGS', {'callback_writes': 'batched'})
+@patch('helcim.callbacks.BatchWriter._ensure_thread')
+def test__batch_writer__failed_save(mock_ensure_thread):
+    # pylint: disable=unused-argument
+    writer = callbacks.BatchWriter(batch_size=10)
+
+    with patch('helcim.callbacks.get_writer', return_value=writer):
+        callbacks.record(CONFIG, create_response('101'))
+        callbacks.record(CONFIG, create_response('102'))
+
+    original_save = callbacks.save
+
+    def save(response, transaction_type):
+        if response.response['transaction_id'] == 101:
+            raise exceptions.DjangoError
+
+        return original_save(response, transaction_type)
+
+    with patch('helcim.callbacks.save', side_effect=save):
+        assert writer.flush() == 1
+
+    assert list(
+        models.HelcimTransaction.objects.values_list(
+            'transaction_id', flat=True
+        )
+    ) == [102]
+
+    # The failed transaction can be resubmitted
+    assert list(
+        models.HelcimJSCallback.objects.values_list(
+            'transaction_id', flat=True
+        )
+    ) == [102]
+
+@pytest.mark.django_db
+def test__callback_view(client, helcim_js_config):
+    # pylint: disable=redefined-outer-name, unused-argument
+    url = reverse('helcim_js_callback', kwargs={'config': 'purchase'})
+
+    response = client.post(url, create_response())
+    duplicate = client.post(url, create_response())
+
+    assert response.status_code == 200
+    assert json.loads(response.content.decode('utf-8')) == {
+        'status': 'recorded', 'transaction_id': 101,
+    }
+    assert json.loads(duplicate.content.decode('utf-8'))['status'] == (
+        'duplicate'
+    )
+    assert models.HelcimTransaction.objects.count() == 1
+
+@pytest.mark.django_db
+def test__callback_view__invalid(client, helcim_js_config):
+    # pylint: disable=redefined-outer-name, unused-argument
+    url = reverse('helcim_js_callback', kwargs={'config': 'purchase'})
+
+    response = client.post(url, create_response(secret='other'))
+
+    assert response.status_code == 400
+    assert models.HelcimTransaction.objects.count() == 0
+
+@pytest.mark.django_db
+def test__callback_view__unknown_config(client, helcim_js_config):
+    # pylint: disable=redefined-outer-name, unused-argument
+    response = client.post(
+        reverse('helcim_js_callback', kwargs={'config': 'other'}),
+        create_response(),
+    )
+
+    assert response.status_code == 404
+
+@pytest.mark.django_db
+def test__callback_view__success_url(rf, helcim_js_config):
+    # pylint: disable=redefined-outer-name, unused-argument
+    request = rf.post('/helcim-js/purchase/', create_response())
+    request.user = AnonymousUser()
+
+    response = views.HelcimJSCallbackView.as_view(success_url='/complete/')(
+        request, config='purchase'
+    )
+
+    assert response.status_code == 302
+    assert response['Location'] == '/complete/'
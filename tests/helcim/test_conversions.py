@@ -1,10 +1,14 @@
 """Tests for the conversions module."""
 # pylint: disable=protected-access
 
-from datetime import date, time
+import copy
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+import pickle
 from unittest.mock import patch
 
+import pytest
+
 from helcim import conversions
 
 # *_API_FIELDS being mocked to allow proper testing of validation
@@ -391,6 +395,83 @@ def test__convert_helcim_response__time_field():
     assert response['transaction_time'] == time(8, 30, 15)
     assert isinstance(response['transaction_time'], time)
 
+def test_parse_date_and_time():
+    """Confirms the fast and fallback date and time parsing."""
+    assert conversions.parse_date('2020-02-29') == date(2020, 2, 29)
+    assert conversions.parse_date('2020-2-9') == date(2020, 2, 9)
+    assert conversions.parse_time('23:59:01') == time(23, 59, 1)
+    assert conversions.parse_time('8:05:00') == time(8, 5, 0)
+
+    for parser, value in (
+            (conversions.parse_date, '2019-02-29'),
+            (conversions.parse_date, '2019/02/01'),
+            (conversions.parse_time, '24:00:00'),
+            (conversions.parse_time, '08-00-00'),
+    ):
+        with pytest.raises(ValueError):
+            parser(value)
+
+def _strptime_or_error(value, format_string):
+    try:
+        return datetime.strptime(value, format_string)
+    except ValueError:
+        return ValueError
+
+def _parse_or_error(parser, value):
+    try:
+        return parser(value)
+    except ValueError:
+        return ValueError
+
+def test_parse_date_matches_strptime():
+    """Confirms parse_date matches strptime for all dates (1900-2099)."""
+    parse_date = conversions.parse_date.__wrapped__
+    day = date(1900, 1, 1)
+
+    while day.year < 2100:
+        value = day.isoformat()
+        assert parse_date(value) == datetime.strptime(value, '%Y-%m-%d').date()
+        day += timedelta(days=1)
+
+    # Invalid months and days (including leap days)
+    for year in (2019, 2020, 2100):
+        for month in range(14):
+            for day_number in range(33):
+                value = '{:04d}-{:02d}-{:02d}'.format(year, month, day_number)
+                expected = _strptime_or_error(value, '%Y-%m-%d')
+
+                if expected is not ValueError:
+                    expected = expected.date()
+
+                assert _parse_or_error(parse_date, value) == expected
+
+def test_parse_time_matches_strptime():
+    """Confirms parse_time matches strptime for all times of a day."""
+    parse_time = conversions.parse_time.__wrapped__
+
+    for hour in range(25):
+        for minute in range(61):
+            for second in range(0, 62, 1 if hour < 24 else 10):
+                value = '{:02d}:{:02d}:{:02d}'.format(hour, minute, second)
+                expected = _strptime_or_error(value, '%H:%M:%S')
+
+                if expected is not ValueError:
+                    expected = expected.time()
+
+                assert _parse_or_error(parse_time, value) == expected
+
+def test_parse_expiry():
+    """Confirms the expiry is the last day of the month (and cached)."""
+    conversions.parse_expiry.cache_clear()
+
+    assert conversions.parse_expiry('0224') == date(2024, 2, 29)
+    assert conversions.parse_expiry('1299') == date(2099, 12, 31)
+    assert conversions.parse_expiry('0224') == date(2024, 2, 29)
+    assert conversions.parse_expiry.cache_info().hits == 1
+
+    with pytest.raises(ValueError):
+        conversions.parse_expiry('1325')
+
 def test_process_api_response_missing_field():
     """Confirms handling of an API response field not accounted for."""
     fields = {'fake_field': 'fake.'}
@@ -444,6 +525,25 @@ def test__create_raw_response__with_data():
     assert 'accountId=123456789' in request_string
     assert 'token=987654321' in request_string
 
+def test__create_raw_response__url_encoded():
+    """Confirms the data is encoded the same way as the request body."""
+    response_data = {
+        'accountId': '123456789',
+        'cardHolderName': 'Test Person & Co',
+        'comments': None,
+    }
+
+    assert conversions.create_raw_request(response_data) == (
+        'accountId=123456789&cardHolderName=Test+Person+%26+Co'
+    )
+
+def test__create_raw_response__encoded_body():
+    """Confirms an encoded request body is used as is."""
+    body = 'accountId=123456789&cardHolderName=Test+Person'
+
+    assert conversions.create_raw_request(body) is body
+    assert conversions.create_raw_request(body.encode('utf-8')) == body
+
 def test__create_raw_response__without_data():
     """Confirms handling when data is not provided."""
     response_data = None
@@ -478,8 +578,8 @@ def test__process_api_response__valid():
     assert response['transaction_success'] is True
     assert response['response_message'] == 'Transaction successful.'
     assert response['notice'] == 'API v2 being depreciated.'
-    assert 'field_1=Field value 1' in response['raw_request']
-    assert 'field_2=Field value 2' in response['raw_request']
+    assert 'field_1=Field+value+1' in response['raw_request']
+    assert 'field_2=Field+value+2' in response['raw_request']
     assert response['raw_response'] == 'This is a raw response.'
     assert response['amount'] == Decimal('50.01')
     assert response['cc_number'] == '1111********9999'
@@ -532,3 +632,71 @@ def test__process_helcim_js__expected_output():
     assert 'amount' in response
     assert 'cc_number' in response
     assert 'token_f4l4' in response
+
+def test__helcim_response__dictionary_access():
+    """Confirms the response supports dictionary and attribute access."""
+    response = conversions.HelcimResponse(
+        {'amount': Decimal('1.00'), 'unknown': 'a'}, cc_name='b'
+    )
+
+    assert response['amount'] == Decimal('1.00')
+    assert response.amount == Decimal('1.00')
+    assert response['unknown'] == 'a'
+    assert response.get('cc_number') is None
+    assert 'cc_number' not in response
+    assert 'cc_name' in response
+    assert len(response) == 3
+    assert response == {
+        'amount': Decimal('1.00'), 'cc_name': 'b', 'unknown': 'a',
+    }
+    assert {**response}['unknown'] == 'a'
+
+    with pytest.raises(KeyError):
+        response['cc_number'] # pylint: disable=pointless-statement
+
+def test__helcim_response__immutable():
+    """Confirms the response cannot be modified."""
+    response = conversions.HelcimResponse({'amount': Decimal('1.00')})
+
+    with pytest.raises(TypeError):
+        response['amount'] = Decimal('2.00')
+
+    with pytest.raises(AttributeError):
+        response.amount = Decimal('2.00')
+
+    assert copy.copy(response) is response
+    assert copy.deepcopy(response) is response
+    assert pickle.loads(pickle.dumps(response)) == response
+
+def test__helcim_response__replace():
+    """Confirms replace returns an updated copy."""
+    response = conversions.HelcimResponse({'cc_name': 'a', 'amount': 1})
+    updated = response.replace(cc_name=None)
+
+    assert updated == {'cc_name': None, 'amount': 1}
+    assert response['cc_name'] == 'a'
+
+def test__helcim_response__redact():
+    """Confirms the redacted view hides the redacted fields."""
+    response = conversions.HelcimResponse({
+        'cc_number': '5454********5454',
+        'cc_type': 'MasterCard',
+        'raw_response': '<cardNumber>5454********5454</cardNumber>',
+    })
+    redacted = response.redact(
+        ['cc_number', 'token'], 'a=REDACTED',
+        '<cardNumber>REDACTED</cardNumber>',
+    )
+
+    assert redacted == {
+        'cc_number': None,
+        'cc_type': 'MasterCard',
+        'raw_request': 'a=REDACTED',
+        'raw_response': '<cardNumber>REDACTED</cardNumber>',
+    }
+    assert redacted.cc_type == 'MasterCard'
+    assert 'token' not in redacted
+    assert response['cc_number'] == '5454********5454'
+
+    with pytest.raises(AttributeError):
+        redacted.cc_type = None
@@ -0,0 +1,109 @@
+"""Tests for the instrumentation module."""
+# pylint: disable=missing-docstring, too-few-public-methods
+from unittest.mock import patch
+
+from helcim import instrumentation
+from helcim.signals import stage_completed
+
+
+class Timed():
+    transaction_type = 'purchase'
+
+    @instrumentation.timed('example')
+    def run(self, value):
+        return value
+
+    @instrumentation.timed('failure')
+    def fail(self):
+        raise ValueError('failed')
+
+    @instrumentation.timed('enclosing')
+    def fail_nested(self):
+        self.fail()
+
+class Receiver():
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, sender, **kwargs):
+        self.calls.append({'sender': sender, **kwargs})
+
+def test__timed__no_signal_when_disabled():
+    receiver = Receiver()
+    stage_completed.connect(receiver, weak=False)
+
+    try:
+        assert Timed().run(1) == 1
+    finally:
+        stage_completed.disconnect(receiver)
+
+    assert receiver.calls == []
+
+@patch.dict(
+    'helcim.instrumentation.SETTINGS', {'enable_instrumentation': True}
+)
+def test__timed__sends_signal_when_enabled():
+    receiver = Receiver()
+    stage_completed.connect(receiver, weak=False)
+    instance = Timed()
+
+    try:
+        assert instance.run(1) == 1
+    finally:
+        stage_completed.disconnect(receiver)
+
+    assert len(receiver.calls) == 1
+    assert receiver.calls[0]['sender'] is Timed
+    assert receiver.calls[0]['instance'] is instance
+    assert receiver.calls[0]['stage'] == 'example'
+    assert receiver.calls[0]['transaction_type'] == 'purchase'
+    assert receiver.calls[0]['outcome'] == 'success'
+    assert receiver.calls[0]['raised'] is False
+    assert receiver.calls[0]['duration'] >= 0
+
+@patch.dict(
+    'helcim.instrumentation.SETTINGS', {'enable_instrumentation': True}
+)
+def test__timed__records_exception_outcome():
+    receiver = Receiver()
+    stage_completed.connect(receiver, weak=False)
+
+    try:
+        Timed().fail()
+    except ValueError:
+        pass
+    else:
+        assert False
+    finally:
+        stage_completed.disconnect(receiver)
+
+    assert receiver.calls[0]['stage'] == 'failure'
+    assert receiver.calls[0]['outcome'] == 'ValueError'
+
+def test__transaction_type_label():
+    assert instrumentation.transaction_type_label(Timed()) == 'purchase'
+    assert instrumentation.transaction_type_label(object()) == 'unknown'
+
+@patch.dict(
+    'helcim.instrumentation.SETTINGS', {'enable_instrumentation': True}
+)
+def test__timed__records_stage_that_raised():
+    receiver = Receiver()
+    stage_completed.connect(receiver, weak=False)
+
+    try:
+        Timed().fail_nested()
+    except ValueError as error:
+        assert error.helcim_stage == 'failure'
+    else:
+        assert False
+    finally:
+        stage_completed.disconnect(receiver)
+
+    assert [
+        (call['stage'], call['outcome'], call['raised'])
+        for call in receiver.calls
+    ] == [
+        ('failure', 'ValueError', True),
+        ('enclosing', 'ValueError', False),
+    ]
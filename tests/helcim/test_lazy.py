@@ -0,0 +1,52 @@
+"""Tests for the lazy module."""
+import subprocess
+import sys
+from unittest.mock import patch
+
+from helcim import gateway, transports
+from helcim.lazy import lazy_import
+
+
+SCRIPT = """
+import sys
+
+import django
+from django.conf import settings
+
+settings.configure(
+    INSTALLED_APPS=[
+        'django.contrib.admin', 'django.contrib.auth',
+        'django.contrib.contenttypes', 'django.contrib.sessions',
+        'helcim',
+    ],
+    HELCIM_ACCOUNT_ID='1', HELCIM_API_TOKEN='2',
+)
+django.setup()
+
+import helcim.admin, helcim.gateway, helcim.models, helcim.transports
+print(' '.join(sorted({'requests', 'xmltodict'} & set(sys.modules))))
+"""
+
+def test_modules_load_without_http_and_xml_libraries():
+    """Confirms requests and xmltodict are not imported by the modules."""
+    result = subprocess.run(
+        [sys.executable, '-c', SCRIPT],
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+
+    assert result.stdout.strip() == ''
+
+def test_lazy_import():
+    """Confirms the proxy imports the module and forwards attributes."""
+    json = lazy_import('json')
+
+    assert json.loads('[1]') == [1]
+
+def test_lazy_import_patching():
+    """Confirms the modules can be patched through either proxy."""
+    with patch('helcim.gateway.requests.post', 'mock_post'):
+        assert transports.requests.post == 'mock_post'
+
+    assert gateway.requests.post != 'mock_post'
@@ -0,0 +1,219 @@
+"""Tests for the metrics module."""
+# pylint: disable=missing-docstring, protected-access
+import json
+import os
+from unittest.mock import patch
+
+from helcim import metrics
+
+
+def test__counter__inc():
+    counter = metrics.Counter('test_total', 'Test.', ('type',))
+
+    counter.inc('a')
+    counter.inc('a', amount=2)
+    counter.inc('b')
+
+    assert counter.value('a') == 3
+    assert counter.value('b') == 1
+    assert counter.value('c') == 0
+
+def test__histogram__observe():
+    histogram = metrics.Histogram('test', 'Test.', ('type',), (1, 5))
+
+    histogram.observe(0.5, 'a')
+    histogram.observe(3, 'a')
+    histogram.observe(10, 'a')
+
+    assert histogram.count('a') == 3
+    assert histogram._values[('a',)] == [[1, 1, 1], 13.5, 3]
+
+def test__registry__expose_counter():
+    registry = metrics.Registry()
+    counter = registry.counter('test_total', 'Test counter.', ('type',))
+    counter.inc('a"b')
+
+    assert registry.expose() == (
+        '# HELP test_total Test counter.\n'
+        '# TYPE test_total counter\n'
+        'test_total{type="a\\"b"} 1.0\n'
+    )
+
+def test__registry__expose_histogram():
+    registry = metrics.Registry()
+    histogram = registry.histogram('test', 'Test histogram.', (), (1,))
+    histogram.observe(0.5)
+    histogram.observe(2)
+
+    assert registry.expose() == (
+        '# HELP test Test histogram.\n'
+        '# TYPE test histogram\n'
+        'test_bucket{le="1.0"} 1.0\n'
+        'test_bucket{le="+Inf"} 2.0\n'
+        'test_sum 2.5\n'
+        'test_count 2.0\n'
+    )
+
+def test__registry__flush_and_merge_processes(tmpdir):
+    registry = metrics.Registry(directory=str(tmpdir))
+    counter = registry.counter('test_total', 'Test counter.', ('type',))
+    counter.inc('a')
+
+    registry.flush()
+
+    assert os.path.exists(registry._process_file())
+
+    # Mimic the metrics of another process
+    with open(os.path.join(str(tmpdir), 'helcim_metrics_1.json'), 'w') as dump:
+        json.dump({'test_total': [[['a'], 2], [['b'], 1]]}, dump)
+
+    exposed = registry.expose()
+
+    assert 'test_total{type="a"} 3.0' in exposed
+    assert 'test_total{type="b"} 1.0' in exposed
+
+def test__registry__ignores_invalid_files(tmpdir):
+    registry = metrics.Registry(directory=str(tmpdir))
+    counter = registry.counter('test_total', 'Test counter.')
+    counter.inc()
+
+    with open(os.path.join(str(tmpdir), 'helcim_metrics_1.json'), 'w') as dump:
+        dump.write('{invalid')
+
+    assert 'test_total 1.0' in registry.expose()
+
+def _exited_pid():
+    """Returns a process ID that is not running."""
+    pid = 2 ** 22
+
+    while True:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return pid
+        except OSError:
+            pass
+
+        pid += 1
+
+def test__registry__directory_from_settings(tmpdir):
+    registry = metrics.Registry()
+
+    assert registry.directory is None
+
+    with patch.dict('helcim.metrics.SETTINGS', {'metrics_dir': str(tmpdir)}):
+        assert registry.directory == str(tmpdir)
+
+def test__registry__merges_exited_processes(tmpdir):
+    registry = metrics.Registry(directory=str(tmpdir))
+    registry.counter('test_total', 'Test counter.', ('type',))
+    path = registry._process_file(_exited_pid())
+
+    with open(path, 'w') as dump:
+        json.dump({'test_total': [[['a'], 2]]}, dump)
+
+    assert 'test_total{type="a"} 2.0' in registry.expose()
+    assert not os.path.exists(path)
+
+    with open(os.path.join(str(tmpdir), metrics.EXITED_FILE)) as dump:
+        assert json.load(dump) == {'test_total': [[['a'], 2]]}
+
+    # The same process ID is reused and exits again
+    with open(path, 'w') as dump:
+        json.dump({'test_total': [[['a'], 1]]}, dump)
+
+    assert 'test_total{type="a"} 3.0' in registry.expose()
+
+def test__registry__exit_merges_own_file(tmpdir):
+    registry = metrics.Registry(directory=str(tmpdir))
+    counter = registry.counter('test_total', 'Test counter.')
+    counter.inc()
+
+    registry._exit()
+    counter.inc()
+    registry.flush()
+
+    assert not os.path.exists(registry._process_file())
+
+    other = metrics.Registry(directory=str(tmpdir))
+    other.counter('test_total', 'Test counter.')
+
+    assert 'test_total 1.0' in other.expose()
+
+def test__registry__merges_file_left_with_own_process_id(tmpdir):
+    registry = metrics.Registry(directory=str(tmpdir))
+    counter = registry.counter('test_total', 'Test counter.')
+    counter.inc()
+
+    with open(registry._process_file(), 'w') as dump:
+        json.dump({'test_total': [[[], 4]]}, dump)
+
+    assert 'test_total 5.0' in registry.expose()
+
+    registry.flush()
+
+    assert 'test_total 5.0' in registry.expose()
+
+def test__record_stage__disabled():
+    count = metrics.TRANSACTIONS.value('purchase', 'success')
+
+    metrics.record_stage(
+        None, stage='process', duration=0.1, transaction_type='purchase',
+        outcome='success',
+    )
+
+    assert metrics.TRANSACTIONS.value('purchase', 'success') == count
+
+@patch.dict('helcim.metrics.SETTINGS', {'enable_metrics': True})
+def test__record_stage__process():
+    count = metrics.TRANSACTIONS.value('purchase', 'success')
+    observed = metrics.TRANSACTION_DURATION.count('purchase')
+
+    metrics.record_stage(
+        None, stage='process', duration=0.1, transaction_type='purchase',
+        outcome='success',
+    )
+
+    assert metrics.TRANSACTIONS.value('purchase', 'success') == count + 1
+    assert metrics.TRANSACTION_DURATION.count('purchase') == observed + 1
+
+@patch.dict('helcim.metrics.SETTINGS', {'enable_metrics': True})
+def test__record_stage__database_error():
+    count = metrics.DATABASE_ERRORS.value('save_transaction')
+
+    metrics.record_stage(
+        None, stage='save_transaction', duration=0.1,
+        transaction_type='purchase', outcome='DjangoError',
+    )
+
+    assert metrics.DATABASE_ERRORS.value('save_transaction') == count + 1
+
+@patch.dict('helcim.metrics.SETTINGS', {'enable_metrics': True})
+def test__record_stage__database_error_in_enclosing_stage():
+    count = metrics.DATABASE_ERRORS.value('process')
+
+    metrics.record_stage(
+        None, stage='process', duration=0.1, transaction_type='purchase',
+        outcome='DjangoError', raised=False,
+    )
+
+    assert metrics.DATABASE_ERRORS.value('process') == count
+
+@patch.dict('helcim.metrics.SETTINGS', {'enable_metrics': True})
+def test__record_api_response():
+    count = metrics.API_RESPONSES.value('200', '1')
+
+    metrics.record_api_response(200, '1')
+
+    assert metrics.API_RESPONSES.value('200', '1') == count + 1
+
+@patch.dict('helcim.metrics.SETTINGS', {'enable_metrics': True})
+def test__record_token_vault():
+    hits = metrics.TOKEN_VAULT.value('hit')
+    created = metrics.TOKEN_VAULT.value('created')
+
+    metrics.record_token_vault(False)
+    metrics.record_token_vault(True)
+
+    assert metrics.TOKEN_VAULT.value('hit') == hits + 1
+    assert metrics.TOKEN_VAULT.value('created') == created + 1
@@ -7,9 +7,10 @@ import pytest
 
 from django.contrib.auth.models import AnonymousUser
 from django.db import IntegrityError
+from django.test import override_settings
 from django.utils.safestring import SafeString
 
-from helcim import exceptions as helcim_exceptions
+from helcim import exceptions as helcim_exceptions, mixins
 from helcim.mixins import ResponseMixin, HelcimJSMixin
 
 
@@ -60,23 +61,14 @@ def mock_value_error(**kwargs): # pylint: disable=unused-argument
     raise ValueError
 
 
-def test__response__redact_field__only_redacts_specified_details():
+def test__redact_raw__only_redacts_specified_details():
     """Tests that non-specified fields are not redacted."""
-    redacted_response = {
-        'raw_request': 'cardHolderName=a',
-        'raw_response': '<cardHolderName>a</cardHolderName>',
-        'cc_name': 'a',
-    }
-    mixin = ResponseMixinModel(redacted_response=redacted_response)
-
-    mixin._redact_field('cardNumber', 'cc_number')
-
-    assert len(mixin.redacted_response) == 3
-    assert mixin.redacted_response['raw_request'] == 'cardHolderName=a'
-    assert mixin.redacted_response['raw_response'] == (
-        '<cardHolderName>a</cardHolderName>'
-    )
-    assert mixin.redacted_response['cc_name'] == 'a'
+    assert mixins.redact_raw_request(
+        'cardHolderName=a', ('cardNumber',)
+    ) == 'cardHolderName=a'
+    assert mixins.redact_raw_response(
+        '<cardHolderName>a</cardHolderName>', ('cardNumber',)
+    ) == '<cardHolderName>a</cardHolderName>'
 
 def test__response__identify_redact_fields__defaults():
     """Tests for expected output from method."""
@@ -405,71 +397,45 @@ def test__response__determine_user_reference_no_anonymous_with_anonymous():
     else:
         assert False
 
-def test__response__redact_api_data__account_id():
-    """Tests that method redacts account ID."""
-    redacted_response = {'raw_request': 'accountId=1'}
-    mixin = ResponseMixinModel(redacted_response=redacted_response)
-
-    mixin._redact_api_data()
-
-    assert mixin.redacted_response['raw_request'] == 'accountId=REDACTED'
-
-def test__response__redact_api_data__api_token():
-    """Tests that method redacts API token."""
-    redacted_response = {'raw_request': 'apiToken=1'}
-    mixin = ResponseMixinModel(redacted_response=redacted_response)
-
-    mixin._redact_api_data()
-
-    assert mixin.redacted_response['raw_request'] == 'apiToken=REDACTED'
-
-def test__response__redact_api_data__terminal_id():
-    """Tests that method redacts terminal ID."""
-    redacted_response = {'raw_request': 'terminalId=1'}
-    mixin = ResponseMixinModel(redacted_response=redacted_response)
-
-    mixin._redact_api_data()
-
-    assert mixin.redacted_response['raw_request'] == 'terminalId=REDACTED'
-
-def test__response__redact_api_data__all_fields():
-    """Tests that method redacts all expected fields."""
-    redacted_response = {
-        'raw_request': 'accountId=1&apiToken=2&terminalId=3',
-    }
-    mixin = ResponseMixinModel(redacted_response=redacted_response)
-
-    mixin._redact_api_data()
-
-    assert mixin.redacted_response['raw_request'] == (
-        'accountId=REDACTED&apiToken=REDACTED&terminalId=REDACTED'
-    )
-
-def test__response__redact_api_data__no_raw_request():
-    """Tests that method handles no raw_request present."""
-    redacted_response = {}
-    mixin = ResponseMixinModel(redacted_response=redacted_response)
-
-    mixin._redact_api_data()
+def test__redact_raw_request__account_id():
+    """Tests that the account ID is redacted."""
+    assert mixins.redact_raw_request(
+        'accountId=1', mixins.API_CREDENTIAL_FIELDS
+    ) == 'accountId=REDACTED'
+
+def test__redact_raw_request__api_token():
+    """Tests that the API token is redacted."""
+    assert mixins.redact_raw_request(
+        'apiToken=1', mixins.API_CREDENTIAL_FIELDS
+    ) == 'apiToken=REDACTED'
+
+def test__redact_raw_request__terminal_id():
+    """Tests that the terminal ID is redacted."""
+    assert mixins.redact_raw_request(
+        'terminalId=1', mixins.API_CREDENTIAL_FIELDS
+    ) == 'terminalId=REDACTED'
+
+def test__redact_raw_request__all_fields():
+    """Tests that all the API credentials are redacted."""
+    assert mixins.redact_raw_request(
+        'accountId=1&apiToken=2&terminalId=3', mixins.API_CREDENTIAL_FIELDS
+    ) == 'accountId=REDACTED&apiToken=REDACTED&terminalId=REDACTED'
+
+def test__response__redact_data__no_raw_request():
+    """Tests that redaction handles no raw_request present."""
+    mixin = ResponseMixinModel(response={})
+    mixin.redact_data()
 
     assert mixin.redacted_response['raw_request'] is None
 
-def test__response__redact_field():
+def test__redact_raw__field():
     """Tests that provided fields are redacted."""
-    redacted_response = {
-        'raw_request': 'cardHolderName=a',
-        'raw_response': '<cardHolderName>a</cardHolderName>',
-        'cc_name': 'a',
-    }
-    mixin = ResponseMixinModel(redacted_response=redacted_response)
-
-    mixin._redact_field('cardHolderName', 'cc_name')
-
-    assert mixin.redacted_response['raw_request'] == 'cardHolderName=REDACTED'
-    assert mixin.redacted_response['raw_response'] == (
-        '<cardHolderName>REDACTED</cardHolderName>'
-    )
-    assert mixin.redacted_response['cc_name'] is None
+    assert mixins.redact_raw_request(
+        'cardHolderName=a', ('cardHolderName',)
+    ) == 'cardHolderName=REDACTED'
+    assert mixins.redact_raw_response(
+        '<cardHolderName>a</cardHolderName>', ('cardHolderName',)
+    ) == '<cardHolderName>REDACTED</cardHolderName>'
 
 @patch.dict('helcim.mixins.SETTINGS', {'redact_cc_name': True})
 def test__response__redact_data__cc_name():
@@ -585,6 +551,28 @@ def test__response__redact_data__partial():
     assert mixin.redacted_response['cc_name'] is None
     assert mixin.redacted_response['token'] == 'b'
 
+@patch.dict('helcim.mixins.SETTINGS', {'redact_all': True})
+def test__response__redact_data__does_not_modify_response():
+    """Confirms the redactions only apply to the redacted response."""
+    response = {
+        'raw_request': 'accountId=1&cardNumber=2',
+        'raw_response': '<cardNumber>2</cardNumber>',
+        'cc_number': '2',
+        'token': 'a',
+    }
+    mixin = ResponseMixinModel(response=dict(response))
+    mixin.redact_data()
+
+    assert mixin.response['raw_request'] == response['raw_request']
+    assert mixin.response['raw_response'] == response['raw_response']
+    assert mixin.response['cc_number'] == '2'
+    assert mixin.response['token'] == 'a'
+    assert mixin.redacted_response['raw_request'] == (
+        'accountId=REDACTED&cardNumber=REDACTED'
+    )
+    assert mixin.redacted_response['cc_number'] is None
+    assert mixin.redacted_response['token'] is None
+
 def test__response__create_model_arguments__partial():
     """Confirms expected output when minimal details provided."""
     mixin = ResponseMixinModel(redacted_response={})
@@ -922,7 +910,13 @@ def test__helcim_js_mixin__adds_context():
     context = django_view.get_context_data()
 
     assert 'helcim_js' in context
-    assert context['helcim_js'] == {'id': {'url': 'abc', 'test_input': ''}}
+    assert context['helcim_js'] == {
+        'id': {
+            'url': 'abc',
+            'script': '<script type="text/javascript" src="abc"></script>',
+            'test_input': '',
+        }
+    }
 
 @patch.dict('helcim.mixins.SETTINGS', {'helcim_js': {'id': {'test': True}}})
 def test__helcim_js_mixin__adds_test_input__with_test_key():
@@ -956,3 +950,64 @@ def test__helcim_js_mixin__adds_test_input__with_falsy_key():
 
     assert 'test_input' in context['helcim_js']['id']
     assert context['helcim_js']['id']['test_input'] == ''
+
+@patch.dict('helcim.mixins.SETTINGS', {'helcim_js': {'id': {'url': '"a&b'}}})
+def test__helcim_js_mixin__escapes_script_url():
+    """Confirms the script tag URL is escaped."""
+    django_view = MockMixinView()
+
+    context = django_view.get_context_data()
+
+    assert context['helcim_js']['id']['script'] == (
+        '<script type="text/javascript" src="&quot;a&amp;b"></script>'
+    )
+    assert isinstance(context['helcim_js']['id']['script'], SafeString)
+
+@patch.dict('helcim.mixins.SETTINGS', {'helcim_js': {'id': {'url': 'abc'}}})
+def test__helcim_js_mixin__context_built_once():
+    """Confirms the context is shared and does not change the settings."""
+    with patch(
+        'helcim.mixins.build_helcim_js_context',
+        wraps=mixins.build_helcim_js_context,
+    ) as mock_build:
+        first = MockMixinView().get_context_data()['helcim_js']
+        second = MockMixinView().get_context_data()['helcim_js']
+
+    assert first is second
+    assert mock_build.call_count == 1
+    assert mixins.SETTINGS['helcim_js'] == {'id': {'url': 'abc'}}
+
+@patch.dict('helcim.mixins.SETTINGS', {'helcim_js': {'id': {'url': 'abc'}}})
+def test__helcim_js_mixin__context_read_only():
+    """Confirms the context cannot be changed by a view or template."""
+    context = MockMixinView().get_context_data()
+
+    with pytest.raises(TypeError):
+        context['helcim_js']['id']['url'] = 'def'
+
+    with pytest.raises(TypeError):
+        context['helcim_js']['other'] = {}
+
+def test__helcim_js_mixin__rebuilt_when_setting_changed():
+    """Confirms the context is rebuilt when HELCIM_JS_CONFIG changes."""
+    original = mixins.SETTINGS['helcim_js']
+
+    with override_settings(
+        HELCIM_JS_CONFIG={'id': {'url': 'abc', 'token': 'def'}}
+    ):
+        context = MockMixinView().get_context_data()
+
+        assert context['helcim_js']['id']['token'] == 'def'
+
+    assert mixins.SETTINGS['helcim_js'] == original
+    assert 'id' not in MockMixinView().get_context_data()['helcim_js']
+
+@patch.dict(
+    'helcim.mixins.SETTINGS',
+    {'helcim_js': {'id': {'url': 'a', 'secret': 'b'}}},
+)
+def test__helcim_js_mixin__excludes_secret():
+    """Confirms the Helcim.js secret is not added to the context."""
+    context = MockMixinView().get_context_data()
+
+    assert 'secret' not in context['helcim_js']['id']
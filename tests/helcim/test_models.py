@@ -1,9 +1,12 @@
 """Tests for the Helcim models module."""
 # pylint: disable=missing-docstring, invalid-name
+from decimal import Decimal
+from importlib import import_module
 import re
 
 import pytest
 
+from django.apps import apps
 from django.utils import timezone
 
 from helcim import models
@@ -68,6 +71,40 @@ def test_helcim_transaction_can_be_captured_invalid_type():
 
     assert transaction.can_be_captured is False
 
+def test_helcim_transaction_can_be_captured_invalid_captured():
+    transaction = models.HelcimTransaction.objects.create(
+        transaction_success=True,
+        date_response='2018-01-01 01:02:03',
+        transaction_type='p',
+        amount=Decimal('1.00'),
+        captured_amount=Decimal('1.00'),
+    )
+
+    assert transaction.can_be_captured is False
+
+def test_helcim_transaction_refundable_amount():
+    transaction = models.HelcimTransaction.objects.create(
+        transaction_success=True,
+        date_response='2018-01-01 01:02:03',
+        transaction_type='s',
+        amount=Decimal('5.00'),
+        refunded_amount=Decimal('2.00'),
+    )
+
+    assert transaction.refundable_amount == Decimal('3.00')
+    assert transaction.can_be_refunded
+
+def test_helcim_transaction_can_be_refunded_invalid_refunded():
+    transaction = models.HelcimTransaction.objects.create(
+        transaction_success=True,
+        date_response='2018-01-01 01:02:03',
+        transaction_type='s',
+        amount=Decimal('5.00'),
+        refunded_amount=Decimal('5.00'),
+    )
+
+    assert transaction.can_be_refunded is False
+
 def test_helcim_transaction_can_be_refunded_valid_purchase():
     transaction = models.HelcimTransaction.objects.create(
         transaction_success=True,
@@ -251,3 +288,43 @@ def test_helcim_token_property_get_credit_card_svg_missing():
     )
 
     assert token.get_credit_card_svg == 'helcim/placeholder.svg'
+
+def create_linked(transaction_type, transaction_id, date, amount, **kwargs):
+    return models.HelcimTransaction.objects.create(
+        transaction_success=kwargs.pop('transaction_success', True),
+        date_response='2018-01-0{} 01:02:03'.format(date),
+        transaction_type=transaction_type,
+        transaction_id=transaction_id,
+        amount=Decimal(amount),
+        **kwargs
+    )
+
+def test_backfill_linked_totals_migration():
+    old_preauth = create_linked('p', 1, 1, '5.00')
+    preauth = create_linked('p', 1, 2, '5.00')
+    uncaptured = create_linked('p', 2, 2, '5.00')
+    create_linked('c', 1, 3, '4.00')
+    create_linked('c', 2, 3, '5.00', transaction_success=False)
+    purchase = create_linked('s', 3, 1, '9.00')
+    create_linked('r', 4, 2, '2.00', original_transaction=purchase)
+    create_linked('r', 5, 2, '3.00', original_transaction=purchase)
+
+    import_module(
+        'helcim.migrations.0011_backfill_linked_totals'
+    ).backfill_linked_totals(apps, None)
+
+    values = dict(models.HelcimTransaction.objects.filter(
+        transaction_type__in=['p', 's']
+    ).values_list('pk', 'captured_amount'))
+    assert values == {
+        old_preauth.pk: Decimal('0.00'),
+        preauth.pk: Decimal('4.00'),
+        uncaptured.pk: Decimal('0.00'),
+        purchase.pk: Decimal('0.00'),
+    }
+
+    purchase.refresh_from_db()
+    assert purchase.refunded_amount == Decimal('5.00')
+    assert models.HelcimTransaction.objects.get(
+        transaction_type='c', transaction_success=True
+    ).original_transaction == preauth
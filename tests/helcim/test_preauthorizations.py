@@ -0,0 +1,482 @@
+"""Tests for the preauthorizations module."""
+# pylint: disable=missing-docstring, redefined-outer-name
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils import timezone
+
+from helcim import actions, exceptions, models, preauthorizations
+from helcim.signals import preauthorizations_swept
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+    yield
+
+    cache.clear()
+
+def create_transaction(
+        transaction_type='p', transaction_success=True, days=0, **kwargs
+):
+    kwargs.setdefault('date_response', timezone.now() - timedelta(days=days))
+    kwargs.setdefault('transaction_id', '1')
+
+    return models.HelcimTransaction.objects.create(
+        transaction_success=transaction_success,
+        transaction_type=transaction_type,
+        amount='2.20',
+        token='f',
+        token_f4l4='11119999',
+        customer_code='k',
+        **kwargs
+    )
+
+def capture_transaction(original_transaction, **kwargs):
+    """Mocks a Capture request saving the capture transaction."""
+    create_transaction('c', original_transaction=original_transaction)
+
+    return MagicMock()
+
+@pytest.mark.django_db
+def test__track_transaction__queues_preauthorization():
+    preauth = create_transaction()
+
+    queued = preauth.open_preauthorization
+    assert queued.expires == preauth.date_response + timedelta(days=7)
+    assert queued.capture_due == queued.expires - timedelta(hours=24)
+    assert queued.attempts == 0
+
+@pytest.mark.django_db
+@patch.dict(
+    'helcim.preauthorizations.SETTINGS',
+    {'preauth_expiry_days': 30, 'preauth_capture_margin_hours': 48},
+)
+def test__track_transaction__expiry_settings():
+    preauth = create_transaction()
+
+    queued = preauth.open_preauthorization
+    assert queued.expires == preauth.date_response + timedelta(days=30)
+    assert queued.capture_due == queued.expires - timedelta(hours=48)
+
+@pytest.mark.django_db
+def test__track_transaction__string_response_date():
+    preauth = create_transaction(date_response='2018-01-01 01:01:01')
+
+    assert str(preauth.open_preauthorization.expires) == '2018-01-08 01:01:01'
+
+@pytest.mark.django_db
+def test__track_transaction__ignores_other_transactions():
+    create_transaction('p', transaction_success=False)
+    create_transaction('s')
+    create_transaction('v')
+
+    assert models.HelcimOpenPreauthorization.objects.count() == 0
+
+@pytest.mark.django_db
+def test__track_transaction__capture_removes_preauthorization():
+    preauth = create_transaction()
+    other = create_transaction()
+
+    create_transaction(
+        'c', transaction_success=False, original_transaction=preauth
+    )
+    assert models.HelcimOpenPreauthorization.objects.count() == 2
+
+    create_transaction('c', original_transaction=preauth)
+    assert list(
+        models.HelcimOpenPreauthorization.objects.values_list('pk', flat=True)
+    ) == [other.pk]
+
+@pytest.mark.django_db
+def test__queue_open_preauthorizations():
+    queued = create_transaction()
+    missing = create_transaction()
+    create_transaction(captured_amount='2.20')
+    models.HelcimOpenPreauthorization.objects.all().delete()
+    models.HelcimOpenPreauthorization.objects.create(
+        preauthorization=queued,
+        expires=timezone.now(),
+        capture_due=timezone.now(),
+    )
+
+    assert preauthorizations.queue_open_preauthorizations() == 1
+    assert preauthorizations.queue_open_preauthorizations() == 0
+    assert missing.open_preauthorization.expires == (
+        missing.date_response + timedelta(days=7)
+    )
+
+@pytest.mark.django_db
+def test__queue_open_preauthorizations__skips_unlinked_captures():
+    unlinked = create_transaction(transaction_id='5')
+    create_transaction('c', transaction_id='5')
+    linked = create_transaction(transaction_id='6')
+    create_transaction('c', transaction_id='7', original_transaction=linked)
+    declined = create_transaction(transaction_id='8')
+    create_transaction('c', transaction_success=False, transaction_id='8')
+    models.HelcimOpenPreauthorization.objects.all().delete()
+
+    assert preauthorizations.queue_open_preauthorizations() == 1
+    assert list(
+        models.HelcimOpenPreauthorization.objects.values_list('pk', flat=True)
+    ) == [declined.pk]
+    assert unlinked.captured_amount == 0
+
+@pytest.mark.django_db
+def test__schedule_capture():
+    preauth = create_transaction()
+    due = timezone.now() + timedelta(hours=1)
+
+    assert preauthorizations.schedule_capture(preauth, due) is True
+
+    preauth.open_preauthorization.refresh_from_db()
+    assert preauth.open_preauthorization.capture_due == due
+
+    preauth.open_preauthorization.delete()
+    assert preauthorizations.schedule_capture(preauth) is False
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__capture__succeeded(mock_capture):
+    mock_capture.side_effect = capture_transaction
+    preauth = create_transaction()
+
+    assert preauthorizations.capture(preauth.pk) is None
+    assert mock_capture.call_args[1]['original_transaction'] == preauth
+    assert mock_capture.call_args[1]['django_user'] is None
+    assert not models.HelcimOpenPreauthorization.objects.exists()
+    assert actions.get_status(preauth.pk)['status'] == 'succeeded'
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__capture__not_locked_during_request(mock_capture):
+    savepoints = len(connection.savepoint_ids)
+
+    def capture(original_transaction, **kwargs):
+        # The capture was marked as started and committed
+        assert len(connection.savepoint_ids) == savepoints
+        assert models.HelcimOpenPreauthorization.objects.get(
+            pk=original_transaction.pk
+        ).capture_started is not None
+
+        return capture_transaction(original_transaction)
+
+    mock_capture.side_effect = capture
+    preauth = create_transaction()
+
+    assert preauthorizations.capture(preauth.pk) is None
+    assert mock_capture.call_count == 1
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__capture__in_progress(mock_capture):
+    preauth = create_transaction()
+    started = timezone.now()
+    preauthorizations.schedule_capture(preauth, started)
+    models.HelcimOpenPreauthorization.objects.update(capture_started=started)
+
+    assert preauthorizations.capture(preauth.pk) == (
+        'The capture is already in progress'
+    )
+    assert preauthorizations.sweep(
+        now=started + timedelta(seconds=1), workers=1
+    ) == ([], [], [], [])
+    assert mock_capture.call_count == 0
+
+    queued = models.HelcimOpenPreauthorization.objects.get()
+    assert queued.capture_started == started
+    assert queued.attempts == 0
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__capture__timed_out_until_released(mock_capture):
+    mock_capture.side_effect = capture_transaction
+    preauth = create_transaction(days=6.5)
+    models.HelcimOpenPreauthorization.objects.update(
+        capture_started=timezone.now() - timedelta(
+            seconds=preauthorizations.CAPTURE_TIMEOUT + 1
+        )
+    )
+
+    assert preauthorizations.capture(preauth.pk) == (
+        'The capture is already in progress'
+    )
+    assert preauthorizations.sweep(workers=1) == ([], [], [], [preauth.pk])
+    assert mock_capture.call_count == 0
+
+    assert preauthorizations.release_capture(preauth.pk) is True
+    assert preauthorizations.release_capture(preauth.pk) is False
+    assert preauthorizations.sweep(workers=1) == ([preauth.pk], [], [], [])
+    assert mock_capture.call_count == 1
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__capture__payment_error(mock_capture):
+    mock_capture.return_value.process.side_effect = exceptions.PaymentError(
+        'Declined'
+    )
+    preauth = create_transaction()
+
+    assert preauthorizations.capture(preauth.pk) == 'Declined'
+    assert preauthorizations.capture(preauth.pk) == 'Declined'
+
+    queued = models.HelcimOpenPreauthorization.objects.get()
+    assert queued.attempts == 2
+    assert queued.last_error == 'Declined'
+    assert queued.capture_started is None
+    assert actions.get_status(preauth.pk)['status'] == 'failed'
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('error', [
+    exceptions.ProcessingError('Unable to connect to Helcim API'),
+    exceptions.DjangoError('Unable to save transaction record'),
+])
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__capture__uncertain_error_keeps_claim(mock_capture, error):
+    mock_capture.return_value.process.side_effect = error
+    preauth = create_transaction()
+
+    assert preauthorizations.capture(preauth.pk) == str(error)
+
+    # Helcim may have processed the capture, so it is not retried
+    queued = models.HelcimOpenPreauthorization.objects.get()
+    assert queued.attempts == 1
+    assert queued.last_error == str(error)
+    assert queued.capture_started is not None
+    assert preauthorizations.capture(preauth.pk) == (
+        'The capture is already in progress'
+    )
+    assert mock_capture.call_count == 1
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__capture__unexpected_error_keeps_claim(mock_capture):
+    mock_capture.return_value.process.side_effect = ValueError('Timed out')
+    preauth = create_transaction()
+
+    assert preauthorizations.capture(preauth.pk) == (
+        'Unable to capture transaction'
+    )
+
+    queued = models.HelcimOpenPreauthorization.objects.get()
+    assert queued.last_error == 'Unable to capture transaction'
+    assert queued.capture_started is not None
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__capture__user_of_preauthorization(mock_capture, django_user_model):
+    mock_capture.side_effect = capture_transaction
+    user = django_user_model.objects.create(username='user')
+    preauth = create_transaction(django_user=user)
+
+    assert preauthorizations.capture(preauth.pk) is None
+    assert mock_capture.call_args[1]['django_user'] == user
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__capture__not_queued(mock_capture):
+    mock_capture.side_effect = capture_transaction
+    preauth = create_transaction()
+    models.HelcimOpenPreauthorization.objects.all().delete()
+
+    assert preauthorizations.capture(preauth.pk) is None
+    assert mock_capture.call_count == 1
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__capture__pending_action(mock_capture):
+    preauth = create_transaction()
+    actions.start(preauth.pk, 'refund')
+
+    assert preauthorizations.capture(preauth.pk) == (
+        'A capture or refund is already pending'
+    )
+    assert mock_capture.call_count == 0
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__capture__already_captured(mock_capture):
+    preauth = create_transaction()
+    models.HelcimTransaction.objects.filter(pk=preauth.pk).update(
+        captured_amount='2.20'
+    )
+
+    assert preauthorizations.capture(preauth.pk) == (
+        'Transaction cannot be captured'
+    )
+    assert mock_capture.call_count == 0
+    assert not models.HelcimOpenPreauthorization.objects.exists()
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__sweep(mock_capture):
+    def capture(original_transaction, **kwargs):
+        if original_transaction.pk == failing.pk:
+            raise exceptions.PaymentError('Declined')
+
+        return capture_transaction(original_transaction)
+
+    mock_capture.side_effect = capture
+    not_due = create_transaction(days=1)
+    due_later = create_transaction(days=6.5)
+    failing = create_transaction(days=6.6)
+    due_first = create_transaction(days=6.7)
+    expired = create_transaction(days=8)
+    receiver = MagicMock()
+    preauthorizations_swept.connect(receiver)
+
+    try:
+        result = preauthorizations.sweep(workers=1)
+    finally:
+        preauthorizations_swept.disconnect(receiver)
+
+    assert result.captured == [due_first.pk, due_later.pk]
+    assert result.failed == [(failing.pk, 'Declined')]
+    assert result.expired == [expired.pk]
+    assert set(
+        models.HelcimOpenPreauthorization.objects.values_list('pk', flat=True)
+    ) == {not_due.pk, failing.pk}
+    assert receiver.call_args[1]['result'] == result
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.capture')
+def test__sweep__limit_and_dry_run(mock_capture):
+    due_later = create_transaction(days=6.5)
+    due_first = create_transaction(days=6.7)
+    expired = create_transaction(days=8)
+
+    result = preauthorizations.sweep(dry_run=True)
+
+    assert result == ([due_first.pk, due_later.pk], [], [expired.pk], [])
+    assert mock_capture.call_count == 0
+    assert models.HelcimOpenPreauthorization.objects.count() == 3
+
+    mock_capture.return_value = None
+    result = preauthorizations.sweep(limit=1, workers=1)
+
+    assert result.captured == [due_first.pk]
+    mock_capture.assert_called_once_with(due_first.pk)
+
+@patch('helcim.preauthorizations.capture')
+@patch('helcim.preauthorizations.connection')
+def test__sweep__worker_pool(mock_connection, mock_capture):
+    mock_capture.side_effect = lambda pk: 'Declined' if pk == 2 else None
+    queue = MagicMock()
+    queue.filter.return_value.values_list.return_value = []
+    queue.filter.return_value.order_by.return_value.values_list\
+        .return_value = [1, 2, 3]
+
+    with patch.object(
+            models.HelcimOpenPreauthorization.objects, 'all',
+            return_value=queue
+    ):
+        result = preauthorizations.sweep(workers=2)
+
+    assert result == ([1, 3], [(2, 'Declined')], [], [])
+    assert mock_connection.close.call_count == 3
+
+@patch('helcim.preauthorizations.sleep')
+@patch('helcim.preauthorizations.monotonic', return_value=100)
+def test__rate_limiter(mock_monotonic, mock_sleep):
+    limiter = preauthorizations.RateLimiter(4)
+
+    limiter.wait()
+    limiter.wait()
+    limiter.wait()
+
+    assert [call[0][0] for call in mock_sleep.call_args_list] == [0.25, 0.5]
+
+@patch('helcim.preauthorizations.sleep')
+def test__rate_limiter__no_rate(mock_sleep):
+    preauthorizations.RateLimiter().wait()
+
+    assert mock_sleep.call_count == 0
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__capture_command(mock_capture):
+    mock_capture.side_effect = capture_transaction
+    create_transaction(days=6.5)
+    create_transaction(days=8)
+    models.HelcimOpenPreauthorization.objects.all().delete()
+    output = StringIO()
+
+    call_command(
+        'helcim_capture_preauthorizations', '--backfill', '--workers=1',
+        '--rate=100', stdout=output,
+    )
+
+    assert output.getvalue() == (
+        'Queued 2 pre-authorization(s).\n'
+        'Captured 1 pre-authorization(s), 0 failed, 1 expired, 0 stalled.\n'
+    )
+
+@pytest.mark.django_db
+@patch('helcim.preauthorizations.gateway.Capture')
+def test__capture_command__stalled_and_released(mock_capture):
+    mock_capture.side_effect = capture_transaction
+    stalled = create_transaction(days=6.5)
+    models.HelcimOpenPreauthorization.objects.update(
+        capture_started=timezone.now() - timedelta(
+            seconds=preauthorizations.CAPTURE_TIMEOUT + 1
+        )
+    )
+    output = StringIO()
+    errors = StringIO()
+
+    call_command(
+        'helcim_capture_preauthorizations', '--workers=1', stdout=output,
+        stderr=errors,
+    )
+
+    assert output.getvalue() == (
+        'Captured 0 pre-authorization(s), 0 failed, 0 expired, 1 stalled.\n'
+    )
+    assert errors.getvalue() == (
+        'The capture of pre-authorization {} has stalled: check it with '
+        'Helcim before releasing it.\n'.format(stalled.pk)
+    )
+
+    output = StringIO()
+    call_command(
+        'helcim_capture_preauthorizations', '--workers=1',
+        '--release={}'.format(stalled.pk), stdout=output,
+    )
+
+    assert output.getvalue() == (
+        'Released pre-authorization {}.\n'
+        'Captured 1 pre-authorization(s), 0 failed, 0 expired, 0 stalled.\n'
+    ).format(stalled.pk)
+
+    with pytest.raises(CommandError):
+        call_command(
+            'helcim_capture_preauthorizations',
+            '--release={}'.format(stalled.pk),
+        )
+
+@pytest.mark.django_db
+def test__capture_command__dry_run():
+    create_transaction(days=6.5)
+    output = StringIO()
+
+    call_command(
+        'helcim_capture_preauthorizations', '--dry-run', stdout=output
+    )
+
+    assert output.getvalue() == (
+        '1 pre-authorization(s) due, 0 expired, 0 stalled.\n'
+    )
+    assert models.HelcimOpenPreauthorization.objects.count() == 1
+
+@pytest.mark.parametrize('option', ['--workers=0', '--rate=0', '--limit=0'])
+def test__capture_command__invalid_options(option):
+    with pytest.raises(CommandError):
+        call_command('helcim_capture_preauthorizations', option)
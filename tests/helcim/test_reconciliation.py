@@ -0,0 +1,312 @@
+"""Tests for the reconciliation module and command."""
+# pylint: disable=missing-docstring, protected-access
+from datetime import date, datetime
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from helcim import models, reconciliation
+
+
+CSV_EXPORT = (
+    'transactionId,type,date,time,amount,currency,orderNumber,'
+    'cardHolderName\n'
+    '101,purchase,2020-01-01,12:00:00,10.00,CAD,INV1,Test Person\n'
+    '102,purchase,2020-01-01,13:00:00,25.50,CAD,INV2,Test Person\n'
+    '103,refund,2020-01-02,09:30:00,5.00,CAD,INV3,\n'
+    ',preauth,2020-01-02,10:00:00,7.00,CAD,INV4,\n'
+)
+
+XML_EXPORT = """<?xml version="1.0"?>
+<message>
+    <transactions>
+        <transaction>
+            <transactionId>101</transactionId>
+            <type>purchase</type>
+            <date>2020-01-01</date>
+            <time>12:00:00</time>
+            <amount>10.00</amount>
+            <orderNumber>INV1</orderNumber>
+        </transaction>
+        <transaction>
+            <transactionId>102</transactionId>
+            <type>purchase</type>
+            <date>2020-01-01</date>
+            <time>13:00:00</time>
+            <amount>25.50</amount>
+            <orderNumber>INV2</orderNumber>
+        </transaction>
+    </transactions>
+</message>
+"""
+
+def create_transaction(transaction_id, amount, order_number, **kwargs):
+    details = {
+        'transaction_success': True,
+        'date_response': datetime(2020, 1, 1, 12, 0),
+        'transaction_type': 's',
+        'transaction_id': transaction_id,
+        'amount': Decimal(amount),
+        'currency': 'CAD',
+        'order_number': order_number,
+    }
+    details.update(kwargs)
+
+    return models.HelcimTransaction.objects.create(**details)
+
+@pytest.fixture
+def csv_export(tmpdir):
+    path = tmpdir.join('export.csv')
+    path.write(CSV_EXPORT)
+
+    return str(path)
+
+def test__convert_export_record():
+    record = reconciliation.convert_export_record({
+        'transactionId': '101',
+        'type': 'Preauth',
+        'date': '2020-01-01',
+        'amount': ' 10.00 ',
+        'cardHolderName': '',
+        'unknown': 'a',
+    })
+
+    assert record == {
+        'transaction_id': 101,
+        'transaction_type': 'p',
+        'transaction_date': date(2020, 1, 1),
+        'amount': Decimal('10.00'),
+    }
+
+def test__read_csv_export(csv_export):
+    records = list(reconciliation.read_csv_export(csv_export))
+
+    assert len(records) == 4
+    assert records[0]['transaction_id'] == 101
+    assert records[0]['cc_name'] == 'Test Person'
+    assert 'cc_name' not in records[2]
+    assert 'transaction_id' not in records[3]
+
+def test__read_xml_export(tmpdir):
+    path = tmpdir.join('export.xml')
+    path.write(XML_EXPORT)
+
+    records = list(reconciliation.read_xml_export(str(path)))
+
+    assert [record['transaction_id'] for record in records] == [101, 102]
+    assert records[1]['amount'] == Decimal('25.50')
+
+def test__read_export__format(csv_export, tmpdir):
+    assert len(list(reconciliation.read_export(csv_export))) == 4
+
+    with pytest.raises(ValueError):
+        reconciliation.read_export(str(tmpdir.join('export.txt')))
+
+def test__seen_ids():
+    seen = reconciliation._SeenIDs()
+
+    for transaction_id in (5, 3, 9, 1):
+        seen.add(transaction_id)
+
+    assert 3 in seen
+    assert 9 in seen
+    assert 4 not in seen
+    assert 10 not in seen
+
+@pytest.mark.django_db
+def test__reconcile(csv_export):
+    matched = create_transaction(101, '10.00', 'INV1')
+    mismatched = create_transaction(102, '25.00', 'INV2')
+    by_order = create_transaction(
+        None, '7.00', 'INV4',
+        transaction_type='p', date_response=datetime(2020, 1, 2, 10, 0),
+    )
+    orphaned = create_transaction(104, '1.00', 'INV5')
+    create_transaction(105, '1.00', 'INV6', date_response=datetime(2020, 2, 1))
+
+    discrepancies = list(reconciliation.reconcile(
+        reconciliation.read_export(csv_export), chunk_size=2
+    ))
+
+    assert discrepancies == [
+        reconciliation.Discrepancy(
+            'mismatched', 102, 'INV2', Decimal('25.50'), mismatched.id,
+            ('amount',), 2,
+        ),
+        reconciliation.Discrepancy(
+            'missing', 103, 'INV3', Decimal('5.00'), None, (), 3,
+        ),
+        reconciliation.Discrepancy(
+            'orphaned', 104, 'INV5', Decimal('1.00'), orphaned.id, (), None,
+        ),
+    ]
+    assert matched.id not in [item.local_id for item in discrepancies]
+    assert by_order.id not in [item.local_id for item in discrepancies]
+
+@pytest.mark.django_db
+def test__reconcile__matched_by_order_with_different_id():
+    local = create_transaction(999, '10.00', 'INV1')
+    records = [{
+        'transaction_id': 101,
+        'transaction_date': date(2020, 1, 1),
+        'amount': Decimal('10.00'),
+        'order_number': 'INV1',
+    }]
+
+    discrepancies = list(reconciliation.reconcile(records))
+
+    # The saved transaction is matched (so it is not orphaned)
+    assert discrepancies == [
+        reconciliation.Discrepancy(
+            'mismatched', 101, 'INV1', Decimal('10.00'), local.id,
+            ('transaction_id',), 1,
+        ),
+    ]
+
+def order_record(**kwargs):
+    """Returns an export transaction without a saved transaction ID."""
+    record = {
+        'transaction_date': date(2020, 1, 1),
+        'amount': Decimal('10.00'),
+        'order_number': 'INV1',
+    }
+    record.update(kwargs)
+
+    return record
+
+@pytest.mark.django_db
+def test__reconcile__matches_each_saved_transaction_once():
+    create_transaction(None, '10.00', 'INV1')
+    records = [order_record(), order_record()]
+
+    discrepancies = list(reconciliation.reconcile(records))
+
+    # The second export transaction is not matched to the same one
+    assert discrepancies == [
+        reconciliation.Discrepancy(
+            'missing', None, 'INV1', Decimal('10.00'), None, (), 2,
+        ),
+    ]
+
+@pytest.mark.django_db
+def test__reconcile__matches_each_saved_transaction_once_across_chunks():
+    create_transaction(None, '10.00', 'INV1')
+    records = [order_record(), order_record()]
+
+    discrepancies = list(reconciliation.reconcile(records, chunk_size=1))
+
+    assert discrepancies == [
+        reconciliation.Discrepancy(
+            'missing', None, 'INV1', Decimal('10.00'), None, (), 2,
+        ),
+    ]
+
+@pytest.mark.django_db
+def test__reconcile__invalid_records(tmpdir):
+    path = tmpdir.join('export.csv')
+    path.write(
+        'transactionId,date,amount,orderNumber\n'
+        '101,2020-01-01,abc,INV1\n'
+        '102,2020-13-45,10.00,INV2\n'
+        '103,2020-01-01,10.00,INV3\n'
+    )
+    create_transaction(101, '10.00', 'INV1')
+    create_transaction(102, '10.00', 'INV2')
+
+    discrepancies = list(reconciliation.reconcile(
+        reconciliation.read_export(str(path))
+    ))
+
+    # The saved transactions are not reported as orphaned
+    assert discrepancies == [
+        reconciliation.Discrepancy(
+            'invalid', 101, 'INV1', None, None, ('amount',), 1,
+        ),
+        reconciliation.Discrepancy(
+            'invalid', 102, 'INV2', Decimal('10.00'), None,
+            ('transaction_date',), 2,
+        ),
+        reconciliation.Discrepancy(
+            'missing', 103, 'INV3', Decimal('10.00'), None, (), 3,
+        ),
+    ]
+
+@pytest.mark.django_db
+def test__reconcile__matches_duplicated_orders_in_turn():
+    create_transaction(None, '10.00', 'INV1')
+    create_transaction(None, '10.00', 'INV1')
+    records = [order_record(), order_record()]
+
+    assert list(reconciliation.reconcile(records)) == []
+
+@pytest.mark.django_db
+def test__reconcile__prefers_matching_details():
+    create_transaction(None, '10.00', 'INV1', transaction_type='r')
+    create_transaction(None, '10.00', 'INV1')
+    records = [order_record(transaction_type='s')]
+
+    # Matched to the purchase (not the first saved transaction)
+    assert list(reconciliation.reconcile(records)) == []
+
+@pytest.mark.django_db
+def test__reconcile__ambiguous_duplicates():
+    create_transaction(201, '10.00', 'INV1')
+    create_transaction(202, '10.00', 'INV1')
+    records = [order_record(transaction_id=101)]
+
+    discrepancies = list(reconciliation.reconcile(records))
+
+    # The duplicates are reported once (not also as orphaned)
+    assert discrepancies == [
+        reconciliation.Discrepancy(
+            'ambiguous', 101, 'INV1', Decimal('10.00'), None, (), 1,
+        ),
+    ]
+
+@pytest.mark.django_db
+def test__reconcile__queries_per_chunk(csv_export, django_assert_num_queries):
+    # Each chunk: one query by ID and one by order number (for the
+    # unmatched transactions), plus the orphaned transactions
+    with django_assert_num_queries(5):
+        list(reconciliation.reconcile(
+            reconciliation.read_export(csv_export), chunk_size=2
+        ))
+
+@pytest.mark.django_db
+def test__reconcile_command(csv_export, tmpdir):
+    create_transaction(101, '10.00', 'INV1')
+    output = tmpdir.join('discrepancies.csv')
+    summary = StringIO()
+
+    call_command(
+        'helcim_reconcile_transactions', csv_export,
+        '--output={}'.format(output), stderr=summary,
+    )
+
+    assert output.read().splitlines() == [
+        'status,transaction_id,order_number,amount,local_id,fields,row',
+        'missing,102,INV2,25.50,,,2',
+        'missing,103,INV3,5.00,,,3',
+        'missing,,INV4,7.00,,,4',
+    ]
+    assert summary.getvalue() == (
+        'Invalid: 0, missing: 3, mismatched: 0, ambiguous: 0, orphaned: 0\n'
+    )
+
+def test__reconcile_command__invalid_format(tmpdir):
+    with pytest.raises(CommandError):
+        call_command(
+            'helcim_reconcile_transactions', str(tmpdir.join('export.txt'))
+        )
+
+@pytest.mark.django_db
+def test__reconcile_command__missing_file(tmpdir):
+    with pytest.raises(CommandError):
+        call_command(
+            'helcim_reconcile_transactions', str(tmpdir.join('export.csv')),
+            stdout=StringIO(),
+        )
@@ -0,0 +1,141 @@
+"""Tests for the reports module."""
+# pylint: disable=missing-docstring, redefined-outer-name
+from datetime import date, datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from django.core.cache import cache
+
+from helcim import models, reports
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+    yield
+
+    cache.clear()
+
+@pytest.fixture
+def today():
+    with patch('helcim.reports._today', return_value=date(2020, 1, 3)):
+        yield date(2020, 1, 3)
+
+def create_transaction(day, transaction_type, amount, **kwargs):
+    details = {
+        'transaction_success': True,
+        'date_response': datetime.combine(day, datetime.min.time()),
+        'transaction_type': transaction_type,
+        'amount': Decimal(amount),
+        'currency': 'CAD',
+    }
+    details.update(kwargs)
+
+    return models.HelcimTransaction.objects.create(**details)
+
+@pytest.mark.django_db
+def test__daily_totals():
+    create_transaction(date(2020, 1, 1), 's', '10.00')
+    create_transaction(date(2020, 1, 1), 's', '5.00')
+    create_transaction(
+        date(2020, 1, 1), 's', '1.00', transaction_success=False
+    )
+    create_transaction(date(2020, 1, 2), 'r', '2.00', currency='USD')
+    create_transaction(date(2020, 1, 4), 's', '1.00')
+
+    totals = reports.daily_totals(date(2020, 1, 1), date(2020, 1, 2))
+
+    assert totals == [
+        {
+            'day': date(2020, 1, 1), 'transaction_type': 's',
+            'currency': 'CAD', 'transaction_success': False,
+            'count': 1, 'amount': Decimal('1.00'),
+        },
+        {
+            'day': date(2020, 1, 1), 'transaction_type': 's',
+            'currency': 'CAD', 'transaction_success': True,
+            'count': 2, 'amount': Decimal('15.00'),
+        },
+        {
+            'day': date(2020, 1, 2), 'transaction_type': 'r',
+            'currency': 'USD', 'transaction_success': True,
+            'count': 1, 'amount': Decimal('2.00'),
+        },
+    ]
+
+def test__summarize_day():
+    totals = [
+        {
+            'transaction_type': transaction_type, 'currency': currency,
+            'transaction_success': success, 'count': 1,
+            'amount': Decimal(amount),
+        }
+        for transaction_type, currency, success, amount in [
+            ('s', 'CAD', True, '10.00'),
+            ('c', 'CAD', True, '5.00'),
+            ('r', 'CAD', True, '3.00'),
+            ('s', 'CAD', False, '100.00'),
+            ('p', 'CAD', True, '7.00'),
+            ('v', 'CAD', True, '0.00'),
+            ('r', 'USD', True, '1.00'),
+        ]
+    ]
+
+    summary = reports.summarize_day(date(2020, 1, 1), totals)
+
+    assert summary['date'] == date(2020, 1, 1)
+    assert summary['settled'] == {
+        'CAD': Decimal('12.00'), 'USD': Decimal('-1.00'),
+    }
+    assert summary['preauthorized'] == {'CAD': Decimal('7.00')}
+    assert len(summary['totals']) == 7
+
+@pytest.mark.django_db
+def test__daily_summaries(today):
+    create_transaction(date(2020, 1, 1), 's', '10.00')
+    create_transaction(today, 'p', '4.00')
+
+    summaries = reports.daily_summaries(date(2020, 1, 1), date(2020, 1, 4))
+
+    assert [summary['date'] for summary in summaries] == [
+        date(2020, 1, 1), date(2020, 1, 2), today, date(2020, 1, 4),
+    ]
+    assert summaries[0]['settled'] == {'CAD': Decimal('10.00')}
+    assert summaries[1]['totals'] == []
+    assert summaries[2]['preauthorized'] == {'CAD': Decimal('4.00')}
+    assert summaries[3]['settled'] == {}
+
+@pytest.mark.django_db
+def test__daily_summaries__only_recomputes_today(
+        today, django_assert_num_queries
+):
+    create_transaction(date(2020, 1, 1), 's', '10.00')
+    reports.daily_summaries(date(2020, 1, 1), today)
+
+    # Changes to past days are not seen until the cache is cleared
+    create_transaction(date(2020, 1, 1), 's', '5.00')
+    create_transaction(today, 's', '1.00')
+
+    with django_assert_num_queries(1):
+        summaries = reports.daily_summaries(date(2020, 1, 1), today)
+
+    assert summaries[0]['settled'] == {'CAD': Decimal('10.00')}
+    assert summaries[2]['settled'] == {'CAD': Decimal('1.00')}
+
+    reports.clear_cached_summaries(date(2020, 1, 1), date(2020, 1, 1))
+    summaries = reports.daily_summaries(date(2020, 1, 1), today)
+
+    assert summaries[0]['settled'] == {'CAD': Decimal('15.00')}
+
+@pytest.mark.django_db
+def test__daily_summaries__uncached_days_in_one_query(
+        today, django_assert_num_queries
+):
+    reports.daily_summaries(date(2020, 1, 2), date(2020, 1, 2))
+
+    # Two uncached past days and the current day
+    with django_assert_num_queries(2):
+        reports.daily_summaries(date(2019, 12, 31), today)
@@ -1,10 +1,17 @@
 """Tests for the determine_helcim_settings function."""
+from unittest.mock import patch
+
+import pytest
+
 from django.conf import settings
 from django.core import exceptions as django_exceptions
 from django.test import override_settings
 
 from helcim.settings import (
-    determine_helcim_settings, _validate_helcim_js_settings
+    SETTINGS, determine_helcim_settings, update_helcim_js_setting,
+    update_metrics_dir_setting,
+    _validate_helcim_js_settings, _validate_transport_settings,
+    _validate_audit_storage, _validate_callback_writes
 )
 
 
@@ -38,6 +45,85 @@ def test__validate_helcim_js_settings__missing_keys():
     else:
         assert False
 
+def test__validate_transport_settings__valid():
+    """Confirms no errors when transport settings are properly set."""
+    try:
+        _validate_transport_settings('live', None)
+        _validate_transport_settings('record', 'cassette.jsonl')
+        _validate_transport_settings('replay', 'cassette.jsonl')
+    except django_exceptions.ImproperlyConfigured:
+        assert False
+    else:
+        assert True
+
+def test__validate_transport_settings__invalid_mode():
+    """Confirms error when HELCIM_TRANSPORT_MODE is not supported."""
+    try:
+        _validate_transport_settings('invalid', 'cassette.jsonl')
+    except django_exceptions.ImproperlyConfigured as error:
+        assert str(error) == (
+            'HELCIM_TRANSPORT_MODE setting must be one of "live", '
+            '"record", or "replay".'
+        )
+    else:
+        assert False
+
+def test__validate_transport_settings__missing_cassette():
+    """Confirms error when recording or replaying without a cassette."""
+    try:
+        _validate_transport_settings('replay', None)
+    except django_exceptions.ImproperlyConfigured as error:
+        assert str(error) == (
+            'HELCIM_TRANSPORT_CASSETTE setting must be provided to '
+            'record or replay transactions.'
+        )
+    else:
+        assert False
+
+def test__validate_audit_storage__valid():
+    """Confirms no errors when the audit storage is properly set."""
+    try:
+        _validate_audit_storage('inline')
+        _validate_audit_storage('compressed')
+    except django_exceptions.ImproperlyConfigured:
+        assert False
+    else:
+        assert True
+
+def test__validate_audit_storage__invalid():
+    """Confirms error when HELCIM_AUDIT_STORAGE is not supported."""
+    try:
+        _validate_audit_storage('invalid')
+    except django_exceptions.ImproperlyConfigured as error:
+        assert str(error) == (
+            'HELCIM_AUDIT_STORAGE setting must be either "inline" or '
+            '"compressed".'
+        )
+    else:
+        assert False
+
+def test__validate_callback_writes__valid():
+    """Confirms no errors when the callback writes are properly set."""
+    try:
+        _validate_callback_writes('immediate')
+        _validate_callback_writes('batched')
+    except django_exceptions.ImproperlyConfigured:
+        assert False
+    else:
+        assert True
+
+def test__validate_callback_writes__invalid():
+    """Confirms error when HELCIM_JS_CALLBACK_WRITES is not supported."""
+    try:
+        _validate_callback_writes('invalid')
+    except django_exceptions.ImproperlyConfigured as error:
+        assert str(error) == (
+            'HELCIM_JS_CALLBACK_WRITES setting must be either "immediate" '
+            'or "batched".'
+        )
+    else:
+        assert False
+
 @override_settings(
     HELCIM_ACCOUNT_ID=1, HELCIM_API_TOKEN=2, HELCIM_API_URL=3,
     HELCIM_TERMINAL_ID=4, HELCIM_API_TEST=5, HELCIM_JS_CONFIG={},
@@ -47,13 +133,20 @@ def test__validate_helcim_js_settings__missing_keys():
     HELCIM_REDACT_CC_MAGNETIC_ENCRYPTED=14, HELCIM_REDACT_TOKEN=15,
     HELCIM_ENABLE_TRANSACTION_CAPTURE=16, HELCIM_ENABLE_TRANSACTION_REFUND=17,
     HELCIM_ENABLE_TOKEN_VAULT=18, HELCIM_ALLOW_ANONYMOUS=19,
-    HELCIM_ENABLE_ADMIN=20,
+    HELCIM_ENABLE_ADMIN=20, HELCIM_ENABLE_INSTRUMENTATION=21,
+    HELCIM_ENABLE_METRICS=22, HELCIM_METRICS_DIR=23,
+    HELCIM_TRANSPORT_MODE='replay', HELCIM_TRANSPORT_CASSETTE=25,
+    HELCIM_TRANSPORT_REPLAY_LATENCY=26,
+    HELCIM_ASYNC_TRANSACTION_ACTIONS=27, HELCIM_ASYNC_ACTION_WORKERS=28,
+    HELCIM_AUDIT_STORAGE='compressed', HELCIM_JS_CALLBACK_WRITES='batched',
+    HELCIM_JS_CALLBACK_BATCH_SIZE=31, HELCIM_PREAUTH_EXPIRY_DAYS=32,
+    HELCIM_PREAUTH_CAPTURE_MARGIN_HOURS=33,
 )
 def test__determine_helcim_settings__all_settings_provided():
     """Tests that dictionary contains all expected values."""
     helcim_settings = determine_helcim_settings()
 
-    assert len(helcim_settings) == 20
+    assert len(helcim_settings) == 33
     assert helcim_settings['account_id'] == 1
     assert helcim_settings['api_token'] == 2
     assert helcim_settings['api_url'] == 3
@@ -74,6 +167,19 @@ def test__determine_helcim_settings__all_settings_provided():
     assert helcim_settings['enable_token_vault'] == 18
     assert helcim_settings['allow_anonymous'] == 19
     assert helcim_settings['enable_admin'] == 20
+    assert helcim_settings['enable_instrumentation'] == 21
+    assert helcim_settings['enable_metrics'] == 22
+    assert helcim_settings['metrics_dir'] == 23
+    assert helcim_settings['transport_mode'] == 'replay'
+    assert helcim_settings['transport_cassette'] == 25
+    assert helcim_settings['transport_replay_latency'] == 26
+    assert helcim_settings['async_transaction_actions'] == 27
+    assert helcim_settings['async_action_workers'] == 28
+    assert helcim_settings['preauth_expiry_days'] == 32
+    assert helcim_settings['preauth_capture_margin_hours'] == 33
+    assert helcim_settings['audit_storage'] == 'compressed'
+    assert helcim_settings['callback_writes'] == 'batched'
+    assert helcim_settings['callback_batch_size'] == 31
 
 @override_settings()
 def test__determine_helcim_settings__defaults():
@@ -99,10 +205,23 @@ def test__determine_helcim_settings__defaults():
     del settings.HELCIM_ENABLE_TOKEN_VAULT
     del settings.HELCIM_ALLOW_ANONYMOUS
     del settings.HELCIM_ENABLE_ADMIN
+    del settings.HELCIM_ENABLE_INSTRUMENTATION
+    del settings.HELCIM_ENABLE_METRICS
+    del settings.HELCIM_METRICS_DIR
+    del settings.HELCIM_TRANSPORT_MODE
+    del settings.HELCIM_TRANSPORT_CASSETTE
+    del settings.HELCIM_TRANSPORT_REPLAY_LATENCY
+    del settings.HELCIM_ASYNC_TRANSACTION_ACTIONS
+    del settings.HELCIM_ASYNC_ACTION_WORKERS
+    del settings.HELCIM_PREAUTH_EXPIRY_DAYS
+    del settings.HELCIM_PREAUTH_CAPTURE_MARGIN_HOURS
+    del settings.HELCIM_AUDIT_STORAGE
+    del settings.HELCIM_JS_CALLBACK_WRITES
+    del settings.HELCIM_JS_CALLBACK_BATCH_SIZE
 
     helcim_settings = determine_helcim_settings()
 
-    assert len(helcim_settings) == 20
+    assert len(helcim_settings) == 33
     assert helcim_settings['account_id'] == ''
     assert helcim_settings['api_token'] == ''
     assert helcim_settings['api_url'] == 'https://secure.myhelcim.com/api/'
@@ -123,3 +242,44 @@ def test__determine_helcim_settings__defaults():
     assert helcim_settings['enable_token_vault'] is False
     assert helcim_settings['allow_anonymous'] is True
     assert helcim_settings['enable_admin'] is False
+    assert helcim_settings['enable_instrumentation'] is False
+    assert helcim_settings['enable_metrics'] is False
+    assert helcim_settings['metrics_dir'] is None
+    assert helcim_settings['transport_mode'] == 'live'
+    assert helcim_settings['transport_cassette'] is None
+    assert helcim_settings['transport_replay_latency'] is False
+    assert helcim_settings['async_transaction_actions'] is False
+    assert helcim_settings['async_action_workers'] == 4
+    assert helcim_settings['preauth_expiry_days'] == 7
+    assert helcim_settings['preauth_capture_margin_hours'] == 24
+    assert helcim_settings['audit_storage'] == 'inline'
+    assert helcim_settings['callback_writes'] == 'immediate'
+    assert helcim_settings['callback_batch_size'] == 50
+
+def test__update_helcim_js_setting__invalid():
+    """Confirms an invalid Helcim.js configuration is not applied."""
+    original = SETTINGS['helcim_js']
+
+    with pytest.raises(django_exceptions.ImproperlyConfigured):
+        update_helcim_js_setting('HELCIM_JS_CONFIG', {'id': {'url': 'a'}})
+
+    assert SETTINGS['helcim_js'] is original
+
+def test__update_helcim_js_setting__other_setting():
+    """Confirms other settings do not change the configuration."""
+    original = SETTINGS['helcim_js']
+
+    update_helcim_js_setting('HELCIM_API_URL', 'https://example.com')
+
+    assert SETTINGS['helcim_js'] is original
+
+@patch.dict('helcim.settings.SETTINGS', {'metrics_dir': None})
+def test__update_metrics_dir_setting():
+    """Confirms the metrics directory follows its setting."""
+    update_metrics_dir_setting('HELCIM_METRICS_DIR', '/tmp/metrics')
+
+    assert SETTINGS['metrics_dir'] == '/tmp/metrics'
+
+    update_metrics_dir_setting('HELCIM_API_URL', 'https://example.com')
+
+    assert SETTINGS['metrics_dir'] == '/tmp/metrics'
@@ -0,0 +1,274 @@
+"""Tests for the Helcim API simulator."""
+# pylint: disable=missing-docstring, redefined-outer-name
+from decimal import Decimal
+import socket
+
+import pytest
+import requests
+
+from helcim import exceptions, gateway
+from helcim.testing import simulator as helcim_simulator
+from helcim.testing.simulator import __main__ as simulator_main, responses
+
+
+CARD = {
+    'cc_name': 'Test Person',
+    'cc_number': '4242424242424242',
+    'cc_expiry': '0125',
+}
+
+@pytest.fixture
+def simulator():
+    simulator = helcim_simulator.HelcimSimulator(seed=1).start()
+
+    yield simulator
+
+    simulator.stop()
+
+def api_details(simulator):
+    return {
+        'url': simulator.url,
+        'account_id': '1234567890',
+        'token': 'abcdefghijklmno1234567890',
+        'terminal_id': '98765432',
+    }
+
+@pytest.mark.django_db
+def test_preauthorize_and_capture(simulator):
+    preauth = gateway.Preauthorize(
+        api_details=api_details(simulator), amount=Decimal('50.00'), **CARD
+    ).process()[0]
+
+    capture = gateway.Capture(
+        api_details=api_details(simulator),
+        transaction_id=preauth.transaction_id,
+    ).process()
+
+    assert preauth.transaction_type == 'p'
+    assert preauth.customer_code == 'CST1000'
+    assert capture.transaction_type == 'c'
+    assert capture.original_transaction == preauth
+    assert simulator.ledger.get_transaction(preauth.transaction_id)[
+        'captured'
+    ]
+
+@pytest.mark.django_db
+def test_capture_unknown_preauthorization(simulator):
+    capture = gateway.Capture(
+        api_details=api_details(simulator), transaction_id=999
+    )
+
+    with pytest.raises(exceptions.PaymentError) as error:
+        capture.process()
+
+    assert 'Transaction Not Found' in str(error.value)
+
+@pytest.mark.django_db
+def test_purchase_with_saved_token(simulator):
+    card = simulator.ledger.add_card('CST2000')
+
+    purchase = gateway.Purchase(
+        api_details=api_details(simulator), amount=Decimal('10.00'),
+        token=card.token, token_f4l4=card.f4l4, customer_code='CST2000',
+    ).process()[0]
+
+    assert purchase.token == card.token
+    assert purchase.customer_code == 'CST2000'
+
+@pytest.mark.django_db
+def test_purchase_with_unknown_token(simulator):
+    purchase = gateway.Purchase(
+        api_details=api_details(simulator), amount=Decimal('10.00'),
+        token='abcdefghijklmnopqrstuv', token_f4l4='54545454',
+        customer_code='CST2000',
+    )
+
+    with pytest.raises(exceptions.PaymentError) as error:
+        purchase.process()
+
+    assert 'Invalid Card Token' in str(error.value)
+
+@pytest.mark.django_db
+def test_stateless_simulator_accepts_unknown_transactions():
+    simulator = helcim_simulator.HelcimSimulator(stateful=False).start()
+
+    try:
+        for _ in range(2):
+            capture = gateway.Capture(
+                api_details=api_details(simulator), transaction_id=999
+            ).process()
+
+            assert capture.transaction_type == 'c'
+    finally:
+        simulator.stop()
+
+def test_error_rate():
+    simulator = helcim_simulator.HelcimSimulator(error_rate=1).start()
+
+    try:
+        response = requests.post(simulator.url, {'transactionType': 'verify'})
+    finally:
+        simulator.stop()
+
+    assert response.status_code == 500
+
+def test_decline_rate():
+    simulator = helcim_simulator.HelcimSimulator(decline_rate=1).start()
+
+    try:
+        response = requests.post(simulator.url, {
+            'accountId': '1', 'apiToken': '2', 'transactionType': 'verify',
+            'customerCode': 'CST1000',
+        })
+    finally:
+        simulator.stop()
+
+    assert '<responseMessage>DECLINED</responseMessage>' in response.text
+
+def test_max_throughput_reject():
+    simulator = helcim_simulator.HelcimSimulator(
+        max_throughput=0.1, throughput_mode='reject'
+    ).start()
+    data = {'accountId': '1', 'apiToken': '2', 'transactionType': 'verify'}
+
+    try:
+        statuses = [
+            requests.post(simulator.url, data).status_code for _ in range(2)
+        ]
+    finally:
+        simulator.stop()
+
+    assert statuses == [200, 429]
+
+def test_max_throughput_queue():
+    simulator = helcim_simulator.HelcimSimulator(max_throughput=1000)
+
+    assert all(simulator.acquire_slot() for _ in range(5))
+    # The sixth request would wait for the next slot
+    assert simulator._next_slot > 0 # pylint: disable=protected-access
+
+    simulator.server_close()
+
+def test_listen_backlog():
+    # Not serving, so the connections wait in the listen backlog
+    simulator = helcim_simulator.HelcimSimulator()
+    connections = []
+
+    try:
+        for _ in range(32):
+            connections.append(socket.create_connection(
+                simulator.server_address, timeout=1
+            ))
+    finally:
+        for client in connections:
+            client.close()
+
+        simulator.server_close()
+
+    assert len(connections) == 32
+
+def test_invalid_credentials():
+    simulator = helcim_simulator.HelcimSimulator()
+
+    response = simulator.respond({'transactionType': 'verify'})
+
+    simulator.server_close()
+
+    assert 'Invalid API Credentials' in response
+
+def test_invalid_options():
+    with pytest.raises(ValueError):
+        helcim_simulator.HelcimSimulator(latency_distribution='normal')
+
+    with pytest.raises(ValueError):
+        helcim_simulator.HelcimSimulator(throughput_mode='drop')
+
+def test_ledger_capture_once():
+    ledger = helcim_simulator.Ledger()
+    preauth = ledger.process({
+        'transactionType': 'preauth', 'amount': '20.00',
+        'cardNumber': '5454545454545454', 'cardExpiry': '0125',
+    })
+    capture = {
+        'transactionType': 'capture',
+        'transactionId': str(preauth['transaction_id']),
+    }
+
+    assert ledger.process(capture)['amount'] == Decimal('20.00')
+
+    with pytest.raises(helcim_simulator.Declined) as error:
+        ledger.process(capture)
+
+    assert str(error.value) == 'Transaction Already Captured'
+    assert len(ledger) == 2
+
+def test_ledger_capture_exceeds_preauthorized_amount():
+    ledger = helcim_simulator.Ledger()
+    preauth = ledger.process({
+        'transactionType': 'preauth', 'amount': '20.00',
+        'cardNumber': '5454545454545454', 'cardExpiry': '0125',
+    })
+
+    with pytest.raises(helcim_simulator.Declined):
+        ledger.process({
+            'transactionType': 'capture', 'amount': '25.00',
+            'transactionId': str(preauth['transaction_id']),
+        })
+
+def test_ledger_saves_card_tokens():
+    ledger = helcim_simulator.Ledger()
+    purchase = ledger.process({
+        'transactionType': 'purchase', 'amount': '20.00',
+        'cardNumber': '5454545454545454', 'cardExpiry': '0125',
+    })
+    card = purchase['card']
+
+    refund = ledger.process({
+        'transactionType': 'refund', 'amount': '20.00',
+        'cardToken': card.token, 'cardF4L4': '54545454',
+        'customerCode': card.customer_code,
+    })
+
+    assert card.customer_code == 'CST1000'
+    assert refund['token'] == card.token
+
+    with pytest.raises(helcim_simulator.Declined) as error:
+        ledger.process({
+            'transactionType': 'refund', 'amount': '20.00',
+            'cardToken': card.token, 'cardF4L4': '42424242',
+            'customerCode': card.customer_code,
+        })
+
+    assert str(error.value) == 'Invalid Card F4L4'
+
+def test_ledger_invalid_requests():
+    ledger = helcim_simulator.Ledger()
+
+    for data in (
+            {'transactionType': 'void'},
+            {'transactionType': 'purchase', 'amount': '10.00'},
+            {'transactionType': 'purchase', 'customerCode': 'CST1'},
+            {'transactionType': 'purchase', 'amount': 'a', 'cardMag': 'b'},
+            {'transactionType': 'capture', 'transactionId': 'a'},
+    ):
+        with pytest.raises(helcim_simulator.Declined):
+            ledger.process(data)
+
+def test_approved_response_escapes_values():
+    card = helcim_simulator.Card('a', '5454545454545454', '0125', 'A & B', '')
+    response = responses.approved({
+        'transaction_id': 1, 'type': 'verify', 'amount': Decimal('0.00'),
+        'order_number': '<1>', 'card': card,
+    })
+
+    assert '<cardHolderName>A &amp; B</cardHolderName>' in response
+    assert '<orderNumber>&lt;1&gt;</orderNumber>' in response
+
+def test_parse_args():
+    arguments = simulator_main.parse_args([
+        '--port', '8080', '--max-throughput', '50', '--stateless'
+    ])
+
+    assert arguments.port == 8080
+    assert arguments.max_throughput == 50
+    assert arguments.stateless is True
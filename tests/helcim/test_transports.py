@@ -0,0 +1,214 @@
+"""Tests for the transports module."""
+# pylint: disable=missing-docstring, protected-access
+import json
+from unittest.mock import patch
+
+import pytest
+
+from helcim import exceptions as helcim_exceptions, gateway, transports
+
+
+RESPONSE = (
+    '<?xml version="1.0"?><message><response>1</response>'
+    '<responseMessage>APPROVED</responseMessage><notice></notice>'
+    '<transaction><transactionId>1</transactionId><type>purchase</type>'
+    '<date>2020-09-11</date><time>12:30:45</time>'
+    '<cardHolderName>Test Person</cardHolderName><amount>100.00</amount>'
+    '<cardNumber>5454********5454</cardNumber>'
+    '<cardToken>80defad45bae30e557da0e</cardToken>'
+    '<expiryDate>0125</expiryDate><cardType>MasterCard</cardType>'
+    '</transaction></message>'
+)
+
+REQUEST = {
+    'accountId': '1',
+    'apiToken': '2',
+    'terminalId': '3',
+    'transactionType': 'purchase',
+    'amount': '100.00',
+    'cardNumber': '5454545454545454',
+    'cardExpiry': '0125',
+    'cardCVV': '100',
+}
+
+class MockResponse():
+    def __init__(self, status_code=200, text=RESPONSE):
+        self.status_code = status_code
+        self.text = text
+
+class MockTransport():
+    def __init__(self, response=None):
+        self.response = response or MockResponse()
+
+    def post(self, url, post_data):
+        return self.response
+
+def record(path, post_data=None, response=None):
+    transport = transports.RecordingTransport(
+        path, transport=MockTransport(response)
+    )
+
+    return transport.post('https://example.com/', post_data or REQUEST)
+
+def test__redact_request():
+    assert transports.redact_request(REQUEST) == {
+        'terminalId': '3',
+        'transactionType': 'purchase',
+        'amount': '100.00',
+    }
+
+@patch.dict('helcim.transports.SETTINGS', {'redact_all': None})
+def test__redact_response__follows_settings():
+    redacted = transports.redact_response(RESPONSE)
+
+    assert '<cardHolderName>' not in redacted
+    assert '<cardNumber>' not in redacted
+    assert '<expiryDate>' not in redacted
+    assert '<cardType>' not in redacted
+    assert '<cardToken>80defad45bae30e557da0e</cardToken>' in redacted
+    assert '<amount>100.00</amount>' in redacted
+
+@patch.dict('helcim.transports.SETTINGS', {'redact_all': False})
+def test__redact_response__redact_all_false():
+    assert transports.redact_response(RESPONSE) == RESPONSE
+
+def test__request_key__ignores_redacted_fields():
+    other_card = dict(REQUEST, cardNumber='4111111111111111', apiToken='9')
+    other_amount = dict(REQUEST, amount='50.00')
+
+    assert transports.request_key(REQUEST) == (
+        transports.request_key(other_card)
+    )
+    assert transports.request_key(REQUEST) != (
+        transports.request_key(other_amount)
+    )
+
+def test__recording_transport__writes_redacted_line(tmpdir):
+    path = str(tmpdir.join('cassette.jsonl'))
+
+    response = record(path)
+
+    assert response.text == RESPONSE
+
+    with open(path) as cassette:
+        lines = cassette.readlines()
+
+    assert len(lines) == 1
+
+    entry = json.loads(lines[0])
+    assert entry['key'] == transports.request_key(REQUEST)
+    assert entry['request'] == transports.redact_request(REQUEST)
+    assert entry['status_code'] == 200
+    assert entry['text'] == transports.redact_response(RESPONSE)
+    assert entry['latency'] >= 0
+    assert '5454545454545454' not in lines[0]
+
+def test__replay_transport__serves_recorded_responses(tmpdir):
+    path = str(tmpdir.join('cassette.jsonl'))
+    record(path, response=MockResponse(text='first'))
+    record(path, response=MockResponse(text='second'))
+    record(path, dict(REQUEST, amount='50.00'), MockResponse(500, 'other'))
+
+    transport = transports.ReplayTransport(path)
+
+    assert transport.post('', REQUEST).text == 'first'
+    assert transport.post('', REQUEST).text == 'second'
+    assert transport.post('', REQUEST).text == 'first'
+
+    other = transport.post('', dict(REQUEST, amount='50.00'))
+    assert other.status_code == 500
+    assert other.text == 'other'
+
+    transport.close()
+
+def test__replay_transport__unmatched_request(tmpdir):
+    path = str(tmpdir.join('cassette.jsonl'))
+    record(path)
+
+    transport = transports.ReplayTransport(path)
+
+    with pytest.raises(helcim_exceptions.ProcessingError):
+        transport.post('', dict(REQUEST, amount='1.00'))
+
+def test__replay_transport__empty_cassette(tmpdir):
+    path = tmpdir.join('cassette.jsonl')
+    path.write('')
+
+    transport = transports.ReplayTransport(str(path))
+
+    with pytest.raises(helcim_exceptions.ProcessingError):
+        transport.post('', REQUEST)
+
+    transport.close()
+
+@patch('helcim.transports.sleep')
+def test__replay_transport__recorded_latency(mock_sleep, tmpdir):
+    path = str(tmpdir.join('cassette.jsonl'))
+    record(path)
+
+    transports.ReplayTransport(path).post('', REQUEST)
+    assert mock_sleep.called is False
+
+    transports.ReplayTransport(path, latency=True).post('', REQUEST)
+    assert mock_sleep.call_count == 1
+
+@patch.dict('helcim.transports.SETTINGS', {'transport_mode': 'live'})
+def test__get_transport__live():
+    assert isinstance(
+        transports.get_transport(), transports.RequestsTransport
+    )
+
+def test__get_transport__record_and_replay(tmpdir):
+    path = str(tmpdir.join('cassette.jsonl'))
+    record(path)
+
+    with patch.dict('helcim.transports.SETTINGS', {
+            'transport_mode': 'record', 'transport_cassette': path,
+    }):
+        recording = transports.get_transport()
+
+        assert isinstance(recording, transports.RecordingTransport)
+        assert transports.get_transport() is recording
+
+    with patch.dict('helcim.transports.SETTINGS', {
+            'transport_mode': 'replay', 'transport_cassette': path,
+            'transport_replay_latency': False,
+    }):
+        replay = transports.get_transport()
+
+        assert isinstance(replay, transports.ReplayTransport)
+        assert transports.get_transport() is replay
+
+    transports._TRANSPORTS.clear()
+
+@patch('helcim.gateway.models.HelcimTransaction.objects.create')
+def test__gateway_purchase__replayed(mock_create, tmpdir):
+    path = str(tmpdir.join('cassette.jsonl'))
+    details = {
+        'amount': '100.00',
+        'cc_number': '5454545454545454',
+        'cc_expiry': '0125',
+        'cc_cvv': '100',
+    }
+
+    with patch('helcim.gateway.requests.post') as mock_post:
+        mock_post.return_value = MockResponse()
+
+        with patch.dict('helcim.transports.SETTINGS', {
+                'transport_mode': 'record', 'transport_cassette': path,
+        }):
+            gateway.Purchase(**details).process()
+
+    with patch('helcim.gateway.requests.post') as mock_post:
+        with patch.dict('helcim.transports.SETTINGS', {
+                'transport_mode': 'replay', 'transport_cassette': path,
+                'transport_replay_latency': False,
+        }):
+            gateway.Purchase(**details).process()
+
+        assert mock_post.called is False
+
+    assert mock_create.call_count == 2
+    assert mock_create.call_args[1]['transaction_id'] == 1
+
+    transports._TRANSPORTS.clear()
@@ -36,16 +36,32 @@ def test_tokens_list_exists_at_desired_name(admin_client):
 
     assert response.status_code == 200
 
+def test_helcim_js_callback_exists_at_desired_url():
+    """Tests that the Helcim.js callback URL works."""
+    assert reverse('helcim_js_callback', kwargs={'config': 'purchase'}) == (
+        '/helcim-js/purchase/'
+    )
+
 @pytest.mark.django_db
 def test_token_urls_not_loaded_if_settings_are_false():
     """Tests that token list URL name works."""
     # Check correct number of URLs when vault disabled
     with patch.dict('helcim.gateway.SETTINGS', {'enable_token_vault': False}):
         reload(urls)
-        assert len(urls.urlpatterns) == 2
+        assert len(urls.urlpatterns) == 3
 
     # Check correct number of URLs when vault enabled
     # NB: Need to reload URLs in this order otherwise tests bleed into others
     with patch.dict('helcim.gateway.SETTINGS', {'enable_token_vault': True}):
         reload(urls)
-        assert len(urls.urlpatterns) == 4
+        assert len(urls.urlpatterns) == 5
+
+def test_metrics_url_loaded_if_enabled():
+    """Tests that metrics URL is only added when metrics are enabled."""
+    with patch.dict('helcim.gateway.SETTINGS', {'enable_metrics': True}):
+        reload(urls)
+        assert urls.urlpatterns[-1].name == 'helcim_metrics'
+
+    # Reload without metrics to prevent tests bleeding into others
+    reload(urls)
+    assert urls.urlpatterns[-1].name != 'helcim_metrics'
@@ -6,15 +6,16 @@ import pytest
 from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.messages import get_messages
+from django.test import RequestFactory
 from django.urls import reverse
 
-from helcim import exceptions, models
+from helcim import actions, exceptions, models, views
 
 
 class MockRefund():
     """Mock of the Refund Object."""
     # pylint: disable=missing-docstring
-    def __init__(self, args, **kwargs):
+    def __init__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
 
@@ -24,7 +25,7 @@ class MockRefund():
 class MockRefundError():
     """Mock of the Refund Object that returns RefundError."""
     # pylint: disable=missing-docstring
-    def __init__(self, args, **kwargs):
+    def __init__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
 
@@ -34,7 +35,7 @@ class MockRefundError():
 class MockCapture():
     """Mock of the Capture Object."""
     # pylint: disable=missing-docstring
-    def __init__(self, args, **kwargs):
+    def __init__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
 
@@ -44,7 +45,7 @@ class MockCapture():
 class MockCaptureError():
     """Mock of the Capture Objectthat returns PaymentError."""
     # pylint: disable=missing-docstring
-    def __init__(self, args, **kwargs):
+    def __init__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
 
@@ -476,6 +477,183 @@ def test_transaction_capture_error(admin_client):
     assert messages[0].tags == 'error'
     assert messages[0].message == 'Unable to capture transaction'
 
+@pytest.mark.django_db
+@patch('helcim.gateway.Refund')
+@patch.dict('helcim.gateway.SETTINGS', {'enable_transaction_refund': True})
+def test_transaction_detail_post_refund_details(mock_refund, admin_client):
+    """Tests that the transaction details are passed to the refund."""
+    transaction = create_transaction('s')
+
+    with patch.object(
+        views.TransactionDetailView,
+        'get_object',
+        autospec=True,
+        side_effect=views.TransactionDetailView.get_object,
+    ) as mock_get_object:
+        admin_client.post(
+            reverse(
+                'helcim_transaction_detail',
+                kwargs={'transaction_id': transaction.id}
+            ),
+            {'action': 'refund'},
+        )
+
+    # The transaction is only retrieved once
+    assert mock_get_object.call_count == 1
+
+    _, kwargs = mock_refund.call_args
+    assert str(kwargs['amount']) == '2.20'
+    assert kwargs['token'] == 'f'
+    assert kwargs['token_f4l4'] == '11119999'
+    assert kwargs['customer_code'] == 'k'
+    assert kwargs['django_user'].username == 'admin'
+
+@pytest.mark.django_db
+@patch('helcim.gateway.Refund')
+@patch.dict('helcim.gateway.SETTINGS', {'enable_transaction_refund': True})
+def test_transaction_detail_post_refund_saving_error(
+        mock_refund, admin_client
+):
+    """Tests that an error after the refund is reported (not a 500)."""
+    mock_refund.return_value.process.side_effect = exceptions.DjangoError(
+        'Unable to save transaction record'
+    )
+    transaction = create_transaction('s')
+
+    response = admin_client.post(
+        reverse(
+            'helcim_transaction_detail',
+            kwargs={'transaction_id': transaction.id}
+        ),
+        {'action': 'refund'},
+        follow=True
+    )
+
+    messages = [message for message in get_messages(response.wsgi_request)]
+
+    assert response.status_code == 200
+    assert messages[0].tags == 'error'
+    assert messages[0].message == (
+        'Unable to refund transaction: Unable to save transaction record'
+    )
+
+@pytest.mark.django_db
+@patch('helcim.views.actions.submit', return_value=True)
+@patch.dict('helcim.gateway.SETTINGS', {
+    'enable_transaction_refund': True, 'async_transaction_actions': True,
+})
+def test_transaction_detail_post_async_refund(mock_submit, admin_client):
+    """Tests that asynchronous refunds are submitted to the workers."""
+    transaction = create_transaction('s')
+
+    response = admin_client.post(
+        reverse(
+            'helcim_transaction_detail',
+            kwargs={'transaction_id': transaction.id}
+        ),
+        {'action': 'refund'},
+    )
+
+    messages = [message for message in get_messages(response.wsgi_request)]
+
+    assert response.status_code == 302
+    mock_submit.assert_called_once_with(
+        transaction.pk, 'refund', django_user=response.wsgi_request.user
+    )
+    assert messages[0].tags == 'info'
+    assert messages[0].message == 'Transaction refund submitted'
+
+@pytest.mark.django_db
+@patch('helcim.views.actions.submit', return_value=False)
+@patch.dict('helcim.gateway.SETTINGS', {
+    'enable_transaction_capture': True, 'async_transaction_actions': True,
+})
+def test_transaction_detail_post_async_already_pending(
+        mock_submit, admin_client # pylint: disable=unused-argument
+):
+    """Tests that a second action is refused while one is pending."""
+    transaction = create_transaction('p')
+
+    response = admin_client.post(
+        reverse(
+            'helcim_transaction_detail',
+            kwargs={'transaction_id': transaction.id}
+        ),
+        {'action': 'capture'},
+    )
+
+    messages = [message for message in get_messages(response.wsgi_request)]
+
+    assert messages[0].tags == 'error'
+    assert messages[0].message == (
+        'An action is already being processed for this transaction'
+    )
+
+@pytest.mark.django_db
+@patch('helcim.gateway.Refund', MockRefund)
+@patch.dict('helcim.gateway.SETTINGS', {'enable_transaction_refund': True})
+def test_transaction_detail_post_refund_already_pending(admin_client):
+    """Tests that a refund is refused while another action is pending."""
+    transaction = create_transaction('s')
+    actions.start(transaction.pk, 'capture')
+
+    response = admin_client.post(
+        reverse(
+            'helcim_transaction_detail',
+            kwargs={'transaction_id': transaction.id}
+        ),
+        {'action': 'refund'},
+    )
+
+    actions.finish(transaction.pk)
+    messages = [message for message in get_messages(response.wsgi_request)]
+
+    assert messages[0].tags == 'error'
+    assert messages[0].message == (
+        'An action is already being processed for this transaction'
+    )
+
+@pytest.mark.django_db
+def test_transaction_detail_pending_action(admin_client):
+    """Tests that a pending action is displayed and polled."""
+    transaction = create_transaction('s')
+    actions.start(transaction.pk, 'refund')
+
+    response = admin_client.get(
+        reverse(
+            'helcim_transaction_detail',
+            kwargs={'transaction_id': transaction.id}
+        ),
+    )
+
+    actions.finish(transaction.pk)
+
+    assert response.context['action_status']['status'] == 'pending'
+    assert b'http-equiv="refresh"' in response.content
+    assert b'Transaction refund is being processed' in response.content
+
+@pytest.mark.django_db
+def test_transaction_detail_finished_action(admin_client):
+    """Tests that a finished action is displayed once."""
+    transaction = create_transaction('s')
+    actions.start(transaction.pk, 'refund')
+    actions.finish(transaction.pk, {
+        'action': 'refund', 'status': 'succeeded',
+        'message': 'Transaction refunded',
+    })
+    url = reverse(
+        'helcim_transaction_detail',
+        kwargs={'transaction_id': transaction.id}
+    )
+
+    response = admin_client.get(url)
+    messages = [message for message in get_messages(response.wsgi_request)]
+
+    assert response.context['action_status'] is None
+    assert messages[0].tags == 'success'
+    assert messages[0].message == 'Transaction refunded'
+    assert actions.get_status(transaction.pk) is None
+
 @pytest.mark.django_db
 def test_token_list_template(admin_client):
     """Tests for proper HTML template for token list."""
@@ -620,3 +798,12 @@ def test_token_delete_post_message_on_success(admin_client):
     assert response.status_code == 200
     assert messages[0].tags == 'success'
     assert messages[0].message == 'Token successfully deleted.'
+
+def test_metrics_view_returns_exposition():
+    """Tests that metrics view returns the Prometheus text format."""
+    view = views.MetricsView.as_view()
+    response = view(RequestFactory().get('/metrics/'))
+
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+    assert b'# TYPE helcim_transactions_total counter' in response.content
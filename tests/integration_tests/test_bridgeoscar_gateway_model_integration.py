@@ -295,7 +295,7 @@ def test_purchase_bridge_valid_no_redaction():
     assert transaction.transaction_id == 1111111
     assert transaction.cc_name == 'Test Person'
     assert 'amount=200.00' in transaction.raw_request
-    assert 'cardHolderName=Test Person' in transaction.raw_request
+    assert 'cardHolderName=Test+Person' in transaction.raw_request
 
     # Check for expected token details
     assert isinstance(token, models.HelcimToken)